@@ -1,11 +1,15 @@
 import React, { useState, useEffect } from 'react';
 import { useAuth } from '../context/AuthContext';
 import axios from 'axios';
+import { readNdjson } from '../utils/readNdjson';
 import './Assignment.css';
 
 const Assignment = () => {
   const { user } = useAuth();
   const [view, setView] = useState('home'); // home, generating, taking, results
+  // Questions received so far while the assignment is being generated
+  const [streamedQuestions, setStreamedQuestions] = useState([]);
+  const [streamingHeader, setStreamingHeader] = useState(null);
   const [topic, setTopic] = useState('Number System');
   const [currentAssignment, setCurrentAssignment] = useState(null);
   const [currentAttempt, setCurrentAttempt] = useState(null);
@@ -73,24 +77,45 @@ const Assignment = () => {
   const generateAssignment = async () => {
     setLoading(true);
     setError('');
+    setStreamedQuestions([]);
+    setStreamingHeader(null);
     setView('generating');
 
     try {
-      const response = await axios.post('http://localhost:5000/api/assignment/generate', {
-        studentId: user.id,
-        topic: topic
+      // The questions are streamed (one JSON object per line) as the AI writes them
+      const response = await fetch('http://localhost:5000/api/assignment/generate?stream=ndjson', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ studentId: user.id, topic: topic })
       });
+      if (!response.ok) {
+        const body = await response.json().catch(() => ({}));
+        throw new Error(body.message || 'Failed to generate assignment');
+      }
 
-      if (response.data.data) {
-        setCurrentAssignment(response.data.data);
-        setView('home');
-        setLoading(false);
+      let generated = null;
+      await readNdjson(response, (message) => {
+        if (message.type === 'assignment') {
+          setStreamingHeader(message.data);
+        } else if (message.type === 'question') {
+          setStreamedQuestions(prev => [...prev, message.data]);
+        } else if (message.type === 'done') {
+          generated = message.data;
+        } else if (message.type === 'error') {
+          throw new Error(message.message || 'Failed to generate assignment');
+        }
+      });
+      if (!generated) {
+        throw new Error('Assignment generation was interrupted');
       }
+
+      setCurrentAssignment(generated);
+      setView('home');
     } catch (error) {
-      setError(error.response?.data?.message || 'Failed to generate assignment');
+      setError(error.message || 'Failed to generate assignment');
       setView('home');
-      setLoading(false);
     }
+    setLoading(false);
   };
 
   const startAssignment = async () => {
@@ -309,12 +334,25 @@ const Assignment = () => {
         <div className="spinner-large"></div>
         <h2>🤖 Creating Your Personalized Assignment...</h2>
         <p>Analyzing your performance and selecting questions on <strong>{topic}</strong></p>
-        <div className="generating-steps">
-          <div className="step active">📊 Analyzing your quiz history</div>
-          <div className="step">🎯 Identifying weak areas</div>
-          <div className="step">📝 Selecting adaptive questions</div>
-          <div className="step">✅ Finalizing assignment</div>
-        </div>
+        {streamedQuestions.length > 0 ? (
+          <div className="generating-steps">
+            <div className="step active">
+              📝 {streamedQuestions.length} of {streamingHeader?.totalQuestions || 10} questions ready
+            </div>
+            {streamedQuestions.map((q, idx) => (
+              <div key={idx} className="step">
+                Q{idx + 1} ({q.difficulty}): {q.question}
+              </div>
+            ))}
+          </div>
+        ) : (
+          <div className="generating-steps">
+            <div className="step active">📊 Analyzing your quiz history</div>
+            <div className="step">🎯 Identifying weak areas</div>
+            <div className="step">📝 Selecting adaptive questions</div>
+            <div className="step">✅ Finalizing assignment</div>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { useAuth } from '../context/AuthContext';
 import axios from 'axios';
+import { pickRendition } from './LessonVideo';
 import './Doubt.css';
 
 const Doubt = () => {
@@ -21,6 +22,8 @@ const Doubt = () => {
     topic: 'Rational vs Irrational Numbers'
   });
   const [showProfileEditor, setShowProfileEditor] = useState(false);
+  // Render progress of the answer being prepared, pushed by the server
+  const [videoProgress, setVideoProgress] = useState(null);
   const messagesEndRef = useRef(null);
   const fileInputRef = useRef(null);
 
@@ -104,7 +107,7 @@ const Doubt = () => {
               role: 'assistant',
               content: parsed,
               manimCode: msg.manimCode,
-              videoUrl: msg.videoUrl,
+              videoUrl: pickRendition(msg.videoUrl, msg.renditions),
               audioUrl: msg.audioUrl
             };
           } catch {
@@ -112,7 +115,7 @@ const Doubt = () => {
               role: 'assistant',
               content: { doubtClarification: msg.content },
               manimCode: msg.manimCode,
-              videoUrl: msg.videoUrl
+              videoUrl: pickRendition(msg.videoUrl, msg.renditions)
             };
           }
         }
@@ -150,6 +153,14 @@ const Doubt = () => {
 
     setMessages(prev => [...prev, userMessage]);
     setLoading(true);
+    setVideoProgress(null);
+
+    // Follow the analysis and video render while the request is pending
+    const progressId = `${user.id}_${Date.now()}_${Math.random().toString(36).substr(2, 6)}`;
+    const progressSource = new EventSource(`http://localhost:5000/api/progress/doubt/${progressId}`);
+    progressSource.addEventListener('progress', (event) => {
+      setVideoProgress(JSON.parse(event.data));
+    });
 
     try {
       let imageBase64 = null;
@@ -171,7 +182,8 @@ const Doubt = () => {
           studentId: user.id,
           doubtText: inputText,
           imageBase64,
-          studentProfile
+          studentProfile,
+          progressId
         });
 
         setCurrentDoubtId(response.data.data.doubtId);
@@ -180,7 +192,8 @@ const Doubt = () => {
         // Continue existing conversation
         response = await axios.post(`http://localhost:5000/api/doubt/${currentDoubtId}/followup`, {
           followUpText: inputText,
-          imageBase64
+          imageBase64,
+          progressId
         });
       }
 
@@ -191,7 +204,7 @@ const Doubt = () => {
         role: 'assistant',
         content: aiResponse,
         manimCode: aiResponse?.manimCode,
-        videoUrl: video?.videoUrl,
+        videoUrl: pickRendition(video?.videoUrl, video?.renditions),
         audioUrl: video?.audioUrl
       }]);
 
@@ -209,7 +222,27 @@ const Doubt = () => {
         }
       }]);
     } finally {
+      progressSource.close();
       setLoading(false);
+      setVideoProgress(null);
+    }
+  };
+
+  const describeProgress = (progress) => {
+    switch (progress?.stage) {
+      case 'analyzing':
+        return progress.answerChars
+          ? `Writing the explanation... (${progress.answerChars} characters so far)`
+          : 'Analyzing your doubt and creating visual explanation...';
+      case 'tts': return 'Recording the narration...';
+      case 'mux': return 'Adding the narration to the video...';
+      case 'done': return 'Video ready, finishing up...';
+      case 'render': {
+        if (!progress.total) return 'Creating visual explanation with Manim...';
+        const eta = progress.etaSeconds != null ? ` · about ${Math.max(1, progress.etaSeconds)}s left` : '';
+        return `Creating visual explanation: animation ${Math.min(progress.animation + 1, progress.total)} of ${progress.total} (${progress.percent || 0}%)${eta}`;
+      }
+      default: return 'Analyzing your doubt and creating visual explanation...';
     }
   };
 
@@ -517,7 +550,7 @@ const Doubt = () => {
                   <span></span>
                   <span></span>
                 </div>
-                <p>Analyzing your doubt and creating visual explanation...</p>
+                <p>{describeProgress(videoProgress)}</p>
               </div>
             </div>
           )}
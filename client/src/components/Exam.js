@@ -1,11 +1,15 @@
 import React, { useState, useEffect, useCallback } from 'react';
 import { useAuth } from '../context/AuthContext';
 import axios from 'axios';
+import { readNdjson } from '../utils/readNdjson';
 import './Exam.css';
 
 const Exam = () => {
   const { user } = useAuth();
   const [view, setView] = useState('home'); // home, generating, taking, results, history
+  // Questions received so far while the exam is being generated
+  const [streamedQuestions, setStreamedQuestions] = useState([]);
+  const [streamingHeader, setStreamingHeader] = useState(null);
   const [topic, setTopic] = useState('Number System');
   const [currentExam, setCurrentExam] = useState(null);
   const [currentAttempt, setCurrentAttempt] = useState(null);
@@ -87,24 +91,45 @@ const Exam = () => {
   const generateExam = async () => {
     setLoading(true);
     setError('');
+    setStreamedQuestions([]);
+    setStreamingHeader(null);
     setView('generating');
 
     try {
-      const response = await axios.post('http://localhost:5000/api/exam/generate', {
-        studentId: user.id,
-        topic: topic
+      // The questions are streamed (one JSON object per line) as the AI writes them
+      const response = await fetch('http://localhost:5000/api/exam/generate?stream=ndjson', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ studentId: user.id, topic: topic })
       });
+      if (!response.ok) {
+        const body = await response.json().catch(() => ({}));
+        throw new Error(body.message || 'Failed to generate exam');
+      }
 
-      if (response.data.data) {
-        setCurrentExam(response.data.data);
-        setView('home');
-        setLoading(false);
+      let generated = null;
+      await readNdjson(response, (message) => {
+        if (message.type === 'exam') {
+          setStreamingHeader(message.data);
+        } else if (message.type === 'question') {
+          setStreamedQuestions(prev => [...prev, message.data]);
+        } else if (message.type === 'done') {
+          generated = message.data;
+        } else if (message.type === 'error') {
+          throw new Error(message.message || 'Failed to generate exam');
+        }
+      });
+      if (!generated) {
+        throw new Error('Exam generation was interrupted');
       }
+
+      setCurrentExam(generated);
+      setView('home');
     } catch (error) {
-      setError(error.response?.data?.message || 'Failed to generate exam');
+      setError(error.message || 'Failed to generate exam');
       setView('home');
-      setLoading(false);
     }
+    setLoading(false);
   };
 
   const startExam = async () => {
@@ -314,14 +339,27 @@ const Exam = () => {
       <div className="generating-animation">
         <div className="spinner-large"></div>
         <h2>🤖 AI is Creating Your Exam...</h2>
-        <p>Generating 15 balanced questions on <strong>{topic}</strong></p>
-        <div className="generating-steps">
-          <div className="step active">📚 Analyzing NCERT curriculum</div>
-          <div className="step">🎯 Selecting easy questions</div>
-          <div className="step">📊 Adding medium questions</div>
-          <div className="step">🔥 Including challenging problems</div>
-          <div className="step">✅ Finalizing exam paper</div>
-        </div>
+        <p>Generating {streamingHeader?.totalQuestions || 15} balanced questions on <strong>{topic}</strong></p>
+        {streamedQuestions.length > 0 ? (
+          <div className="generating-steps">
+            <div className="step active">
+              📝 {streamedQuestions.length} of {streamingHeader?.totalQuestions || 15} questions ready
+            </div>
+            {streamedQuestions.map((q, idx) => (
+              <div key={idx} className="step">
+                Q{idx + 1} ({q.difficulty}): {q.question}
+              </div>
+            ))}
+          </div>
+        ) : (
+          <div className="generating-steps">
+            <div className="step active">📚 Analyzing NCERT curriculum</div>
+            <div className="step">🎯 Selecting easy questions</div>
+            <div className="step">📊 Adding medium questions</div>
+            <div className="step">🔥 Including challenging problems</div>
+            <div className="step">✅ Finalizing exam paper</div>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -0,0 +1,161 @@
+import React, { useEffect, useRef } from 'react';
+
+const SERVER_URL = 'http://localhost:5000';
+const PLAYLIST_POLL_MS = 2000;
+
+const isPlaylist = (url) => /\.m3u8($|\?)/.test(url || '');
+
+// Lesson streams are served by the Express server, finished videos by the React app
+const resolveUrl = (url) => (url && url.startsWith('/hls/') ? `${SERVER_URL}${url}` : url);
+
+// Read "avc1.PPCCLL" from the avcC box of an fMP4 init segment
+const codecFromInit = (bytes) => {
+  for (let i = 0; i < bytes.length - 8; i++) {
+    if (bytes[i] === 0x61 && bytes[i + 1] === 0x76 && bytes[i + 2] === 0x63 && bytes[i + 3] === 0x43) {
+      const hex = (b) => b.toString(16).padStart(2, '0');
+      return `avc1.${hex(bytes[i + 5])}${hex(bytes[i + 6])}${hex(bytes[i + 7])}`;
+    }
+  }
+  return 'avc1.64001f';
+};
+
+/**
+ * Choose the rendition to play from the measured bandwidth (Network Information
+ * API): the best one whose bitrate fits, the smallest one with Save-Data on.
+ * Without bandwidth information the server's choice (src, the best rendition) is kept.
+ */
+export const pickRendition = (src, renditions) => {
+  const connection = typeof navigator !== 'undefined' ? navigator.connection : null;
+  if (!renditions || renditions.length === 0 || isPlaylist(src) || !connection) return src;
+
+  const bestFirst = [...renditions].sort((a, b) => (b.height || 0) - (a.height || 0));
+  if (connection.saveData) return bestFirst[bestFirst.length - 1].url;
+  if (!connection.downlink) return src;
+
+  const fits = bestFirst.find((rendition) => (rendition.minMbps || 0) <= connection.downlink);
+  return (fits || bestFirst[bestFirst.length - 1]).url;
+};
+
+const parsePlaylist = (text, baseUrl) => {
+  const items = [];
+  for (const line of text.split(/\r?\n/)) {
+    const map = line.match(/^#EXT-X-MAP:URI="([^"]+)"/);
+    if (map) {
+      items.push({ type: 'init', url: new URL(map[1], baseUrl).href });
+    } else if (line && !line.startsWith('#')) {
+      items.push({ type: 'segment', url: new URL(line.trim(), baseUrl).href });
+    }
+  }
+  return { items, ended: text.includes('#EXT-X-ENDLIST') };
+};
+
+/**
+ * Play a live (still growing) lesson playlist through Media Source Extensions.
+ * Every animation in the playlist carries its own init segment, so the source
+ * buffer runs in "sequence" mode and each segment is appended after its init.
+ */
+const playLivePlaylist = (video, playlistUrl) => {
+  let cancelled = false;
+  const mediaSource = new MediaSource();
+  const objectUrl = URL.createObjectURL(mediaSource);
+  video.src = objectUrl;
+
+  const fetchBytes = async (url) => new Uint8Array(await (await fetch(url)).arrayBuffer());
+
+  const append = (sourceBuffer, bytes) => new Promise((resolve, reject) => {
+    sourceBuffer.addEventListener('updateend', resolve, { once: true });
+    sourceBuffer.addEventListener('error', reject, { once: true });
+    sourceBuffer.appendBuffer(bytes);
+  });
+
+  mediaSource.addEventListener('sourceopen', async () => {
+    let sourceBuffer = null;
+    let processed = 0;
+    let initBytes = null;
+
+    try {
+      while (!cancelled) {
+        const response = await fetch(playlistUrl, { cache: 'no-store' });
+        const { items, ended } = parsePlaylist(await response.text(), playlistUrl);
+
+        for (; processed < items.length && !cancelled; processed++) {
+          const item = items[processed];
+          if (item.type === 'init') {
+            initBytes = await fetchBytes(item.url);
+            continue;
+          }
+          if (!sourceBuffer) {
+            sourceBuffer = mediaSource.addSourceBuffer(`video/mp4; codecs="${codecFromInit(initBytes)}"`);
+            sourceBuffer.mode = 'sequence';
+          }
+          if (initBytes) {
+            await append(sourceBuffer, initBytes);
+            initBytes = null;
+          }
+          await append(sourceBuffer, await fetchBytes(item.url));
+        }
+
+        if (ended) {
+          if (!cancelled && mediaSource.readyState === 'open') mediaSource.endOfStream();
+          return;
+        }
+        await new Promise((resolve) => setTimeout(resolve, PLAYLIST_POLL_MS));
+      }
+    } catch (error) {
+      console.error('Lesson stream playback error:', error);
+    }
+  }, { once: true });
+
+  return () => {
+    cancelled = true;
+    URL.revokeObjectURL(objectUrl);
+  };
+};
+
+/**
+ * Lesson video player. Plays finished MP4s directly and lessons that are
+ * still rendering from their HLS playlist. When the lesson switches from
+ * the stream to the finished video, or to a better rendition of it,
+ * playback continues at the same time.
+ */
+const LessonVideo = ({ src, renditions, className }) => {
+  const videoRef = useRef(null);
+  const resumeRef = useRef(null);
+  const chosen = pickRendition(src, renditions);
+  const renditionUrls = (renditions || []).map((rendition) => rendition.url).join(' ');
+
+  useEffect(() => {
+    const video = videoRef.current;
+    if (!video || !chosen) return undefined;
+
+    const url = resolveUrl(chosen);
+    const resume = resumeRef.current;
+    let cleanup = () => {};
+
+    if (resume && (resume.fromStream || resume.renditionUrls.split(' ').includes(chosen))) {
+      video.addEventListener('loadedmetadata', () => {
+        video.currentTime = resume.time;
+        if (resume.playing) video.play().catch(() => {});
+      }, { once: true });
+    }
+
+    if (!isPlaylist(url) || video.canPlayType('application/vnd.apple.mpegurl')) {
+      video.src = url;
+    } else if (window.MediaSource) {
+      cleanup = playLivePlaylist(video, url);
+    }
+
+    return () => {
+      resumeRef.current = { time: video.currentTime, playing: !video.paused, fromStream: isPlaylist(url), renditionUrls };
+      cleanup();
+    };
+  }, [chosen, renditionUrls]);
+
+  return (
+    <video controls ref={videoRef} className={className}>
+      Your browser does not support video playback.
+    </video>
+  );
+};
+
+export default LessonVideo;
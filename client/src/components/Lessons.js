@@ -1,6 +1,7 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useAuth } from '../context/AuthContext';
 import axios from 'axios';
+import LessonVideo from './LessonVideo';
 import './Lessons.css';
 
 const Lessons = () => {
@@ -14,6 +15,9 @@ const Lessons = () => {
   const [error, setError] = useState('');
   const [activeTab, setActiveTab] = useState('lessons');
   const [customTopic, setCustomTopic] = useState('');
+  // lessonId -> latest render progress pushed by the server
+  const [renderProgress, setRenderProgress] = useState({});
+  const progressStreams = useRef({});
 
   useEffect(() => {
     if (user?.id) {
@@ -22,6 +26,11 @@ const Lessons = () => {
     }
   }, [user]);
 
+  // Close the progress streams when leaving the page
+  useEffect(() => () => {
+    Object.values(progressStreams.current).forEach(source => source.close());
+  }, []);
+
   const fetchLessons = async () => {
     setLoading(true);
     try {
@@ -57,10 +66,10 @@ const Lessons = () => {
         setSelectedLesson(newLesson);
         setCustomTopic('');
 
-        // If rendering is in progress, start polling for completion
+        // If rendering is in progress, follow its progress until the video is ready
         if (newLesson.renderStatus === 'rendering' && newLesson.lessonId) {
-          console.log('⏳ Lesson created, polling for video...');
-          pollForVideoCompletion(newLesson.lessonId, newLesson._id);
+          console.log('⏳ Lesson created, waiting for video...');
+          watchRenderProgress(newLesson.lessonId);
         }
       }
     } catch (error) {
@@ -69,45 +78,63 @@ const Lessons = () => {
     setGenerating(false);
   };
 
-  const pollForVideoCompletion = (lessonId, dbId, attempts = 0) => {
-    const maxAttempts = 180; // Poll for up to 30 minutes (180 * 10 seconds)
-    
-    if (attempts >= maxAttempts) {
-      console.log('❌ Video rendering timeout');
-      setError('Video rendering took too long. Please refresh the page.');
-      return;
-    }
+  const watchRenderProgress = (lessonId) => {
+    if (progressStreams.current[lessonId]) return;
 
-    // Wait 10 seconds before polling
-    setTimeout(async () => {
-      try {
-        const response = await axios.get(`http://localhost:5000/api/lesson/${dbId}`);
-        const lesson = response.data.data;
+    const source = new EventSource(`http://localhost:5000/api/progress/lesson/${lessonId}`);
+    progressStreams.current[lessonId] = source;
+    const stop = () => {
+      source.close();
+      delete progressStreams.current[lessonId];
+    };
 
-        if (lesson.renderStatus === 'completed' && lesson.videoUrl) {
-          console.log('✅ Video ready!');
-          setSelectedLesson(lesson);
-          setLessons(prev =>
-            prev.map(l => (l._id === dbId) ? lesson : l)
-          );
-        } else if (lesson.renderStatus === 'rendering') {
-          console.log(`⏳ Still rendering... (${attempts + 1}/${maxAttempts})`);
-          pollForVideoCompletion(lessonId, dbId, attempts + 1);
-        } else if (lesson.renderStatus === 'failed' || lesson.renderStatus === 'error') {
-          console.log('❌ Rendering failed');
-          setError(`Rendering failed: ${lesson.renderError}`);
-        } else {
-          // Continue polling
-          pollForVideoCompletion(lessonId, dbId, attempts + 1);
+    source.addEventListener('progress', async (event) => {
+      const progress = JSON.parse(event.data);
+      setRenderProgress(prev => ({ ...prev, [lessonId]: progress }));
+
+      // The first animations can be streamed before the render finishes
+      if (progress.streamUrl) {
+        setSelectedLesson(prev => (prev && prev.lessonId === lessonId && !prev.videoUrl)
+          ? { ...prev, videoUrl: progress.streamUrl }
+          : prev);
+      }
+
+      if (progress.stage === 'done' || progress.stage === 'failed') {
+        stop();
+        try {
+          const response = await axios.get(`http://localhost:5000/api/lesson/${lessonId}`);
+          const lesson = response.data.data;
+          console.log(progress.stage === 'done' ? '✅ Video ready!' : '❌ Rendering failed');
+          setSelectedLesson(prev => (prev && prev.lessonId === lessonId) ? lesson : prev);
+          setLessons(prev => prev.map(l => (l.lessonId === lessonId) ? lesson : l));
+        } catch (error) {
+          console.error('Error fetching rendered lesson:', error);
         }
-      } catch (error) {
-        console.error('Error polling for video:', error);
-        // Continue polling despite errors
-        if (attempts < maxAttempts) {
-          pollForVideoCompletion(lessonId, dbId, attempts + 1);
+        if (progress.stage === 'failed') {
+          setError(`Rendering failed: ${progress.error}`);
         }
       }
-    }, 10000); // Poll every 10 seconds
+    });
+
+    // EventSource reconnects by itself; only give up once the server closed the stream
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) stop();
+    };
+  };
+
+  const describeProgress = (progress) => {
+    if (!progress) return null;
+    switch (progress.stage) {
+      case 'queued': return 'Waiting for a render worker...';
+      case 'tts': return 'Recording the narration...';
+      case 'mux': return 'Adding the narration to the video...';
+      case 'render': {
+        if (!progress.total) return 'Rendering animations...';
+        const eta = progress.etaSeconds != null ? ` · about ${Math.max(1, Math.round(progress.etaSeconds / 60))} min left` : '';
+        return `Rendering animation ${Math.min(progress.animation + 1, progress.total)} of ${progress.total} (${progress.percent || 0}%)${eta}`;
+      }
+      default: return null;
+    }
   };
 
   const generateChapters = async () => {
@@ -132,6 +159,9 @@ const Lessons = () => {
     try {
       const response = await axios.get(`http://localhost:5000/api/lesson/${lessonId}`);
       setSelectedLesson(response.data.data);
+      if (response.data.data?.renderStatus === 'rendering') {
+        watchRenderProgress(lessonId);
+      }
     } catch (error) {
       console.error('Error fetching lesson:', error);
     }
@@ -153,9 +183,8 @@ const Lessons = () => {
   const renderManimAnimation = async (lessonId) => {
     try {
       await axios.post(`http://localhost:5000/api/lesson/${lessonId}/render`);
-      alert('Rendering started! Please wait...');
-      // Poll for completion
-      setTimeout(() => viewLesson(lessonId), 10000);
+      setSelectedLesson(prev => (prev && prev.lessonId === lessonId) ? { ...prev, renderStatus: 'rendering' } : prev);
+      watchRenderProgress(lessonId);
     } catch (error) {
       console.error('Error rendering:', error);
     }
@@ -445,19 +474,29 @@ const Lessons = () => {
               {selectedLesson.videoUrl ? (
                 <div className="video-container">
                   <h4>🎬 Animation</h4>
-                  <video 
-                    controls 
+                  <LessonVideo 
                     src={selectedLesson.videoUrl}
+                    renditions={selectedLesson.renditions}
                     className="lesson-video"
-                  >
-                    Your browser does not support video playback.
-                  </video>
+                  />
+                  {selectedLesson.renderStatus === 'rendering' && (
+                    <p className="progress-hint">
+                      📡 Streaming while the rest of the lesson renders...
+                      {describeProgress(renderProgress[selectedLesson.lessonId]) && ` ${describeProgress(renderProgress[selectedLesson.lessonId])}`}
+                    </p>
+                  )}
                 </div>
               ) : selectedLesson.renderStatus === 'rendering' ? (
                 <div className="render-progress">
                   <h4>⏳ Creating Animation...</h4>
                   <div className="spinner"></div>
-                  <p>Manim is rendering your personalized animation. This typically takes 5-15 minutes.</p>
+                  <p>
+                    {describeProgress(renderProgress[selectedLesson.lessonId])
+                      || 'Manim is rendering your personalized animation. This typically takes 5-15 minutes.'}
+                  </p>
+                  {renderProgress[selectedLesson.lessonId]?.percent != null && (
+                    <progress className="render-progress-bar" max="100" value={renderProgress[selectedLesson.lessonId].percent} />
+                  )}
                   <p className="progress-hint">🔄 The page will automatically update when the video is ready.</p>
                 </div>
               ) : selectedLesson.manimCode ? (
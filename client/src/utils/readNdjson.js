@@ -0,0 +1,33 @@
+// Calls onMessage with each line of a streamed (NDJSON) response. A
+// malformed line, or an error thrown by onMessage, cancels the response
+// before the error is passed on.
+export const readNdjson = async (response, onMessage) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = '';
+
+  const handleLine = (line) => {
+    let message;
+    try {
+      message = JSON.parse(line);
+    } catch (error) {
+      throw new Error('Received a malformed response from the server');
+    }
+    onMessage(message);
+  };
+
+  try {
+    for (;;) {
+      const { value, done } = await reader.read();
+      buffered += decoder.decode(value || new Uint8Array(), { stream: !done });
+      const lines = buffered.split('\n');
+      buffered = lines.pop();
+      lines.filter(line => line.trim()).forEach(handleLine);
+      if (done) break;
+    }
+    if (buffered.trim()) handleLine(buffered);
+  } catch (error) {
+    reader.cancel().catch(() => {});
+    throw error;
+  }
+};
@@ -12,11 +12,28 @@ const { Assignment, AssignmentAttempt } = require('./models/Assignment');
 const { Doubt } = require('./models/Doubt');
 const class9Quizzes = require('./data/quizData');
 const { analyzeStudentPerformance } = require('./services/analyticsAgent');
-const { generateTeachingLesson, generateChapterContent, determineMasteryLevel } = require('./services/teacherAgent');
+const { generateTeachingLesson, generateChapterContent, determineMasteryLevel, renderManimAnimation, previewManimAnimation } = require('./services/teacherAgent');
 const { generateExam, calculateScore } = require('./services/examAgent');
 const { generateAssignment, calculateStudentAnalytics } = require('./services/assignmentAgent');
-const { resolveDoubt, continueDoubt, generateVideo, getDefaultManimCode } = require('./services/doubtAgent');
+const { backfillQuestionBank, getQuestionBankStats } = require('./services/questionBank');
+const { registerPrecompute, schedulePrecompute, cancelPrecompute, joinPrecompute, getPrecomputeStats } = require('./services/precompute');
+const { resolveDoubt, continueDoubt, getDefaultManimCode, renderDoubtRendition } = require('./services/doubtAgent');
 const { generateScheduleFromContext, getScheduleRecommendation } = require('./services/scheduleAgent');
+const { startRenderPool, getRenderPoolStats } = require('./render/workerPool');
+const { getRenderCacheStats } = require('./render/renderCache');
+const { getFragmentStats } = require('./render/fragments');
+const { getRepairStats } = require('./render/repair');
+const { startProgress, getProgress, subscribeProgress, createProgressTracker } = require('./render/progress');
+const { HLS_DIR } = require('./render/hlsStream');
+const { JOB_PRIORITIES, registerJobHandler, enqueueJob, runJob, cancelJob, getJobStatus, reprioritizeJob, startJobQueue, getJobQueueStats } = require('./render/jobQueue');
+const { preflightScript, describePreflightErrors } = require('./render/preflight');
+const { getTtsStats } = require('./render/tts');
+const { getRenderEntry } = require('./render/manifest');
+const { getSessionStats } = require('./ondemand/sessions');
+const { getHttpStats } = require('./ondemand/http');
+const { startScratchCollector, getScratchStats } = require('./render/scratch');
+const { registerReferenceSource, sweepStorage, getStorageReport, startStorageManager } = require('./render/storage');
+const { makeRendition, mergeRendition, registerUpgradeTarget, enqueueUpgrades } = require('./render/renditions');
 
 const app = express();
 const PORT = 5000;
@@ -29,6 +46,8 @@ mongoose.connect(MONGO_URI)
   .then(async () => {
     console.log('Connected to MongoDB');
     await initializeQuizzes();
+    await startJobQueue();
+    backfillQuestionBank().catch(err => console.log('Question bank backfill failed:', err.message));
   })
   .catch(err => {
     console.log('MongoDB connection error:', err.message);
@@ -65,6 +84,16 @@ app.use(express.urlencoded({ limit: '50mb', extended: true }));
 app.use('/videos', express.static(path.join(__dirname, 'output', 'videos')));
 app.use('/audio', express.static(path.join(__dirname, 'output', 'audio')));
 
+// Progressive HLS playlists of lessons that are still rendering (playlists change, never cache them)
+app.use('/hls', express.static(HLS_DIR, {
+  setHeaders: (res, filePath) => {
+    if (filePath.endsWith('.m3u8')) {
+      res.setHeader('Content-Type', 'application/vnd.apple.mpegurl');
+      res.setHeader('Cache-Control', 'no-cache');
+    }
+  }
+}));
+
 // In-memory database (replace with real database in production)
 let parents = [];
 let students = [];
@@ -672,6 +701,8 @@ app.post('/api/quizzes/:quizId/submit', verifyToken, async (req, res) => {
     
     if (mongoose.connection.readyState === 1) {
       await QuizAttempt.create(attemptData);
+      // Analytics and the next lesson are usually asked for next: start on them now
+      schedulePrecompute(attemptData.studentId, { studentName: attemptData.studentName, trigger: 'quiz' });
     } else {
       inMemoryAttempts.push(attemptData);
     }
@@ -819,6 +850,119 @@ app.get('/api/analytics/:studentId', verifyToken, async (req, res) => {
   }
 });
 
+/**
+ * Analyze a student's quiz attempts (oldest first) with the analytics agent
+ * and save the result. Resolves to the Analytics document, or null when the
+ * agent failed.
+ */
+async function generateAnalytics(studentId, studentName, quizAttempts, { precomputed = false } = {}) {
+  // Call analytics agent
+  const analyticsResult = await analyzeStudentPerformance(
+    studentId, 
+    studentName, 
+    quizAttempts
+  );
+
+  if (!analyticsResult) return null;
+
+  // Parse AI response to extract structured data
+  const fullAnalysis = analyticsResult.answer || '';
+  
+  // Enhanced parsing logic with robust regex patterns
+  let performanceStatus = 'Stagnation';
+  const perfMatch = fullAnalysis.match(/Performance Status:\s*\*?\*?([^*\n-]+)/i);
+  if (perfMatch) {
+    const perfText = perfMatch[1].toLowerCase();
+    if (perfText.includes('improvement')) performanceStatus = 'Improvement';
+    else if (perfText.includes('decline')) performanceStatus = 'Decline';
+    else if (perfText.includes('stagnation')) performanceStatus = 'Stagnation';
+  }
+  
+  let riskLevel = 'Medium';
+  const riskMatch = fullAnalysis.match(/Risk Level:\s*\*?\*?(HIGH|MEDIUM|LOW|High|Medium|Low)/i);
+  if (riskMatch) {
+    const riskText = riskMatch[1].toUpperCase();
+    if (riskText === 'HIGH') riskLevel = 'High';
+    else if (riskText === 'LOW') riskLevel = 'Low';
+    else riskLevel = 'Medium';
+  }
+  
+  // Extract weak concepts more intelligently
+  const weakConcepts = [];
+  const weakSection = fullAnalysis.match(/Identified Weak Concepts:([^]*?)(?=Risk Level:|---|\n\n##)/i);
+  if (weakSection) {
+    const conceptText = weakSection[1];
+    // Look for specific mentions with WEAK tag or in bold
+    if (/Polynomial.*WEAK/i.test(conceptText)) weakConcepts.push('Polynomials');
+    if (/Number System.*WEAK/i.test(conceptText)) weakConcepts.push('Number System');
+    if (/Algebra.*WEAK/i.test(conceptText)) weakConcepts.push('Algebraic Expressions');
+    
+    // Also check for general mentions if no WEAK tag found
+    if (weakConcepts.length === 0) {
+      if (/polynomial/i.test(conceptText)) weakConcepts.push('Polynomials');
+      if (/number system/i.test(conceptText)) weakConcepts.push('Number System');
+      if (/algebra/i.test(conceptText)) weakConcepts.push('Algebraic Expressions');
+    }
+  }
+  
+  // Extract recommended action with complete context
+  let recommendedAction = 'Continue practice and review weak areas.';
+  const actionMatch = fullAnalysis.match(/Recommended Next Action:([^]*?)(?=If you can share|$)/i);
+  if (actionMatch) {
+    recommendedAction = actionMatch[1]
+      .replace(/\*\*/g, '')
+      .replace(/^\s*-+\s*/gm, '')
+      .replace(/\n{3,}/g, '\n\n')
+      .trim()
+      .substring(0, 1500); // Increased limit
+  }
+  
+  // Format the full analysis for beautiful display with section breaks
+  const formattedAnalysis = fullAnalysis
+    .split(/---+/)
+    .map(section => section.trim())
+    .filter(section => section.length > 0)
+    .join('\n\n---\n\n');
+  
+  // Calculate metrics
+  const totalAttempts = quizAttempts.length;
+  const averageAccuracy = quizAttempts.reduce((sum, a) => sum + a.accuracy, 0) / totalAttempts;
+  const averageHintUsage = quizAttempts.reduce((sum, a) => sum + a.hintUsageCount, 0) / totalAttempts;
+  const averageMistakeRepetitions = quizAttempts.reduce((sum, a) => sum + a.mistakeRepetitionCount, 0) / totalAttempts;
+  const maxConsecutiveWrong = Math.max(...quizAttempts.map(a => a.consecutiveWrongAnswers));
+  const averageTimePerQuestion = quizAttempts.reduce((sum, a) => {
+    const totalTime = a.timePerQuestion.reduce((s, t) => s + t, 0);
+    return sum + (totalTime / a.timePerQuestion.length);
+  }, 0) / totalAttempts;
+
+  // Save analytics to database
+  const newAnalytics = new Analytics({
+    analyticsId: 'ANL-' + Date.now(),
+    studentId,
+    studentName,
+    sessionId: analyticsResult.sessionId,
+    messageId: analyticsResult.messageId,
+    performanceStatus,
+    weakConcepts,
+    riskLevel,
+    recommendedAction,
+    fullAnalysis: formattedAnalysis,
+    totalAttempts,
+    averageAccuracy: Math.round(averageAccuracy * 100) / 100,
+    averageHintUsage: Math.round(averageHintUsage * 100) / 100,
+    averageMistakeRepetitions: Math.round(averageMistakeRepetitions * 100) / 100,
+    maxConsecutiveWrong,
+    averageTimePerQuestion: Math.round(averageTimePerQuestion * 100) / 100,
+    analyzedQuizzes: quizAttempts.map(a => a.quizId),
+    precomputed
+  });
+
+  await newAnalytics.save();
+
+  console.log(`✅ Analytics saved with ID: ${newAnalytics.analyticsId}`);
+  return newAnalytics;
+}
+
 // Trigger analytics generation for a student
 app.post('/api/analytics/generate', verifyToken, async (req, res) => {
   try {
@@ -840,114 +984,23 @@ app.post('/api/analytics/generate', verifyToken, async (req, res) => {
 
     console.log(`\nGenerating analytics for ${studentName} (${studentId}) with ${quizAttempts.length} attempts`);
 
-    // Call analytics agent
-    const analyticsResult = await analyzeStudentPerformance(
-      studentId, 
-      studentName, 
-      quizAttempts
-    );
+    // Analytics pre-computed after the latest submission answer at once
+    const precomputed = await takePrecomputedAnalytics(studentId, quizAttempts.length);
+    if (precomputed) {
+      console.log(`⚡ Using pre-computed analytics ${precomputed.analyticsId}`);
+      return res.json({
+        message: 'Analytics generated successfully',
+        data: precomputed
+      });
+    }
 
-    if (!analyticsResult) {
+    const newAnalytics = await generateAnalytics(studentId, studentName, quizAttempts);
+    if (!newAnalytics) {
       return res.status(500).json({ 
         message: 'Failed to generate analytics. Check server logs.' 
       });
     }
 
-    // Parse AI response to extract structured data
-    const fullAnalysis = analyticsResult.answer || '';
-    
-    // Enhanced parsing logic with robust regex patterns
-    let performanceStatus = 'Stagnation';
-    const perfMatch = fullAnalysis.match(/Performance Status:\s*\*?\*?([^*\n-]+)/i);
-    if (perfMatch) {
-      const perfText = perfMatch[1].toLowerCase();
-      if (perfText.includes('improvement')) performanceStatus = 'Improvement';
-      else if (perfText.includes('decline')) performanceStatus = 'Decline';
-      else if (perfText.includes('stagnation')) performanceStatus = 'Stagnation';
-    }
-    
-    let riskLevel = 'Medium';
-    const riskMatch = fullAnalysis.match(/Risk Level:\s*\*?\*?(HIGH|MEDIUM|LOW|High|Medium|Low)/i);
-    if (riskMatch) {
-      const riskText = riskMatch[1].toUpperCase();
-      if (riskText === 'HIGH') riskLevel = 'High';
-      else if (riskText === 'LOW') riskLevel = 'Low';
-      else riskLevel = 'Medium';
-    }
-    
-    // Extract weak concepts more intelligently
-    const weakConcepts = [];
-    const weakSection = fullAnalysis.match(/Identified Weak Concepts:([^]*?)(?=Risk Level:|---|\n\n##)/i);
-    if (weakSection) {
-      const conceptText = weakSection[1];
-      // Look for specific mentions with WEAK tag or in bold
-      if (/Polynomial.*WEAK/i.test(conceptText)) weakConcepts.push('Polynomials');
-      if (/Number System.*WEAK/i.test(conceptText)) weakConcepts.push('Number System');
-      if (/Algebra.*WEAK/i.test(conceptText)) weakConcepts.push('Algebraic Expressions');
-      
-      // Also check for general mentions if no WEAK tag found
-      if (weakConcepts.length === 0) {
-        if (/polynomial/i.test(conceptText)) weakConcepts.push('Polynomials');
-        if (/number system/i.test(conceptText)) weakConcepts.push('Number System');
-        if (/algebra/i.test(conceptText)) weakConcepts.push('Algebraic Expressions');
-      }
-    }
-    
-    // Extract recommended action with complete context
-    let recommendedAction = 'Continue practice and review weak areas.';
-    const actionMatch = fullAnalysis.match(/Recommended Next Action:([^]*?)(?=If you can share|$)/i);
-    if (actionMatch) {
-      recommendedAction = actionMatch[1]
-        .replace(/\*\*/g, '')
-        .replace(/^\s*-+\s*/gm, '')
-        .replace(/\n{3,}/g, '\n\n')
-        .trim()
-        .substring(0, 1500); // Increased limit
-    }
-    
-    // Format the full analysis for beautiful display with section breaks
-    const formattedAnalysis = fullAnalysis
-      .split(/---+/)
-      .map(section => section.trim())
-      .filter(section => section.length > 0)
-      .join('\n\n---\n\n');
-    
-    // Calculate metrics
-    const totalAttempts = quizAttempts.length;
-    const averageAccuracy = quizAttempts.reduce((sum, a) => sum + a.accuracy, 0) / totalAttempts;
-    const averageHintUsage = quizAttempts.reduce((sum, a) => sum + a.hintUsageCount, 0) / totalAttempts;
-    const averageMistakeRepetitions = quizAttempts.reduce((sum, a) => sum + a.mistakeRepetitionCount, 0) / totalAttempts;
-    const maxConsecutiveWrong = Math.max(...quizAttempts.map(a => a.consecutiveWrongAnswers));
-    const averageTimePerQuestion = quizAttempts.reduce((sum, a) => {
-      const totalTime = a.timePerQuestion.reduce((s, t) => s + t, 0);
-      return sum + (totalTime / a.timePerQuestion.length);
-    }, 0) / totalAttempts;
-
-    // Save analytics to database
-    const newAnalytics = new Analytics({
-      analyticsId: 'ANL-' + Date.now(),
-      studentId,
-      studentName,
-      sessionId: analyticsResult.sessionId,
-      messageId: analyticsResult.messageId,
-      performanceStatus,
-      weakConcepts,
-      riskLevel,
-      recommendedAction,
-      fullAnalysis: formattedAnalysis,
-      totalAttempts,
-      averageAccuracy: Math.round(averageAccuracy * 100) / 100,
-      averageHintUsage: Math.round(averageHintUsage * 100) / 100,
-      averageMistakeRepetitions: Math.round(averageMistakeRepetitions * 100) / 100,
-      maxConsecutiveWrong,
-      averageTimePerQuestion: Math.round(averageTimePerQuestion * 100) / 100,
-      analyzedQuizzes: quizAttempts.map(a => a.quizId)
-    });
-
-    await newAnalytics.save();
-
-    console.log(`✅ Analytics saved with ID: ${newAnalytics.analyticsId}`);
-
     res.json({
       message: 'Analytics generated successfully',
       data: newAnalytics
@@ -961,6 +1014,68 @@ app.post('/api/analytics/generate', verifyToken, async (req, res) => {
 
 // ==================== TEACHER/LESSON ENDPOINTS ====================
 
+/**
+ * Generate a lesson on topic (the weakest concept when missing) with the
+ * teacher agent and save it; the Manim render is queued separately
+ * (queueLessonRender). Resolves to { lesson } or { error }.
+ */
+async function createLesson(studentId, studentName, analytics, topic, { speculative = false } = {}) {
+  // Get quiz attempts for additional context
+  const quizAttempts = await QuizAttempt.find({ studentId }).sort({ completedAt: -1 }).limit(5);
+
+  const lessonResult = await generateTeachingLesson(
+    studentId,
+    studentName,
+    analytics,
+    quizAttempts,
+    topic,
+    true  // Don't render Manim yet - it is queued as a render job
+  );
+
+  if (!lessonResult.success) {
+    return { error: lessonResult.error };
+  }
+
+  // Save lesson to database
+  const newLesson = new Lesson({
+    lessonId: lessonResult.lessonId,
+    studentId,
+    studentName,
+    topic: lessonResult.topic,
+    masteryLevel: lessonResult.masteryLevel,
+    teachingSummary: lessonResult.teachingSummary,
+    teacherGuidance: lessonResult.teacherGuidance,
+    fullResponse: lessonResult.fullResponse,
+    manimCode: lessonResult.manimCode,
+    scriptPath: lessonResult.scriptPath,
+    videoUrl: lessonResult.videoUrl,
+    renderStatus: lessonResult.renderStatus,
+    renderError: lessonResult.renderError,
+    renderFailure: lessonResult.renderFailure,
+    sessionId: lessonResult.sessionId,
+    analyticsId: analytics.analyticsId,
+    speculative,
+    status: 'ready'
+  });
+
+  await newLesson.save();
+
+  console.log(`✅ Lesson saved with ID: ${newLesson.lessonId}`);
+  return { lesson: newLesson };
+}
+
+/**
+ * Queue the Manim render of a saved lesson (runs in the background,
+ * survives restarts). Resolves to the render job id, or null without a script.
+ */
+async function queueLessonRender(lesson, { priority } = {}) {
+  if (!lesson.manimCode || !lesson.scriptPath) return null;
+  const jobId = await enqueueJob('lesson', { lessonId: lesson.lessonId, scriptPath: lesson.scriptPath }, { priority });
+  startProgress('lesson', lesson.lessonId);
+  console.log(`⏳ Queued Manim render ${jobId} for lesson: ${lesson.lessonId}`);
+  return jobId;
+}
+
 // Generate a teaching lesson based on student analytics
 app.post('/api/lessons/generate', async (req, res) => {
   try {
@@ -999,85 +1114,40 @@ app.post('/api/lessons/generate', async (req, res) => {
       });
     }
 
-    // Get quiz attempts for additional context
-    const quizAttempts = await QuizAttempt.find({ studentId }).sort({ completedAt: -1 }).limit(5);
+    // A lesson pre-generated on this analytics after the last submission answers at once
+    const precomputed = await takePrecomputedLesson(studentId, analytics, topic);
+    if (precomputed) {
+      console.log(`⚡ Using pre-generated lesson ${precomputed.lessonId}`);
+      return res.json({
+        message: 'Lesson generated successfully',
+        data: precomputed
+      });
+    }
 
     // Generate the teaching lesson (WITHOUT waiting for Manim rendering)
-    const lessonResult = await generateTeachingLesson(
-      studentId,
-      studentName,
-      analytics,
-      quizAttempts,
-      topic,
-      false  // Don't render Manim yet - we'll do it in background
-    );
+    const { lesson: newLesson, error } = await createLesson(studentId, studentName, analytics, topic);
 
-    if (!lessonResult.success) {
+    if (!newLesson) {
       return res.status(500).json({ 
         message: 'Failed to generate lesson', 
-        error: lessonResult.error 
+        error 
       });
     }
 
-    // Save lesson to database
-    const newLesson = new Lesson({
-      lessonId: lessonResult.lessonId,
-      studentId,
-      studentName,
-      topic: lessonResult.topic,
-      masteryLevel: lessonResult.masteryLevel,
-      teachingSummary: lessonResult.teachingSummary,
-      teacherGuidance: lessonResult.teacherGuidance,
-      fullResponse: lessonResult.fullResponse,
-      manimCode: lessonResult.manimCode,
-      scriptPath: lessonResult.scriptPath,
-      videoUrl: lessonResult.videoUrl,
-      renderStatus: lessonResult.renderStatus,
-      renderError: lessonResult.renderError,
-      sessionId: lessonResult.sessionId,
-      analyticsId: analytics.analyticsId,
-      status: 'ready'
-    });
-
-    await newLesson.save();
-
-    console.log(`✅ Lesson saved with ID: ${newLesson.lessonId}`);
-
-    // Return immediately - don't wait for Manim rendering
-    const response = res.json({
+    // Return immediately - don't wait for Manim rendering. The response is
+    // already sent, so a render that cannot be queued is recorded on the lesson.
+    res.json({
       message: 'Lesson generated successfully',
       data: newLesson
     });
 
-    // Render Manim animation in the background
-    if (newLesson.manimCode && newLesson.scriptPath) {
-      console.log(`⏳ Starting background Manim rendering for lesson: ${newLesson.lessonId}`);
-      (async () => {
-        try {
-          const { renderManimAnimation } = require('./services/teacherAgent');
-          const renderResult = await renderManimAnimation(newLesson.scriptPath, newLesson.lessonId);
-          
-          if (renderResult.success) {
-            newLesson.videoUrl = renderResult.relativePath;
-            newLesson.renderStatus = 'completed';
-            console.log(`✅ Animation rendered: ${newLesson.videoUrl}`);
-          } else {
-            newLesson.renderStatus = 'failed';
-            newLesson.renderError = renderResult.error;
-            console.log(`⚠️ Animation rendering failed: ${renderResult.error}`);
-          }
-          
-          await newLesson.save();
-        } catch (error) {
-          console.error(`❌ Background rendering error: ${error.message}`);
-          newLesson.renderStatus = 'error';
-          newLesson.renderError = error.message;
-          await newLesson.save();
-        }
-      })();
-    }
-
-    return response;
+    queueLessonRender(newLesson).catch(async (error) => {
+      console.error(`❌ Could not queue render for lesson ${newLesson.lessonId}: ${error.message}`);
+      await Lesson.updateOne(
+        { lessonId: newLesson.lessonId },
+        { $set: { renderStatus: 'failed', renderError: `Render could not be queued: ${error.message}` } }
+      ).catch(() => {});
+    });
 
   } catch (error) {
     console.error('Lesson generation error:', error);
@@ -1163,7 +1233,8 @@ app.post('/api/chapters/generate', async (req, res) => {
             studentName,
             analytics,
             quizAttempts,
-            concept
+            concept,
+            true  // Rendered by the job queue, behind interactive lessons and doubts
           );
 
           if (lessonResult.success) {
@@ -1181,6 +1252,7 @@ app.post('/api/chapters/generate', async (req, res) => {
               videoUrl: lessonResult.videoUrl,
               renderStatus: lessonResult.renderStatus,
               renderError: lessonResult.renderError,
+              renderFailure: lessonResult.renderFailure,
               sessionId: lessonResult.sessionId,
               analyticsId: analytics.analyticsId,
               status: 'ready'
@@ -1188,6 +1260,11 @@ app.post('/api/chapters/generate', async (req, res) => {
 
             await newLesson.save();
 
+            if (newLesson.scriptPath) {
+              await enqueueJob('chapter', { lessonId: newLesson.lessonId, scriptPath: newLesson.scriptPath });
+              startProgress('lesson', newLesson.lessonId);
+            }
+
             // Update chapter with lesson
             await Chapter.findOneAndUpdate(
               { chapterId },
@@ -1229,7 +1306,8 @@ app.post('/api/chapters/generate', async (req, res) => {
 app.get('/api/lessons/:studentId', async (req, res) => {
   try {
     const { studentId } = req.params;
-    const lessons = await Lesson.find({ studentId }).sort({ createdAt: -1 });
+    // Pre-generated lessons appear once the student asks for a lesson
+    const lessons = await Lesson.find({ studentId, speculative: { $ne: true } }).sort({ createdAt: -1 });
 
     res.json({
       message: 'Lessons retrieved successfully',
@@ -1377,8 +1455,6 @@ app.post('/api/lesson/:lessonId/render', async (req, res) => {
       return res.status(400).json({ message: 'No Manim code available for this lesson' });
     }
 
-    // Import render function
-    const { renderManimAnimation } = require('./services/teacherAgent');
     const path = require('path');
     const fs = require('fs');
 
@@ -1388,32 +1464,31 @@ app.post('/api/lesson/:lessonId/render', async (req, res) => {
       fs.mkdirSync(MANIM_SCRIPTS_DIR, { recursive: true });
     }
 
+    // Don't queue a script that cannot render
+    const preflight = await preflightScript(lesson.manimCode, { repair: true });
+    if (!preflight.ok) {
+      lesson.renderStatus = 'failed';
+      lesson.renderError = `Pre-flight check failed: ${describePreflightErrors(preflight)}`;
+      await lesson.save();
+      return res.status(422).json({ message: lesson.renderError, preflight });
+    }
+    if (preflight.repairedSource) {
+      lesson.manimCode = preflight.repairedSource;
+    }
+
     const scriptPath = path.join(MANIM_SCRIPTS_DIR, `lesson_${lessonId}.py`);
     fs.writeFileSync(scriptPath, lesson.manimCode);
 
     lesson.renderStatus = 'rendering';
     await lesson.save();
 
-    // Render in background
-    renderManimAnimation(scriptPath, lessonId)
-      .then(async (result) => {
-        if (result.success) {
-          lesson.videoUrl = result.relativePath;
-          lesson.renderStatus = 'completed';
-        } else {
-          lesson.renderStatus = 'failed';
-          lesson.renderError = result.error;
-        }
-        await lesson.save();
-      })
-      .catch(async (error) => {
-        lesson.renderStatus = 'failed';
-        lesson.renderError = error.message;
-        await lesson.save();
-      });
+    // Render in background through the job queue
+    const jobId = await enqueueJob('lesson', { lessonId, scriptPath });
+    startProgress('lesson', lessonId);
 
     res.json({
       message: 'Rendering started',
+      jobId,
       data: lesson
     });
 
@@ -1423,12 +1498,134 @@ app.post('/api/lesson/:lessonId/render', async (req, res) => {
   }
 });
 
+// Preview a lesson without rendering it: key still frames and a per-section timeline
+app.post('/api/lesson/:lessonId/preview', async (req, res) => {
+  try {
+    const { lessonId } = req.params;
+    const lesson = await Lesson.findOne({ lessonId });
+
+    if (!lesson) {
+      return res.status(404).json({ message: 'Lesson not found' });
+    }
+
+    if (!lesson.manimCode) {
+      return res.status(400).json({ message: 'No Manim code available for this lesson' });
+    }
+
+    const fs = require('fs');
+
+    // Preview the script the render would use
+    let scriptPath = lesson.scriptPath;
+    if (!scriptPath || !fs.existsSync(scriptPath)) {
+      const MANIM_SCRIPTS_DIR = path.join(__dirname, 'manim_scripts');
+      fs.mkdirSync(MANIM_SCRIPTS_DIR, { recursive: true });
+      scriptPath = path.join(MANIM_SCRIPTS_DIR, `lesson_${lessonId}.py`);
+      fs.writeFileSync(scriptPath, lesson.manimCode);
+    }
+
+    const preview = await previewManimAnimation(scriptPath, lessonId, {
+      priority: JOB_PRIORITIES.doubt,   // interactive, and done in about a second
+      maxFrames: parseInt(req.body?.maxFrames, 10) || undefined
+    });
+
+    if (!preview.success) {
+      return res.status(preview.preflight ? 422 : 500).json({
+        message: 'Preview failed',
+        error: preview.error,
+        preflight: preview.preflight,
+        estimate: preview.estimate
+      });
+    }
+
+    res.json({
+      message: 'Preview generated',
+      data: preview
+    });
+
+  } catch (error) {
+    console.error('Error previewing lesson:', error);
+    res.status(500).json({ message: 'Server error', error: error.message });
+  }
+});
+
 // ==================== EXAM ENDPOINTS ====================
 
-// Generate a new exam for a topic
+/**
+ * Streaming mode of a question generation endpoint, chosen with ?stream=ndjson
+ * (one JSON object per line) or ?stream=sse (Server-Sent Events), or with the
+ * Accept header. Returns null when the client wants the plain JSON response.
+ */
+function openGenerationStream(req, res) {
+  const accept = req.get('accept') || '';
+  const mode = req.query.stream
+    || (accept.includes('application/x-ndjson') ? 'ndjson' : accept.includes('text/event-stream') ? 'sse' : null);
+  if (mode !== 'ndjson' && mode !== 'sse') return null;
+
+  res.set({
+    'Content-Type': mode === 'sse' ? 'text/event-stream' : 'application/x-ndjson',
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'
+  });
+  res.flushHeaders();
+
+  return {
+    send(type, payload) {
+      if (res.writableEnded) return;
+      res.write(mode === 'sse'
+        ? `event: ${type}\ndata: ${JSON.stringify(payload)}\n\n`
+        : `${JSON.stringify({ type, ...payload })}\n`);
+    },
+    end() {
+      if (!res.writableEnded) res.end();
+    }
+  };
+}
+
+// A question as shown while it is being answered (correctAnswer and explanation hidden)
+function questionForStudent(q) {
+  return {
+    id: q.id,
+    question: q.question,
+    options: q.options,
+    difficulty: q.difficulty,
+    marks: q.marks,
+    concept: q.concept
+  };
+}
+
+/**
+ * Question bank size per topic and difficulty, and how often it served papers
+ * GET /api/question-bank/stats
+ */
+app.get('/api/question-bank/stats', async (req, res) => {
+  try {
+    res.json({
+      message: 'Question bank status',
+      data: await getQuestionBankStats()
+    });
+  } catch (error) {
+    console.error('Error fetching question bank stats:', error);
+    res.status(500).json({ message: 'Server error', error: error.message });
+  }
+});
+
+/**
+ * Generate a new exam for a topic
+ * POST /api/exam/generate
+ *
+ * With ?stream=ndjson or ?stream=sse the exam is sent as it is written:
+ * "exam" (examId, then title and marks), one "question" per question, then
+ * "done" with the saved exam, or "error". The Exam document is created
+ * right away with status "generating" and filled in question by question.
+ *
+ * Papers come from the question bank (questions the student has not seen)
+ * when it covers the topic; { fresh: true } asks the agent for new ones.
+ * grade and subject pick the bank (Class 9 Mathematics by default).
+ */
 app.post('/api/exam/generate', async (req, res) => {
+  let stream = null;
   try {
-    const { studentId, topic } = req.body;
+    const { studentId, topic, grade, subject, fresh } = req.body;
 
     if (!studentId || !topic) {
       return res.status(400).json({ message: 'Student ID and topic are required' });
@@ -1438,10 +1635,42 @@ app.post('/api/exam/generate', async (req, res) => {
 
     console.log(`\n📋 Generating exam for ${studentName} on topic: ${topic}`);
 
+    // Streamed: create the exam now and fill it in as the questions are parsed
+    stream = openGenerationStream(req, res);
+    const options = { grade, subject, fresh: fresh === true };
+    let writes = Promise.resolve();
+    if (stream) {
+      options.examId = `EXAM-${Date.now()}`;
+      await Exam.create({ examId: options.examId, studentId, studentName, topic, questions: [], status: 'generating' });
+      stream.send('exam', { data: { examId: options.examId, topic, status: 'generating' } });
+
+      options.onHeader = (header) => {
+        const fields = {
+          examTitle: header.examTitle || `${topic} Examination`,
+          totalQuestions: header.totalQuestions,
+          totalMarks: header.totalMarks,
+          duration: header.duration
+        };
+        Object.keys(fields).forEach(key => fields[key] === undefined && delete fields[key]);
+        stream.send('exam', { data: { examId: options.examId, topic, status: 'generating', ...fields } });
+        writes = writes.then(() => Exam.updateOne({ examId: options.examId }, { $set: fields }));
+      };
+      options.onQuestion = (question, index) => {
+        stream.send('question', { index, data: questionForStudent(question) });
+        writes = writes.then(() => Exam.updateOne({ examId: options.examId }, { $push: { questions: question } }));
+      };
+    }
+
     // Generate exam using AI agent
-    const result = await generateExam(studentId, studentName, topic);
+    const result = await generateExam(studentId, studentName, topic, options);
+    await writes.catch(error => console.log(`⚠️ Could not store streamed exam questions: ${error.message}`));
 
     if (!result.success) {
+      if (stream) {
+        await Exam.deleteOne({ examId: options.examId });
+        stream.send('error', { message: 'Failed to generate exam', error: result.error });
+        return stream.end();
+      }
       return res.status(500).json({ 
         message: 'Failed to generate exam', 
         error: result.error,
@@ -1449,9 +1678,8 @@ app.post('/api/exam/generate', async (req, res) => {
       });
     }
 
-    // Save exam to database
-    const newExam = new Exam({
-      examId: result.examId,
+    // The complete answer is authoritative over what was parsed on the way
+    const examFields = {
       studentId,
       studentName,
       topic: result.topic,
@@ -1463,7 +1691,12 @@ app.post('/api/exam/generate', async (req, res) => {
       questions: result.examData.questions,
       sessionId: result.sessionId,
       status: 'generated'
-    });
+    };
+
+    // Save exam to database
+    const newExam = stream
+      ? await Exam.findOneAndUpdate({ examId: result.examId }, examFields, { new: true, upsert: true, runValidators: true })
+      : new Exam({ examId: result.examId, ...examFields });
 
     await newExam.save();
     console.log(`✅ Exam saved: ${newExam.examId}`);
@@ -1471,17 +1704,13 @@ app.post('/api/exam/generate', async (req, res) => {
     // Return exam without correct answers for taking the exam
     const examForStudent = {
       ...newExam.toObject(),
-      questions: newExam.questions.map(q => ({
-        id: q.id,
-        question: q.question,
-        options: q.options,
-        difficulty: q.difficulty,
-        marks: q.marks,
-        concept: q.concept
-        // correctAnswer and explanation hidden
-      }))
+      questions: newExam.questions.map(questionForStudent)
     };
 
+    if (stream) {
+      stream.send('done', { message: 'Exam generated successfully', data: examForStudent });
+      return stream.end();
+    }
     res.json({
       message: 'Exam generated successfully',
       data: examForStudent
@@ -1489,6 +1718,10 @@ app.post('/api/exam/generate', async (req, res) => {
 
   } catch (error) {
     console.error('Exam generation error:', error);
+    if (stream) {
+      stream.send('error', { message: 'Server error', error: error.message });
+      return stream.end();
+    }
     res.status(500).json({ message: 'Server error', error: error.message });
   }
 });
@@ -1502,7 +1735,7 @@ app.get('/api/exams/:studentId', async (req, res) => {
     // Hide answers for pending exams
     const examsForStudent = exams.map(exam => ({
       ...exam.toObject(),
-      questions: exam.status === 'generated' ? exam.questions.map(q => ({
+      questions: exam.status === 'generated' || exam.status === 'generating' ? exam.questions.map(q => ({
         id: q.id,
         question: q.question,
         options: q.options,
@@ -1536,7 +1769,7 @@ app.get('/api/exam/:examId', async (req, res) => {
     // Hide answers if exam not submitted
     const examForStudent = {
       ...exam.toObject(),
-      questions: exam.status === 'generated' || exam.status === 'in_progress' 
+      questions: ['generating', 'generated', 'in_progress'].includes(exam.status)
         ? exam.questions.map(q => ({
             id: q.id,
             question: q.question,
@@ -1568,6 +1801,9 @@ app.post('/api/exam/:examId/start', async (req, res) => {
     if (!exam) {
       return res.status(404).json({ message: 'Exam not found' });
     }
+    if (exam.status === 'generating') {
+      return res.status(409).json({ message: 'Exam is still being generated' });
+    }
 
     // Check for existing incomplete attempt
     const existingAttempt = await ExamAttempt.findOne({ 
@@ -1717,6 +1953,9 @@ app.post('/api/exam/:examId/submit', async (req, res) => {
     exam.status = 'submitted';
     await exam.save();
 
+    // Analytics and the next lesson are usually asked for next: start on them now
+    schedulePrecompute(attempt.studentId, { studentName: attempt.studentName || 'Student', trigger: 'exam' });
+
     res.json({
       message: 'Exam submitted successfully',
       data: {
@@ -1783,10 +2022,19 @@ app.get('/api/exam/attempts/:studentId', async (req, res) => {
 // ASSIGNMENT AGENT API ENDPOINTS
 // ============================================
 
-// Generate a new assignment based on student analytics
+/**
+ * Generate a new assignment based on student analytics
+ * POST /api/assignment/generate
+ *
+ * Streams like /api/exam/generate with ?stream=ndjson or ?stream=sse:
+ * "assignment", one "question" per question, then "done" or "error".
+ * Served from the question bank like exams (grade, subject, fresh), with
+ * questions on the student's weak concepts preferred.
+ */
 app.post('/api/assignment/generate', async (req, res) => {
+  let stream = null;
   try {
-    const { studentId, topic } = req.body;
+    const { studentId, topic, grade, subject, fresh } = req.body;
 
     if (!studentId || !topic) {
       return res.status(400).json({ message: 'Student ID and topic are required' });
@@ -1839,19 +2087,50 @@ app.post('/api/assignment/generate', async (req, res) => {
     console.log(`\n📚 Generating assignment for ${studentName} on topic: ${topic}`);
     console.log('📊 Analytics:', analyticsData);
 
+    // Streamed: create the assignment now and fill it in as the questions are parsed
+    stream = openGenerationStream(req, res);
+    const options = { grade, subject, fresh: fresh === true };
+    let writes = Promise.resolve();
+    if (stream) {
+      options.assignmentId = uuidv4();
+      await Assignment.create({ assignmentId: options.assignmentId, studentId, studentName, topic, questions: [], status: 'generating' });
+      stream.send('assignment', { data: { assignmentId: options.assignmentId, topic, status: 'generating' } });
+
+      options.onHeader = (header) => {
+        const fields = {
+          assignmentTitle: header.assignmentTitle || `Daily Practice: ${topic}`,
+          totalQuestions: header.totalQuestions,
+          totalMarks: header.totalMarks,
+          estimatedTime: header.estimatedTime
+        };
+        Object.keys(fields).forEach(key => fields[key] === undefined && delete fields[key]);
+        stream.send('assignment', { data: { assignmentId: options.assignmentId, topic, status: 'generating', ...fields } });
+        writes = writes.then(() => Assignment.updateOne({ assignmentId: options.assignmentId }, { $set: fields }));
+      };
+      options.onQuestion = (question, index) => {
+        stream.send('question', { index, data: questionForStudent(question) });
+        writes = writes.then(() => Assignment.updateOne({ assignmentId: options.assignmentId }, { $push: { questions: question } }));
+      };
+    }
+
     // Generate assignment using AI agent
-    const result = await generateAssignment(studentId, studentName, topic, analyticsData);
+    const result = await generateAssignment(studentId, studentName, topic, analyticsData, options);
+    await writes.catch(error => console.log(`⚠️ Could not store streamed assignment questions: ${error.message}`));
 
     if (!result.success) {
+      if (stream) {
+        await Assignment.deleteOne({ assignmentId: options.assignmentId });
+        stream.send('error', { message: 'Failed to generate assignment', error: result.error });
+        return stream.end();
+      }
       return res.status(500).json({ 
         message: 'Failed to generate assignment', 
         error: result.error 
       });
     }
 
-    // Save assignment to database
-    const newAssignment = new Assignment({
-      assignmentId: result.assignmentId,
+    // The complete answer is authoritative over what was parsed on the way
+    const assignmentFields = {
       studentId,
       studentName,
       topic: result.topic,
@@ -1867,7 +2146,12 @@ app.post('/api/assignment/generate', async (req, res) => {
       sessionId: result.sessionId,
       status: 'generated',
       dueDate: new Date(Date.now() + 24 * 60 * 60 * 1000) // Due in 24 hours
-    });
+    };
+
+    // Save assignment to database
+    const newAssignment = stream
+      ? await Assignment.findOneAndUpdate({ assignmentId: result.assignmentId }, assignmentFields, { new: true, upsert: true, runValidators: true })
+      : new Assignment({ assignmentId: result.assignmentId, ...assignmentFields });
 
     await newAssignment.save();
     console.log(`✅ Assignment saved: ${newAssignment.assignmentId}`);
@@ -1875,16 +2159,13 @@ app.post('/api/assignment/generate', async (req, res) => {
     // Return assignment without correct answers
     const assignmentForStudent = {
       ...newAssignment.toObject(),
-      questions: newAssignment.questions.map(q => ({
-        id: q.id,
-        question: q.question,
-        options: q.options,
-        difficulty: q.difficulty,
-        marks: q.marks,
-        concept: q.concept
-      }))
+      questions: newAssignment.questions.map(questionForStudent)
     };
 
+    if (stream) {
+      stream.send('done', { message: 'Assignment generated successfully', data: assignmentForStudent });
+      return stream.end();
+    }
     res.status(201).json({
       message: 'Assignment generated successfully',
       data: assignmentForStudent
@@ -1892,6 +2173,10 @@ app.post('/api/assignment/generate', async (req, res) => {
 
   } catch (error) {
     console.error('Error generating assignment:', error);
+    if (stream) {
+      stream.send('error', { message: 'Server error', error: error.message });
+      return stream.end();
+    }
     res.status(500).json({ message: 'Server error', error: error.message });
   }
 });
@@ -1906,6 +2191,9 @@ app.post('/api/assignment/:assignmentId/start', async (req, res) => {
     if (!assignment) {
       return res.status(404).json({ message: 'Assignment not found' });
     }
+    if (assignment.status === 'generating') {
+      return res.status(409).json({ message: 'Assignment is still being generated' });
+    }
 
     // Check for existing in-progress attempt
     const existingAttempt = await AssignmentAttempt.findOne({
@@ -2080,7 +2368,7 @@ app.get('/api/assignments/:studentId', async (req, res) => {
     // Hide answers for pending assignments
     const assignmentsForStudent = assignments.map(assignment => ({
       ...assignment.toObject(),
-      questions: assignment.status === 'generated' || assignment.status === 'in_progress'
+      questions: ['generating', 'generated', 'in_progress'].includes(assignment.status)
         ? assignment.questions.map(q => ({
             id: q.id,
             question: q.question,
@@ -2261,7 +2549,8 @@ app.post('/api/doubt/start', async (req, res) => {
       studentName,
       actualDoubtText,
       imageBase64,
-      enrichedProfile
+      enrichedProfile,
+      { progressId: req.body.progressId }
     );
 
     if (!result.success) {
@@ -2289,6 +2578,7 @@ app.post('/api/doubt/start', async (req, res) => {
           manimCode: result.response?.manimCode || null,
           videoUrl: result.video?.videoUrl || null,
           audioUrl: result.video?.audioUrl || null,
+          renditions: result.video?.renditions || [],
           timestamp: new Date()
         }
       ],
@@ -2339,7 +2629,8 @@ app.post('/api/doubt/:doubtId/followup', async (req, res) => {
     const result = await continueDoubt(
       doubt.sessionId,
       followUpText,
-      doubt.studentProfile
+      doubt.studentProfile,
+      { progressId: req.body.progressId }
     );
 
     if (!result.success) {
@@ -2360,6 +2651,7 @@ app.post('/api/doubt/:doubtId/followup', async (req, res) => {
       manimCode: result.response?.manimCode || null,
       videoUrl: result.video?.videoUrl || null,
       audioUrl: result.video?.audioUrl || null,
+      renditions: result.video?.renditions || [],
       timestamp: new Date()
     });
 
@@ -2385,17 +2677,20 @@ app.post('/api/doubt/:doubtId/followup', async (req, res) => {
  */
 app.post('/api/doubt/generate-video', async (req, res) => {
   try {
-    const { manimCode, narration, doubtId } = req.body;
+    const { manimCode, narration, doubtId, progressId } = req.body;
 
     if (!manimCode) {
       return res.status(400).json({ message: 'Manim code is required' });
     }
 
-    const result = await generateVideo(
+    const videoId = doubtId || `manual_${Date.now()}`;
+    if (progressId) startProgress('doubt', progressId);
+    const result = await runJob('doubt', {
       manimCode,
-      narration || [],
-      doubtId || `manual_${Date.now()}`
-    );
+      narration: narration || [],
+      doubtId: videoId,
+      progressId: progressId || videoId
+    });
 
     res.json({
       message: result.success ? 'Video generation initiated' : 'Video generation info',
@@ -2733,6 +3028,535 @@ app.get('/api/schedule/chapters/:subject', async (req, res) => {
   }
 });
 
+// ============================================
+// RENDER PIPELINE ENDPOINTS
+// ============================================
+
+/**
+ * Manim render worker pool status
+ * GET /api/render/pool
+ */
+app.get('/api/render/pool', (req, res) => {
+  res.json({
+    message: 'Render pool status',
+    data: getRenderPoolStats()
+  });
+});
+
+/**
+ * Render cache usage and hit rate (fragment clips included), plus the
+ * repaired-render counters and most frequent failure signatures
+ * GET /api/render/cache
+ */
+app.get('/api/render/cache', (req, res) => {
+  res.json({
+    message: 'Render cache status',
+    data: {
+      ...getRenderCacheStats(),
+      fragments: getFragmentStats(),
+      repairs: getRepairStats()
+    }
+  });
+});
+
+/**
+ * Manifest entry of a published video (path, size, hash, duration, job)
+ * GET /api/render/manifest/:renderId   e.g. lesson_123_l
+ */
+app.get('/api/render/manifest/:renderId', (req, res) => {
+  const entry = getRenderEntry(req.params.renderId);
+  if (!entry) {
+    return res.status(404).json({ message: 'Render not found' });
+  }
+  res.json({
+    message: 'Render manifest entry',
+    data: entry
+  });
+});
+
+/**
+ * Render scratch folders in use and what the collector has freed
+ * GET /api/render/scratch
+ */
+app.get('/api/render/scratch', (req, res) => {
+  res.json({
+    message: 'Render scratch status',
+    data: getScratchStats()
+  });
+});
+
+/**
+ * Disk usage of generated scripts, audio and videos per category
+ * GET /api/storage
+ */
+app.get('/api/storage', async (req, res) => {
+  try {
+    const report = await getStorageReport();
+    res.json({
+      message: 'Storage usage',
+      data: {
+        ...report,
+        caches: {
+          render: getRenderCacheStats(),
+          tts: getTtsStats(),
+          scratch: getScratchStats()
+        }
+      }
+    });
+  } catch (error) {
+    console.error('Error building storage report:', error);
+    res.status(500).json({ message: 'Server error', error: error.message });
+  }
+});
+
+/**
+ * Run a storage sweep now (dedup + eviction to the disk budget)
+ * POST /api/storage/sweep
+ */
+app.post('/api/storage/sweep', async (req, res) => {
+  try {
+    res.json({
+      message: 'Storage sweep finished',
+      data: await sweepStorage()
+    });
+  } catch (error) {
+    console.error('Error sweeping storage:', error);
+    res.status(500).json({ message: 'Server error', error: error.message });
+  }
+});
+
+/**
+ * TTS backend, sentence cache usage and hit rate
+ * GET /api/render/tts
+ */
+app.get('/api/render/tts', (req, res) => {
+  res.json({
+    message: 'TTS status',
+    data: getTtsStats()
+  });
+});
+
+/**
+ * Render job queue depth, wait time and run time per job kind
+ * GET /api/render/queue?windowMinutes=60
+ */
+app.get('/api/render/queue', async (req, res) => {
+  try {
+    const windowMinutes = parseInt(req.query.windowMinutes, 10) || 60;
+    res.json({
+      message: 'Render queue status',
+      data: await getJobQueueStats(windowMinutes * 60 * 1000)
+    });
+  } catch (error) {
+    console.error('Error fetching render queue stats:', error);
+    res.status(500).json({ message: 'Server error', error: error.message });
+  }
+});
+
+/**
+ * OnDemand chat session reuse (cached sessions, hits, expiries, retries) and
+ * the shared HTTP pool (in-flight and queued requests, new vs reused sockets)
+ * GET /api/ondemand/stats
+ */
+app.get('/api/ondemand/stats', (req, res) => {
+  res.json({
+    message: 'OnDemand status',
+    data: {
+      sessions: getSessionStats(),
+      http: getHttpStats()
+    }
+  });
+});
+
+/**
+ * Live render progress of a lesson or doubt as Server-Sent Events
+ * GET /api/progress/lesson/:lessonId
+ * GET /api/progress/doubt/:progressId   (the progressId sent with the doubt request)
+ *
+ * Every update is a "progress" event: { stage: queued|analyzing|tts|render|mux|done|failed,
+ * animation, total, percent, etaSeconds, streamUrl, videoUrl, error } (doubts also report
+ * answerChars, the size of the streamed answer, while analyzing). The stream
+ * ends after "done" or "failed".
+ */
+app.get('/api/progress/:kind/:id', async (req, res) => {
+  const { kind, id } = req.params;
+  if (kind !== 'lesson' && kind !== 'doubt') {
+    return res.status(404).json({ message: 'Unknown progress kind' });
+  }
+
+  res.set({
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive',
+    'X-Accel-Buffering': 'no'
+  });
+  res.flushHeaders();
+
+  let closed = false;
+  let unsubscribe = null;
+  const heartbeat = setInterval(() => res.write(': keep-alive\n\n'), 15000);
+  const close = () => {
+    if (closed) return;
+    closed = true;
+    clearInterval(heartbeat);
+    if (unsubscribe) unsubscribe();
+    res.end();
+  };
+  const send = (state) => {
+    if (closed) return;
+    res.write(`event: progress\ndata: ${JSON.stringify(state)}\n\n`);
+    if (state.stage === 'done' || state.stage === 'failed') close();
+  };
+  req.on('close', close);
+
+  // A lesson this process is not rendering reports its stored status
+  if (kind === 'lesson' && !getProgress(kind, id)) {
+    try {
+      const lesson = await Lesson.findOne({ lessonId: id }, 'renderStatus videoUrl renderError');
+      if (!lesson) {
+        send({ kind, id, stage: 'failed', error: 'Lesson not found' });
+      } else if (lesson.renderStatus === 'completed') {
+        send({ kind, id, stage: 'done', percent: 100, videoUrl: lesson.videoUrl });
+      } else if (['failed', 'error', 'skipped', 'no_code'].includes(lesson.renderStatus)) {
+        send({ kind, id, stage: 'failed', error: lesson.renderError || lesson.renderStatus });
+      }
+    } catch (error) {
+      console.log(`⚠️ Could not load lesson ${id} for progress: ${error.message}`);
+    }
+  }
+  if (closed) return;
+
+  unsubscribe = subscribeProgress(kind, id, send);
+  if (closed) unsubscribe();
+});
+
+/**
+ * Render a lesson's Manim script and publish the video on the Lesson.
+ * Used for 'lesson' jobs (single lessons) and 'chapter' jobs (chapter batches).
+ */
+async function renderLessonJob({ lessonId, scriptPath }, job) {
+  const lesson = await Lesson.findOne({ lessonId });
+  // Deleted (or a discarded pre-generated lesson) before the job started
+  if (!lesson) {
+    console.log(`⏭️ Skipping render of missing lesson ${lessonId}`);
+    return { success: false, error: 'Lesson no longer exists' };
+  }
+  const progress = createProgressTracker('lesson', lessonId);
+  let streamed = false;
+
+  try {
+    const result = await renderManimAnimation(scriptPath || lesson.scriptPath, lessonId, {
+      priority: job.priority,
+      jobId: job.jobId,
+      progress,
+      // Let students start watching while the rest of the lesson renders
+      onStreamReady: (playlistUrl) => {
+        streamed = true;
+        Lesson.updateOne({ _id: lesson._id }, { videoUrl: playlistUrl }).catch(() => {});
+        progress.stage('render', { streamUrl: playlistUrl });
+      }
+    });
+
+    if (result.success) {
+      // A new first rendition replaces the ladder of the previous script
+      lesson.renditions = [makeRendition(result.quality, result.relativePath, result.videoPath)];
+      lesson.upgradesQueued = false;
+      lesson.videoUrl = result.relativePath;
+      lesson.renderStatus = 'completed';
+      lesson.renderFailure = undefined;
+      console.log(`✅ Animation rendered: ${lesson.videoUrl}`);
+    } else {
+      // Restore the previous video in place of the partial stream
+      if (streamed) lesson.markModified('videoUrl');
+      lesson.renderStatus = 'failed';
+      lesson.renderError = result.error;
+      lesson.renderFailure = result.failure;
+      console.log(`⚠️ Animation rendering failed: ${result.error}`);
+    }
+    // The script was fixed in place before a retry
+    if (result.manimCode) lesson.manimCode = result.manimCode;
+    await lesson.save();
+    // Subscribers fetch the lesson on completion, so only report it once saved
+    progress.finish({ success: result.success, videoUrl: result.relativePath || null, error: result.error || null });
+
+    // Publish fast, then render the better qualities when the pool is otherwise
+    // idle (a pre-generated lesson gets them once it is claimed)
+    if (result.success) {
+      await queueLessonUpgrades(lessonId);
+    }
+
+    return { success: result.success, videoUrl: result.relativePath || null, cached: !!result.cached, error: result.error };
+  } catch (error) {
+    console.error(`❌ Background rendering error: ${error.message}`);
+    if (streamed) lesson.markModified('videoUrl');
+    lesson.renderStatus = 'error';
+    lesson.renderError = error.message;
+    await lesson.save();
+    progress.finish({ success: false, error: error.message });
+    throw error;
+  }
+}
+
+registerJobHandler('lesson', renderLessonJob);
+registerJobHandler('chapter', renderLessonJob);
+
+/**
+ * Queue the better renditions of a lesson's published video, once: called
+ * when its render finishes and when a pre-generated lesson is claimed, and
+ * only the later of the two finds the lesson claimed and rendered.
+ */
+async function queueLessonUpgrades(lessonId) {
+  const lesson = await Lesson.findOneAndUpdate(
+    { lessonId, speculative: { $ne: true }, renderStatus: 'completed', upgradesQueued: { $ne: true }, 'renditions.0': { $exists: true } },
+    { $set: { upgradesQueued: true } },
+    { new: true }
+  );
+  if (!lesson) return [];
+  const fromQuality = lesson.renditions[lesson.renditions.length - 1].quality;
+  return enqueueUpgrades('lesson', { lessonId, scriptPath: lesson.scriptPath }, { fromQuality });
+}
+
+/**
+ * Render a better quality of a published lesson and switch the lesson to it
+ */
+async function upgradeLessonJob({ lessonId, scriptPath, quality }, job) {
+  if (!(await Lesson.exists({ lessonId }))) {
+    return { success: false, quality, error: 'Lesson no longer exists' };
+  }
+  const result = await renderManimAnimation(scriptPath, lessonId, { priority: job.priority, quality, jobId: job.jobId });
+  if (!result.success) {
+    console.log(`⚠️ ${quality} rendition of lesson ${lessonId} failed: ${result.error}`);
+    return { success: false, quality, error: result.error };
+  }
+
+  const lesson = await Lesson.findOne({ lessonId });
+  if (!lesson) return { success: true, quality, videoUrl: result.relativePath };
+
+  lesson.renditions = mergeRendition(lesson.renditions, makeRendition(quality, result.relativePath, result.videoPath));
+  // Leave a re-render that is streaming (or failed) alone; it publishes its own video
+  if (lesson.renderStatus === 'completed') {
+    lesson.videoUrl = lesson.renditions[0].url;
+  }
+  await lesson.save();
+  console.log(`⏫ Lesson ${lessonId} now has ${lesson.renditions.map(r => r.label).join(', ')}`);
+
+  return { success: true, quality, videoUrl: result.relativePath, cached: !!result.cached };
+}
+
+registerUpgradeTarget('lesson', upgradeLessonJob);
+
+/**
+ * Render a better quality of a doubt answer video and switch the message to it
+ */
+async function upgradeDoubtJob(payload, job) {
+  const result = await renderDoubtRendition(payload, job);
+  if (!result.success) {
+    console.log(`⚠️ ${payload.quality} rendition of ${payload.publishedUrl} failed: ${result.error}`);
+    return result;
+  }
+
+  // The message is found by the URL its first rendition was published under
+  const doubt = await Doubt.findOne({ 'messages.renditions.url': payload.publishedUrl });
+  const message = doubt?.messages.find(m => (m.renditions || []).some(r => r.url === payload.publishedUrl));
+  if (message) {
+    message.renditions = mergeRendition(message.renditions, result.rendition);
+    message.videoUrl = message.renditions[0].url;
+    doubt.markModified('messages');
+    await doubt.save();
+  }
+
+  return { success: true, quality: result.quality, videoUrl: result.rendition.url, updated: !!message };
+}
+
+registerUpgradeTarget('doubt', upgradeDoubtJob);
+
+/**
+ * Everything Lessons and Doubts still point at, so storage eviction keeps it
+ */
+registerReferenceSource(async () => {
+  if (mongoose.connection.readyState !== 1) return null;
+  const [lessons, doubts] = await Promise.all([
+    Lesson.find({}, 'videoUrl renditions scriptPath').lean(),
+    Doubt.find({}, 'messages.videoUrl messages.audioUrl messages.renditions').lean()
+  ]);
+  const urls = [];
+  const paths = [];
+  for (const lesson of lessons) {
+    urls.push(lesson.videoUrl, ...(lesson.renditions || []).map(r => r.url));
+    paths.push(lesson.scriptPath);
+  }
+  for (const doubt of doubts) {
+    for (const message of doubt.messages || []) {
+      urls.push(message.videoUrl, message.audioUrl, ...(message.renditions || []).map(r => r.url));
+    }
+  }
+  return { urls: urls.filter(Boolean), paths };
+});
+
+// ============================================
+// PRE-COMPUTATION AFTER SUBMISSIONS
+// ============================================
+
+// Speculative lessons render below chapter batches: nobody is waiting for them yet
+const PRECOMPUTE_RENDER_PRIORITY = JOB_PRIORITIES.upgrade;
+
+/**
+ * Analytics pre-computed for the student's current quiz attempts, handed
+ * over once (asking again analyzes again). Waits for a pre-computation
+ * that is still analyzing instead of starting a second analysis.
+ */
+async function takePrecomputedAnalytics(studentId, attemptCount) {
+  const pending = joinPrecompute(studentId, 'analytics');
+  if (pending) await pending.catch(() => null);
+
+  return Analytics.findOneAndUpdate(
+    { studentId, precomputed: true, totalAttempts: attemptCount },
+    { $set: { precomputed: false } },
+    { sort: { createdAt: -1 }, new: true }
+  );
+}
+
+/**
+ * The lesson pre-generated on this analytics for topic (the weakest concept
+ * when missing), claimed for the student: it shows up in their lessons, its
+ * render, if still queued, moves up to interactive priority, and its better
+ * renditions are queued once the first one is published.
+ */
+async function takePrecomputedLesson(studentId, analytics, topic) {
+  const lessonTopic = topic || analytics.weakConcepts?.[0];
+  if (!lessonTopic) return null;
+
+  const pending = joinPrecompute(studentId, `lesson:${lessonTopic}`);
+  if (pending) await pending.catch(() => null);
+
+  const lesson = await Lesson.findOneAndUpdate(
+    { studentId, speculative: true, analyticsId: analytics.analyticsId, topic: lessonTopic },
+    { $set: { speculative: false, createdAt: new Date() } },
+    { sort: { createdAt: -1 }, new: true }
+  );
+  if (lesson && lesson.renderJobId) {
+    await reprioritizeJob(lesson.renderJobId, JOB_PRIORITIES.lesson)
+      .catch(error => console.log(`⚠️ Could not move up render ${lesson.renderJobId}: ${error.message}`));
+  }
+  if (lesson) {
+    await queueLessonUpgrades(lesson.lessonId)
+      .catch(error => console.log(`⚠️ Could not queue renditions of ${lesson.lessonId}: ${error.message}`));
+  }
+  return lesson;
+}
+
+/**
+ * Drop a pre-generated lesson nobody claimed, unless its render is running.
+ * A queued render is cancelled (speculative lessons are saved as 'rendering'
+ * before the job starts, so renderStatus does not tell).
+ */
+async function discardSpeculativeLesson(lessonId) {
+  const lesson = await Lesson.findOne({ lessonId, speculative: true });
+  if (!lesson) return false;
+  if (lesson.renderJobId
+    && !(await cancelJob(lesson.renderJobId, 'Pre-computed lesson discarded'))
+    && await getJobStatus(lesson.renderJobId) === 'running') {
+    return false;
+  }
+  const result = await Lesson.deleteOne({ lessonId, speculative: true });
+  return result.deletedCount > 0;
+}
+
+/**
+ * After a quiz or exam submission: analyze the student's quiz attempts if
+ * the latest analytics predate them, then generate (and queue the render
+ * of) the lesson /api/lessons/generate would create next, on the weakest
+ * concept. Each LLM step and the lesson's render take one unit of the
+ * student's budget each; better renditions wait until the lesson is claimed.
+ */
+registerPrecompute(async ({ studentId, studentName }, run) => {
+  if (mongoose.connection.readyState !== 1) return;
+
+  const quizAttempts = await QuizAttempt.find({ studentId }).sort({ completedAt: 1 });
+  if (quizAttempts.length === 0) return;
+
+  let analytics = await Analytics.findOne({ studentId }).sort({ createdAt: -1 });
+  if (!analytics || analytics.totalAttempts !== quizAttempts.length) {
+    if (!run.spend()) return;
+    analytics = await run.step('analytics', () => generateAnalytics(studentId, studentName, quizAttempts, { precomputed: true }));
+    if (!analytics) return;
+  }
+  run.signal.throwIfAborted();
+
+  const topic = analytics.weakConcepts?.[0];
+  if (!topic) return;
+  if (await Lesson.exists({ studentId, speculative: true, analyticsId: analytics.analyticsId, topic })) return;
+
+  // Lessons pre-generated on older analytics will not be asked for any more
+  const stale = await Lesson.find({ studentId, speculative: true }, 'lessonId').lean();
+  for (const lesson of stale) {
+    await discardSpeculativeLesson(lesson.lessonId);
+  }
+  // The teacher agent and the render of its lesson
+  if (!run.spend(2)) return;
+
+  await run.step(`lesson:${topic}`, async () => {
+    const { lesson } = await createLesson(studentId, studentName, analytics, topic, { speculative: true });
+    if (!lesson) return null;
+    // Cancelled while the teacher agent was writing: nothing is rendered
+    if (run.signal.aborted) {
+      await discardSpeculativeLesson(lesson.lessonId);
+      return null;
+    }
+    const jobId = await queueLessonRender(lesson, { priority: PRECOMPUTE_RENDER_PRIORITY });
+    if (jobId) {
+      lesson.renderJobId = jobId;
+      await Lesson.updateOne({ lessonId: lesson.lessonId }, { $set: { renderJobId: jobId } });
+    }
+    console.log(`🔮 Pre-generated lesson ${lesson.lessonId} on ${topic} for ${studentId}`);
+    return lesson;
+  });
+});
+
+/**
+ * Pre-computation status of a student (budget used, run in progress) and
+ * overall counters
+ * GET /api/precompute/:studentId
+ */
+app.get('/api/precompute/:studentId', (req, res) => {
+  res.json({
+    message: 'Pre-computation status',
+    data: getPrecomputeStats(req.params.studentId)
+  });
+});
+
+/**
+ * Cancel a student's pre-computation and drop the lessons pre-generated for
+ * them that nobody claimed (renders already running are kept)
+ * DELETE /api/precompute/:studentId
+ */
+app.delete('/api/precompute/:studentId', async (req, res) => {
+  try {
+    const { studentId } = req.params;
+    const cancelled = cancelPrecompute(studentId);
+    let discarded = 0;
+    if (mongoose.connection.readyState === 1) {
+      const lessons = await Lesson.find({ studentId, speculative: true }, 'lessonId').lean();
+      for (const lesson of lessons) {
+        if (await discardSpeculativeLesson(lesson.lessonId)) discarded++;
+      }
+    }
+    res.json({
+      message: cancelled ? 'Pre-computation cancelled' : 'No pre-computation in progress',
+      data: { cancelled, discardedLessons: discarded }
+    });
+  } catch (error) {
+    console.error('Error cancelling pre-computation:', error);
+    res.status(500).json({ message: 'Server error', error: error.message });
+  }
+});
+
 app.listen(PORT, () => {
   console.log(`Server running on port ${PORT}`);
+  // Warm up the Manim workers so the first render skips Python/manim start-up
+  startRenderPool();
+  // Remove render intermediates left by crashed or older renders
+  startScratchCollector();
+  // Keep generated media within its disk budget
+  startStorageManager();
 });
@@ -67,7 +67,8 @@ const AssignmentSchema = new mongoose.Schema({
     sessionId: String,
     status: {
         type: String,
-        enum: ['generated', 'in_progress', 'completed', 'expired'],
+        // 'generating' while a streamed assignment is still being written
+        enum: ['generating', 'generated', 'in_progress', 'completed', 'expired'],
         default: 'generated'
     },
     dueDate: Date,
@@ -31,6 +31,11 @@ const MessageSchema = new mongoose.Schema({
     type: String,
     default: null
   },
+  // Every quality rendered so far, best first (videoUrl points at the best one)
+  renditions: {
+    type: [mongoose.Schema.Types.Mixed],
+    default: []
+  },
   timestamp: {
     type: Date,
     default: Date.now
@@ -58,7 +58,8 @@ const ExamSchema = new mongoose.Schema({
     sessionId: String,
     status: {
         type: String,
-        enum: ['generated', 'in_progress', 'submitted', 'evaluated'],
+        // 'generating' while a streamed exam is still being written
+        enum: ['generating', 'generated', 'in_progress', 'submitted', 'evaluated'],
         default: 'generated'
     },
     createdAt: {
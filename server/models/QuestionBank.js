@@ -0,0 +1,104 @@
+const mongoose = require('mongoose');
+
+// Reusable exam/assignment question (see server/services/questionBank.js)
+const BankQuestionSchema = new mongoose.Schema({
+  // Hash of scope + question text and options, so a question is banked once
+  questionKey: {
+    type: String,
+    required: true,
+    unique: true
+  },
+  grade: {
+    type: String,
+    required: true
+  },
+  subject: {
+    type: String,
+    required: true
+  },
+  topic: {
+    type: String,
+    required: true
+  },
+  // Lowercased, whitespace-collapsed topic used for lookups
+  topicKey: {
+    type: String,
+    required: true
+  },
+  difficulty: {
+    type: String,
+    enum: ['easy', 'medium', 'hard'],
+    required: true
+  },
+  question: {
+    type: String,
+    required: true
+  },
+  options: [String],
+  correctAnswer: {
+    type: String,
+    required: true
+  },
+  marks: Number,
+  concept: String,
+  explanation: String,
+
+  // Where the question was first generated
+  source: {
+    type: String,
+    enum: ['exam', 'assignment'],
+    required: true
+  },
+  sourceId: String,
+
+  // Usage
+  timesServed: {
+    type: Number,
+    default: 0
+  },
+  lastServedAt: {
+    type: Date,
+    default: null
+  },
+  createdAt: {
+    type: Date,
+    default: Date.now
+  }
+});
+
+// Paper assembly: least used questions of a scope and difficulty first
+BankQuestionSchema.index({ source: 1, grade: 1, subject: 1, topicKey: 1, difficulty: 1, timesServed: 1 });
+
+// A banked question a student already had (never served to them again).
+// One document per student and question, so bank questions stay small.
+const SeenQuestionSchema = new mongoose.Schema({
+  studentId: {
+    type: String,
+    required: true
+  },
+  questionId: {
+    type: mongoose.Schema.Types.ObjectId,
+    ref: 'BankQuestion',
+    required: true
+  },
+  // Scope of the question, so a draw only loads the student's seen questions of one scope
+  source: {
+    type: String,
+    enum: ['exam', 'assignment'],
+    required: true
+  },
+  grade: String,
+  subject: String,
+  topicKey: String,
+  seenAt: {
+    type: Date,
+    default: Date.now
+  }
+});
+
+SeenQuestionSchema.index({ studentId: 1, source: 1, grade: 1, subject: 1, topicKey: 1, questionId: 1 }, { unique: true });
+
+const BankQuestion = mongoose.model('BankQuestion', BankQuestionSchema);
+const SeenQuestion = mongoose.model('SeenQuestion', SeenQuestionSchema);
+
+module.exports = { BankQuestion, SeenQuestion };
@@ -98,7 +98,9 @@ const analyticsSchema = new mongoose.Schema({
   
   // Metadata
   createdAt: { type: Date, default: Date.now },
-  analyzedQuizzes: [{ type: String }] // Quiz IDs included in analysis
+  analyzedQuizzes: [{ type: String }], // Quiz IDs included in analysis
+  // Generated in the background after a submission, not yet asked for (services/precompute.js)
+  precomputed: { type: Boolean, default: false }
 });
 
 // Teaching Lesson Schema
@@ -118,12 +120,31 @@ const lessonSchema = new mongoose.Schema({
   manimCode: { type: String },
   scriptPath: { type: String },
   videoUrl: { type: String },
+  // Every quality rendered so far, best first (videoUrl points at the best one)
+  renditions: [{
+    quality: { type: String },
+    label: { type: String },
+    height: { type: Number },
+    fps: { type: Number },
+    minMbps: { type: Number },
+    url: { type: String },
+    size: { type: Number },
+    createdAt: { type: Date }
+  }],
   renderStatus: { 
     type: String, 
     enum: ['pending', 'rendering', 'completed', 'failed', 'skipped', 'no_code', 'error'],
     default: 'pending'
   },
   renderError: { type: String },
+  // Cause of the last failed render, classified from its traceback (render/repair.js)
+  renderFailure: {
+    cause: { type: String },
+    signature: { type: String },
+    detail: { type: String },
+    line: { type: Number },
+    traceback: { type: String }
+  },
   
   // Session Info
   sessionId: { type: String },
@@ -138,6 +159,14 @@ const lessonSchema = new mongoose.Schema({
     default: 'generating'
   },
   viewCount: { type: Number, default: 0 },
+
+  // Pre-generated for the student's weakest concept and hidden until they
+  // ask for a lesson (services/precompute.js); renderJobId is its render
+  speculative: { type: Boolean, default: false },
+  renderJobId: { type: String },
+  // Better renditions of the current first rendition have been queued
+  // (only once the lesson is claimed, for a pre-generated lesson)
+  upgradesQueued: { type: Boolean, default: false },
   
   // Timestamps
   createdAt: { type: Date, default: Date.now },
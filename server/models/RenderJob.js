@@ -0,0 +1,73 @@
+const mongoose = require('mongoose');
+
+// Durable render job (see server/render/jobQueue.js)
+const RenderJobSchema = new mongoose.Schema({
+  jobId: {
+    type: String,
+    required: true,
+    unique: true
+  },
+  kind: {
+    type: String,
+    enum: ['doubt', 'lesson', 'chapter', 'upgrade'],
+    required: true
+  },
+  // Higher runs first: doubt > lesson > chapter > upgrade
+  priority: {
+    type: Number,
+    required: true
+  },
+  status: {
+    type: String,
+    enum: ['queued', 'running', 'completed', 'failed'],
+    default: 'queued'
+  },
+  payload: {
+    type: mongoose.Schema.Types.Mixed,
+    default: {}
+  },
+  result: {
+    type: mongoose.Schema.Types.Mixed,
+    default: null
+  },
+  error: {
+    type: String,
+    default: null
+  },
+  attempts: {
+    type: Number,
+    default: 0
+  },
+  workerId: {
+    type: String,
+    default: null
+  },
+
+  // Timing
+  createdAt: {
+    type: Date,
+    default: Date.now
+  },
+  startedAt: {
+    type: Date,
+    default: null
+  },
+  // Refreshed by the worker while the job runs (stale = worker is gone)
+  heartbeatAt: {
+    type: Date,
+    default: null
+  },
+  finishedAt: {
+    type: Date,
+    default: null
+  }
+});
+
+// Claim order for the queue
+RenderJobSchema.index({ status: 1, priority: -1, createdAt: 1 });
+// Finished jobs are kept for a week of stats
+RenderJobSchema.index({ finishedAt: 1 }, { expireAfterSeconds: 7 * 24 * 60 * 60 });
+
+const RenderJob = mongoose.model('RenderJob', RenderJobSchema);
+
+module.exports = { RenderJob };
@@ -0,0 +1,173 @@
+const http = require('http');
+const https = require('https');
+const fetch = require('node-fetch');
+
+// ==================== ONDEMAND HTTP CONFIGURATION ====================
+// Every Chat and Media API call goes through one keep-alive agent per
+// protocol, so a session create, its query and an image upload reuse the
+// same TLS connections instead of handshaking each time. In-flight requests
+// are bounded: past ONDEMAND_MAX_IN_FLIGHT they wait in a FIFO queue (a
+// class pressing "generate" at once queues instead of opening a socket each).
+const ONDEMAND_MAX_SOCKETS = parseInt(process.env.ONDEMAND_MAX_SOCKETS || '32', 10);
+const ONDEMAND_MAX_FREE_SOCKETS = parseInt(process.env.ONDEMAND_MAX_FREE_SOCKETS || '8', 10);
+const ONDEMAND_MAX_IN_FLIGHT = parseInt(process.env.ONDEMAND_MAX_IN_FLIGHT || '32', 10);
+// Seconds a request may wait for a slot before it fails
+const ONDEMAND_QUEUE_TIMEOUT = parseInt(process.env.ONDEMAND_QUEUE_TIMEOUT || '120', 10) * 1000;
+// Idle keep-alive sockets are closed after this long (the API drops them eventually anyway)
+const FREE_SOCKET_TIMEOUT = 30000;
+
+const stats = {
+    requests: 0,
+    failures: 0,
+    queuedRequests: 0,
+    queueTimeouts: 0,
+    maxQueued: 0,
+    totalWaitMs: 0,
+    socketsCreated: 0,
+    socketsReused: 0
+};
+
+/**
+ * Keep-alive agent that counts new and reused connections
+ */
+function createAgent(Agent) {
+    const agent = new Agent({
+        keepAlive: true,
+        maxSockets: ONDEMAND_MAX_SOCKETS,
+        maxFreeSockets: ONDEMAND_MAX_FREE_SOCKETS,
+        // Idle pooled sockets are destroyed after this (a request on a socket
+        // only gets an unhandled 'timeout' event, so slow streams are not cut)
+        timeout: FREE_SOCKET_TIMEOUT,
+        scheduling: 'lifo'
+    });
+
+    const createConnection = agent.createConnection;
+    agent.createConnection = function (...args) {
+        stats.socketsCreated++;
+        return createConnection.apply(this, args);
+    };
+    const reuseSocket = agent.reuseSocket;
+    agent.reuseSocket = function (socket, request) {
+        stats.socketsReused++;
+        return reuseSocket.call(this, socket, request);
+    };
+    return agent;
+}
+
+const agents = {
+    'http:': createAgent(http.Agent),
+    'https:': createAgent(https.Agent)
+};
+
+// ---------------------------------------------------------------- in-flight limit
+
+// Resolvers of requests waiting for a slot, oldest first
+const waiting = [];
+let active = 0;
+
+function acquireSlot() {
+    if (active < ONDEMAND_MAX_IN_FLIGHT) {
+        active++;
+        return Promise.resolve();
+    }
+    stats.queuedRequests++;
+    return new Promise((resolve, reject) => {
+        const waiter = { resolve, timer: null };
+        waiter.timer = setTimeout(() => {
+            waiting.splice(waiting.indexOf(waiter), 1);
+            stats.queueTimeouts++;
+            reject(new Error(`OnDemand request queue timed out after ${ONDEMAND_QUEUE_TIMEOUT / 1000}s`));
+        }, ONDEMAND_QUEUE_TIMEOUT);
+        waiting.push(waiter);
+        stats.maxQueued = Math.max(stats.maxQueued, waiting.length);
+    });
+}
+
+function releaseSlot() {
+    const next = waiting.shift();
+    if (next) {
+        // The slot passes straight to the next request (active stays the same)
+        clearTimeout(next.timer);
+        next.resolve();
+    } else {
+        active--;
+    }
+}
+
+/**
+ * fetch() for the OnDemand APIs: same arguments and response as node-fetch,
+ * sent over the shared keep-alive agents once an in-flight slot is free.
+ *
+ * The slot of a successful response is held until its body has been read
+ * (a streamed answer occupies its connection until the last event), so
+ * callers must consume the body (json(), text() or the stream) as they
+ * already do. Error responses free their slot straight away.
+ */
+async function ondemandFetch(url, options = {}) {
+    const queuedAt = Date.now();
+    await acquireSlot();
+    stats.totalWaitMs += Date.now() - queuedAt;
+    stats.requests++;
+
+    let released = false;
+    const release = () => {
+        if (released) return;
+        released = true;
+        releaseSlot();
+    };
+
+    try {
+        const response = await fetch(url, {
+            ...options,
+            agent: (parsedUrl) => agents[parsedUrl.protocol]
+        });
+        const body = response.body;
+        // An error answer is short and callers often return without reading
+        // it: its slot is freed at once rather than when the body ends
+        if (!response.ok || !body || typeof body.once !== 'function' || body.readableEnded || body.destroyed) {
+            release();
+        } else {
+            body.once('end', release);
+            body.once('close', release);
+            body.once('error', release);
+        }
+        return response;
+    } catch (error) {
+        stats.failures++;
+        release();
+        throw error;
+    }
+}
+
+// host:port -> number of sockets, over both agents
+function socketCounts(kind) {
+    const counts = {};
+    for (const agent of Object.values(agents)) {
+        for (const [host, list] of Object.entries(agent[kind])) {
+            counts[host] = (counts[host] || 0) + list.length;
+        }
+    }
+    return counts;
+}
+
+function getHttpStats() {
+    return {
+        maxSockets: ONDEMAND_MAX_SOCKETS,
+        maxFreeSockets: ONDEMAND_MAX_FREE_SOCKETS,
+        maxInFlight: ONDEMAND_MAX_IN_FLIGHT,
+        inFlight: active,
+        queued: waiting.length,
+        averageWaitMs: stats.requests > 0 ? Math.round(stats.totalWaitMs / stats.requests) : 0,
+        reuseRate: stats.socketsCreated + stats.socketsReused > 0
+            ? Math.round(stats.socketsReused / (stats.socketsCreated + stats.socketsReused) * 100) / 100
+            : null,
+        activeSockets: socketCounts('sockets'),
+        freeSockets: socketCounts('freeSockets'),
+        ...stats
+    };
+}
+
+module.exports = {
+    ondemandFetch,
+    getHttpStats
+};
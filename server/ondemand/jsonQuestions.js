@@ -0,0 +1,149 @@
+// ==================== STREAMED QUESTION EXTRACTION ====================
+// Exam and assignment answers are one JSON object whose "questions" array is
+// written question by question. The extractor follows the JSON as it
+// streams in and hands out each question as soon as its object is closed,
+// long before the whole answer can be parsed.
+
+/**
+ * Incremental extractor for a streamed { ...header, "questions": [ {...}, ... ] }
+ * answer. Text before the first "{" (a ```json fence, a sentence) is skipped.
+ *
+ * @param {Object} handlers
+ * @param {Function} handlers.onHeader - (header) the top-level fields written before "questions"
+ * @param {Function} handlers.onQuestion - (question, index) each complete question object
+ * @param {string} handlers.arrayKey - top-level key of the array to extract (default "questions")
+ */
+function createQuestionExtractor({ onHeader, onQuestion, arrayKey = 'questions' } = {}) {
+    let text = '';
+    let position = 0;
+    let objectStart = -1;   // index of the top-level "{"
+    let depth = 0;
+    let inString = false;
+    let escaped = false;
+    let stringStart = -1;
+    let lastString = null;  // last complete string at the top level (a key candidate)
+    let lastStringStart = -1;
+    let currentKey = null;
+    let currentKeyStart = -1;
+    let arrayDepth = -1;    // depth inside the questions array, -1 when not in it
+    let itemStart = -1;
+    let index = 0;
+    let headerSent = false;
+    let done = false;
+
+    function sendHeader(end) {
+        if (headerSent) return;
+        headerSent = true;
+        if (!onHeader) return;
+        // '{ "examTitle": ..., "totalMarks": 60, ' + '}' is the header on its own
+        const prefix = text.slice(objectStart, end).replace(/,\s*$/, '');
+        try {
+            onHeader(JSON.parse(`${prefix}}`));
+        } catch (e) {
+            // A header that does not parse on its own is read from the full answer instead
+        }
+    }
+
+    function sendItem(end) {
+        let question;
+        try {
+            question = JSON.parse(text.slice(itemStart, end));
+        } catch (e) {
+            return;
+        }
+        if (onQuestion) onQuestion(question, index);
+        index++;
+    }
+
+    function scan() {
+        for (; position < text.length && !done; position++) {
+            const char = text[position];
+
+            if (inString) {
+                if (escaped) {
+                    escaped = false;
+                } else if (char === '\\') {
+                    escaped = true;
+                } else if (char === '"') {
+                    inString = false;
+                    if (depth === 1) {
+                        lastStringStart = stringStart;
+                        try {
+                            lastString = JSON.parse(text.slice(stringStart, position + 1));
+                        } catch (e) {
+                            lastString = null;
+                        }
+                    }
+                }
+                continue;
+            }
+
+            if (objectStart === -1) {
+                if (char === '{') {
+                    objectStart = position;
+                    depth = 1;
+                }
+                continue;
+            }
+
+            switch (char) {
+                case '"':
+                    inString = true;
+                    stringStart = position;
+                    break;
+                case ':':
+                    if (depth === 1) {
+                        currentKey = lastString;
+                        currentKeyStart = lastStringStart;
+                    }
+                    break;
+                case ',':
+                    if (depth === 1) currentKey = null;
+                    break;
+                case '{':
+                case '[':
+                    if (depth === 1 && char === '[' && currentKey === arrayKey) {
+                        sendHeader(currentKeyStart);
+                        arrayDepth = depth + 1;
+                    }
+                    depth++;
+                    if (char === '{' && depth === arrayDepth + 1) itemStart = position;
+                    break;
+                case '}':
+                case ']':
+                    depth--;
+                    if (char === '}' && depth === arrayDepth && itemStart !== -1) {
+                        sendItem(position + 1);
+                        itemStart = -1;
+                    } else if (char === ']' && depth === 1 && arrayDepth !== -1) {
+                        arrayDepth = -1;
+                    } else if (depth === 0) {
+                        done = true;
+                    }
+                    break;
+                default:
+                    break;
+            }
+        }
+    }
+
+    return {
+        /**
+         * Feed the next delta of the streamed answer
+         */
+        push(delta) {
+            if (done || !delta) return;
+            text += delta;
+            scan();
+        },
+
+        /**
+         * Questions handed out so far
+         */
+        count: () => index
+    };
+}
+
+module.exports = {
+    createQuestionExtractor
+};
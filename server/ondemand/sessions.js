@@ -0,0 +1,154 @@
+// ==================== ONDEMAND SESSION CONFIGURATION ====================
+// Chat sessions are reused per (agent, student) instead of creating one
+// before every query: a generation then costs one round trip instead of two.
+// Sessions expire after ONDEMAND_SESSION_TTL seconds or ONDEMAND_SESSION_USES
+// queries (so a conversation's context does not grow without bound); the
+// least recently used is dropped past ONDEMAND_SESSION_MAX.
+const ONDEMAND_SESSION_TTL = parseInt(process.env.ONDEMAND_SESSION_TTL || '1800', 10) * 1000;
+const ONDEMAND_SESSION_MAX = parseInt(process.env.ONDEMAND_SESSION_MAX || '1000', 10);
+const ONDEMAND_SESSION_USES = parseInt(process.env.ONDEMAND_SESSION_USES || '20', 10);
+// Query statuses that mean the session no longer exists on the OnDemand side
+const SESSION_GONE_STATUSES = new Set([400, 404, 410]);
+
+// `${agent}:${studentId}` -> { session, createdAt, lastUsed, uses }, least recently used first
+const sessions = new Map();
+// Creations in flight, so concurrent queries of one student share a session
+const creating = new Map();
+
+const stats = {
+    hits: 0,
+    created: 0,
+    failedCreates: 0,
+    expired: 0,
+    evicted: 0,
+    invalidated: 0,
+    retries: 0
+};
+
+function sessionKey(agent, studentId) {
+    return `${agent}:${studentId}`;
+}
+
+// create*Session results are either the session id or { sessionId, ... }
+function sessionIdOf(session) {
+    return typeof session === 'string' ? session : session && session.sessionId;
+}
+
+function isFresh(entry) {
+    return Date.now() - entry.createdAt < ONDEMAND_SESSION_TTL && entry.uses < ONDEMAND_SESSION_USES;
+}
+
+/**
+ * True if a failed query response says its session is gone (expired or unknown)
+ */
+function sessionGone(response) {
+    return SESSION_GONE_STATUSES.has(response.status);
+}
+
+/**
+ * Cached session of a student for an agent, or a new one from create().
+ * Resolves to { session, reused } (session null if it could not be created).
+ */
+async function acquireSession(agent, studentId, create) {
+    const key = sessionKey(agent, studentId);
+    const entry = sessions.get(key);
+    if (entry) {
+        sessions.delete(key);
+        if (isFresh(entry)) {
+            // Re-inserted to mark it most recently used
+            entry.uses++;
+            entry.lastUsed = Date.now();
+            sessions.set(key, entry);
+            stats.hits++;
+            return { session: entry.session, reused: true };
+        }
+        stats.expired++;
+    }
+
+    if (!creating.has(key)) {
+        const promise = Promise.resolve()
+            .then(create)
+            .then((session) => {
+                if (!sessionIdOf(session)) {
+                    stats.failedCreates++;
+                    return null;
+                }
+                stats.created++;
+                sessions.set(key, { session, createdAt: Date.now(), lastUsed: Date.now(), uses: 1 });
+                while (sessions.size > ONDEMAND_SESSION_MAX) {
+                    sessions.delete(sessions.keys().next().value);
+                    stats.evicted++;
+                }
+                return session;
+            })
+            .finally(() => creating.delete(key));
+        creating.set(key, promise);
+        return { session: await promise, reused: false };
+    }
+    // Another query is creating this student's session: use it once it exists
+    const session = await creating.get(key);
+    if (session) {
+        const created = sessions.get(key);
+        if (created) created.uses++;
+    }
+    return { session, reused: false };
+}
+
+/**
+ * Drop a student's cached session (only if it is still the given one)
+ */
+function invalidateSession(agent, studentId, session = null) {
+    const key = sessionKey(agent, studentId);
+    const entry = sessions.get(key);
+    if (!entry) return;
+    if (session && sessionIdOf(entry.session) !== sessionIdOf(session)) return;
+    sessions.delete(key);
+    stats.invalidated++;
+}
+
+/**
+ * Run query(session) in the student's session for an agent.
+ *
+ * A failed query (null, or { success: false }) drops the session so the
+ * next call starts a new one. When the failure says the session is gone
+ * ({ sessionGone: true }) and the session was a cached one, the query is
+ * retried once in a fresh session.
+ *
+ * @param {string} agent - agent name ('teacher', 'exam', ...)
+ * @param {string} studentId - whose session
+ * @param {Function} create - async () => the agent's create*Session result, or null
+ * @param {Function} query - async (session) => result
+ * @returns {Promise<{session, result}>} session is null if none could be created
+ */
+async function withSession(agent, studentId, create, query) {
+    for (let attempt = 0; ; attempt++) {
+        const { session, reused } = await acquireSession(agent, studentId, create);
+        if (!session) return { session: null, result: null };
+
+        const result = await query(session);
+        if (result && result.success !== false) return { session, result };
+
+        invalidateSession(agent, studentId, session);
+        if (!(reused && attempt === 0 && result && result.sessionGone)) return { session, result };
+        stats.retries++;
+        console.log(`🔄 ${agent} session ${sessionIdOf(session)} expired, retrying in a new session`);
+    }
+}
+
+function getSessionStats() {
+    return {
+        cached: sessions.size,
+        creating: creating.size,
+        ttlSeconds: ONDEMAND_SESSION_TTL / 1000,
+        maxSessions: ONDEMAND_SESSION_MAX,
+        maxUses: ONDEMAND_SESSION_USES,
+        ...stats
+    };
+}
+
+module.exports = {
+    sessionGone,
+    withSession,
+    invalidateSession,
+    getSessionStats
+};
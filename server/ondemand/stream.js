@@ -0,0 +1,151 @@
+const { StringDecoder } = require('string_decoder');
+
+// ==================== ONDEMAND STREAM CONFIGURATION ====================
+// Streamed query answers (responseMode "stream") arrive as Server-Sent Events:
+// "data: {json}" lines, events separated by a blank line, "[DONE]" at the end.
+// Every agent reads them through here instead of its own buffer-splitting loop.
+const DONE_MARKER = '[DONE]';
+
+/**
+ * Incremental SSE parser. Bytes are decoded with a StringDecoder (a UTF-8
+ * character split across chunks is held back until it is complete) and only
+ * the unterminated tail of the previous chunk is carried over, so the
+ * stream is never re-split from the start.
+ */
+function createSseParser() {
+    const decoder = new StringDecoder('utf8');
+    let tail = '';
+    let data = [];
+
+    function dispatch(events) {
+        if (data.length === 0) return;
+        const lines = data;
+        data = [];
+        const payload = lines.join('\n');
+        if (payload === DONE_MARKER) return;
+        try {
+            events.push(JSON.parse(payload));
+        } catch (e) {
+            // Events are expected to be single-line JSON; when the blank
+            // separator is missing, each data line is its own event
+            for (const line of lines) {
+                if (line === DONE_MARKER) continue;
+                try {
+                    events.push(JSON.parse(line));
+                } catch (err) {
+                    // Skip malformed events
+                }
+            }
+        }
+    }
+
+    function parseLines(text, events) {
+        let start = 0;
+        let newline;
+        while ((newline = text.indexOf('\n', start)) !== -1) {
+            let line = text.slice(start, newline);
+            start = newline + 1;
+            if (line.endsWith('\r')) line = line.slice(0, -1);
+
+            if (line === '') {
+                dispatch(events);
+            } else if (line.startsWith('data:')) {
+                data.push(line.slice(5).trim());
+            }
+            // "event:", "id:", "retry:" and ":" comments carry nothing we use
+        }
+        return text.slice(start);
+    }
+
+    return {
+        /**
+         * Feed a chunk (Buffer or string); returns the events it completed
+         */
+        push(chunk) {
+            const events = [];
+            tail = parseLines(tail + (typeof chunk === 'string' ? chunk : decoder.write(chunk)), events);
+            return events;
+        },
+
+        /**
+         * End of stream: the events still pending (no trailing blank line)
+         */
+        end() {
+            const events = [];
+            tail = parseLines(tail + decoder.end() + '\n', events);
+            dispatch(events);
+            return events;
+        }
+    };
+}
+
+/**
+ * Async iterator over the parsed events of a streamed response body
+ * (a node-fetch v2 body is a Node readable stream)
+ */
+async function* readSseEvents(body) {
+    const parser = createSseParser();
+    for await (const chunk of body) {
+        yield* parser.push(chunk);
+    }
+    yield* parser.end();
+}
+
+/**
+ * Read an OnDemand streamed answer to the end.
+ *
+ * Answer deltas come from "fulfillment" events (or events without an
+ * eventType, the older format); they are kept as a list of parts and
+ * joined once, so a long answer is not copied on every delta.
+ *
+ * @param {ReadableStream} body - response.body of a streamed query
+ * @param {Object} handlers
+ * @param {Function} handlers.onDelta - (delta, answer, length) for each answer delta; answer()
+ *   returns the text so far (joined on demand), length its size
+ * @param {Function} handlers.onMetrics - (publicMetrics) for each metricsLog event
+ * @param {Function} handlers.onEvent - (event) for every parsed event
+ * @returns {Promise<{answer, sessionId, messageId, metrics, events}>}
+ */
+async function readOnDemandStream(body, { onDelta, onMetrics, onEvent } = {}) {
+    let parts = [];
+    let length = 0;
+    let sessionId = '';
+    let messageId = '';
+    let metrics = {};
+    let events = 0;
+
+    const answer = () => {
+        if (parts.length > 1) parts = [parts.join('')];
+        return parts[0] || '';
+    };
+
+    for await (const event of readSseEvents(body)) {
+        events++;
+        if (onEvent) onEvent(event);
+
+        if (event.eventType === 'metricsLog') {
+            if (event.publicMetrics) {
+                metrics = event.publicMetrics;
+                if (onMetrics) onMetrics(metrics);
+            }
+            continue;
+        }
+        if (event.eventType && event.eventType !== 'fulfillment') continue;
+
+        if (event.sessionId) sessionId = event.sessionId;
+        if (event.messageId) messageId = event.messageId;
+        if (event.answer) {
+            parts.push(event.answer);
+            length += event.answer.length;
+            if (onDelta) onDelta(event.answer, answer, length);
+        }
+    }
+
+    return { answer: answer(), sessionId, messageId, metrics, events };
+}
+
+module.exports = {
+    createSseParser,
+    readSseEvents,
+    readOnDemandStream
+};
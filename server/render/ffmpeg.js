@@ -0,0 +1,85 @@
+const { spawn } = require('child_process');
+const fs = require('fs');
+const path = require('path');
+const { renderEnv } = require('./workerPool');
+
+/**
+ * Run ffmpeg with an argument list (no shell, so paths need no quoting)
+ */
+function runFfmpeg(args, { timeoutMs = 120000, binary = 'ffmpeg' } = {}) {
+    return new Promise((resolve) => {
+        const child = spawn(binary, ['-hide_banner', '-loglevel', 'error', ...args], {
+            env: renderEnv(),
+            windowsHide: true
+        });
+
+        let stdout = '';
+        let stderr = '';
+        const timer = setTimeout(() => child.kill('SIGKILL'), timeoutMs);
+
+        child.stdout.on('data', (data) => { stdout += data.toString(); });
+        child.stderr.on('data', (data) => { stderr += data.toString(); });
+        child.on('error', (error) => {
+            clearTimeout(timer);
+            resolve({ success: false, error: `${binary} not available: ${error.message}`, stdout, stderr });
+        });
+        child.on('close', (code) => {
+            clearTimeout(timer);
+            resolve({
+                success: code === 0,
+                error: code === 0 ? undefined : `${binary} exited with code ${code}: ${stderr.substring(0, 300)}`,
+                stdout,
+                stderr
+            });
+        });
+    });
+}
+
+/**
+ * Duration of a media file in seconds (null if ffprobe cannot read it)
+ */
+async function probeDuration(file) {
+    const result = await runFfmpeg([
+        '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        file
+    ], { timeoutMs: 30000, binary: 'ffprobe' });
+    const seconds = parseFloat(result.stdout);
+    return result.success && Number.isFinite(seconds) ? seconds : null;
+}
+
+/**
+ * Entry for an ffmpeg concat demuxer list file
+ */
+function concatListEntry(file) {
+    return `file '${path.resolve(file).replace(/\\/g, '/').replace(/'/g, "'\\''")}'`;
+}
+
+/**
+ * Join videos with identical codec settings by stream copy (no re-encode)
+ */
+async function concatVideos(inputs, outputPath) {
+    fs.mkdirSync(path.dirname(outputPath), { recursive: true });
+    const listPath = `${outputPath}.concat.txt`;
+    fs.writeFileSync(listPath, inputs.map(concatListEntry).join('\n') + '\n');
+
+    const result = await runFfmpeg([
+        '-y',
+        '-f', 'concat',
+        '-safe', '0',
+        '-i', listPath,
+        '-c', 'copy',
+        '-movflags', '+faststart',
+        outputPath
+    ]);
+
+    try { fs.unlinkSync(listPath); } catch (e) {}
+    return { ...result, outputPath };
+}
+
+module.exports = {
+    runFfmpeg,
+    probeDuration,
+    concatListEntry,
+    concatVideos
+};
@@ -0,0 +1,110 @@
+const path = require('path');
+const { STATIC_HOLDS, submitJob, getManimVersion } = require('./workerPool');
+
+// ==================== SCENE FRAGMENT CONFIGURATION ====================
+// Title cards, section headers and outros are cut out of a scene by the split
+// planner (scene_fragments.py) and rendered from their parameters, so a card
+// every lesson repeats is rendered once and then only concatenated
+const RENDER_FRAGMENTS = process.env.RENDER_FRAGMENTS !== '0';
+const FRAGMENT_TIMEOUT = 120000;
+
+const inFlight = new Map();
+
+const stats = {
+    hits: 0,
+    misses: 0,
+    coalesced: 0,
+    failures: 0
+};
+
+function fragmentSceneName(kind) {
+    return kind.split('_').map(word => word[0].toUpperCase() + word.slice(1)).join('');
+}
+
+async function renderFragmentClip(job, fragment, key) {
+    // Cached clips share the render cache (and its budget) with whole videos.
+    // Required here: renderCache itself depends on sectionRender.
+    const { storeRender } = require('./renderCache');
+    const sceneName = fragmentSceneName(fragment.kind);
+    const result = await submitJob({
+        action: 'fragment',
+        params: fragment.params,
+        sceneName,
+        quality: job.quality || 'l',
+        holds: STATIC_HOLDS,
+        mediaDir: path.join(job.mediaDir, `fragment_${(key || sceneName).substring(0, 12)}`)
+    }, { timeoutMs: FRAGMENT_TIMEOUT, priority: job.priority });
+
+    if (!result.success || !result.videoPath) {
+        stats.failures++;
+        return { ...result, success: false, error: result.error || 'no video produced' };
+    }
+    if (key) {
+        try {
+            result.videoPath = storeRender(key, result.videoPath, {
+                sceneName: `fragment:${fragment.kind}`,
+                quality: job.quality || 'l',
+                renderMs: result.elapsedMs
+            });
+        } catch (e) {
+            console.log(`⚠️ Could not store fragment in cache: ${e.message}`);
+        }
+    }
+    return result;
+}
+
+/**
+ * Render one fragment part of a split plan ({kind, params}), or reuse the
+ * clip cached under hash(params, kind, quality, manim version).
+ *
+ * onEvent receives the finished clip as a single 'animation' event, the
+ * same way a streamed section reports its animations (with `animations`,
+ * the number of animations the clip replaces, for progress reporting).
+ */
+async function renderFragment(job, fragment, onEvent) {
+    const { renderCacheKey, getCachedRender } = require('./renderCache');
+    const manimVersion = await getManimVersion();
+    const quality = job.quality || 'l';
+    const key = manimVersion
+        ? renderCacheKey(JSON.stringify(fragment.params), `fragment:${fragment.kind}`, quality, manimVersion)
+        : null;
+
+    let result;
+    const cached = key && getCachedRender(key);
+    if (cached) {
+        stats.hits++;
+        result = { success: true, cached: true, videoPath: cached.videoPath, elapsedMs: 0 };
+    } else if (key && inFlight.has(key)) {
+        stats.coalesced++;
+        result = await inFlight.get(key);
+    } else {
+        stats.misses++;
+        const promise = renderFragmentClip(job, fragment, key);
+        if (key) {
+            inFlight.set(key, promise);
+            promise.finally(() => inFlight.delete(key));
+        }
+        result = await promise;
+    }
+
+    if (result.success && onEvent) {
+        // One clip, but it stands for all of the card's plays and waits
+        const animations = fragment.params.steps.filter(step => 'play' in step || 'wait' in step).length;
+        onEvent({ event: 'animation', index: 0, path: result.videoPath, animations });
+    }
+    return { ...result, fragment: fragment.kind, cacheKey: key };
+}
+
+function getFragmentStats() {
+    return {
+        enabled: RENDER_FRAGMENTS,
+        inFlight: inFlight.size,
+        ...stats
+    };
+}
+
+module.exports = {
+    RENDER_FRAGMENTS,
+    renderFragment,
+    getFragmentStats
+};
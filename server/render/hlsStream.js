@@ -0,0 +1,248 @@
+const fs = require('fs');
+const path = require('path');
+const { runFfmpeg } = require('./ffmpeg');
+
+// ==================== PROGRESSIVE HLS CONFIGURATION ====================
+// Lessons are published as an HLS (fMP4) EVENT playlist while they render
+const HLS_DIR = process.env.HLS_DIR || path.join(__dirname, '..', 'output', 'hls');
+const HLS_URL_PREFIX = '/hls';
+const SEGMENT_SECONDS = 6;
+const MIN_TARGET_DURATION = 20;
+// A finished stream is removed this long after the render (the mp4 is
+// published by then); viewers still on the playlist get to finish it
+const HLS_RETAIN = (parseInt(process.env.HLS_RETAIN_MIN, 10) || 30) * 60 * 1000;
+
+// streamId -> the stream that owns its folder (live, or finished and awaiting removal)
+const streams = new Map();
+
+/**
+ * Public URL of a stream's playlist
+ */
+function hlsPlaylistUrl(streamId) {
+    return `${HLS_URL_PREFIX}/${encodeURIComponent(streamId)}/index.m3u8`;
+}
+
+/**
+ * Whether a stream folder still belongs to a stream of this process
+ */
+function isStreamActive(streamId) {
+    return streams.has(streamId);
+}
+
+/**
+ * Parse the vod playlist ffmpeg writes for one remuxed animation
+ */
+function parseChunkPlaylist(text) {
+    const chunk = { init: null, segments: [] };
+    let duration = null;
+    for (const line of text.split(/\r?\n/)) {
+        const map = line.match(/^#EXT-X-MAP:URI="([^"]+)"/);
+        const inf = line.match(/^#EXTINF:([\d.]+)/);
+        if (map) {
+            chunk.init = map[1];
+        } else if (inf) {
+            duration = parseFloat(inf[1]);
+        } else if (line && !line.startsWith('#') && duration !== null) {
+            chunk.segments.push({ file: line.trim(), duration });
+            duration = null;
+        }
+    }
+    return chunk;
+}
+
+/**
+ * Create a progressive HLS stream for one render.
+ *
+ * Feed it the render's events (see renderInSections/submitRender): each
+ * finished animation is remuxed by stream copy into fMP4 segments and
+ * appended to an EVENT playlist in scene order, so playback can start as
+ * soon as the first animation is done. finish() closes the playlist and
+ * removes the stream HLS_RETAIN_MIN minutes later; discard() removes it now.
+ *
+ * @param {string} streamId - folder/URL name (e.g. the lessonId)
+ * @param {Object} options
+ * @param {Function} options.onReady - called once with the playlist URL when the first segment is published
+ */
+function createHlsStream(streamId, { onReady } = {}) {
+    const dir = path.join(HLS_DIR, streamId);
+    const playlistPath = path.join(dir, 'index.m3u8');
+    const playlistUrl = hlsPlaylistUrl(streamId);
+
+    // A re-render replaces the previous stream of the same id
+    const previous = streams.get(streamId);
+    if (previous) clearTimeout(previous.removeTimer);
+    const owner = { removeTimer: null };
+    streams.set(streamId, owner);
+
+    fs.rmSync(dir, { recursive: true, force: true });
+    fs.mkdirSync(dir, { recursive: true });
+
+    // Animations arrive per section and out of order across sections
+    const sections = new Map();
+    let currentSection = 0;
+    let nextIndex = 0;
+    let chunkCounter = 0;
+    let chunks = [];
+    let ended = false;
+    let announced = false;
+    let work = Promise.resolve();
+
+    function sectionState(section) {
+        if (!sections.has(section)) sections.set(section, { pending: new Map(), done: false });
+        return sections.get(section);
+    }
+
+    function writePlaylist() {
+        const maxDuration = Math.max(0, ...chunks.flatMap(chunk => chunk.segments.map(s => s.duration)));
+        const lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:7',
+            '#EXT-X-PLAYLIST-TYPE:EVENT',
+            `#EXT-X-TARGETDURATION:${Math.max(MIN_TARGET_DURATION, Math.ceil(maxDuration))}`,
+            '#EXT-X-MEDIA-SEQUENCE:0',
+            '#EXT-X-INDEPENDENT-SEGMENTS'
+        ];
+        chunks.forEach((chunk, i) => {
+            // Every animation is its own encode, so each starts a new timeline
+            if (i > 0) lines.push('#EXT-X-DISCONTINUITY');
+            lines.push(`#EXT-X-MAP:URI="${chunk.init}"`);
+            for (const segment of chunk.segments) {
+                lines.push(`#EXTINF:${segment.duration.toFixed(3)},`, segment.file);
+            }
+        });
+        if (ended) lines.push('#EXT-X-ENDLIST');
+
+        const tempPath = `${playlistPath}.tmp`;
+        fs.writeFileSync(tempPath, lines.join('\n') + '\n');
+        fs.renameSync(tempPath, playlistPath);
+    }
+
+    async function remux(videoPath, hold) {
+        const name = `a${String(chunkCounter++).padStart(4, '0')}`;
+        const chunkPlaylist = path.join(dir, `${name}.m3u8`);
+        // A static hold is a single frame: repeat it for its duration (a cheap
+        // encode of identical frames), everything else is stream copied
+        const codec = hold
+            ? ['-vf', `tpad=stop_mode=clone:stop_duration=${hold}`, '-t', String(hold), '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p']
+            : ['-c', 'copy'];
+        const result = await runFfmpeg([
+            '-y',
+            '-i', videoPath,
+            ...codec,
+            '-f', 'hls',
+            '-hls_time', String(SEGMENT_SECONDS),
+            '-hls_playlist_type', 'vod',
+            '-hls_segment_type', 'fmp4',
+            '-hls_fmp4_init_filename', `${name}_init.mp4`,
+            '-hls_segment_filename', path.join(dir, `${name}_%03d.m4s`),
+            chunkPlaylist
+        ]);
+        if (!result.success) {
+            console.log(`⚠️ HLS remux failed for ${path.basename(videoPath)}: ${result.error}`);
+            return;
+        }
+
+        const chunk = parseChunkPlaylist(fs.readFileSync(chunkPlaylist, 'utf-8'));
+        try { fs.unlinkSync(chunkPlaylist); } catch (e) {}
+        if (!chunk.init || chunk.segments.length === 0) return;
+
+        chunks.push(chunk);
+        writePlaylist();
+        if (!announced) {
+            announced = true;
+            console.log(`📡 Streaming ${streamId} at ${playlistUrl}`);
+            if (onReady) onReady(playlistUrl);
+        }
+    }
+
+    // Queue every animation that is next in scene order
+    function pump() {
+        while (!ended) {
+            const state = sectionState(currentSection);
+            if (state.pending.has(nextIndex)) {
+                const { path: videoPath, hold } = state.pending.get(nextIndex);
+                state.pending.delete(nextIndex++);
+                work = work.then(() => remux(videoPath, hold)).catch((e) => {
+                    console.log(`⚠️ HLS stream error: ${e.message}`);
+                });
+            } else if (state.done && state.pending.size === 0) {
+                currentSection++;
+                nextIndex = 0;
+            } else {
+                return;
+            }
+        }
+    }
+
+    function handleEvent(event) {
+        if (ended) return;
+        const section = event.section || 0;
+
+        if (event.event === 'animation') {
+            sectionState(section).pending.set(event.index, { path: event.path, hold: event.hold });
+        } else if (event.event === 'section-done') {
+            sectionState(section).done = true;
+        } else if (event.event === 'reset') {
+            // The render restarted from scratch, drop what is not yet published
+            sections.clear();
+            currentSection = 0;
+            nextIndex = 0;
+            work = work.then(() => {
+                chunks = [];
+                writePlaylist();
+            });
+            return;
+        }
+        pump();
+    }
+
+    // Remove the folder unless a newer render of the same id took it over
+    function remove() {
+        if (streams.get(streamId) !== owner) return;
+        clearTimeout(owner.removeTimer);
+        streams.delete(streamId);
+        fs.rmSync(dir, { recursive: true, force: true });
+    }
+
+    /**
+     * Publish anything still buffered and close the playlist. The stream is
+     * removed after the grace period, once players have moved to the mp4.
+     */
+    async function finish() {
+        for (const state of sections.values()) state.done = true;
+        pump();
+        await work;
+        ended = true;
+        if (chunks.length > 0) writePlaylist();
+        if (streams.get(streamId) === owner) {
+            owner.removeTimer = setTimeout(remove, HLS_RETAIN);
+            owner.removeTimer.unref();
+        }
+    }
+
+    /**
+     * Stop streaming and remove the stream's files
+     */
+    async function discard() {
+        ended = true;
+        await work;
+        remove();
+    }
+
+    return {
+        playlistUrl,
+        playlistPath,
+        handleEvent,
+        finish,
+        discard,
+        isLive: () => announced
+    };
+}
+
+module.exports = {
+    HLS_DIR,
+    HLS_RETAIN,
+    createHlsStream,
+    isStreamActive,
+    hlsPlaylistUrl
+};
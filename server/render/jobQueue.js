@@ -0,0 +1,368 @@
+const os = require('os');
+const mongoose = require('mongoose');
+const { RenderJob } = require('../models/RenderJob');
+
+// ==================== RENDER JOB QUEUE CONFIGURATION ====================
+// MongoDB-backed, so queued renders survive a server restart
+const JOB_PRIORITIES = {
+    doubt: 30,      // a student is waiting on the answer
+    lesson: 20,     // single lesson requested from the UI
+    chapter: 10,    // background chapter batches
+    upgrade: 5      // better renditions of videos that are already published
+};
+const CONCURRENCY = Math.max(2, parseInt(process.env.RENDER_QUEUE_CONCURRENCY, 10) || os.cpus().length);
+const MAX_ATTEMPTS = 3;
+const POLL_INTERVAL = 5000;
+// Running jobs are touched this often; one untouched for STALE_AFTER is
+// taken to be orphaned by a dead process and queued again
+const HEARTBEAT_INTERVAL = 30000;
+const STALE_AFTER = 3 * HEARTBEAT_INTERVAL;
+const WORKER_ID = `${os.hostname()}:${process.pid}`;
+
+const handlers = {};
+const waiters = new Map();
+const runningByKind = { doubt: 0, lesson: 0, chapter: 0, upgrade: 0 };
+let running = 0;
+let started = false;
+let pumping = false;
+let pumpAgain = false;
+let pollTimer = null;
+let recoveryTimer = null;
+
+/**
+ * Register the function that executes jobs of one kind.
+ * handler(payload, job) resolves to a plain result object ({ success, ... }).
+ */
+function registerJobHandler(kind, handler) {
+    handlers[kind] = handler;
+}
+
+function isDurable() {
+    return started && mongoose.connection.readyState === 1;
+}
+
+function newJobId() {
+    return `RJ_${Date.now()}_${Math.random().toString(36).substr(2, 6)}`;
+}
+
+function settle(jobId, result) {
+    const pending = waiters.get(jobId);
+    if (!pending) return;
+    waiters.delete(jobId);
+    pending.forEach(resolve => resolve(result));
+}
+
+async function execute(kind, payload, job) {
+    const handler = handlers[kind];
+    if (!handler) {
+        return { success: false, error: `No handler registered for ${kind} jobs` };
+    }
+    try {
+        return (await handler(payload, job)) || { success: true };
+    } catch (error) {
+        return { success: false, error: error.message };
+    }
+}
+
+/**
+ * Run a claimed job and record its outcome
+ */
+async function runClaimed(job) {
+    running++;
+    runningByKind[job.kind]++;
+    // Tell other processes this job is alive (see recoverStaleJobs)
+    const heartbeat = setInterval(() => {
+        RenderJob.updateOne({ jobId: job.jobId, status: 'running', workerId: WORKER_ID }, { $set: { heartbeatAt: new Date() } })
+            .catch(() => {});
+    }, HEARTBEAT_INTERVAL);
+    heartbeat.unref();
+    try {
+        const result = await execute(job.kind, job.payload, job);
+        const failed = result.success === false;
+        await RenderJob.updateOne({ jobId: job.jobId }, {
+            $set: {
+                status: failed ? 'failed' : 'completed',
+                result,
+                error: failed ? (result.error || 'Render failed') : null,
+                finishedAt: new Date()
+            }
+        }).catch(e => console.log(`⚠️ Could not record render job ${job.jobId}: ${e.message}`));
+        settle(job.jobId, result);
+    } finally {
+        clearInterval(heartbeat);
+        running--;
+        runningByKind[job.kind]--;
+        pump();
+    }
+}
+
+/**
+ * Claim queued jobs, highest priority first, until all slots are busy.
+ * The last slot is kept for doubts so a student never waits behind a chapter batch.
+ */
+async function pump() {
+    if (!isDurable()) return;
+    if (pumping) {
+        pumpAgain = true;
+        return;
+    }
+    pumping = true;
+    try {
+        do {
+            pumpAgain = false;
+            while (running < CONCURRENCY) {
+                const query = { status: 'queued' };
+                if (running >= CONCURRENCY - 1) query.priority = { $gte: JOB_PRIORITIES.doubt };
+
+                const job = await RenderJob.findOneAndUpdate(query, {
+                    $set: { status: 'running', startedAt: new Date(), heartbeatAt: new Date(), workerId: WORKER_ID },
+                    $inc: { attempts: 1 }
+                }, { sort: { priority: -1, createdAt: 1 }, new: true }).lean();
+                if (!job) break;
+
+                console.log(`▶️ Render job ${job.jobId} (${job.kind}) started after ${job.startedAt - job.createdAt}ms in queue`);
+                runClaimed(job);
+            }
+        } while (pumpAgain);
+    } catch (error) {
+        console.log(`⚠️ Render queue error: ${error.message}`);
+    } finally {
+        pumping = false;
+    }
+}
+
+/**
+ * Queue a job and return its id without waiting for it
+ */
+async function enqueueJob(kind, payload, { priority = JOB_PRIORITIES[kind] } = {}) {
+    const jobId = newJobId();
+
+    if (!isDurable()) {
+        // Without MongoDB the job simply runs now (not persisted, not throttled)
+        execute(kind, payload, { jobId, kind, priority }).then(result => settle(jobId, result));
+        return jobId;
+    }
+
+    await RenderJob.create({ jobId, kind, priority, payload });
+    pump();
+    return jobId;
+}
+
+/**
+ * Wait for a job to finish and return its handler result
+ */
+function waitForJob(jobId) {
+    return new Promise((resolve) => {
+        if (!waiters.has(jobId)) waiters.set(jobId, []);
+        waiters.get(jobId).push(resolve);
+
+        if (!isDurable()) return;
+        // The job may already have finished (e.g. before a restart)
+        RenderJob.findOne({ jobId }).lean().then((job) => {
+            if (job && (job.status === 'completed' || job.status === 'failed')) {
+                settle(jobId, job.result || { success: false, error: job.error });
+            }
+        }).catch(() => {});
+    });
+}
+
+/**
+ * Queue a job and wait for its result (interactive renders)
+ */
+async function runJob(kind, payload, options) {
+    const jobId = await enqueueJob(kind, payload, options);
+    return waitForJob(jobId);
+}
+
+/**
+ * Drop a job that has not started yet (a running job finishes). Resolves
+ * to true if the job was still queued; its waiters get a failed result.
+ */
+async function cancelJob(jobId, reason = 'Cancelled') {
+    if (!isDurable()) return false;
+    const result = await RenderJob.updateOne(
+        { jobId, status: 'queued' },
+        { $set: { status: 'failed', error: reason, finishedAt: new Date() } }
+    );
+    if (result.modifiedCount === 0) return false;
+    settle(jobId, { success: false, error: reason });
+    return true;
+}
+
+/**
+ * Status of a job ('queued', 'running', 'completed', 'failed'), or null if unknown
+ */
+async function getJobStatus(jobId) {
+    if (!isDurable()) return null;
+    const job = await RenderJob.findOne({ jobId }, 'status').lean();
+    return job ? job.status : null;
+}
+
+/**
+ * Move a job that has not started yet to another priority (e.g. a
+ * background render somebody is now waiting for)
+ */
+async function reprioritizeJob(jobId, priority) {
+    if (!isDurable()) return false;
+    const result = await RenderJob.updateOne({ jobId, status: 'queued' }, { $set: { priority } });
+    if (result.modifiedCount === 0) return false;
+    pump();
+    return true;
+}
+
+function processAlive(pid) {
+    try {
+        process.kill(pid, 0);
+        return true;
+    } catch (e) {
+        return e.code === 'EPERM';
+    }
+}
+
+/**
+ * Queue again the running jobs whose process is gone: an earlier process
+ * on this host that is no longer alive, or any worker whose heartbeat is
+ * older than STALE_AFTER. Jobs of live processes (other servers on the
+ * same MongoDB) are left alone. Jobs past MAX_ATTEMPTS fail instead.
+ * @returns {Promise<number>} jobs queued again
+ */
+async function recoverStaleJobs() {
+    const host = `${os.hostname()}:`;
+    const workers = await RenderJob.distinct('workerId', { status: 'running' });
+    const deadHere = workers.filter(workerId => workerId && workerId !== WORKER_ID && workerId.startsWith(host)
+        && !processAlive(parseInt(workerId.slice(host.length), 10)));
+    const cutoff = new Date(Date.now() - STALE_AFTER);
+    const orphaned = {
+        status: 'running',
+        workerId: { $ne: WORKER_ID },
+        $or: [
+            { workerId: { $in: deadHere } },
+            { heartbeatAt: { $lt: cutoff } },
+            { heartbeatAt: null, startedAt: { $lt: cutoff } }
+        ]
+    };
+
+    await RenderJob.updateMany(
+        { ...orphaned, attempts: { $gte: MAX_ATTEMPTS } },
+        { $set: { status: 'failed', error: `Gave up after ${MAX_ATTEMPTS} attempts`, finishedAt: new Date() } }
+    );
+    const requeued = await RenderJob.updateMany(orphaned, { $set: { status: 'queued', workerId: null } });
+    if (requeued.modifiedCount > 0) pump();
+    return requeued.modifiedCount;
+}
+
+/**
+ * Start claiming jobs (call once MongoDB is connected). Jobs a dead
+ * process left running are queued again, up to MAX_ATTEMPTS tries.
+ */
+async function startJobQueue() {
+    if (started) return;
+    started = true;
+
+    try {
+        const resumed = await recoverStaleJobs();
+        const queued = await RenderJob.countDocuments({ status: 'queued' });
+        console.log(`📋 Render queue started (concurrency ${CONCURRENCY}, ${queued} queued, ${resumed} resumed)`);
+    } catch (error) {
+        console.log(`⚠️ Render queue recovery failed: ${error.message}`);
+    }
+
+    pollTimer = setInterval(pump, POLL_INTERVAL);
+    pollTimer.unref();
+    // Pick up the jobs of a server that died while this one keeps running
+    recoveryTimer = setInterval(() => {
+        recoverStaleJobs().catch(error => console.log(`⚠️ Render queue recovery failed: ${error.message}`));
+    }, HEARTBEAT_INTERVAL);
+    recoveryTimer.unref();
+    pump();
+}
+
+/**
+ * Queue depth, wait time and run time per job kind
+ * @param {number} windowMs - how far back to look for finished jobs
+ */
+async function getJobQueueStats(windowMs = 60 * 60 * 1000) {
+    const stats = {
+        durable: isDurable(),
+        concurrency: CONCURRENCY,
+        running,
+        priorities: JOB_PRIORITIES,
+        windowMs,
+        kinds: {}
+    };
+    for (const kind of Object.keys(JOB_PRIORITIES)) {
+        stats.kinds[kind] = {
+            queued: 0,
+            running: runningByKind[kind],
+            oldestQueuedMs: 0,
+            completed: 0,
+            failed: 0,
+            avgWaitMs: 0,
+            maxWaitMs: 0,
+            avgRunMs: 0,
+            maxRunMs: 0
+        };
+    }
+    if (!stats.durable) return stats;
+
+    const now = Date.now();
+    const [queued, finished] = await Promise.all([
+        RenderJob.aggregate([
+            { $match: { status: 'queued' } },
+            { $group: { _id: '$kind', count: { $sum: 1 }, oldest: { $min: '$createdAt' } } }
+        ]),
+        RenderJob.aggregate([
+            { $match: { finishedAt: { $gte: new Date(now - windowMs) }, startedAt: { $ne: null } } },
+            {
+                $project: {
+                    kind: 1,
+                    status: 1,
+                    waitMs: { $subtract: ['$startedAt', '$createdAt'] },
+                    runMs: { $subtract: ['$finishedAt', '$startedAt'] }
+                }
+            },
+            {
+                $group: {
+                    _id: '$kind',
+                    completed: { $sum: { $cond: [{ $eq: ['$status', 'completed'] }, 1, 0] } },
+                    failed: { $sum: { $cond: [{ $eq: ['$status', 'failed'] }, 1, 0] } },
+                    avgWaitMs: { $avg: '$waitMs' },
+                    maxWaitMs: { $max: '$waitMs' },
+                    avgRunMs: { $avg: '$runMs' },
+                    maxRunMs: { $max: '$runMs' }
+                }
+            }
+        ])
+    ]);
+
+    for (const row of queued) {
+        if (!stats.kinds[row._id]) continue;
+        stats.kinds[row._id].queued = row.count;
+        stats.kinds[row._id].oldestQueuedMs = now - row.oldest.getTime();
+    }
+    for (const row of finished) {
+        if (!stats.kinds[row._id]) continue;
+        Object.assign(stats.kinds[row._id], {
+            completed: row.completed,
+            failed: row.failed,
+            avgWaitMs: Math.round(row.avgWaitMs || 0),
+            maxWaitMs: row.maxWaitMs || 0,
+            avgRunMs: Math.round(row.avgRunMs || 0),
+            maxRunMs: row.maxRunMs || 0
+        });
+    }
+    return stats;
+}
+
+module.exports = {
+    JOB_PRIORITIES,
+    registerJobHandler,
+    enqueueJob,
+    waitForJob,
+    runJob,
+    cancelJob,
+    getJobStatus,
+    reprioritizeJob,
+    startJobQueue,
+    getJobQueueStats
+};
@@ -0,0 +1,162 @@
+const crypto = require('crypto');
+const fs = require('fs');
+const path = require('path');
+const { probeDuration } = require('./ffmpeg');
+
+// ==================== RENDER MANIFEST CONFIGURATION ====================
+// Every published video is recorded under its render id, so nothing has to
+// search the media folders for "the newest mp4" after a render
+const MANIFEST_PATH = process.env.RENDER_MANIFEST_PATH || path.join(__dirname, '..', 'output', 'render_manifest.jsonl');
+
+// renderId -> entry (the log is append-only, the last line for an id wins)
+const entries = new Map();
+let logLines = 0;
+let loaded = false;
+
+/**
+ * Replay the manifest log once per process
+ */
+function loadManifest() {
+    if (loaded) return;
+    loaded = true;
+    if (!fs.existsSync(MANIFEST_PATH)) return;
+
+    for (const line of fs.readFileSync(MANIFEST_PATH, 'utf-8').split('\n')) {
+        if (!line.trim()) continue;
+        try {
+            const entry = JSON.parse(line);
+            if (entry.removed) {
+                entries.delete(entry.renderId);
+            } else {
+                entries.set(entry.renderId, entry);
+            }
+            logLines++;
+        } catch (e) {
+            // A torn last line from a crash; the entry is simply missing
+        }
+    }
+    console.log(`📒 Render manifest loaded: ${entries.size} videos`);
+}
+
+/**
+ * Rewrite the log with one line per live entry (atomic rename)
+ */
+function compactManifest() {
+    const tempPath = `${MANIFEST_PATH}.${process.pid}.tmp`;
+    fs.writeFileSync(tempPath, [...entries.values()].map(entry => JSON.stringify(entry) + '\n').join(''));
+    fs.renameSync(tempPath, MANIFEST_PATH);
+    logLines = entries.size;
+}
+
+function appendManifest(record) {
+    fs.mkdirSync(path.dirname(MANIFEST_PATH), { recursive: true });
+    fs.appendFileSync(MANIFEST_PATH, JSON.stringify(record) + '\n');
+    logLines++;
+    if (logLines > 2 * entries.size + 100) compactManifest();
+}
+
+/**
+ * sha256 of a file, streamed
+ */
+function hashFile(filePath) {
+    return new Promise((resolve, reject) => {
+        const hash = crypto.createHash('sha256');
+        fs.createReadStream(filePath)
+            .on('data', chunk => hash.update(chunk))
+            .on('error', reject)
+            .on('end', () => resolve(hash.digest('hex')));
+    });
+}
+
+/**
+ * Publish a rendered video at its final path and record it in the manifest.
+ *
+ * The video is staged next to the destination and renamed over it, so a
+ * reader sees either the previous file or the complete new one. With
+ * `move` the source itself is renamed (for temporary files such as a
+ * narration mux); otherwise it is hard-linked, or copied across devices.
+ *
+ * @param {string} renderId - stable id of this output (e.g. lesson_<id>_<quality>)
+ * @param {string} sourcePath - finished video
+ * @param {string} outputPath - deterministic destination
+ * @param {Object} info - sceneName, quality, jobId, cacheKey, ... (stored with the entry)
+ * @returns {Promise<Object>} manifest entry {renderId, path, size, hash, duration, ...}
+ */
+async function publishRender(renderId, sourcePath, outputPath, { move = false, ...info } = {}) {
+    loadManifest();
+    fs.mkdirSync(path.dirname(outputPath), { recursive: true });
+
+    const stagedPath = `${outputPath}.${process.pid}.${Date.now()}.tmp`;
+    if (move) {
+        try {
+            fs.renameSync(sourcePath, stagedPath);
+        } catch (e) {
+            // Scratch folders may sit on another device than the public videos
+            fs.copyFileSync(sourcePath, stagedPath);
+            fs.unlinkSync(sourcePath);
+        }
+    } else {
+        try {
+            fs.linkSync(sourcePath, stagedPath);
+        } catch (e) {
+            fs.copyFileSync(sourcePath, stagedPath);
+        }
+    }
+
+    const [hash, duration] = await Promise.all([hashFile(stagedPath), probeDuration(stagedPath)]);
+    fs.renameSync(stagedPath, outputPath);
+
+    const entry = {
+        renderId,
+        ...info,
+        path: outputPath,
+        size: fs.statSync(outputPath).size,
+        hash,
+        duration,
+        publishedAt: Date.now()
+    };
+    entries.set(renderId, entry);
+    appendManifest(entry);
+    return entry;
+}
+
+/**
+ * Manifest entry of a published video (null if unknown or deleted since)
+ */
+function getRenderEntry(renderId) {
+    loadManifest();
+    const entry = entries.get(renderId);
+    if (!entry) return null;
+    if (!fs.existsSync(entry.path)) {
+        removeRenderEntry(renderId);
+        return null;
+    }
+    return entry;
+}
+
+/**
+ * Forget a published video (the file itself is left to the caller)
+ */
+function removeRenderEntry(renderId) {
+    loadManifest();
+    if (!entries.delete(renderId)) return false;
+    appendManifest({ renderId, removed: true });
+    return true;
+}
+
+/**
+ * All live manifest entries (for storage accounting and monitoring)
+ */
+function listRenderEntries() {
+    loadManifest();
+    return [...entries.values()];
+}
+
+module.exports = {
+    MANIFEST_PATH,
+    hashFile,
+    publishRender,
+    getRenderEntry,
+    removeRenderEntry,
+    listRenderEntries
+};
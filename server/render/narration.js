@@ -0,0 +1,211 @@
+const fs = require('fs');
+const path = require('path');
+const { runFfmpeg } = require('./ffmpeg');
+const { submitPreview } = require('./workerPool');
+const { preflightScript } = require('./preflight');
+const { synthesize } = require('./tts');
+
+// ==================== NARRATION CONFIGURATION ====================
+// Spoken narration from "# Teacher Voice:" comments, timed to the animation
+const SEGMENT_GAP = 0.25;       // seconds between segments spoken for one cue
+const CUE_TAIL = 0.4;           // silence kept after a cue before the next block starts
+const MIN_PAD = 0.05;
+const PAD_MARK = '# narration pad';
+
+/**
+ * Remove the waits a previous narration pass added (keeps re-renders idempotent)
+ */
+function stripNarrationPadding(source) {
+    return source
+        .split('\n')
+        .filter(line => !line.trimEnd().endsWith(PAD_MARK))
+        .join('\n');
+}
+
+/**
+ * Replace the script in one step (a temp file renamed over it): upgrade
+ * renditions and the render cache may be reading it at the same time
+ */
+function writeScript(scriptPath, source) {
+    const tempPath = `${scriptPath}.${process.pid}.${Math.random().toString(36).substr(2, 6)}.tmp`;
+    fs.writeFileSync(tempPath, source, 'utf-8');
+    fs.renameSync(tempPath, scriptPath);
+}
+
+/**
+ * Leave the script without narration pads (they would only be silence)
+ */
+function withoutNarration(scriptPath, source, original) {
+    if (source !== original) writeScript(scriptPath, source);
+    return null;
+}
+
+/**
+ * Speak every segment (sentences are cached and synthesized concurrently) and measure it
+ */
+async function synthesizeSegments(texts, audioDir) {
+    return Promise.all(texts.map(async (text, i) => {
+        const result = await synthesize(text, path.join(audioDir, `segment_${String(i).padStart(3, '0')}`));
+        return result.success
+            ? { text, path: result.path, duration: result.duration, cachedSentences: result.cachedSentences, sentences: result.sentences }
+            : { text, error: result.error };
+    }));
+}
+
+/**
+ * Prepare narration for a scene before it is rendered.
+ *
+ * Cues come from the script's "# Teacher Voice:" comments (see
+ * python/narration.py), or, when it has none, from `narration` texts spoken
+ * back to back from the start of the scene. All segments are synthesized in
+ * parallel while a skip-animation preview measures how long each cue's block
+ * of animation runs (the static pre-flight estimate is used if the preview
+ * fails). Blocks shorter than their audio get a self.wait() at the end, so
+ * the script on disk is rewritten before the render.
+ *
+ * @param {string} scriptPath - script to narrate (rewritten in place when padded)
+ * @param {Object} options
+ * @param {string} options.sceneName - scene to narrate
+ * @param {string[]} options.narration - fallback texts when the script has no cues
+ * @param {string} options.audioDir - folder for the synthesized segments
+ * @param {number} options.priority - pool priority of the timing preview
+ * @returns {Promise<null|{segments: Array<{path, start, duration}>, totalSeconds, padded}>}
+ */
+async function prepareNarration(scriptPath, { sceneName, narration = [], audioDir, priority = 0 } = {}) {
+    const original = fs.readFileSync(scriptPath, 'utf-8');
+    const source = stripNarrationPadding(original);
+
+    const report = await preflightScript(source, { sceneName });
+    if (!report.narration || !report.narration.body) return withoutNarration(scriptPath, source, original);
+
+    let cues = report.narration.cues.map(cue => ({ ...cue, texts: [cue.text] }));
+    const fallbackTexts = (Array.isArray(narration) ? narration : [narration]).filter(Boolean);
+    if (cues.length === 0 && fallbackTexts.length > 0) {
+        const { body } = report.narration;
+        cues = [{
+            texts: fallbackTexts,
+            startLine: body.startLine,
+            afterLine: body.afterLine,
+            indent: body.indent,
+            startSeconds: 0,
+            seconds: report.narration.totalSeconds
+        }];
+    }
+    if (cues.length === 0) return withoutNarration(scriptPath, source, original);
+
+    const texts = cues.flatMap(cue => cue.texts);
+    console.log(`🔊 Synthesizing ${texts.length} narration segments for ${cues.length} cues...`);
+
+    // Time the unpadded script from a copy: renditions of the same script are
+    // narrated concurrently and must never see it half-rewritten
+    const timingDir = path.join(audioDir, 'timing');
+    const timingScript = path.join(timingDir, path.basename(scriptPath));
+    fs.mkdirSync(timingDir, { recursive: true });
+    fs.writeFileSync(timingScript, source, 'utf-8');
+
+    const [segments, preview] = await Promise.all([
+        synthesizeSegments(texts, audioDir),
+        submitPreview({
+            scriptPath: timingScript,
+            sceneName,
+            outputDir: timingDir,
+            cwd: path.dirname(scriptPath),
+            maxFrames: 0,
+            priority
+        })
+    ]);
+
+    fs.rmSync(timingDir, { recursive: true, force: true });
+
+    const failed = segments.find(segment => segment.error);
+    if (failed) {
+        console.log(`⚠️ Narration skipped: ${failed.error}`);
+        return withoutNarration(scriptPath, source, original);
+    }
+    const sentences = segments.reduce((sum, segment) => sum + segment.sentences, 0);
+    const cachedSentences = segments.reduce((sum, segment) => sum + segment.cachedSentences, 0);
+
+    // Measured block times are exact; fall back to the static estimate
+    const measured = preview.success && preview.narration && preview.narration.cues.length === report.narration.cues.length
+        ? preview.narration.cues
+        : null;
+    if (measured) {
+        measured.forEach((cue, i) => {
+            cues[i].startSeconds = cue.startSeconds;
+            cues[i].seconds = cue.seconds;
+        });
+        if (cues.length === 1 && report.narration.cues.length === 0) cues[0].seconds = preview.narration.totalSeconds;
+    }
+
+    // Lengthen blocks that are shorter than their narration
+    let next = 0;
+    let shift = 0;
+    const placed = [];
+    const pads = [];
+    for (const cue of cues) {
+        const parts = cue.texts.map(() => segments[next++]);
+        const audioSeconds = parts.reduce((sum, part) => sum + part.duration, 0) + SEGMENT_GAP * (parts.length - 1);
+        let start = cue.startSeconds + shift;
+        for (const part of parts) {
+            placed.push({ path: part.path, start: Math.round(start * 1000) / 1000, duration: part.duration });
+            start += part.duration + SEGMENT_GAP;
+        }
+        const pad = audioSeconds + CUE_TAIL - cue.seconds;
+        if (pad > MIN_PAD) {
+            pads.push({ afterLine: cue.afterLine, indent: cue.indent, seconds: Math.round(pad * 100) / 100 });
+            shift += Math.round(pad * 100) / 100;
+        }
+    }
+
+    const lines = source.split('\n');
+    for (const pad of pads.slice().reverse()) {
+        lines.splice(pad.afterLine, 0, `${pad.indent}self.wait(${pad.seconds})  ${PAD_MARK}`);
+    }
+    const padded = lines.join('\n');
+    if (padded !== original) writeScript(scriptPath, padded);
+
+    const totalSeconds = Math.round(((measured ? preview.narration.totalSeconds : report.narration.totalSeconds) + shift) * 100) / 100;
+    console.log(`✅ Narration ready: ${placed.length} segments (${cachedSentences}/${sentences} sentences cached), ${pads.length} blocks lengthened, ~${Math.round(totalSeconds)}s (${measured ? 'measured' : 'estimated'} timing)`);
+    return { segments: placed, totalSeconds, padded: pads.length > 0 };
+}
+
+/**
+ * Lay the narration segments over a video in one ffmpeg pass: every segment
+ * is delayed to its start time and mixed, the video stream is copied.
+ * @param {string} audioPath - optional separate copy of the mixed narration (m4a)
+ */
+async function muxNarration(videoPath, segments, outputPath, { audioPath } = {}) {
+    const inputs = ['-i', videoPath];
+    const filters = [];
+    segments.forEach((segment, i) => {
+        inputs.push('-i', segment.path);
+        const delay = Math.max(0, Math.round(segment.start * 1000));
+        filters.push(`[${i + 1}:a]adelay=${delay}:all=1[s${i}]`);
+    });
+    const mixed = segments.map((_, i) => `[s${i}]`).join('');
+    filters.push(segments.length > 1
+        ? `${mixed}amix=inputs=${segments.length}:normalize=0:dropout_transition=0${audioPath ? ',asplit=2[mix][copy]' : '[mix]'}`
+        : `[s0]${audioPath ? 'asplit=2[mix][copy]' : 'anull[mix]'}`);
+
+    const args = [
+        '-y',
+        ...inputs,
+        '-filter_complex', filters.join(';'),
+        '-map', '0:v:0',
+        '-map', '[mix]',
+        '-c:v', 'copy',
+        '-c:a', 'aac',
+        '-movflags', '+faststart',
+        outputPath
+    ];
+    if (audioPath) {
+        args.push('-map', '[copy]', '-c:a', 'aac', audioPath);
+    }
+    return runFfmpeg(args, { timeoutMs: 120000 });
+}
+
+module.exports = {
+    stripNarrationPadding,
+    prepareNarration,
+    muxNarration
+};
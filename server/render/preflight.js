@@ -0,0 +1,74 @@
+const { spawn } = require('child_process');
+const path = require('path');
+const { resolvePythonPath, renderEnv } = require('./workerPool');
+
+// ==================== PRE-FLIGHT CONFIGURATION ====================
+// Static checks on generated scripts before they take a render slot (python/preflight.py)
+const PREFLIGHT_SCRIPT = path.join(__dirname, 'python', 'preflight.py');
+const PREFLIGHT_TIMEOUT = 5000;
+
+/**
+ * Check a Manim script without rendering it.
+ *
+ * Resolves to the pre-flight report: { ok, verdict: 'ok'|'repaired'|'reject',
+ * errors, warnings, sceneName, animationCount, estimatedSeconds, sections,
+ * repairs, repairedSource, downgrade, elapsedMs }. If Python cannot run the
+ * checker the script is let through ({ ok: true, skipped: true }) and the
+ * render itself reports the problem.
+ *
+ * @param {string} source - script source
+ * @param {Object} options
+ * @param {string} options.sceneName - scene to check when the script has several
+ * @param {number} options.maxSeconds - set downgrade when the estimate is longer
+ * @param {boolean} options.repair - apply safe fixes (returned as repairedSource)
+ */
+function preflightScript(source, { sceneName, maxSeconds, repair = false } = {}) {
+    const args = [PREFLIGHT_SCRIPT, '-'];
+    if (sceneName) args.push('--scene', sceneName);
+    if (maxSeconds) args.push('--max-seconds', String(maxSeconds));
+    if (repair) args.push('--repair');
+
+    return new Promise((resolve) => {
+        const skipped = (reason) => {
+            console.log(`⚠️ Pre-flight check skipped: ${reason}`);
+            resolve({ ok: true, skipped: true, verdict: 'ok', errors: [], warnings: [reason] });
+        };
+
+        const child = spawn(resolvePythonPath(), args, { env: renderEnv(), windowsHide: true });
+        let stdout = '';
+        let stderr = '';
+        const timer = setTimeout(() => child.kill('SIGKILL'), PREFLIGHT_TIMEOUT);
+
+        child.stdout.on('data', (data) => { stdout += data.toString(); });
+        child.stderr.on('data', (data) => { stderr += data.toString(); });
+        child.stdin.on('error', () => {});
+        child.on('error', (error) => {
+            clearTimeout(timer);
+            skipped(`python not available: ${error.message}`);
+        });
+        child.on('close', (code) => {
+            clearTimeout(timer);
+            try {
+                resolve(JSON.parse(stdout));
+            } catch (e) {
+                skipped(`checker exited with code ${code}: ${stderr.substring(0, 200)}`);
+            }
+        });
+        child.stdin.end(source, 'utf-8');
+    });
+}
+
+/**
+ * One-line summary of a rejected script for logs and error messages
+ */
+function describePreflightErrors(report) {
+    return (report.errors || [])
+        .slice(0, 5)
+        .map(error => (error.line ? `line ${error.line}: ${error.message}` : error.message))
+        .join('; ');
+}
+
+module.exports = {
+    preflightScript,
+    describePreflightErrors
+};
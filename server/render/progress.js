@@ -0,0 +1,186 @@
+// ==================== RENDER PROGRESS CONFIGURATION ====================
+// Structured progress of lesson and doubt renders (stage, animation i of N,
+// percent, ETA), pushed to subscribers such as the /api/progress SSE endpoint
+const FINISHED_TTL = 10 * 60 * 1000;
+// Within-animation progress (manim's progress bar) is published at most this often
+const PROGRESS_INTERVAL = 250;
+const FINAL_STAGES = new Set(['done', 'failed']);
+
+// `${kind}:${id}` -> { state, listeners, expireTimer }
+const channels = new Map();
+
+function channelFor(kind, id) {
+    const key = `${kind}:${id}`;
+    let channel = channels.get(key);
+    if (!channel) {
+        channel = { state: null, listeners: new Set(), expireTimer: null };
+        channels.set(key, channel);
+    }
+    return channel;
+}
+
+/**
+ * Merge an update into the progress of a lesson or doubt and notify its
+ * subscribers. Finished progress is kept for FINISHED_TTL so late
+ * subscribers still learn the outcome.
+ */
+function publishProgress(kind, id, update) {
+    const channel = channelFor(kind, id);
+    clearTimeout(channel.expireTimer);
+    channel.state = { ...channel.state, ...update, kind, id, updatedAt: Date.now() };
+
+    for (const listener of channel.listeners) {
+        try {
+            listener(channel.state);
+        } catch (e) {
+            console.log(`⚠️ Progress listener failed: ${e.message}`);
+        }
+    }
+    if (FINAL_STAGES.has(channel.state.stage)) {
+        channel.expireTimer = setTimeout(() => {
+            if (channel.listeners.size === 0) channels.delete(`${kind}:${id}`);
+        }, FINISHED_TTL);
+        channel.expireTimer.unref();
+    }
+    return channel.state;
+}
+
+/**
+ * Start the progress of a new render of a lesson or doubt over (drops the
+ * previous render's outcome)
+ */
+function startProgress(kind, id, stage = 'queued') {
+    const channel = channelFor(kind, id);
+    channel.state = null;
+    return publishProgress(kind, id, { stage, animation: 0, total: null, percent: null, etaSeconds: null });
+}
+
+/**
+ * Latest progress of a lesson or doubt (null if nothing was reported)
+ */
+function getProgress(kind, id) {
+    const channel = channels.get(`${kind}:${id}`);
+    return channel ? channel.state : null;
+}
+
+/**
+ * Call listener(state) on every update; the current state, if any, is
+ * delivered right away. Returns the unsubscribe function.
+ */
+function subscribeProgress(kind, id, listener) {
+    const channel = channelFor(kind, id);
+    channel.listeners.add(listener);
+    if (channel.state) listener(channel.state);
+    return () => {
+        channel.listeners.delete(listener);
+        if (channel.listeners.size === 0 && (!channel.state || FINAL_STAGES.has(channel.state.stage))) {
+            clearTimeout(channel.expireTimer);
+            channels.delete(`${kind}:${id}`);
+        }
+    };
+}
+
+/**
+ * Progress reporter for one render.
+ *
+ * handleEvent takes the render's onEvent stream: 'animation' events count
+ * finished animations (a cached fragment reports its `animations` at once),
+ * 'progress' events carry manim's within-animation percent and 'reset'
+ * starts over when a render falls back or is retried. Percent and ETA are
+ * extrapolated from the animations done so far.
+ *
+ * @param {string} kind - 'lesson' or 'doubt'
+ * @param {string} id - lessonId or doubt progress id
+ * @param {Object} options
+ * @param {number} options.total - expected animation count (pre-flight estimate)
+ */
+function createProgressTracker(kind, id, { total = null } = {}) {
+    let stage = null;
+    let done = 0;
+    let renderStarted = null;
+    let lastPublished = 0;
+    // section -> fraction of the animation it is rendering
+    const partial = new Map();
+
+    function publish(extra = {}) {
+        let percent = null;
+        let etaSeconds = null;
+        if (total && stage === 'render') {
+            const current = [...partial.values()].reduce((sum, value) => sum + value, 0);
+            // Never claim 100% before the video is published
+            const fraction = Math.min((done + current) / total, 0.99);
+            percent = Math.round(fraction * 100);
+            if (fraction > 0 && renderStarted) {
+                const elapsed = (Date.now() - renderStarted) / 1000;
+                etaSeconds = Math.round(elapsed * (1 - fraction) / fraction);
+            }
+        }
+        lastPublished = Date.now();
+        return publishProgress(kind, id, { stage, animation: done, total, percent, etaSeconds, ...extra });
+    }
+
+    return {
+        /**
+         * Set the expected animation count once it is known
+         */
+        expect(count) {
+            total = count || null;
+        },
+
+        /**
+         * Enter a stage: queued, tts, render, mux
+         */
+        stage(name, extra) {
+            stage = name;
+            if (name === 'render' && !renderStarted) renderStarted = Date.now();
+            return publish(extra);
+        },
+
+        handleEvent(event) {
+            const section = event.section || 0;
+            if (event.event === 'animation') {
+                done += event.animations || 1;
+                partial.delete(section);
+            } else if (event.event === 'progress') {
+                partial.set(section, Math.min(event.percent / 100, 1));
+                if (Date.now() - lastPublished < PROGRESS_INTERVAL) return;
+            } else if (event.event === 'reset') {
+                done = 0;
+                partial.clear();
+                renderStarted = Date.now();
+            } else {
+                return;
+            }
+            if (stage !== 'render') {
+                stage = 'render';
+                renderStarted = renderStarted || Date.now();
+            }
+            publish();
+        },
+
+        /**
+         * Final state: { success, videoUrl, error }
+         */
+        finish({ success, videoUrl = null, error = null }) {
+            stage = success ? 'done' : 'failed';
+            partial.clear();
+            return publishProgress(kind, id, {
+                stage,
+                animation: success && total ? total : done,
+                total,
+                percent: success ? 100 : null,
+                etaSeconds: success ? 0 : null,
+                videoUrl,
+                error
+            });
+        }
+    };
+}
+
+module.exports = {
+    publishProgress,
+    startProgress,
+    getProgress,
+    subscribeProgress,
+    createProgressTracker
+};
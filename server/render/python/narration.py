@@ -0,0 +1,94 @@
+"""
+Find the narration cues of a generated scene and time them.
+
+Lesson scripts carry their narration as comments in construct():
+
+    # Teacher Voice: "Natural numbers are the numbers we use for counting."
+
+Each cue is anchored to the top-level statement of construct() it sits in
+front of (or inside) and covers every statement up to the next cue. Its
+"block" is that range of lines; the video time of a block is the sum of
+the play()/wait() calls made from those lines, either estimated statically
+(preflight.py) or measured by a skip-animation run (scene_preview.py).
+
+server/render/narration.js uses the blocks to pad the script with a
+self.wait() at the end of any block whose spoken audio is longer than its
+animation, at "afterLine" with "indent", and to place each audio segment
+at its block's start time.
+"""
+import ast
+import re
+
+VOICE_MARKER = re.compile(r"^\s*#\s*Teacher\s+Voice\s*:\s*(.+?)\s*$", re.IGNORECASE)
+QUOTES = "\"'“”‘’"
+
+
+def _cue_text(raw):
+    text = raw.strip()
+    if len(text) >= 2 and text[0] in QUOTES and text[-1] in QUOTES:
+        text = text[1:-1]
+    return text.strip()
+
+
+def narration_cues(source, construct):
+    """Cues in construct() as {"line", "text", "startLine", "endLine"} plus
+    the insertion point for padding after each block."""
+    body = construct.body
+    if not body:
+        return {"cues": [], "body": None}
+
+    lines = source.splitlines()
+    indent = " " * body[0].col_offset
+    spans = [(stmt.lineno, stmt.end_lineno) for stmt in body]
+
+    cues = []
+    for lineno in range(construct.lineno, construct.end_lineno + 1):
+        match = VOICE_MARKER.match(lines[lineno - 1])
+        if not match or not _cue_text(match.group(1)):
+            continue
+        # Statement the cue belongs to: the one containing it, else the next one
+        owner = next(
+            (i for i, (start, end) in enumerate(spans) if start <= lineno <= end or start > lineno),
+            None,
+        )
+        if owner is None:
+            continue
+        text = _cue_text(match.group(1))
+        if cues and cues[-1]["owner"] == owner:
+            cues[-1]["text"] += " " + text
+            continue
+        cues.append({"line": lineno, "text": text, "owner": owner})
+
+    for i, cue in enumerate(cues):
+        last = cues[i + 1]["owner"] - 1 if i + 1 < len(cues) else len(spans) - 1
+        cue["startLine"] = spans[cue["owner"]][0]
+        cue["endLine"] = spans[last][1]
+        cue["afterLine"] = spans[last][1]
+        cue["indent"] = indent
+        del cue["owner"]
+
+    return {
+        "cues": cues,
+        "body": {"startLine": spans[0][0], "afterLine": spans[-1][1], "indent": indent},
+    }
+
+
+def time_cues(narration, calls):
+    """Add "startSeconds" and "seconds" to each cue from (line, seconds) calls
+    listed in playback order."""
+    starts = []
+    elapsed = 0.0
+    for line, seconds in calls:
+        starts.append((line, elapsed, seconds))
+        elapsed += seconds
+
+    for cue in narration["cues"]:
+        inside = [(start, seconds) for line, start, seconds in starts if cue["startLine"] <= line <= cue["endLine"]]
+        if inside:
+            cue["startSeconds"] = round(inside[0][0], 3)
+        else:
+            before = [start + seconds for line, start, seconds in starts if line < cue["startLine"]]
+            cue["startSeconds"] = round(max(before) if before else 0.0, 3)
+        cue["seconds"] = round(sum(seconds for _, seconds in inside), 3)
+    narration["totalSeconds"] = round(elapsed, 3)
+    return narration
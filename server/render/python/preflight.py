@@ -0,0 +1,517 @@
+"""
+Pre-flight checks for LLM-generated Manim scripts (no manim import, no render).
+
+Parses the script's AST and reports, in a few milliseconds:
+
+* errors - syntax errors, not exactly one Scene subclass, a missing
+  construct(), imports outside ALLOWED_MODULES, dangerous builtins and
+  names that are not defined anywhere (typos, made-up manim classes);
+* a static cost estimate - animation count and video length from
+  self.play (run_time, default 1s) and self.wait (default 1s) calls,
+  following helper methods and constant-length loops, also broken down
+  per "# Section N" block and per "# Teacher Voice:" narration cue.
+
+With repair enabled, safe fixes are applied before the verdict: disallowed
+imports are dropped, a missing "from manim import *" is added and
+misspelled names with one close match are corrected.
+
+Names exported by "from manim import *" come from MANIM_NAMES_FILE, which
+render_worker.py writes at start-up; without it undefined-name checks for
+manim are skipped.
+
+Usage: preflight.py SCRIPT|- [--scene NAME] [--max-seconds N] [--repair]
+"""
+import argparse
+import ast
+import builtins
+import difflib
+import importlib
+import json
+import os
+import sys
+import time
+
+from narration import narration_cues, time_cues
+from scene_sections import SECTION_MARKER
+
+ALLOWED_MODULES = {
+    "manim", "math", "cmath", "random", "numpy", "itertools", "functools",
+    "operator", "collections", "fractions", "decimal", "typing", "string",
+    "statistics", "enum", "dataclasses", "colour",
+}
+# Standard library modules whose star-imports can be resolved cheaply
+STDLIB_STAR = {"math", "cmath", "random", "itertools", "functools", "operator", "string", "statistics"}
+FORBIDDEN_CALLS = {"open", "exec", "eval", "compile", "__import__", "input", "breakpoint"}
+SCENE_BASES = {
+    "Scene", "MovingCameraScene", "ThreeDScene", "SpecialThreeDScene",
+    "ZoomedScene", "VectorScene", "LinearTransformationScene",
+}
+DEFAULT_RUN_TIME = 1.0
+DEFAULT_WAIT = 1.0
+UNKNOWN_LOOP_ITERATIONS = 3
+MAX_HELPER_DEPTH = 5
+NAMES_FILE = os.environ.get("MANIM_NAMES_FILE") or os.path.join(
+    os.path.dirname(__file__), "..", "..", "output", "manim_names.json"
+)
+
+_manim_names = None
+
+
+def manim_names():
+    """Public names of the installed manim, or None if not known yet."""
+    global _manim_names
+    if _manim_names is None:
+        try:
+            with open(NAMES_FILE, encoding="utf-8") as handle:
+                _manim_names = set(json.load(handle)["names"])
+        except (OSError, ValueError, KeyError):
+            _manim_names = set()
+    return _manim_names or None
+
+
+def _literal(node, default=None):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, SyntaxError, TypeError):
+        return default
+
+
+def _is_self_call(node, method=None):
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and isinstance(node.func.value, ast.Name)
+        and node.func.value.id == "self"
+        and (method is None or node.func.attr == method)
+    )
+
+
+def _keyword(call, name):
+    return next((kw.value for kw in call.keywords if kw.arg == name), None)
+
+
+# ---------------------------------------------------------------- structure
+
+def scene_classes(tree):
+    """Concrete (leaf) Scene subclasses defined at module level."""
+    classes = {node.name: node for node in tree.body if isinstance(node, ast.ClassDef)}
+    is_scene = {}
+
+    def check(name, seen=()):
+        if name in is_scene:
+            return is_scene[name]
+        node = classes[name]
+        result = False
+        for base in node.bases:
+            base_name = base.id if isinstance(base, ast.Name) else getattr(base, "attr", None)
+            if base_name in SCENE_BASES or (base_name in classes and base_name not in seen and check(base_name, seen + (name,))):
+                result = True
+        is_scene[name] = result
+        return result
+
+    scenes = [name for name in classes if check(name)]
+    parents = {
+        base.id for name in scenes for base in classes[name].bases if isinstance(base, ast.Name)
+    }
+    return [classes[name] for name in scenes if name not in parents], classes
+
+
+def find_method(cls, classes, method):
+    """Method defined on a class or its local base classes."""
+    seen = set()
+    while cls is not None and cls.name not in seen:
+        seen.add(cls.name)
+        for node in cls.body:
+            if isinstance(node, ast.FunctionDef) and node.name == method:
+                return node
+        cls = next(
+            (classes[b.id] for b in cls.bases if isinstance(b, ast.Name) and b.id in classes), None
+        )
+    return None
+
+
+def check_imports(tree):
+    """Return (imported modules, disallowed import nodes, star-imported modules)."""
+    modules, disallowed, stars = [], [], []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            names = [node.module or ""]
+            if any(alias.name == "*" for alias in node.names):
+                stars.append(node.module or "")
+        else:
+            continue
+        modules.extend(names)
+        if any(name.split(".")[0] not in ALLOWED_MODULES for name in names):
+            disallowed.append(node)
+    return modules, disallowed, stars
+
+
+def bound_names(tree):
+    """Every name the script binds anywhere (a deliberately permissive scope model)."""
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split(".")[0] for alias in node.names if alias.name != "*")
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif type(node).__name__ in ("MatchAs", "MatchStar") and getattr(node, "name", None):
+            names.add(node.name)
+    return names
+
+
+def star_names(stars):
+    """Names brought in by star-imports, or None if any cannot be resolved."""
+    names = set()
+    for module in stars:
+        top = module.split(".")[0]
+        if top == "manim":
+            known = manim_names()
+            if known is None:
+                return None
+            names |= known
+        elif top in STDLIB_STAR:
+            names |= {n for n in dir(importlib.import_module(module)) if not n.startswith("_")}
+        else:
+            return None
+    return names
+
+
+def undefined_names(tree, stars):
+    extra = star_names(stars)
+    if extra is None:
+        return None
+    known = bound_names(tree) | set(dir(builtins)) | extra
+    found = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in known:
+            found.setdefault(node.id, []).append(node)
+    return found
+
+
+# ---------------------------------------------------------------- estimate
+
+def _loop_iterations(node):
+    """Iterations of a for loop over a constant range/sequence (None if unknown)."""
+    it = node.iter
+    if isinstance(it, ast.Call) and isinstance(it.func, ast.Name):
+        if it.func.id == "range":
+            args = [_literal(arg) for arg in it.args]
+            if args and all(isinstance(arg, int) for arg in args):
+                return len(range(*args))
+            return None
+        if it.func.id in ("enumerate", "zip", "reversed", "list") and it.args:
+            it = it.args[0]
+    if isinstance(it, (ast.List, ast.Tuple, ast.Set)):
+        return len(it.elts)
+    value = _literal(it)
+    return len(value) if isinstance(value, (list, tuple, str, dict)) else None
+
+
+def _play_seconds(call):
+    run_time = _keyword(call, "run_time")
+    if run_time is not None:
+        value = _literal(run_time)
+        return (float(value), False) if isinstance(value, (int, float)) else (DEFAULT_RUN_TIME, True)
+    # Animations passed without a play-level run_time play in parallel
+    inner = [
+        _literal(_keyword(arg, "run_time"))
+        for arg in call.args
+        if isinstance(arg, ast.Call) and _keyword(arg, "run_time") is not None
+    ]
+    inner = [value for value in inner if isinstance(value, (int, float))]
+    return (float(max(inner)) if inner else DEFAULT_RUN_TIME), False
+
+
+class Estimator:
+    """Walks construct() and collects (line, kind, seconds) timeline events."""
+
+    def __init__(self, scene, classes):
+        self.scene = scene
+        self.classes = classes
+        self.events = []
+        self.approximate = False
+
+    def run(self):
+        construct = find_method(self.scene, self.classes, "construct")
+        if construct is not None:
+            self.block(construct.body, 1, None, 0)
+        return self
+
+    def block(self, stmts, multiplier, call_line, depth):
+        for stmt in stmts:
+            line = call_line or stmt.lineno
+            if isinstance(stmt, (ast.For, ast.AsyncFor)):
+                iterations = _loop_iterations(stmt)
+                if iterations is None:
+                    iterations = UNKNOWN_LOOP_ITERATIONS
+                    self.approximate = True
+                self.block(stmt.body, multiplier * iterations, call_line, depth)
+            elif isinstance(stmt, ast.While):
+                self.approximate = True
+                self.block(stmt.body, multiplier, call_line, depth)
+            elif isinstance(stmt, ast.If):
+                # Count the more expensive branch
+                branches = []
+                for body in (stmt.body, stmt.orelse):
+                    sub = Estimator(self.scene, self.classes)
+                    sub.block(body, multiplier, call_line or None, depth)
+                    branches.append(sub)
+                chosen = max(branches, key=lambda sub: sum(event[2] for event in sub.events))
+                self.events.extend(
+                    (call_line or event[0], event[1], event[2]) for event in chosen.events
+                )
+                self.approximate = self.approximate or chosen.approximate or bool(stmt.orelse)
+            elif isinstance(stmt, (ast.With, ast.Try)):
+                for body in (stmt.body, getattr(stmt, "orelse", []), getattr(stmt, "finalbody", [])):
+                    self.block(body, multiplier, call_line, depth)
+            elif isinstance(stmt, ast.Expr) and _is_self_call(stmt.value):
+                self.call(stmt.value, multiplier, line, depth)
+
+    def call(self, call, multiplier, line, depth):
+        method = call.func.attr
+        if method == "play":
+            seconds, approximate = _play_seconds(call)
+            self.approximate = self.approximate or approximate
+            for _ in range(multiplier):
+                self.events.append((line, "play", seconds))
+        elif method == "wait":
+            value = _literal(call.args[0]) if call.args else _literal(_keyword(call, "duration"), DEFAULT_WAIT)
+            if not isinstance(value, (int, float)):
+                value = DEFAULT_WAIT
+                self.approximate = True
+            for _ in range(multiplier):
+                self.events.append((line, "wait", float(value)))
+        elif depth < MAX_HELPER_DEPTH:
+            helper = find_method(self.scene, self.classes, method)
+            if helper is not None and helper.name != "construct":
+                self.block(helper.body, multiplier, line, depth + 1)
+
+
+def section_starts(source, construct):
+    """(line, title) of each "# Section N" comment inside construct()."""
+    lines = source.splitlines()
+    starts = []
+    for lineno in range(construct.lineno, construct.end_lineno + 1):
+        text = lines[lineno - 1]
+        if SECTION_MARKER.match(text):
+            starts.append((lineno, text.strip().lstrip("#").strip()))
+    return starts
+
+
+def summarize(events, approximate, sections):
+    result = {
+        "animationCount": len(events),
+        "playCount": sum(1 for event in events if event[1] == "play"),
+        "waitCount": sum(1 for event in events if event[1] == "wait"),
+        "estimatedSeconds": round(sum(event[2] for event in events), 2),
+        "approximate": approximate,
+        "sections": [],
+    }
+    if sections:
+        bounds = [(0, "Intro")] + sections
+        for i, (start, title) in enumerate(bounds):
+            end = bounds[i + 1][0] if i + 1 < len(bounds) else float("inf")
+            inside = [event for event in events if start <= event[0] < end]
+            if i == 0 and not inside:
+                continue
+            result["sections"].append({
+                "title": title,
+                "startLine": start or None,
+                "animationCount": len(inside),
+                "estimatedSeconds": round(sum(event[2] for event in inside), 2),
+            })
+    return result
+
+
+# ---------------------------------------------------------------- analysis
+
+def analyze(source, scene_name=None):
+    report = {"errors": [], "warnings": [], "sceneName": None, "imports": [], "undefinedNames": []}
+
+    def error(message, line=None):
+        report["errors"].append({"line": line, "message": message})
+
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as exc:
+        error("SyntaxError: %s" % exc.msg, exc.lineno)
+        return report, None
+
+    modules, disallowed, stars = check_imports(tree)
+    report["imports"] = sorted(set(modules))
+    for node in disallowed:
+        error("import not allowed: %s" % ast.unparse(node) if hasattr(ast, "unparse") else "import not allowed", node.lineno)
+    if not any(module.split(".")[0] == "manim" for module in modules):
+        error("script does not import manim")
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FORBIDDEN_CALLS:
+            error("call to %s() is not allowed" % node.func.id, node.lineno)
+
+    scenes, classes = scene_classes(tree)
+    report["sceneCount"] = len(scenes)
+    scene = None
+    if scene_name and scene_name in classes and scene_name in [cls.name for cls in scenes]:
+        scene = classes[scene_name]
+        if len(scenes) > 1:
+            report["warnings"].append("%d Scene classes, using %s" % (len(scenes), scene_name))
+    elif len(scenes) == 1:
+        scene = scenes[0]
+    elif not scenes:
+        error("no Scene subclass found")
+    else:
+        error("expected exactly one Scene subclass, found %d (%s)" % (len(scenes), ", ".join(c.name for c in scenes)))
+
+    if scene is not None:
+        report["sceneName"] = scene.name
+        if find_method(scene, classes, "construct") is None:
+            error("%s has no construct() method" % scene.name, scene.lineno)
+
+    found = undefined_names(tree, stars)
+    if found is None:
+        report["warnings"].append("undefined-name check skipped (star-import names unknown)")
+    else:
+        for name, nodes in sorted(found.items(), key=lambda item: item[1][0].lineno):
+            report["undefinedNames"].append({"name": name, "line": nodes[0].lineno})
+            error("undefined name %r" % name, nodes[0].lineno)
+
+    return report, (tree, scene, classes, found)
+
+
+def _replace_lines(source, edits):
+    """Replace whole-line ranges: edits = [(first, last, replacement_lines)]."""
+    lines = source.splitlines()
+    for first, last, replacement in sorted(edits, reverse=True):
+        lines[first - 1:last] = replacement
+    return "\n".join(lines) + "\n"
+
+
+def repair(source, scene_name=None):
+    """Apply safe deterministic fixes; returns (source, list of repairs)."""
+    repairs = []
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return source, repairs
+
+    # 1. Drop disallowed imports (keep the block valid with "pass")
+    _, disallowed, _ = check_imports(tree)
+    if disallowed:
+        edits = []
+        for node in disallowed:
+            indent = " " * node.col_offset
+            edits.append((node.lineno, node.end_lineno, [indent + "pass"]))
+            repairs.append("removed disallowed import on line %d" % node.lineno)
+        source = _replace_lines(source, edits)
+        tree = ast.parse(source)
+
+    # 2. Scripts that use manim names without importing manim
+    modules, _, _ = check_imports(tree)
+    if not any(module.split(".")[0] == "manim" for module in modules):
+        source = "from manim import *\n" + source
+        repairs.append("added 'from manim import *'")
+        tree = ast.parse(source)
+
+    # 3. Misspelled names with a single close match
+    _, _, stars = check_imports(tree)
+    found = undefined_names(tree, stars)
+    if found:
+        candidates = sorted((star_names(stars) or set()) | bound_names(tree))
+        by_lower = {}
+        for candidate in candidates:
+            by_lower.setdefault(candidate.lower(), []).append(candidate)
+        renames = {}
+        for name in found:
+            if len(by_lower.get(name.lower(), [])) == 1:
+                renames[name] = by_lower[name.lower()][0]
+                continue
+            matches = difflib.get_close_matches(name, candidates, n=2, cutoff=0.75)
+            ratios = [difflib.SequenceMatcher(None, name, match).ratio() for match in matches]
+            if len(matches) == 1 or (matches and ratios[0] - ratios[1] >= 0.1):
+                renames[name] = matches[0]
+        if renames:
+            lines = source.splitlines()
+            nodes = sorted(
+                (node for name in renames for node in found[name]),
+                key=lambda node: (node.lineno, node.col_offset),
+                reverse=True,
+            )
+            for node in nodes:
+                text = lines[node.lineno - 1]
+                lines[node.lineno - 1] = text[:node.col_offset] + renames[node.id] + text[node.end_col_offset:]
+            source = "\n".join(lines) + "\n"
+            repairs.extend("renamed %s -> %s" % pair for pair in sorted(renames.items()))
+
+    return source, repairs
+
+
+def preflight(source, scene_name=None, max_seconds=None, allow_repair=False):
+    started = time.perf_counter()
+    source = source.lstrip("\ufeff")
+    repairs = []
+
+    report, parsed = analyze(source, scene_name)
+    if report["errors"] and allow_repair and parsed is not None:
+        repaired, repairs = repair(source, scene_name)
+        if repairs:
+            source = repaired
+            report, parsed = analyze(source, scene_name)
+            report["repairedSource"] = source
+    report["repairs"] = repairs
+
+    estimate = {"animationCount": 0, "playCount": 0, "waitCount": 0, "estimatedSeconds": 0, "approximate": True, "sections": []}
+    if parsed is not None and parsed[1] is not None:
+        tree, scene, classes, _ = parsed
+        estimator = Estimator(scene, classes).run()
+        construct = find_method(scene, classes, "construct")
+        sections = section_starts(source, construct) if construct is not None else []
+        estimate = summarize(estimator.events, estimator.approximate, sections)
+        if construct is not None:
+            estimate["narration"] = time_cues(
+                narration_cues(source, construct), [(line, seconds) for line, _, seconds in estimator.events]
+            )
+    report.update(estimate)
+
+    if report["errors"]:
+        report["verdict"] = "reject"
+    elif repairs:
+        report["verdict"] = "repaired"
+    else:
+        report["verdict"] = "ok"
+    report["ok"] = report["verdict"] != "reject"
+    report["downgrade"] = bool(max_seconds) and report["estimatedSeconds"] > max_seconds
+    report["elapsedMs"] = round((time.perf_counter() - started) * 1000, 2)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-flight check a Manim script")
+    parser.add_argument("script", help="script path, or - to read the source from stdin")
+    parser.add_argument("--scene", help="scene class to check")
+    parser.add_argument("--max-seconds", type=float, help="flag scripts estimated longer than this")
+    parser.add_argument("--repair", action="store_true", help="apply safe fixes and return repairedSource")
+    options = parser.parse_args(argv)
+
+    if options.script == "-":
+        source = sys.stdin.buffer.read().decode("utf-8")
+    else:
+        with open(options.script, encoding="utf-8") as handle:
+            source = handle.read()
+
+    report = preflight(source, options.scene, options.max_seconds, options.repair)
+    sys.stdout.write(json.dumps(report) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
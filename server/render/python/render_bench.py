@@ -0,0 +1,379 @@
+"""
+Benchmark the render pipeline on the corpus of generated scenes.
+
+Every scene of the lesson scripts (server/manim_scripts), the doubt scripts
+(server/output/manim) and the sample scripts (client/public/videos) is
+rendered at each requested quality, each time in a fresh render worker, so
+CPU time and peak RSS belong to that one render. Per scene the baseline
+records wall time, CPU time, peak RSS, rendered frames per second, Tex
+compiles and output size; a later run is compared against it to check that
+a pipeline change really made renders faster.
+
+Usage:
+  python render_bench.py run [--qualities l,m,h] [--repeat N] [--compare OLD.json] [SCRIPT ...]
+  python render_bench.py compare OLD.json NEW.json [--threshold 10] [--strict]
+"""
+import argparse
+import ast
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from scene_sections import find_scene
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.abspath(os.path.join(HERE, "..", ".."))
+REPO_DIR = os.path.dirname(SERVER_DIR)
+WORKER_SCRIPT = os.path.join(HERE, "render_worker.py")
+DEFAULT_CORPUS_DIRS = [
+    os.path.join(SERVER_DIR, "manim_scripts"),
+    os.path.join(SERVER_DIR, "output", "manim"),
+    os.path.join(REPO_DIR, "client", "public", "videos"),
+]
+DEFAULT_OUTPUT_DIR = os.path.join(SERVER_DIR, "output", "bench")
+
+# Frame rates of manim's quality presets
+QUALITY_FPS = {"l": 15, "m": 30, "h": 60, "p": 60, "k": 60}
+
+# metric -> True when lower is better
+METRICS = {
+    "wallMs": True,
+    "cpuMs": True,
+    "maxRssMb": True,
+    "fps": False,
+    "texCompiles": True,
+    "sizeBytes": True,
+}
+
+
+class BenchError(RuntimeError):
+    pass
+
+
+def corpus(paths):
+    """(script path, scene name) for every scene class in the given files/folders."""
+    scripts = []
+    for target in paths:
+        if os.path.isdir(target):
+            scripts.extend(
+                os.path.join(target, name) for name in sorted(os.listdir(target)) if name.endswith(".py")
+            )
+        elif os.path.isfile(target):
+            scripts.append(target)
+
+    scenes = []
+    for script in scripts:
+        try:
+            with open(script, encoding="utf-8-sig") as handle:
+                tree = ast.parse(handle.read(), filename=script)
+        except (OSError, SyntaxError, ValueError) as exc:
+            print("  skipping %s: %s" % (script, exc), file=sys.stderr)
+            continue
+        for scene, _ in find_scene(tree):
+            scenes.append((os.path.abspath(script), scene.name))
+    return scenes
+
+
+def scene_id(script, scene_name, quality):
+    return "%s:%s@%s" % (os.path.relpath(script, REPO_DIR).replace("\\", "/"), scene_name, quality)
+
+
+def run_worker_job(job, tex_dir, timeout, verbose=False):
+    """Start a fresh render worker, run one job on it and return (ready, reply)."""
+    env = dict(os.environ, PYTHONUNBUFFERED="1", RENDER_TEX_DIR=tex_dir)
+    env.pop("MANIM_NAMES_FILE", None)
+    ffmpeg_dir = os.environ.get("FFMPEG_DIR")
+    if ffmpeg_dir and os.path.isdir(ffmpeg_dir):
+        env["PATH"] = ffmpeg_dir + os.pathsep + env.get("PATH", "")
+
+    process = subprocess.Popen(
+        [sys.executable, WORKER_SCRIPT],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=None if verbose else subprocess.DEVNULL,
+        env=env,
+        text=True,
+        encoding="utf-8",
+    )
+    timer = threading.Timer(timeout, process.kill)
+    timer.start()
+    try:
+        ready = json.loads(process.stdout.readline() or "{}")
+        if ready.get("type") != "ready":
+            raise BenchError(ready.get("error") or "render worker did not start")
+        process.stdin.write(json.dumps(job) + "\n")
+        process.stdin.flush()
+        reply = None
+        for line in process.stdout:
+            message = json.loads(line)
+            if message.get("type") == "result":
+                reply = message
+                break
+        if reply is None:
+            raise BenchError("render worker exited (timeout after %ds?)" % timeout)
+        return ready, reply
+    finally:
+        timer.cancel()
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def probe_duration(path):
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+             "-of", "default=noprint_wrappers=1:nokey=1", path],
+            capture_output=True, text=True, timeout=30,
+        )
+        return float(result.stdout.strip())
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return None
+
+
+def measure(script, scene_name, quality, options):
+    """Render one scene once and return its measurements."""
+    work_dir = tempfile.mkdtemp(prefix="render_bench_")
+    tex_dir = options.tex_dir or os.path.join(work_dir, "Tex")
+    job = {
+        "id": "bench",
+        "action": "render",
+        "scriptPath": script,
+        "sceneName": scene_name,
+        "quality": quality,
+        "mediaDir": os.path.join(work_dir, "media"),
+        "cwd": os.path.dirname(script),
+        "holds": options.holds,
+    }
+    try:
+        ready, reply = run_worker_job(job, tex_dir, options.timeout, options.verbose)
+        if not reply.get("success"):
+            return {"success": False, "error": reply.get("error"), "manimVersion": ready.get("manimVersion")}
+
+        video = reply.get("videoPath")
+        size = os.path.getsize(video) if video and os.path.exists(video) else None
+        duration = probe_duration(video) if size else None
+        frames = int(round(duration * QUALITY_FPS[quality])) if duration else None
+        wall = reply.get("elapsedMs") or 0
+        return {
+            "success": True,
+            "manimVersion": ready.get("manimVersion"),
+            "wallMs": wall,
+            "cpuMs": reply.get("cpuMs"),
+            "maxRssMb": round(reply["maxRssKb"] / 1024, 1) if reply.get("maxRssKb") else None,
+            "durationSeconds": round(duration, 3) if duration else None,
+            "frames": frames,
+            "fps": round(frames / (wall / 1000), 2) if frames and wall else None,
+            "texRequests": reply.get("texRequests"),
+            "texCompiles": reply.get("texCompiles"),
+            "sizeBytes": size,
+        }
+    except BenchError as exc:
+        return {"success": False, "error": str(exc)}
+    finally:
+        if not options.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def combine(runs):
+    """One result for repeated renders: medians of the timings, the rest from the last run."""
+    ok = [run for run in runs if run["success"]]
+    if not ok:
+        return runs[-1]
+    result = dict(ok[-1], runs=len(ok))
+    for key in ("wallMs", "cpuMs", "fps"):
+        values = [run[key] for run in ok if run.get(key) is not None]
+        if values:
+            result[key] = statistics.median(values)
+    rss = [run["maxRssMb"] for run in ok if run.get("maxRssMb") is not None]
+    result["maxRssMb"] = max(rss) if rss else None
+    return result
+
+
+def totals(results):
+    by_quality = {}
+    for result in results:
+        total = by_quality.setdefault(result["quality"], {
+            "scenes": 0, "failed": 0, "wallMs": 0, "cpuMs": 0, "frames": 0,
+            "texCompiles": 0, "sizeBytes": 0, "maxRssMb": 0,
+        })
+        total["scenes"] += 1
+        if not result["success"]:
+            total["failed"] += 1
+            continue
+        for key in ("wallMs", "cpuMs", "frames", "texCompiles", "sizeBytes"):
+            total[key] += result.get(key) or 0
+        total["maxRssMb"] = max(total["maxRssMb"], result.get("maxRssMb") or 0)
+    for total in by_quality.values():
+        total["fps"] = round(total["frames"] / (total["wallMs"] / 1000), 2) if total["wallMs"] else None
+    return by_quality
+
+
+def run(options):
+    qualities = [q.strip() for q in options.qualities.split(",") if q.strip() in QUALITY_FPS]
+    scenes = corpus(options.paths or DEFAULT_CORPUS_DIRS)
+    if not scenes or not qualities:
+        print("Nothing to benchmark", file=sys.stderr)
+        return 2
+    print("Benchmarking %d scenes at %s (%d run(s) each)" % (len(scenes), ",".join(qualities), options.repeat))
+
+    results = []
+    manim_version = None
+    started = time.time()
+    for quality in qualities:
+        for script, scene_name in scenes:
+            runs = [measure(script, scene_name, quality, options) for _ in range(max(1, options.repeat))]
+            result = dict(combine(runs), id=scene_id(script, scene_name, quality), quality=quality)
+            manim_version = result.pop("manimVersion", None) or manim_version
+            results.append(result)
+            if result["success"]:
+                print("  %-70s %7.1fs cpu %7.1fs %6s MB %6s fps %4s tex %8s B" % (
+                    result["id"], result["wallMs"] / 1000, (result.get("cpuMs") or 0) / 1000,
+                    result.get("maxRssMb"), result.get("fps"), result.get("texCompiles"), result.get("sizeBytes"),
+                ))
+            else:
+                print("  %-70s FAILED %s" % (result["id"], result.get("error")))
+
+    baseline = {
+        "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "elapsedSeconds": round(time.time() - started, 1),
+        "environment": {
+            "manimVersion": manim_version,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpuCount": os.cpu_count(),
+        },
+        "options": {
+            "qualities": qualities,
+            "repeat": options.repeat,
+            "holds": options.holds,
+            "warmTex": bool(options.tex_dir),
+        },
+        "totals": totals(results),
+        "results": results,
+    }
+
+    output = options.output or os.path.join(DEFAULT_OUTPUT_DIR, "render_%s.json" % time.strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as handle:
+        json.dump(baseline, handle, indent=2)
+    print("Baseline written to %s" % output)
+
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as handle:
+            return report(json.load(handle), baseline, options.threshold, options.strict)
+    return 0 if all(result["success"] for result in results) else 1
+
+
+def _change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) * 100.0 / old
+
+
+def report(old, new, threshold=10.0, strict=False):
+    """Print per-scene and total changes; regressions are changes past the threshold."""
+    if old.get("environment") != new.get("environment"):
+        print("Note: baselines come from different environments:")
+        print("  old %s" % json.dumps(old.get("environment")))
+        print("  new %s" % json.dumps(new.get("environment")))
+
+    old_results = {result["id"]: result for result in old.get("results", [])}
+    regressions = []
+    pairs = []
+    print("%-70s %-12s %12s %12s %8s" % ("scene", "metric", "old", "new", "change"))
+    for result in new.get("results", []):
+        previous = old_results.get(result["id"])
+        if previous is None:
+            print("%-70s new scene" % result["id"])
+            continue
+        if not (result["success"] and previous["success"]):
+            if previous["success"] and not result["success"]:
+                regressions.append((result["id"], "success"))
+            print("%-70s success: %s -> %s" % (result["id"], previous["success"], result["success"]))
+            continue
+        pairs.append((previous, result))
+        for metric, lower_is_better in METRICS.items():
+            change = _change(previous.get(metric), result.get(metric))
+            if change is None:
+                continue
+            worse = change > threshold if lower_is_better else change < -threshold
+            if worse:
+                regressions.append((result["id"], metric))
+            if abs(change) >= threshold:
+                print("%-70s %-12s %12s %12s %+7.1f%%%s" % (
+                    result["id"], metric, previous.get(metric), result.get(metric), change, "  !" if worse else "",
+                ))
+
+    # Totals over the scenes both baselines rendered successfully
+    old_totals = totals([dict(previous, quality=result["quality"]) for previous, result in pairs])
+    new_totals = totals([result for _, result in pairs])
+    print("")
+    print("Totals per quality (%d scenes in both):" % len(pairs))
+    for quality, total in new_totals.items():
+        previous = old_totals[quality]
+        changes = []
+        for metric in ("wallMs", "cpuMs", "sizeBytes", "texCompiles", "fps"):
+            change = _change(previous.get(metric), total.get(metric))
+            if change is not None:
+                changes.append("%s %+.1f%%" % (metric, change))
+        print("  %s: %s" % (quality, ", ".join(changes)))
+
+    if regressions:
+        print("")
+        print("%d regression(s) past %.0f%%" % (len(regressions), threshold))
+    return 1 if strict and regressions else 0
+
+
+def compare(options):
+    with open(options.old, encoding="utf-8") as handle:
+        old = json.load(handle)
+    with open(options.new, encoding="utf-8") as handle:
+        new = json.load(handle)
+    return report(old, new, options.threshold, options.strict)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="render the corpus and write a baseline")
+    run_parser.add_argument("paths", nargs="*", help="scripts or folders (default: the generated corpus)")
+    run_parser.add_argument("--qualities", default="l,m,h", help="comma-separated manim qualities (l,m,h,p,k)")
+    run_parser.add_argument("--repeat", type=int, default=1, help="renders per scene; timings are medians")
+    run_parser.add_argument("--output", help="baseline file (default: server/output/bench/render_<time>.json)")
+    run_parser.add_argument("--compare", help="baseline to compare the new results against")
+    run_parser.add_argument("--tex-dir", help="share this Tex cache (default: a cold one per render)")
+    run_parser.add_argument("--no-holds", dest="holds", action="store_false",
+                            help="encode static pauses frame by frame")
+    run_parser.add_argument("--timeout", type=int, default=1800, help="seconds per render")
+    run_parser.add_argument("--keep", action="store_true", help="keep the rendered media folders")
+    run_parser.add_argument("--verbose", action="store_true", help="show manim's output")
+    run_parser.set_defaults(holds=os.environ.get("RENDER_STATIC_HOLDS") != "0")
+
+    compare_parser = commands.add_parser("compare", help="compare two baselines")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+
+    for sub in (run_parser, compare_parser):
+        sub.add_argument("--threshold", type=float, default=10.0, help="percent change that counts")
+        sub.add_argument("--strict", action="store_true", help="exit with 1 on any regression")
+
+    options = parser.parse_args(argv)
+    return run(options) if options.command == "run" else compare(options)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,399 @@
+"""
+Classify a failed render from its traceback and fix what can be fixed locally.
+
+The render worker replies with the full Python traceback of a failed job;
+together with manim's log output (stderr) it is enough to tell the common
+causes of failing generated scripts apart:
+
+* unknown_name  - NameError for a made-up or renamed manim class/function
+  (ShowCreation, TextMobject, ...) or an AttributeError for a renamed
+  method (get_graph); fixed by renaming to the current manim name;
+* bad_color     - an undefined color constant (LIGHT_BLUE) or a color
+  string manim cannot parse ("lightblue"); fixed by the nearest manim color;
+* missing_glyph - a character neither LaTeX nor the Text font can draw
+  (U+20B9 in MathTex, emoji in Text); fixed by a LaTeX equivalent or by
+  dropping the character;
+* latex_error   - any other LaTeX compilation error; the Tex/MathTex on
+  the failing line is shown as Text of its TeX source, unchanged;
+* other         - anything else (no local fix: the caller may ask the LLM).
+
+Every failure gets a signature (cause plus the offending name, character
+or normalized message) so the caller can remember which fixes worked.
+Fixes the caller already knows ({"signature": {"rename": [old, new]}}) are
+applied before anything is recomputed. Fixes that change what the student
+sees (a dropped character, TeX shown as source) are marked "lossy": true
+so the caller does not remember them as a known fix.
+
+Usage: render_repair.py -   (reads {"source", "scriptPath", "error",
+"traceback", "stderr", "known"} as JSON from stdin, prints the diagnosis)
+"""
+import argparse
+import ast
+import difflib
+import io
+import json
+import os
+import re
+import sys
+import time
+import tokenize
+
+from preflight import bound_names, check_imports, manim_names, star_names
+
+# Names removed or renamed in manim community edition
+NAME_RENAMES = {
+    "ShowCreation": "Create",
+    "ShowCreationThenDestruction": "ShowPassingFlash",
+    "ShowCreationThenFadeOut": "Create",
+    "TextMobject": "Text",
+    "TexMobject": "MathTex",
+    "TexText": "Tex",
+    "FadeInFrom": "FadeIn",
+    "FadeInFromDown": "FadeIn",
+    "FadeInFromLarge": "FadeIn",
+    "FadeOutAndShift": "FadeOut",
+    "FadeOutAndShiftDown": "FadeOut",
+    "WriteFrom": "Write",
+    "DrawBorderThenFillIn": "DrawBorderThenFill",
+    "GraphScene": "Scene",
+}
+METHOD_RENAMES = {
+    "get_graph": "plot",
+    "scale_in_place": "scale",
+    "scale_about_point": "scale",
+    "add_background_rectangle_to_submobjects": "add_background_rectangle",
+}
+
+COLOR_WORDS = (
+    "WHITE", "BLACK", "GRAY", "GREY", "RED", "GREEN", "BLUE", "YELLOW", "ORANGE",
+    "PURPLE", "PINK", "TEAL", "GOLD", "MAROON", "BROWN",
+)
+# Manim's named colors, used when the installed names are not known yet
+DEFAULT_COLORS = {
+    "WHITE", "BLACK", "GRAY", "GREY", "LIGHT_GRAY", "LIGHT_GREY", "DARK_GRAY", "DARK_GREY",
+    "RED", "GREEN", "BLUE", "YELLOW", "ORANGE", "PURPLE", "PINK", "TEAL", "GOLD", "MAROON",
+    "LIGHT_PINK", "LIGHT_BROWN", "DARK_BROWN", "DARK_BLUE", "GRAY_BROWN",
+    "PURE_RED", "PURE_GREEN", "PURE_BLUE",
+} | {
+    "%s_%s" % (color, shade)
+    for color in ("BLUE", "TEAL", "GREEN", "YELLOW", "GOLD", "RED", "MAROON", "PURPLE", "GRAY", "GREY")
+    for shade in "ABCDE"
+}
+
+# LaTeX spellings of characters that break a default LaTeX setup
+GLYPH_TEX = {
+    "\u00b0": r"^{\circ}", "\u00d7": r"\times", "\u00f7": r"\div", "\u00b1": r"\pm",
+    "\u2264": r"\leq", "\u2265": r"\geq", "\u2260": r"\neq", "\u2248": r"\approx",
+    "\u221e": r"\infty", "\u221a": r"\sqrt{}", "\u03c0": r"\pi", "\u03b8": r"\theta",
+    "\u03b1": r"\alpha", "\u03b2": r"\beta", "\u03b3": r"\gamma", "\u0394": r"\Delta",
+    "\u2192": r"\rightarrow", "\u2190": r"\leftarrow", "\u00b7": r"\cdot", "\u2212": "-",
+    "\u00b2": "^2", "\u00b3": "^3", "\u00bd": r"\frac{1}{2}", "\u20b9": r"\text{Rs.}",
+    "\u2013": "-", "\u2014": "-", "\u2018": "'", "\u2019": "'", "\u201c": "``", "\u201d": "''",
+}
+TEX_MOBJECTS = {"Tex", "MathTex", "SingleStringMathTex"}
+# Keyword arguments Text accepts too
+TEXT_KWARGS = {"font_size", "color", "weight", "slant", "font", "line_spacing", "fill_opacity", "stroke_width"}
+
+NAME_ERROR = re.compile(r"NameError: name '(\w+)' is not defined")
+MODULE_ATTRIBUTE = re.compile(r"AttributeError: module '[\w.]+' has no attribute '(\w+)'")
+OBJECT_ATTRIBUTE = re.compile(r"AttributeError: '(\w+)' object has no attribute '(\w+)'")
+COLOR_VALUE = re.compile(
+    r"(?:Color '?([^'\s]+)'? not found|'([^']+)' is not a recognized color|"
+    r"Unknown color:? '?([^'\s]+)'?|invalid color '?([^'\s]+)'?)",
+    re.IGNORECASE,
+)
+LATEX_UNICODE = re.compile(r"Unicode character (.) \(U\+([0-9A-Fa-f]{4,6})\)")
+GLYPH_ERROR = re.compile(r"(?:missing (?:character|glyph)|no glyph|glyph .*not found)", re.IGNORECASE)
+LATEX_ERROR = re.compile(r"(?:LaTeX compilation error|latex error converting to|latex failed|Tex.*error converting)", re.IGNORECASE)
+LATEX_MESSAGE = re.compile(r"LaTeX compilation error:\s*(.+)")
+FRAME = re.compile(r'File "([^"]+)", line (\d+)')
+EMOJI = re.compile("[\U0001F000-\U0001FAFF\u2600-\u27BF\uFE0F\u200D]")
+
+
+def failing_line(traceback_text, script_path):
+    """Line of the script where the failure surfaced (innermost script frame)."""
+    name = os.path.basename(script_path or "")
+    line = None
+    for path, number in FRAME.findall(traceback_text or ""):
+        if name and os.path.basename(path) == name:
+            line = int(number)
+    return line
+
+
+def exception_line(traceback_text, error):
+    lines = [line for line in (traceback_text or "").strip().splitlines() if line and not line.startswith(" ")]
+    if lines:
+        return lines[-1]
+    return (error or "").replace("Rendering failed: ", "", 1)
+
+
+def _normalize(message):
+    """Message without paths, numbers and quoted values, for signatures."""
+    message = re.sub(r"(/|[A-Za-z]:\\)\S+", "<path>", message)
+    message = re.sub(r"'[^']*'|\"[^\"]*\"", "<value>", message)
+    message = re.sub(r"\d+", "<n>", message)
+    return message.strip()[:120]
+
+
+def color_names():
+    names = manim_names()
+    if not names:
+        return DEFAULT_COLORS
+    return {name for name in names if name.isupper() and any(word in name for word in COLOR_WORDS)}
+
+
+def nearest_color(value):
+    """Closest manim color constant for a color name or string."""
+    colors = color_names()
+    key = re.sub(r"[^A-Z]+", "_", value.upper()).strip("_")
+    key = key.replace("LIGHT", "LIGHT_").replace("DARK", "DARK_").replace("__", "_")
+    if key in colors:
+        return key
+    matches = difflib.get_close_matches(key, sorted(colors), n=1, cutoff=0.8)
+    if matches:
+        return matches[0]
+    for word in COLOR_WORDS:
+        if word in key:
+            shade = "_B" if key.startswith("LIGHT") else "_D" if key.startswith("DARK") else ""
+            if word + shade in colors:
+                return word + shade
+            return word if word in colors else "WHITE"
+    return "WHITE"
+
+
+def _is_color_name(name):
+    return name.isupper() and any(word in name for word in COLOR_WORDS)
+
+
+def nearest_name(name, tree):
+    """Current manim (or script) name for an unknown one, or None."""
+    if name in NAME_RENAMES:
+        return NAME_RENAMES[name]
+    _, _, stars = check_imports(tree)
+    candidates = sorted((star_names(stars) or set()) | bound_names(tree))
+    matches = difflib.get_close_matches(name, candidates, n=2, cutoff=0.75)
+    if not matches:
+        return None
+    ratios = [difflib.SequenceMatcher(None, name, match).ratio() for match in matches]
+    if len(matches) == 1 or ratios[0] - ratios[1] >= 0.1:
+        return matches[0]
+    return None
+
+
+def rename_token(source, old, new, attribute=False):
+    """Rename NAME tokens (only after a dot with attribute=True); returns (source, count)."""
+    tokens = list(tokenize.generate_tokens(io.StringIO(source).readline))
+    lines = source.splitlines(True)
+    edits = []
+    for index, token in enumerate(tokens):
+        if token.type != tokenize.NAME or token.string != old:
+            continue
+        after_dot = index > 0 and tokens[index - 1].string == "."
+        if after_dot != attribute:
+            continue
+        edits.append(token.start)
+    for row, col in sorted(edits, reverse=True):
+        text = lines[row - 1]
+        lines[row - 1] = text[:col] + new + text[col + len(old):]
+    return "".join(lines), len(edits)
+
+
+def _string_nodes(tree, line=None, within=None):
+    """String constants (optionally on one line / inside calls to `within`)."""
+    found = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Name):
+            continue
+        if within is not None and node.func.id not in within:
+            continue
+        if line is not None and not node.lineno <= line <= node.end_lineno:
+            continue
+        for arg in list(node.args) + [kw.value for kw in node.keywords]:
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                found.append(arg)
+    return found
+
+
+def _replace_nodes(source, replacements):
+    """Replace AST nodes by text: replacements = [(node, text)]."""
+    lines = source.splitlines(True)
+    offsets = [0]
+    for text in lines:
+        offsets.append(offsets[-1] + len(text.encode("utf-8")))
+    data = source.encode("utf-8")
+    for node, text in sorted(replacements, key=lambda item: (item[0].lineno, item[0].col_offset), reverse=True):
+        start = offsets[node.lineno - 1] + node.col_offset
+        end = offsets[node.end_lineno - 1] + node.end_col_offset
+        data = data[:start] + text.encode("utf-8") + data[end:]
+    return data.decode("utf-8")
+
+
+def fix_glyph(source, tree, line, char):
+    """Spell (or drop) a character that cannot be drawn; returns (source, repairs, lossy)."""
+    replacements = []
+    repairs = []
+    lossy = False
+    tex_nodes = {id(node) for node in _string_nodes(tree, within=TEX_MOBJECTS)}
+    for node in _string_nodes(tree):
+        value = node.value
+        if id(node) in tex_nodes:
+            for c in [char] if char else {c for c in value if ord(c) > 127}:
+                lossy = lossy or (c in value and c not in GLYPH_TEX)
+                value = value.replace(c, GLYPH_TEX.get(c, ""))
+        elif char:
+            value = value.replace(char, "")
+            lossy = lossy or value != node.value
+        elif line is None or node.lineno <= line <= node.end_lineno:
+            value = EMOJI.sub("", value)
+            lossy = lossy or value != node.value
+        if value != node.value:
+            replacements.append((node, repr(value)))
+            repairs.append("replaced %s on line %d" % ("U+%04X" % ord(char) if char else "unsupported characters", node.lineno))
+    if not replacements:
+        return source, [], False
+    return _replace_nodes(source, replacements), repairs, lossy
+
+
+def fix_latex(source, tree, line):
+    """Show the Tex/MathTex calls on the failing line as Text of their TeX
+    source; returns (source, repairs).
+
+    The markup is kept verbatim rather than simplified: stripping it turns
+    \\frac{1}{2 into "12", different maths from what the script meant.
+    """
+    replacements = []
+    repairs = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Name) or node.func.id not in TEX_MOBJECTS:
+            continue
+        if line is not None and not node.lineno <= line <= node.end_lineno:
+            continue
+        if not node.args or not all(isinstance(arg, ast.Constant) and isinstance(arg.value, str) for arg in node.args):
+            continue
+        if any(kw.arg is None for kw in node.keywords):
+            continue
+        joiner = " " if node.func.id == "Tex" else ""
+        text = joiner.join(arg.value for arg in node.args).strip() or " "
+        keywords = ["%s=%s" % (kw.arg, ast.get_source_segment(source, kw.value)) for kw in node.keywords if kw.arg in TEXT_KWARGS]
+        replacements.append((node, "Text(%s)" % ", ".join([repr(text)] + keywords)))
+        repairs.append("showed %s on line %d as its TeX source" % (node.func.id, node.lineno))
+    if not replacements:
+        return source, []
+    return _replace_nodes(source, replacements), repairs
+
+
+def fix_color_value(source, tree, value):
+    constant = nearest_color(value)
+    replacements = [(node, constant) for node in _string_nodes(tree) if node.value == value]
+    if not replacements:
+        return source, [], None
+    return _replace_nodes(source, replacements), ["replaced color %r with %s" % (value, constant)], constant
+
+
+def diagnose(source, script_path=None, error=None, traceback_text=None, stderr=None, known=None):
+    started = time.perf_counter()
+    text = "\n".join(part for part in (traceback_text, error, stderr) if part)
+    line = failing_line(traceback_text, script_path)
+    report = {
+        "cause": "other",
+        "signature": None,
+        "detail": exception_line(traceback_text, error),
+        "line": line,
+        "fixable": False,
+        "repairs": [],
+    }
+    if not traceback_text:
+        # Timeouts and crashed workers have no Python traceback to go by
+        report["cause"] = "timeout" if "timed out" in (error or "") else "crash"
+        report["signature"] = report["cause"]
+        return finish(report, started)
+
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        tree = None
+
+    fix = None
+    repaired, repairs = source, []
+    name_match = NAME_ERROR.search(text) or MODULE_ATTRIBUTE.search(text)
+    attribute_match = OBJECT_ATTRIBUTE.search(text)
+    color_match = COLOR_VALUE.search(text)
+    unicode_match = LATEX_UNICODE.search(text)
+
+    if name_match and _is_color_name(name_match.group(1)):
+        name = name_match.group(1)
+        report.update(cause="bad_color", signature="bad_color:%s" % name)
+        fix = (known or {}).get(report["signature"]) or {"rename": [name, nearest_color(name)]}
+    elif name_match:
+        name = name_match.group(1)
+        report.update(cause="unknown_name", signature="unknown_name:%s" % name)
+        fix = (known or {}).get(report["signature"])
+        if fix is None and tree is not None:
+            new = nearest_name(name, tree)
+            fix = {"rename": [name, new]} if new and new != name else None
+    elif attribute_match:
+        kind, method = attribute_match.groups()
+        report.update(cause="unknown_name", signature="unknown_name:%s.%s" % (kind, method))
+        fix = (known or {}).get(report["signature"])
+        if fix is None and METHOD_RENAMES.get(method, method) != method:
+            fix = {"rename_attribute": [method, METHOD_RENAMES[method]]}
+    elif color_match:
+        value = next(group for group in color_match.groups() if group)
+        report.update(cause="bad_color", signature="bad_color:%s" % value.lower())
+        if tree is not None:
+            repaired, repairs, constant = fix_color_value(source, tree, value)
+            fix = {"color": [value, constant]} if repairs else None
+    elif unicode_match or GLYPH_ERROR.search(text):
+        char = unicode_match.group(1) if unicode_match else None
+        report.update(cause="missing_glyph", signature="missing_glyph:%s" % ("U+%04X" % ord(char) if char else "text"))
+        if tree is not None:
+            repaired, repairs, lossy = fix_glyph(source, tree, line, char)
+            fix = {"glyph": char, "lossy": lossy} if repairs else None
+    elif LATEX_ERROR.search(text):
+        message = LATEX_MESSAGE.search(text)
+        report.update(cause="latex_error", signature="latex_error:%s" % _normalize(message.group(1) if message else "compile"))
+        if tree is not None:
+            repaired, repairs = fix_latex(source, tree, line)
+            fix = {"latex": line, "lossy": True} if repairs else None
+    else:
+        report["signature"] = "other:%s" % _normalize(report["detail"])
+
+    if fix and not repairs:
+        if "rename" in fix:
+            old, new = fix["rename"]
+            repaired, count = rename_token(source, old, new)
+            repairs = ["renamed %s -> %s" % (old, new)] if count else []
+        elif "rename_attribute" in fix:
+            old, new = fix["rename_attribute"]
+            repaired, count = rename_token(source, old, new, attribute=True)
+            repairs = ["renamed .%s() -> .%s()" % (old, new)] if count else []
+
+    if repairs and repaired != source:
+        report.update(fixable=True, fix=fix, repairs=repairs, repairedSource=repaired)
+    return finish(report, started)
+
+
+def finish(report, started):
+    report["elapsedMs"] = round((time.perf_counter() - started) * 1000, 2)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify (and fix) a failed render")
+    parser.add_argument("failure", help="- to read the failure as JSON from stdin")
+    parser.parse_args(argv)
+    failure = json.loads(sys.stdin.buffer.read().decode("utf-8"))
+    report = diagnose(
+        failure.get("source", "").lstrip("\ufeff"),
+        script_path=failure.get("scriptPath"),
+        error=failure.get("error"),
+        traceback_text=failure.get("traceback"),
+        stderr=failure.get("stderr"),
+        known=failure.get("known"),
+    )
+    sys.stdout.write(json.dumps(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
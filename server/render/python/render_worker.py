@@ -0,0 +1,326 @@
+"""
+Long-lived Manim render worker.
+
+Started once per core by server/render/workerPool.js. Manim (and with it
+numpy, cairo and pango) is imported a single time at start-up, then the
+worker reads one JSON job per line on stdin and answers with one JSON line
+per job on the protocol stream (the original stdout).
+
+Job:    {"id": "...", "scriptPath": "...", "sceneName": "...",
+         "quality": "l|m|h|p|k", "mediaDir": "...", "cwd": "..."}
+Reply:  {"type": "result", "id": "...", "success": true, "videoPath": "...",
+         "elapsedMs": 0, "cpuMs": 0, "maxRssKb": 0}
+
+Render jobs with "stream": true also report each finished animation before
+the reply: {"type": "event", "id": "...", "event": "animation",
+"index": 0, "path": ".../partial_movie_files/<scene>/<hash>.mp4"}
+
+With "holds": true static pauses are written as a single frame and given
+their duration when the movie is assembled (static_holds.py); their
+animation events carry "hold": <seconds>.
+
+Jobs may also carry an "action" other than "render":
+  split    - plan section sub-scenes for parallel rendering (scene_sections.py)
+  fragment - render a title card / section header / outro from its
+             parameters (scene_fragments.py) instead of from a script
+  preview  - run the scene with animations skipped and save key frames and
+             a per-section timeline (scene_preview.py)
+
+All workers share one LaTeX/Tex SVG folder (tex_cache.py), so a formula
+compiled for one lesson is reused by every later lesson and doubt.
+
+At start-up the names exported by "from manim import *" are written to
+MANIM_NAMES_FILE for the pre-flight checker (preflight.py).
+"""
+import importlib.util
+import json
+import os
+import sys
+import time
+import traceback
+from contextlib import contextmanager
+
+import static_holds
+import tex_cache
+
+# Keep a private handle on stdout for protocol messages and send everything
+# else (manim's rich console, LaTeX/ffmpeg subprocess output) to stderr.
+_PROTOCOL = os.fdopen(os.dup(1), "w", buffering=1, encoding="utf-8")
+os.dup2(2, 1)
+sys.stdout = sys.stderr
+
+QUALITY_FLAGS = {
+    "l": "low_quality",
+    "m": "medium_quality",
+    "h": "high_quality",
+    "p": "production_quality",
+    "k": "fourk_quality",
+}
+
+
+def send(message):
+    _PROTOCOL.write(json.dumps(message) + "\n")
+    _PROTOCOL.flush()
+
+
+@contextmanager
+def job_config(options):
+    """Apply per-job manim config and restore the global config afterwards."""
+    from manim import config
+
+    original = config.copy()
+    try:
+        for key, value in options.items():
+            setattr(config, key, value)
+        yield config
+    finally:
+        config.update(original)
+
+
+def load_scene_class(script_path, scene_name):
+    """Import a generated script under a fresh module name and return its scene."""
+    from manim import Scene
+
+    module_name = "_render_job_%d" % time.time_ns()
+    spec = importlib.util.spec_from_file_location(module_name, script_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        sys.modules.pop(module_name, None)
+
+    scene_cls = getattr(module, scene_name, None) if scene_name else None
+    if scene_cls is None:
+        candidates = [
+            obj for obj in vars(module).values()
+            if isinstance(obj, type) and issubclass(obj, Scene)
+            and obj.__module__ == module_name
+        ]
+        if len(candidates) != 1:
+            raise LookupError("Scene class %r not found in %s" % (scene_name, script_path))
+        scene_cls = candidates[0]
+    return scene_cls
+
+
+def stream_animations(scene, job_id, holds=None):
+    """Report each animation's partial movie file as soon as it is written."""
+    file_writer = scene.renderer.file_writer
+    end_animation = file_writer.end_animation
+    emitted = {"files": 0, "count": 0}
+
+    def end_and_report(*args, **kwargs):
+        result = end_animation(*args, **kwargs)
+        files = file_writer.partial_movie_files
+        while emitted["files"] < len(files):
+            path = files[emitted["files"]]
+            emitted["files"] += 1
+            # Skipped animations are recorded as None
+            if path and os.path.exists(path):
+                event = {
+                    "type": "event",
+                    "id": job_id,
+                    "event": "animation",
+                    "index": emitted["count"],
+                    "path": str(path),
+                }
+                if holds and str(path) in holds:
+                    # One frame that has to be shown for this many seconds
+                    event["hold"] = holds[str(path)]
+                send(event)
+                emitted["count"] += 1
+        return result
+
+    file_writer.end_animation = end_and_report
+
+
+def render(job, get_scene_class=None):
+    options = {
+        "quality": QUALITY_FLAGS.get(job.get("quality", "l"), "low_quality"),
+        "media_dir": job["mediaDir"],
+        # Same as the CLI: output goes to videos/<script name>/<quality>/
+        "input_file": job["scriptPath"],
+    }
+
+    tex_before = tex_cache.snapshot()
+    previous_cwd = os.getcwd()
+    os.chdir(job.get("cwd") or os.path.dirname(job["scriptPath"]))
+    try:
+        with job_config(options):
+            if get_scene_class:
+                scene_cls = get_scene_class()
+            else:
+                scene_cls = load_scene_class(job["scriptPath"], job.get("sceneName"))
+            scene = scene_cls()
+            holds = static_holds.install(scene) if job.get("holds") else None
+            if job.get("stream"):
+                stream_animations(scene, job.get("id"), holds)
+            scene.render()
+            if holds:
+                static_holds.expand(scene, holds)
+            video_path = scene.renderer.file_writer.movie_file_path
+    except static_holds.HoldExpansionError as exc:
+        print("Static holds not expanded (%s), rendering in full" % exc, file=sys.stderr)
+        # The live stream already has this render's animations
+        return render(dict(job, holds=False, stream=False), get_scene_class)
+    finally:
+        os.chdir(previous_cwd)
+
+    tex_after = tex_cache.snapshot()
+    return {
+        "sceneName": scene_cls.__name__,
+        "videoPath": str(video_path) if video_path else None,
+        "texRequests": tex_after["requests"] - tex_before["requests"],
+        "texCompiles": tex_after["compiles"] - tex_before["compiles"],
+    }
+
+
+def preview(job):
+    from scene_preview import DEFAULT_MAX_FRAMES, preview_scene
+
+    options = {
+        "quality": QUALITY_FLAGS.get(job.get("quality", "l"), "low_quality"),
+        "media_dir": job.get("mediaDir") or job["outputDir"],
+        "input_file": job["scriptPath"],
+        # Same as "manim -s": skip every animation, write no movie
+        "save_last_frame": True,
+        "write_to_movie": False,
+    }
+
+    tex_before = tex_cache.snapshot()
+    previous_cwd = os.getcwd()
+    os.chdir(job.get("cwd") or os.path.dirname(job["scriptPath"]))
+    try:
+        with job_config(options):
+            scene_cls = load_scene_class(job["scriptPath"], job.get("sceneName"))
+            result = preview_scene(
+                scene_cls, job["scriptPath"], job["outputDir"], job.get("maxFrames", DEFAULT_MAX_FRAMES)
+            )
+    finally:
+        os.chdir(previous_cwd)
+
+    tex_after = tex_cache.snapshot()
+    result.update({
+        "sceneName": scene_cls.__name__,
+        "texRequests": tex_after["requests"] - tex_before["requests"],
+        "texCompiles": tex_after["compiles"] - tex_before["compiles"],
+    })
+    return result
+
+
+def split(job):
+    from scene_sections import split_script
+
+    return split_script(
+        job["scriptPath"], job["outputPath"], job.get("sceneName"),
+        sections=job.get("sections", True), fragments=job.get("fragments", False),
+    )
+
+
+def fragment(job):
+    from scene_fragments import fragment_scene
+
+    name = job.get("sceneName") or "Fragment"
+    # There is no script: the name only decides the videos/<name>/<quality>/ folder
+    job = dict(job, scriptPath=os.path.join(job["mediaDir"], name + ".py"), cwd=job["mediaDir"])
+    os.makedirs(job["mediaDir"], exist_ok=True)
+    return render(job, lambda: fragment_scene(job["params"], name))
+
+
+ACTIONS = {
+    "render": render,
+    "preview": preview,
+    "split": split,
+    "fragment": fragment,
+}
+
+
+def resource_usage():
+    """CPU seconds of this worker and its finished subprocesses, and its peak RSS in KB."""
+    times = os.times()
+    cpu = times.user + times.system + times.children_user + times.children_system
+    try:
+        import resource
+    except ImportError:
+        # Windows: no getrusage
+        return cpu, None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return cpu, peak // 1024 if sys.platform == "darwin" else peak
+
+
+def handle(job):
+    started = time.time()
+    cpu_before, _ = resource_usage()
+    try:
+        action = ACTIONS.get(job.get("action", "render"))
+        if action is None:
+            raise ValueError("Unknown action %r" % job.get("action"))
+        result = action(job)
+        reply = {"type": "result", "id": job.get("id"), "success": True}
+        reply.update(result)
+    except Exception as exc:
+        reply = {
+            "type": "result",
+            "id": job.get("id"),
+            "success": False,
+            "error": "%s: %s" % (type(exc).__name__, exc),
+            "traceback": traceback.format_exc(),
+        }
+    cpu_after, peak_rss = resource_usage()
+    reply["elapsedMs"] = int((time.time() - started) * 1000)
+    reply["cpuMs"] = int((cpu_after - cpu_before) * 1000)
+    # Peak of the whole worker process so far (per job only for a fresh worker)
+    reply["maxRssKb"] = peak_rss
+    return reply
+
+
+def write_manim_names(manim):
+    """Record manim's star-import names so preflight.py can spot undefined names."""
+    path = os.environ.get("MANIM_NAMES_FILE")
+    if not path:
+        return
+    names = getattr(manim, "__all__", None) or [n for n in dir(manim) if not n.startswith("_")]
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump({"manimVersion": manim.__version__, "names": sorted(names)}, handle)
+        os.replace(temp_path, path)
+    except OSError as exc:
+        print("Could not write manim names: %s" % exc, file=sys.stderr)
+
+
+def main():
+    started = time.time()
+    try:
+        import manim
+    except ImportError as exc:
+        send({"type": "fatal", "error": str(exc), "notInstalled": True})
+        return 1
+
+    tex_dir = tex_cache.install()
+    write_manim_names(manim)
+
+    send({
+        "type": "ready",
+        "pid": os.getpid(),
+        "manimVersion": manim.__version__,
+        "texDir": tex_dir,
+        "startupMs": int((time.time() - started) * 1000),
+    })
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except ValueError as exc:
+            send({"type": "result", "id": None, "success": False, "error": "Bad job: %s" % exc})
+            continue
+        send(handle(job))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
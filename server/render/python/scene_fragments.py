@@ -0,0 +1,297 @@
+"""
+Reusable scene fragments: title cards, section headers and outros.
+
+Generated lessons and doubts open with the same kind of title card
+(Text title + subtitle, Write/FadeIn, wait, FadeOut) and close with a
+"Great job!" message. Such a card depends on nothing but its own literal
+texts, styles and timings, so it is cut out of the scene and described by
+those parameters:
+
+    {"version": 1, "steps": [
+        {"make": 0, "mobject": "Text", "args": ["Number System"], "kwargs": {"font_size": 48, "color": {"name": "BLUE"}}},
+        {"line": 1, "method": "next_to", "args": [{"line": 0}, {"name": "DOWN"}], "kwargs": {}},
+        {"play": [{"animation": "Write", "line": 0, "kwargs": {}}], "kwargs": {"run_time": 2}},
+        {"wait": [1], "kwargs": {}},
+        ...]}
+
+The render pool renders a fragment from its parameters (fragment_scene) and
+the clip is cached under a hash of them, so the same card is rendered once
+and then only concatenated in front of (or after) each new middle part.
+
+A run of statements is a card only when:
+
+* it starts on an empty screen and consists solely of Text/MathTex
+  creations, layout calls (next_to, to_edge, ...), self.play() of
+  single-mobject add/remove animations, self.add/remove and self.wait(),
+* every argument is a literal or a manim constant (BLUE, DOWN, BOLD),
+* it ends with its mobjects removed again (an outro may also run to the
+  end of construct()), and no later statement reads its variables,
+* the script holds nothing but imports and the scene class, and the scene
+  nothing but construct(), so a bare Scene renders the card identically.
+"""
+import ast
+import operator
+
+from scene_sections import ADD_ANIMATIONS, REMOVE_ANIMATIONS, _external_reads, _is_self_call, _names
+
+FRAGMENT_VERSION = 1
+
+CARD_MOBJECTS = {"Text", "MarkupText", "Tex", "MathTex"}
+CARD_METHODS = {"next_to", "to_edge", "to_corner", "move_to", "shift", "scale", "set_color"}
+CARD_ANIMATIONS = (ADD_ANIMATIONS | REMOVE_ANIMATIONS) - {"Broadcast"}
+
+OPERATORS = {
+    ast.Add: ("add", operator.add),
+    ast.Sub: ("sub", operator.sub),
+    ast.Mult: ("mul", operator.mul),
+    ast.Div: ("div", operator.truediv),
+}
+OPERATOR_NAMES = {name: function for name, function in OPERATORS.values()}
+
+KIND_TITLES = {
+    "title_card": "Title card",
+    "section_header": "Section header",
+    "outro": "Outro",
+}
+
+
+class NotACard(Exception):
+    pass
+
+
+class CardBuilder:
+    """Collects the parameters of one card while its statements are matched."""
+
+    def __init__(self, constants):
+        self.constants = constants
+        self.lines = {}
+        self.steps = []
+        self.on_screen = set()
+        self.shown = False
+
+    def encode(self, node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (str, int, float, bool, type(None))):
+            return node.value
+        if isinstance(node, ast.Name):
+            if node.id in self.lines:
+                return {"line": self.lines[node.id]}
+            if node.id in self.constants:
+                return {"name": node.id}
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            value = self.encode(node.operand)
+            if isinstance(node.op, ast.UAdd):
+                return value
+            return -value if isinstance(value, (int, float)) and not isinstance(value, bool) else {"neg": value}
+        if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+            return {"op": OPERATORS[type(node.op)][0], "left": self.encode(node.left), "right": self.encode(node.right)}
+        raise NotACard(ast.dump(node))
+
+    def encode_keywords(self, keywords):
+        if any(kw.arg is None for kw in keywords):
+            raise NotACard("**kwargs")
+        return {kw.arg: self.encode(kw.value) for kw in keywords}
+
+    def encode_call(self, call):
+        if any(isinstance(arg, ast.Starred) for arg in call.args):
+            raise NotACard("*args")
+        return [self.encode(arg) for arg in call.args], self.encode_keywords(call.keywords)
+
+    def line_of(self, node):
+        if isinstance(node, ast.Name) and node.id in self.lines:
+            return self.lines[node.id]
+        raise NotACard("not a card mobject")
+
+    def animation(self, node):
+        if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Name) or node.func.id not in CARD_ANIMATIONS:
+            raise NotACard("animation")
+        if len(node.args) != 1:
+            raise NotACard("animation arguments")
+        line = self.line_of(node.args[0])
+        kwargs = self.encode_keywords(node.keywords)
+        if node.func.id in ADD_ANIMATIONS:
+            self.on_screen.add(line)
+            self.shown = True
+        else:
+            self.on_screen.discard(line)
+        return {"animation": node.func.id, "line": line, "kwargs": kwargs}
+
+    def statement(self, stmt):
+        if isinstance(stmt, ast.Assign):
+            call = stmt.value
+            if (
+                len(stmt.targets) != 1 or not isinstance(stmt.targets[0], ast.Name)
+                or not isinstance(call, ast.Call) or not isinstance(call.func, ast.Name)
+                or call.func.id not in CARD_MOBJECTS
+            ):
+                raise NotACard("assignment")
+            name = stmt.targets[0].id
+            if name in self.lines:
+                raise NotACard("reassigned")
+            args, kwargs = self.encode_call(call)
+            self.lines[name] = len(self.lines)
+            self.steps.append({"make": self.lines[name], "mobject": call.func.id, "args": args, "kwargs": kwargs})
+            return
+        if not isinstance(stmt, ast.Expr) or not isinstance(stmt.value, ast.Call):
+            raise NotACard("statement")
+        call = stmt.value
+        if _is_self_call(call, "play"):
+            if not call.args:
+                raise NotACard("empty play")
+            animations = [self.animation(arg) for arg in call.args]
+            self.steps.append({"play": animations, "kwargs": self.encode_keywords(call.keywords)})
+        elif _is_self_call(call, "wait"):
+            args, kwargs = self.encode_call(call)
+            self.steps.append({"wait": args, "kwargs": kwargs})
+        elif _is_self_call(call, "add") or _is_self_call(call, "remove"):
+            lines = [self.line_of(arg) for arg in call.args]
+            if call.func.attr == "add":
+                self.on_screen.update(lines)
+                self.shown = True
+            else:
+                self.on_screen.difference_update(lines)
+            self.steps.append({call.func.attr: lines})
+        elif isinstance(call.func, ast.Attribute) and call.func.attr in CARD_METHODS:
+            line = self.line_of(call.func.value)
+            args, kwargs = self.encode_call(call)
+            self.steps.append({"line": line, "method": call.func.attr, "args": args, "kwargs": kwargs})
+        else:
+            raise NotACard("call")
+
+    def params(self):
+        return {"version": FRAGMENT_VERSION, "steps": list(self.steps)}
+
+
+def _is_wait(stmt):
+    return isinstance(stmt, ast.Expr) and _is_self_call(stmt.value, "wait")
+
+
+def match_card(body, start, constants):
+    """(end, names, params) of the card starting at body[start], or None."""
+    card = CardBuilder(constants)
+    end = None
+    for index in range(start, len(body)):
+        try:
+            card.statement(body[index])
+        except NotACard:
+            break
+        if card.shown and not card.on_screen:
+            end = index + 1
+            break
+    else:
+        # Nothing followed: an outro may keep its message on screen
+        if card.shown:
+            end = len(body)
+    if end is None:
+        return None
+
+    if end < len(body) and all(_is_wait(stmt) for stmt in body[end:]):
+        # Trailing pauses of the last card belong to it
+        try:
+            for stmt in body[end:]:
+                card.statement(stmt)
+            end = len(body)
+        except NotACard:
+            del card.steps[end - start:]
+    return end, set(card.lines), card.params()
+
+
+def _standalone(tree, scene):
+    """Whether a bare Scene renders the same card as this script's scene."""
+    for node in tree.body:
+        if node is scene or isinstance(node, (ast.Import, ast.ImportFrom)):
+            continue
+        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant):
+            continue
+        return False
+    for node in scene.body:
+        if isinstance(node, ast.FunctionDef) and node.name == "construct" and not node.decorator_list:
+            continue
+        if isinstance(node, ast.Pass) or (isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant)):
+            continue
+        return False
+    return True
+
+
+def find_fragments(tree, scene, body, tracker):
+    """
+    Cards of a construct() body as (start, end, kind, params) statement ranges.
+    `tracker` is a fresh scene_sections.ScreenTracker.
+    """
+    if not _standalone(tree, scene):
+        return []
+    # Manim constants: names the script uses without ever assigning them
+    constants = {name for name in _names(tree, ast.Load) if name[:1].isupper()} - _names(tree, ast.Store)
+
+    fragments = []
+    index = 0
+    while index < len(body):
+        if tracker.empty:
+            match = match_card(body, index, constants)
+            if match:
+                end, names, params = match
+                if not names & _external_reads(body[end:], set()):
+                    kind = "title_card" if index == 0 else "outro" if end == len(body) else "section_header"
+                    fragments.append((index, end, kind, params))
+                    for stmt in body[index:end]:
+                        tracker.visit(stmt)
+                    index = end
+                    continue
+        tracker.visit(body[index])
+        index += 1
+    return fragments
+
+
+def _decode(value, mobjects, namespace):
+    if isinstance(value, dict):
+        if "line" in value:
+            return mobjects[value["line"]]
+        if "name" in value:
+            return namespace[value["name"]]
+        if "neg" in value:
+            return -_decode(value["neg"], mobjects, namespace)
+        if "op" in value:
+            left = _decode(value["left"], mobjects, namespace)
+            return OPERATOR_NAMES[value["op"]](left, _decode(value["right"], mobjects, namespace))
+    return value
+
+
+def play_card(scene, params):
+    """Replay a card's steps on a scene."""
+    import manim
+
+    namespace = vars(manim)
+    mobjects = {}
+
+    def decode_call(step):
+        args = [_decode(arg, mobjects, namespace) for arg in step.get("args", [])]
+        kwargs = {key: _decode(value, mobjects, namespace) for key, value in step.get("kwargs", {}).items()}
+        return args, kwargs
+
+    for step in params["steps"]:
+        args, kwargs = decode_call(step)
+        if "make" in step:
+            mobjects[step["make"]] = namespace[step["mobject"]](*args, **kwargs)
+        elif "method" in step:
+            getattr(mobjects[step["line"]], step["method"])(*args, **kwargs)
+        elif "play" in step:
+            animations = []
+            for animation in step["play"]:
+                _, options = decode_call(animation)
+                animations.append(namespace[animation["animation"]](mobjects[animation["line"]], **options))
+            scene.play(*animations, **kwargs)
+        elif "wait" in step:
+            scene.wait(*[_decode(arg, mobjects, namespace) for arg in step["wait"]], **kwargs)
+        elif "add" in step:
+            scene.add(*[mobjects[line] for line in step["add"]])
+        elif "remove" in step:
+            scene.remove(*[mobjects[line] for line in step["remove"]])
+
+
+def fragment_scene(params, name="Fragment"):
+    """A Scene class that renders one card from its parameters."""
+    from manim import Scene
+
+    def construct(self):
+        play_card(self, params)
+
+    return type(name, (Scene,), {"construct": construct})
@@ -0,0 +1,160 @@
+"""
+Preview a scene without rendering video.
+
+The scene runs with manim's skip-animations mode (as "manim -s"): every
+self.play() and self.wait() jumps straight to its end state, so no frames
+are encoded and a lesson takes well under a second instead of minutes.
+
+While it runs, each call's run time is recorded and attributed to the
+"# Section N" block of construct() it was made from, which gives a
+timeline measured by manim itself (real run_time defaults, rate functions
+and helper methods included), also per "# Teacher Voice:" narration cue
+(narration.py). Key still frames are saved as PNGs:
+
+* "title" - after the first animation of each section (usually its heading)
+* "end"   - the last state of each section, before the next one starts
+* "final" - the last frame of the scene
+
+Runs inside a render worker (action "preview", see render_worker.py).
+"""
+import ast
+import os
+import sys
+
+from narration import narration_cues, time_cues
+from preflight import find_method, scene_classes, section_starts
+
+DEFAULT_MAX_FRAMES = 12
+
+
+def scene_construct(script_path, scene_name):
+    """Source of the script and the scene's construct() node (or None)."""
+    with open(script_path, encoding="utf-8") as handle:
+        source = handle.read()
+    tree = ast.parse(source)
+    scenes, classes = scene_classes(tree)
+    scene = classes.get(scene_name) or (scenes[0] if len(scenes) == 1 else None)
+    return source, find_method(scene, classes, "construct") if scene is not None else None
+
+
+def _call_line(script_path):
+    """Line of construct() the current play()/wait() was made from."""
+    frame = sys._getframe(2)
+    line = None
+    while frame is not None:
+        if os.path.abspath(frame.f_code.co_filename) == script_path:
+            line = frame.f_lineno
+            if frame.f_code.co_name == "construct":
+                break
+        frame = frame.f_back
+    return line
+
+
+class PreviewRecorder:
+    """Wraps scene.play to time each call and snapshot section key frames."""
+
+    def __init__(self, scene, script_path, sections, output_dir, max_frames):
+        self.scene = scene
+        self.script_path = os.path.abspath(script_path)
+        self.output_dir = output_dir
+        self.max_frames = max_frames
+        self.bounds = [line for line, _ in sections]
+        self.timeline = [
+            {"index": 0, "title": "Intro", "startLine": None, "startSeconds": 0.0,
+             "seconds": 0.0, "animationCount": 0, "waitCount": 0},
+        ] + [
+            {"index": i + 1, "title": title, "startLine": line, "startSeconds": 0.0,
+             "seconds": 0.0, "animationCount": 0, "waitCount": 0}
+            for i, (line, title) in enumerate(sections)
+        ]
+        self.frames = []
+        self.frame_errors = []
+        self.calls = []
+        self.time = 0.0
+        self.current = None
+        self.play = scene.play
+        scene.play = self.record
+
+    def section_of(self, line):
+        index = 0
+        for i, start in enumerate(self.bounds):
+            if line is not None and line >= start:
+                index = i + 1
+        return index
+
+    def snapshot(self, kind, section):
+        if len(self.frames) >= self.max_frames:
+            return
+        renderer = self.scene.renderer
+        path = os.path.join(self.output_dir, "frame_%02d_%s.png" % (len(self.frames), kind))
+        try:
+            renderer.update_frame(self.scene)
+            renderer.camera.get_image().save(path)
+        except Exception as exc:  # the preview must not fail on one bad frame
+            self.frame_errors.append("%s: %s" % (type(exc).__name__, exc))
+            return
+        entry = self.timeline[section]
+        self.frames.append({
+            "kind": kind,
+            "section": section,
+            "title": entry["title"],
+            "seconds": round(self.time, 2),
+            "path": path,
+        })
+
+    def record(self, *args, **kwargs):
+        line = _call_line(self.script_path)
+        section = self.section_of(line)
+        if section != self.current:
+            if self.current is not None and self.timeline[self.current]["animationCount"]:
+                self.snapshot("end", self.current)
+            self.current = section
+            self.timeline[section]["startSeconds"] = round(self.time, 2)
+
+        result = self.play(*args, **kwargs)
+
+        duration = getattr(self.scene, "duration", None)
+        if duration is None:
+            duration = kwargs.get("run_time", 1.0)
+        entry = self.timeline[section]
+        is_wait = len(args) == 1 and type(args[0]).__name__ == "Wait"
+        entry["waitCount" if is_wait else "animationCount"] += 1
+        entry["seconds"] += float(duration)
+        self.time += float(duration)
+        self.calls.append((line or 0, float(duration)))
+
+        if not is_wait and entry["animationCount"] == 1:
+            self.snapshot("title", section)
+        return result
+
+    def finish(self):
+        self.snapshot("final", self.current or 0)
+        timeline = [entry for entry in self.timeline if entry["animationCount"] or entry["waitCount"] or entry["index"]]
+        for entry in timeline:
+            entry["seconds"] = round(entry["seconds"], 2)
+        return {
+            "frames": self.frames,
+            "frameErrors": self.frame_errors[:5],
+            "timeline": timeline,
+            "totalSeconds": round(self.time, 2),
+            "animationCount": sum(entry["animationCount"] for entry in timeline),
+        }
+
+
+def preview_scene(scene_cls, script_path, output_dir, max_frames=DEFAULT_MAX_FRAMES):
+    """Run scene_cls with animations skipped and return frames and timeline."""
+    os.makedirs(output_dir, exist_ok=True)
+    for name in os.listdir(output_dir):
+        if name.startswith("frame_") and name.endswith(".png"):
+            os.unlink(os.path.join(output_dir, name))
+
+    # The caller sets config.save_last_frame, which makes the renderer skip animations
+    scene = scene_cls()
+    source, construct = scene_construct(script_path, scene_cls.__name__)
+    sections = section_starts(source, construct) if construct is not None else []
+    recorder = PreviewRecorder(scene, script_path, sections, output_dir, max_frames)
+    scene.render()
+    result = recorder.finish()
+    if construct is not None:
+        result["narration"] = time_cues(narration_cues(source, construct), recorder.calls)
+    return result
@@ -0,0 +1,361 @@
+"""
+Split a generated lesson scene into independently renderable sections.
+
+Lesson scripts are one long construct() with "# Section N" comments and a
+FadeOut reset between sections. A boundary is only used when it is safe:
+
+* the later section does not read any variable assigned before the boundary
+  (otherwise the two sections are merged), and
+* everything put on screen before the boundary has been faded out or
+  removed by then, so the next section starts from an empty frame.
+
+With fragments enabled, standalone title cards, section headers and
+outros (scene_fragments.py) are cut out as parts of their own, carrying the
+parameters their clip is cached under.
+
+Each resulting group becomes a subclass of the original scene whose
+construct() holds that group's lines. If fewer than two groups survive the
+script is reported as not splittable and should be rendered whole.
+"""
+import ast
+import json
+import re
+import sys
+import textwrap
+
+SECTION_MARKER = re.compile(r"^\s*#\s*Section\s+\d+\b", re.IGNORECASE)
+
+ADD_ANIMATIONS = {
+    "Create", "Write", "FadeIn", "DrawBorderThenFill", "GrowFromCenter",
+    "GrowFromPoint", "GrowFromEdge", "GrowArrow", "SpinInFromNothing",
+    "AddTextLetterByLetter", "AddTextWordByWord", "Broadcast", "SpiralIn",
+}
+REMOVE_ANIMATIONS = {
+    "FadeOut", "Uncreate", "Unwrite", "ShrinkToCenter",
+    "RemoveTextLetterByLetter", "FadeOutAndShift",
+}
+SAFE_BASES = {"Scene"}
+
+
+def _call_name(node):
+    if isinstance(node, ast.Call):
+        func = node.func
+        if isinstance(func, ast.Name):
+            return func.id
+        if isinstance(func, ast.Attribute):
+            return func.attr
+    return None
+
+
+def _is_self_call(node, method):
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == method
+        and isinstance(node.func.value, ast.Name)
+        and node.func.value.id == "self"
+    )
+
+
+def _root_name(node):
+    """Variable a mobject expression refers to (apples[i] -> apples)."""
+    while isinstance(node, (ast.Subscript, ast.Starred)):
+        node = node.value
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "self":
+        return "self." + node.attr
+    return None
+
+
+def _names(node, ctx):
+    found = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name) and isinstance(child.ctx, ctx):
+            found.add(child.id)
+        elif (
+            isinstance(child, ast.Attribute)
+            and isinstance(child.ctx, ctx)
+            and isinstance(child.value, ast.Name)
+            and child.value.id == "self"
+        ):
+            found.add("self." + child.attr)
+    return found
+
+
+def _external_reads(stmts, stored):
+    """Names read by a statement list before it assigns them itself."""
+    reads = set()
+    for stmt in stmts:
+        if isinstance(stmt, (ast.For, ast.AsyncFor)):
+            reads |= _names(stmt.iter, ast.Load) - stored
+            inner = stored | _names(stmt.target, ast.Store)
+            reads |= _external_reads(stmt.body + stmt.orelse, inner)
+        elif isinstance(stmt, (ast.If, ast.While)):
+            reads |= _names(stmt.test, ast.Load) - stored
+            reads |= _external_reads(stmt.body, set(stored))
+            reads |= _external_reads(stmt.orelse, set(stored))
+        else:
+            local = set()
+            for node in ast.walk(stmt):
+                if isinstance(node, ast.comprehension):
+                    local |= _names(node.target, ast.Store)
+            reads |= _names(stmt, ast.Load) - stored - local
+        stored |= _names(stmt, ast.Store)
+    return reads
+
+
+def _touches_camera(stmt):
+    for child in ast.walk(stmt):
+        if isinstance(child, ast.Attribute) and child.attr in ("camera", "renderer"):
+            if isinstance(child.value, ast.Name) and child.value.id == "self":
+                return True
+    return False
+
+
+class ScreenTracker:
+    """Approximate which variables are on screen after a run of statements."""
+
+    def __init__(self):
+        self.on_screen = set()
+        self.anonymous = False
+        self.aliases = {}
+
+    def _resolve(self, name):
+        return self.aliases.get(name, name)
+
+    def _add(self, node):
+        name = _root_name(node)
+        if name is None:
+            self.anonymous = True
+        else:
+            self.on_screen.add(self._resolve(name))
+
+    def _remove(self, node):
+        name = _root_name(node)
+        if name is not None:
+            self.on_screen.discard(self._resolve(name))
+            self.on_screen.discard(name)
+
+    def _clear(self):
+        self.on_screen.clear()
+        self.anonymous = False
+
+    def _animation(self, anim):
+        if isinstance(anim, ast.Starred):
+            # self.play(*[FadeOut(mob) for mob in self.mobjects])
+            value = anim.value
+            if isinstance(value, ast.ListComp) and _call_name(value.elt) in REMOVE_ANIMATIONS:
+                self._clear()
+            return
+        name = _call_name(anim)
+        if name is None or not anim.args:
+            return
+        if name in ADD_ANIMATIONS:
+            self._add(anim.args[0])
+        elif name in REMOVE_ANIMATIONS:
+            for arg in anim.args:
+                self._remove(arg)
+        elif name == "ReplacementTransform" and len(anim.args) >= 2:
+            self._remove(anim.args[0])
+            self._add(anim.args[1])
+        elif name in ("Transform", "TransformMatchingTex", "TransformMatchingShapes"):
+            self._add(anim.args[0])
+        elif name == "AnimationGroup" or name == "Succession" or name == "LaggedStart":
+            for arg in anim.args:
+                self._animation(arg)
+
+    def visit(self, stmt):
+        for node in ast.walk(stmt):
+            if isinstance(node, (ast.For, ast.comprehension)):
+                iterable = node.iter
+                if isinstance(iterable, ast.Call) and _call_name(iterable) == "enumerate" and iterable.args:
+                    iterable = iterable.args[0]
+                    target = node.target.elts[-1] if isinstance(node.target, ast.Tuple) else node.target
+                else:
+                    target = node.target
+                source = _root_name(iterable)
+                if source and isinstance(target, ast.Name):
+                    self.aliases[target.id] = self._resolve(source)
+            if _is_self_call(node, "play"):
+                for anim in node.args:
+                    self._animation(anim)
+            elif _is_self_call(node, "add") or _is_self_call(node, "add_foreground_mobjects"):
+                for arg in node.args:
+                    self._add(arg)
+            elif _is_self_call(node, "remove"):
+                for arg in node.args:
+                    self._remove(arg)
+            elif _is_self_call(node, "clear"):
+                self._clear()
+
+    @property
+    def empty(self):
+        return not self.on_screen and not self.anonymous
+
+
+def find_scene(tree, scene_name=None):
+    scenes = []
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            bases = {b.id if isinstance(b, ast.Name) else getattr(b, "attr", None) for b in node.bases}
+            if bases & {"Scene", "MovingCameraScene", "ThreeDScene", "ZoomedScene"}:
+                scenes.append((node, bases))
+    if scene_name:
+        scenes = [s for s in scenes if s[0].name == scene_name]
+    return scenes
+
+
+def plan_sections(source, scene_name=None, sections=True, fragments=False):
+    """Return the split plan for a script without writing anything."""
+    source = source.lstrip("\ufeff")
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as exc:
+        return {"splittable": False, "reason": "SyntaxError: %s" % exc}
+
+    scenes = find_scene(tree, scene_name)
+    if len(scenes) != 1:
+        return {"splittable": False, "reason": "expected exactly one Scene class, found %d" % len(scenes)}
+    scene, bases = scenes[0]
+    if not bases <= SAFE_BASES:
+        return {"splittable": False, "reason": "camera scenes are rendered whole"}
+
+    construct = next(
+        (n for n in scene.body if isinstance(n, ast.FunctionDef) and n.name == "construct"), None
+    )
+    if construct is None or not construct.body:
+        return {"splittable": False, "reason": "scene has no construct()"}
+
+    body = construct.body
+    if any(_touches_camera(stmt) for stmt in body):
+        return {"splittable": False, "reason": "construct() changes camera/renderer state"}
+
+    lines = source.splitlines()
+
+    # Statement index that each "# Section N" marker starts
+    starts = []
+    for lineno in range(body[0].lineno, construct.end_lineno + 1):
+        if sections and SECTION_MARKER.match(lines[lineno - 1]):
+            index = next((i for i, stmt in enumerate(body) if stmt.lineno > lineno), None)
+            if index and index not in starts:
+                starts.append(index)
+
+    # Title cards, section headers and outros become parts of their own
+    cards = {}
+    if fragments:
+        from scene_fragments import KIND_TITLES, find_fragments
+
+        for start, end, kind, params in find_fragments(tree, scene, body, ScreenTracker()):
+            cards[(start, end)] = {"kind": kind, "params": params}
+            starts.extend(index for index in (start, end) if 0 < index < len(body) and index not in starts)
+        starts.sort()
+    if not starts:
+        return {"splittable": False, "reason": "no '# Section N' markers" if not cards else "nothing to split"}
+
+    chunks = []
+    bounds = [0] + starts + [len(body)]
+    for a, b in zip(bounds, bounds[1:]):
+        if a < b:
+            chunks.append(body[a:b])
+
+    # Merge sections that read variables assigned by an earlier section
+    defined_in = {}
+    groups = []
+    for chunk in chunks:
+        stored = set()
+        reads = _external_reads(chunk, stored)
+        owner = len(groups)
+        depends = [defined_in[name] for name in reads if name in defined_in]
+        if depends:
+            owner = min(depends)
+            merged = [stmt for group in groups[owner:] for stmt in group] + chunk
+            groups[owner:] = [merged]
+        else:
+            groups.append(list(chunk))
+        for name in stored:
+            defined_in[name] = owner
+        for name, index in list(defined_in.items()):
+            if index > owner:
+                defined_in[name] = owner
+
+    # Only keep boundaries where the screen has been cleared
+    safe_groups = []
+    tracker = ScreenTracker()
+    current = []
+    for group in groups:
+        current.extend(group)
+        for stmt in group:
+            tracker.visit(stmt)
+        if tracker.empty:
+            safe_groups.append(current)
+            current = []
+    if current:
+        # The last group started on an empty screen too, nothing has to follow it
+        safe_groups.append(current)
+
+    if len(safe_groups) < 2:
+        return {"splittable": False, "reason": "no section boundary leaves an empty screen"}
+
+    parts = []
+    for index, group in enumerate(safe_groups):
+        first = construct.lineno + 1
+        if index:
+            # Comments between the previous statement and this section belong to it
+            previous = body[body.index(group[0]) - 1]
+            first = previous.end_lineno + 1
+        last = group[-1].end_lineno
+        card = cards.get((body.index(group[0]), body.index(group[-1]) + 1))
+        if card:
+            default_title = KIND_TITLES[card["kind"]]
+        else:
+            default_title = "Introduction" if index == 0 else "Section %d" % index
+        title = next(
+            (lines[n - 1].strip().lstrip("#").strip() for n in range(first, last + 1)
+             if SECTION_MARKER.match(lines[n - 1])),
+            default_title,
+        )
+        part = {
+            "sceneName": "%s_Part%d" % (scene.name, index + 1),
+            "startLine": first,
+            "endLine": last,
+            "title": title,
+        }
+        if card:
+            part["fragment"] = card
+        parts.append(part)
+
+    return {"splittable": True, "sceneName": scene.name, "parts": parts}
+
+
+def build_parts_script(source, plan):
+    """Original script plus one subclass per part, each with its own construct()."""
+    source = source.lstrip("\ufeff")
+    lines = source.splitlines()
+    out = [source.rstrip("\n"), "", ""]
+    for part in plan["parts"]:
+        chunk = "\n".join(lines[part["startLine"] - 1:part["endLine"]])
+        body = textwrap.indent(textwrap.dedent(chunk), " " * 8)
+        out.append("class %s(%s):" % (part["sceneName"], plan["sceneName"]))
+        out.append("    def construct(self):")
+        out.append(body)
+        out.append("")
+        out.append("")
+    return "\n".join(out)
+
+
+def split_script(script_path, output_path, scene_name=None, sections=True, fragments=False):
+    with open(script_path, encoding="utf-8") as handle:
+        source = handle.read()
+    plan = plan_sections(source, scene_name, sections, fragments)
+    if plan["splittable"]:
+        with open(output_path, "w", encoding="utf-8") as handle:
+            handle.write(build_parts_script(source, plan))
+        plan["scriptPath"] = output_path
+    return plan
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit("usage: scene_sections.py SCRIPT OUTPUT [SCENE]")
+    print(json.dumps(split_script(*sys.argv[1:4]), indent=2))
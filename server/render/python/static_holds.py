@@ -0,0 +1,112 @@
+"""
+Static-hold compression for renders.
+
+Generated lessons spend most of their running time in self.wait() pauses.
+Manim already knows when such a pause is static (no updaters: a "frozen
+frame"), but it still writes the same frame to the encoder once per frame
+of the pause. In hold mode the renderer writes that frame once and the
+pause is only recorded as a duration:
+
+    holds = install(scene)      # before scene.render()
+    scene.render()
+    expand(scene, holds)        # rewrite the movie with the real durations
+
+expand() joins the partial movie files again with the ffmpeg concat demuxer,
+giving every one-frame hold its recorded duration. The result is stream
+copied: the held frame is simply displayed until the next frame's timestamp
+(variable frame rate), so nothing is re-encoded.
+"""
+import os
+import subprocess
+
+# Pauses shorter than this are written normally
+MIN_HOLD_FRAMES = 3
+
+
+class HoldExpansionError(RuntimeError):
+    pass
+
+
+def install(scene):
+    """
+    Make the scene's renderer write frozen frames once.
+    Returns {partial movie file: seconds}, or None if the renderer has no
+    frozen-frame path (the scene then renders as usual).
+    """
+    renderer = scene.renderer
+    freeze = getattr(renderer, "freeze_current_frame", None)
+    if freeze is None or not hasattr(renderer, "add_frame") or not hasattr(renderer, "get_frame"):
+        return None
+    file_writer = renderer.file_writer
+    holds = {}
+
+    def freeze_once(duration):
+        dt = 1 / renderer.camera.frame_rate
+        frames = int(duration / dt)
+        files = file_writer.partial_movie_files
+        if frames < MIN_HOLD_FRAMES or not files or not files[-1]:
+            return freeze(duration)
+        renderer.add_frame(renderer.get_frame())
+        # Keep scene time where a full pause would have left it
+        renderer.time += (frames - 1) * dt
+        holds[str(files[-1])] = frames * dt
+
+    renderer.freeze_current_frame = freeze_once
+    return holds
+
+
+def _concat_entry(path):
+    return "file '%s'" % os.path.abspath(path).replace("\\", "/").replace("'", "'\\''")
+
+
+def expand(scene, holds):
+    """Rewrite the scene's movie so every hold lasts its recorded duration."""
+    file_writer = scene.renderer.file_writer
+    movie = file_writer.movie_file_path
+    if not holds or not movie or not os.path.exists(str(movie)):
+        return movie
+    if getattr(file_writer, "includes_sound", False):
+        # Sounds were mixed into the movie by manim; a stream-copy rebuild would drop them
+        raise HoldExpansionError("scene adds sounds")
+
+    files = [str(path) for path in file_writer.partial_movie_files if path]
+    entries = []
+    for index, path in enumerate(files):
+        entries.append(_concat_entry(path))
+        seconds = holds.get(path)
+        if seconds is None:
+            continue
+        if index == len(files) - 1:
+            # The last frame of a movie only lasts one frame interval, so a
+            # closing hold is its frame again at the very end
+            dt = 1 / scene.renderer.camera.frame_rate
+            entries.append("duration %.6f" % max(seconds - dt, dt))
+            entries.append(_concat_entry(path))
+        else:
+            entries.append("duration %.6f" % seconds)
+
+    movie = str(movie)
+    list_path = movie + ".holds.txt"
+    temp_path = movie + ".holds.mp4"
+    with open(list_path, "w", encoding="utf-8") as handle:
+        handle.write("\n".join(entries) + "\n")
+    try:
+        result = subprocess.run(
+            [
+                "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+                "-f", "concat", "-safe", "0", "-i", list_path,
+                "-c", "copy", "-movflags", "+faststart", temp_path,
+            ],
+            capture_output=True, text=True, timeout=300,
+        )
+    except (OSError, subprocess.TimeoutExpired) as exc:
+        raise HoldExpansionError("ffmpeg not available: %s" % exc)
+    finally:
+        try:
+            os.remove(list_path)
+        except OSError:
+            pass
+    if result.returncode != 0:
+        raise HoldExpansionError("ffmpeg exited with code %d: %s" % (result.returncode, result.stderr[:300]))
+    os.replace(temp_path, movie)
+    return movie
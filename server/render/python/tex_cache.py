@@ -0,0 +1,99 @@
+"""
+Shared, process-safe LaTeX/Tex SVG cache for all renders.
+
+Manim keeps compiled formulas in config.tex_dir, keyed by a hash of the
+LaTeX source. By default that folder lives under each render's media_dir,
+so every lesson and doubt recompiles the same formulas. install() points
+tex_dir at one shared folder (RENDER_TEX_DIR) and wraps tex_to_svg_file
+with a per-formula lock file, so parallel workers never compile the same
+formula twice or read a half-written SVG.
+"""
+import hashlib
+import os
+import time
+from contextlib import contextmanager
+
+DEFAULT_TEX_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "output", "tex_cache")
+STALE_LOCK_SECONDS = 300
+
+counters = {"requests": 0, "compiles": 0}
+
+
+def shared_tex_dir():
+    return os.path.abspath(os.environ.get("RENDER_TEX_DIR") or DEFAULT_TEX_DIR)
+
+
+@contextmanager
+def file_lock(path, poll=0.05):
+    """Exclusive lock via O_EXCL lock files (works on Windows and POSIX)."""
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > STALE_LOCK_SECONDS:
+                    os.unlink(path)
+                    continue
+            except OSError:
+                continue
+            time.sleep(poll)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        yield
+    finally:
+        os.close(fd)
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _lock_key(expression, environment, tex_template):
+    body = getattr(tex_template, "body", "") if tex_template is not None else ""
+    data = "%s\0%s\0%s" % (expression, environment or "", body)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:32]
+
+
+def install(tex_dir=None):
+    """Point manim at the shared Tex folder and make compiles process-safe."""
+    from manim import config
+    from manim.utils import tex_file_writing
+
+    tex_dir = tex_dir or shared_tex_dir()
+    lock_dir = os.path.join(tex_dir, ".locks")
+    os.makedirs(lock_dir, exist_ok=True)
+    config.tex_dir = tex_dir
+
+    if getattr(tex_file_writing.tex_to_svg_file, "_shared_cache", False):
+        return tex_dir
+
+    original_tex_to_svg = tex_file_writing.tex_to_svg_file
+    original_compile = tex_file_writing.compile_tex
+
+    def compile_tex(*args, **kwargs):
+        counters["compiles"] += 1
+        return original_compile(*args, **kwargs)
+
+    def tex_to_svg_file(expression, environment=None, tex_template=None):
+        counters["requests"] += 1
+        lock = os.path.join(lock_dir, _lock_key(expression, environment, tex_template) + ".lock")
+        with file_lock(lock):
+            return original_tex_to_svg(expression, environment, tex_template)
+
+    tex_to_svg_file._shared_cache = True
+    tex_file_writing.compile_tex = compile_tex
+    tex_file_writing.tex_to_svg_file = tex_to_svg_file
+
+    # Mobject modules import the function by name, patch those references too
+    try:
+        from manim.mobject.text import tex_mobject
+        tex_mobject.tex_to_svg_file = tex_to_svg_file
+    except ImportError:
+        pass
+
+    return tex_dir
+
+
+def snapshot():
+    return dict(counters)
@@ -0,0 +1,235 @@
+"""
+Pre-compile common formulas into the shared Tex cache.
+
+Compiles a list of common NCERT Class 6-12 formulas, plus every MathTex/Tex
+call with literal arguments found in the generated lesson and doubt scripts,
+so first renders hit warm SVGs instead of waiting on LaTeX.
+
+Usage: python tex_prewarm.py [--jobs N] [--no-scan] [SCRIPT_DIR ...]
+"""
+import argparse
+import ast
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import tex_cache
+
+SERVER_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
+DEFAULT_SCAN_DIRS = [
+    os.path.join(SERVER_DIR, "manim_scripts"),
+    os.path.join(SERVER_DIR, "output", "manim"),
+]
+
+# Keyword arguments that change the compiled LaTeX (everything else is styling)
+TEX_KEYWORDS = {"tex_environment", "arg_separator"}
+
+NCERT_FORMULAS = [
+    # Number systems and arithmetic (Class 6-9)
+    r"\mathbb{N} = \{1, 2, 3, \ldots\}",
+    r"\mathbb{W} = \{0, 1, 2, 3, \ldots\}",
+    r"\mathbb{Z} = \{\ldots, -2, -1, 0, 1, 2, \ldots\}",
+    r"\mathbb{Q} = \left\{ \frac{p}{q} : p, q \in \mathbb{Z}, q \neq 0 \right\}",
+    r"\mathbb{R}",
+    r"\frac{1}{2}", r"\frac{1}{3}", r"\frac{1}{4}", r"\frac{3}{4}",
+    r"\frac{a}{b} + \frac{c}{d} = \frac{ad + bc}{bd}",
+    r"\frac{a}{b} \times \frac{c}{d} = \frac{ac}{bd}",
+    r"\sqrt{2}", r"\sqrt{3}", r"\pi", r"\pi \approx 3.14",
+    r"a^m \times a^n = a^{m+n}",
+    r"\frac{a^m}{a^n} = a^{m-n}",
+    r"(a^m)^n = a^{mn}",
+    r"a^0 = 1",
+    r"a^{-n} = \frac{1}{a^n}",
+    r"\text{HCF} \times \text{LCM} = a \times b",
+    r"\text{Percentage} = \frac{\text{Part}}{\text{Whole}} \times 100",
+    r"\text{SI} = \frac{P \times R \times T}{100}",
+    r"A = P\left(1 + \frac{R}{100}\right)^n",
+    # Algebraic identities and equations (Class 7-10)
+    r"(a + b)^2 = a^2 + 2ab + b^2",
+    r"(a - b)^2 = a^2 - 2ab + b^2",
+    r"a^2 - b^2 = (a + b)(a - b)",
+    r"(x + a)(x + b) = x^2 + (a + b)x + ab",
+    r"(a + b)^3 = a^3 + b^3 + 3ab(a + b)",
+    r"(a - b)^3 = a^3 - b^3 - 3ab(a - b)",
+    r"a^3 + b^3 + c^3 - 3abc = (a + b + c)(a^2 + b^2 + c^2 - ab - bc - ca)",
+    r"ax + b = 0",
+    r"ax^2 + bx + c = 0",
+    r"x = \frac{-b \pm \sqrt{b^2 - 4ac}}{2a}",
+    r"D = b^2 - 4ac",
+    r"a_1x + b_1y + c_1 = 0",
+    r"\alpha + \beta = -\frac{b}{a}",
+    r"\alpha \beta = \frac{c}{a}",
+    r"a_n = a + (n - 1)d",
+    r"S_n = \frac{n}{2}\left[2a + (n - 1)d\right]",
+    r"a_n = ar^{n-1}",
+    r"S_n = \frac{a(r^n - 1)}{r - 1}",
+    # Geometry and mensuration (Class 6-10)
+    r"\angle A + \angle B + \angle C = 180^\circ",
+    r"a^2 + b^2 = c^2",
+    r"AB^2 + BC^2 = AC^2",
+    r"A = l \times b", r"P = 2(l + b)",
+    r"A = \frac{1}{2} \times b \times h",
+    r"A = \sqrt{s(s - a)(s - b)(s - c)}",
+    r"s = \frac{a + b + c}{2}",
+    r"A = \pi r^2", r"C = 2\pi r",
+    r"V = l \times b \times h",
+    r"V = \pi r^2 h",
+    r"V = \frac{1}{3}\pi r^2 h",
+    r"V = \frac{4}{3}\pi r^3",
+    r"S = 4\pi r^2",
+    r"\text{CSA} = 2\pi r h",
+    r"d = \sqrt{(x_2 - x_1)^2 + (y_2 - y_1)^2}",
+    r"\left(\frac{x_1 + x_2}{2}, \frac{y_1 + y_2}{2}\right)",
+    r"y = mx + c",
+    r"m = \frac{y_2 - y_1}{x_2 - x_1}",
+    # Trigonometry (Class 10-11)
+    r"\sin\theta = \frac{\text{Opposite}}{\text{Hypotenuse}}",
+    r"\cos\theta = \frac{\text{Adjacent}}{\text{Hypotenuse}}",
+    r"\tan\theta = \frac{\sin\theta}{\cos\theta}",
+    r"\sin^2\theta + \cos^2\theta = 1",
+    r"1 + \tan^2\theta = \sec^2\theta",
+    r"1 + \cot^2\theta = \csc^2\theta",
+    r"\sin(A + B) = \sin A \cos B + \cos A \sin B",
+    r"\cos(A + B) = \cos A \cos B - \sin A \sin B",
+    r"\sin 2A = 2 \sin A \cos A",
+    r"\cos 2A = \cos^2 A - \sin^2 A",
+    # Statistics and probability (Class 9-12)
+    r"\bar{x} = \frac{\sum x_i}{n}",
+    r"\bar{x} = \frac{\sum f_i x_i}{\sum f_i}",
+    r"P(E) = \frac{\text{Favourable outcomes}}{\text{Total outcomes}}",
+    r"P(E) + P(\bar{E}) = 1",
+    r"P(A \cup B) = P(A) + P(B) - P(A \cap B)",
+    r"P(A|B) = \frac{P(A \cap B)}{P(B)}",
+    r"\sigma^2 = \frac{1}{n}\sum (x_i - \bar{x})^2",
+    r"{}^nC_r = \frac{n!}{r!(n - r)!}",
+    r"{}^nP_r = \frac{n!}{(n - r)!}",
+    # Calculus, sets and matrices (Class 11-12)
+    r"A \cup B", r"A \cap B", r"n(A \cup B) = n(A) + n(B) - n(A \cap B)",
+    r"\lim_{x \to a} f(x)",
+    r"\lim_{x \to 0} \frac{\sin x}{x} = 1",
+    r"\frac{d}{dx}(x^n) = nx^{n-1}",
+    r"\frac{d}{dx}(\sin x) = \cos x",
+    r"\frac{d}{dx}(\cos x) = -\sin x",
+    r"\frac{d}{dx}(e^x) = e^x",
+    r"\frac{d}{dx}(\ln x) = \frac{1}{x}",
+    r"\frac{dy}{dx} = \frac{dy}{du} \cdot \frac{du}{dx}",
+    r"\int x^n \, dx = \frac{x^{n+1}}{n + 1} + C",
+    r"\int_a^b f(x) \, dx = F(b) - F(a)",
+    r"\begin{vmatrix} a & b \\ c & d \end{vmatrix} = ad - bc",
+    r"A^{-1} = \frac{1}{|A|} \operatorname{adj}(A)",
+    r"\vec{a} \cdot \vec{b} = |\vec{a}||\vec{b}|\cos\theta",
+    # Physics and chemistry (Class 9-12)
+    r"v = u + at",
+    r"s = ut + \frac{1}{2}at^2",
+    r"v^2 = u^2 + 2as",
+    r"F = ma",
+    r"p = mv",
+    r"W = F \cdot s",
+    r"KE = \frac{1}{2}mv^2",
+    r"PE = mgh",
+    r"P = \frac{W}{t}",
+    r"F = G\frac{m_1 m_2}{r^2}",
+    r"g = 9.8 \, \text{m/s}^2",
+    r"V = IR",
+    r"P = VI",
+    r"R = R_1 + R_2 + R_3",
+    r"\frac{1}{R} = \frac{1}{R_1} + \frac{1}{R_2}",
+    r"\frac{1}{f} = \frac{1}{v} - \frac{1}{u}",
+    r"\frac{1}{f} = \frac{1}{v} + \frac{1}{u}",
+    r"m = \frac{h'}{h} = -\frac{v}{u}",
+    r"n = \frac{c}{v}",
+    r"\rho = \frac{m}{V}",
+    r"E = mc^2",
+    r"PV = nRT",
+    r"\text{pH} = -\log[\text{H}^+]",
+    r"\text{Molarity} = \frac{\text{moles of solute}}{\text{volume in L}}",
+    r"6\text{CO}_2 + 6\text{H}_2\text{O} \rightarrow \text{C}_6\text{H}_{12}\text{O}_6 + 6\text{O}_2",
+    r"2\text{H}_2 + \text{O}_2 \rightarrow 2\text{H}_2\text{O}",
+]
+
+
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, SyntaxError):
+        return None
+
+
+def scan_script(path):
+    """Yield (class name, args, kwargs) for Tex calls built only from literals."""
+    try:
+        with open(path, encoding="utf-8-sig") as handle:
+            tree = ast.parse(handle.read(), filename=path)
+    except (OSError, SyntaxError, ValueError):
+        return
+
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)):
+            continue
+        if node.func.id not in ("MathTex", "Tex") or not node.args:
+            continue
+        args = [_literal(arg) for arg in node.args]
+        if not all(isinstance(arg, str) for arg in args):
+            continue
+        kwargs = {}
+        for keyword in node.keywords:
+            if keyword.arg in TEX_KEYWORDS:
+                value = _literal(keyword.value)
+                if not isinstance(value, str):
+                    break
+                kwargs[keyword.arg] = value
+        else:
+            yield node.func.id, tuple(args), tuple(sorted(kwargs.items()))
+
+
+def collect(scan_dirs):
+    items = {("MathTex", (formula,), ()) for formula in NCERT_FORMULAS}
+    for directory in scan_dirs:
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".py"):
+                items.update(scan_script(os.path.join(directory, name)))
+    return sorted(items)
+
+
+def _init_worker():
+    tex_cache.install()
+
+
+def compile_item(item):
+    import manim
+
+    class_name, args, kwargs = item
+    try:
+        getattr(manim, class_name)(*args, **dict(kwargs))
+        return None
+    except Exception as exc:
+        return "%s%r: %s" % (class_name, args, exc)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("dirs", nargs="*", help="script folders to scan for formulas")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--no-scan", action="store_true", help="only compile the built-in formula list")
+    options = parser.parse_args(argv)
+
+    scan_dirs = [] if options.no_scan else (options.dirs or DEFAULT_SCAN_DIRS)
+    items = collect(scan_dirs)
+    tex_dir = tex_cache.shared_tex_dir()
+    print("Pre-warming %d formulas into %s" % (len(items), tex_dir))
+
+    started = time.time()
+    with Pool(max(1, options.jobs), initializer=_init_worker) as pool:
+        errors = [error for error in pool.imap_unordered(compile_item, items) if error]
+
+    for error in errors:
+        print("  failed: %s" % error, file=sys.stderr)
+    print("Done in %.1fs (%d ok, %d failed)" % (time.time() - started, len(items) - len(errors), len(errors)))
+    return 1 if errors and len(errors) == len(items) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+const crypto = require('crypto');
+const fs = require('fs');
+const path = require('path');
+const { submitRender, getManimVersion } = require('./workerPool');
+const { renderInSections } = require('./sectionRender');
+
+// ==================== RENDER CACHE CONFIGURATION ====================
+// Final videos keyed by hash(script source, scene class, quality, manim version)
+const CACHE_DIR = process.env.RENDER_CACHE_DIR || path.join(__dirname, '..', 'output', 'render_cache');
+const MAX_CACHE_BYTES = (parseInt(process.env.RENDER_CACHE_MAX_MB, 10) || 2048) * 1024 * 1024;
+
+// In-memory index, ordered from least to most recently used
+const entries = new Map();
+const inFlight = new Map();
+let totalBytes = 0;
+let loaded = false;
+
+const stats = {
+    hits: 0,
+    misses: 0,
+    coalesced: 0,
+    stores: 0,
+    evictions: 0
+};
+
+/**
+ * Load cache metadata from disk once per process
+ */
+function loadIndex() {
+    if (loaded) return;
+    loaded = true;
+
+    if (!fs.existsSync(CACHE_DIR)) {
+        fs.mkdirSync(CACHE_DIR, { recursive: true });
+        return;
+    }
+
+    const metas = [];
+    for (const file of fs.readdirSync(CACHE_DIR)) {
+        if (!file.endsWith('.json')) continue;
+        try {
+            const meta = JSON.parse(fs.readFileSync(path.join(CACHE_DIR, file), 'utf-8'));
+            if (fs.existsSync(videoPathFor(meta.key))) metas.push(meta);
+        } catch (e) {
+            // Ignore unreadable metadata, the entry will simply be re-rendered
+        }
+    }
+
+    metas.sort((a, b) => a.lastAccess - b.lastAccess);
+    for (const meta of metas) {
+        entries.set(meta.key, meta);
+        totalBytes += meta.size;
+    }
+    console.log(`🗄️ Render cache loaded: ${entries.size} videos, ${(totalBytes / 1024 / 1024).toFixed(1)} MB`);
+}
+
+function videoPathFor(key) {
+    return path.join(CACHE_DIR, `${key}.mp4`);
+}
+
+function metaPathFor(key) {
+    return path.join(CACHE_DIR, `${key}.json`);
+}
+
+/**
+ * Cache key for a render job
+ */
+function renderCacheKey(source, sceneName, quality, manimVersion) {
+    return crypto.createHash('sha256')
+        .update(source.replace(/\r\n/g, '\n'))
+        .update('\0' + sceneName)
+        .update('\0' + quality)
+        .update('\0' + manimVersion)
+        .digest('hex');
+}
+
+function writeMeta(meta) {
+    fs.writeFileSync(metaPathFor(meta.key), JSON.stringify(meta, null, 2));
+}
+
+/**
+ * Look up a cached render and mark it as recently used
+ */
+function getCachedRender(key) {
+    loadIndex();
+    const meta = entries.get(key);
+    if (!meta) return null;
+
+    const videoPath = videoPathFor(key);
+    if (!fs.existsSync(videoPath)) {
+        entries.delete(key);
+        totalBytes -= meta.size;
+        return null;
+    }
+
+    entries.delete(key);
+    meta.lastAccess = Date.now();
+    meta.hits = (meta.hits || 0) + 1;
+    entries.set(key, meta);
+    try { writeMeta(meta); } catch (e) {}
+
+    return { ...meta, videoPath };
+}
+
+/**
+ * Copy a rendered video into the cache (atomic rename) and evict to budget
+ */
+function storeRender(key, sourcePath, metadata) {
+    loadIndex();
+    const videoPath = videoPathFor(key);
+    const tempPath = `${videoPath}.${process.pid}.tmp`;
+
+    fs.copyFileSync(sourcePath, tempPath);
+    fs.renameSync(tempPath, videoPath);
+
+    const previous = entries.get(key);
+    if (previous) {
+        entries.delete(key);
+        totalBytes -= previous.size;
+    }
+
+    const meta = {
+        ...metadata,
+        key,
+        size: fs.statSync(videoPath).size,
+        createdAt: Date.now(),
+        lastAccess: Date.now(),
+        hits: 0
+    };
+    writeMeta(meta);
+    entries.set(key, meta);
+    totalBytes += meta.size;
+    stats.stores++;
+
+    evictToBudget();
+    return videoPath;
+}
+
+/**
+ * Drop least recently used videos until the cache fits its size budget
+ */
+function evictToBudget() {
+    for (const [key, meta] of entries) {
+        if (totalBytes <= MAX_CACHE_BYTES) break;
+        entries.delete(key);
+        totalBytes -= meta.size;
+        stats.evictions++;
+        try { fs.unlinkSync(videoPathFor(key)); } catch (e) {}
+        try { fs.unlinkSync(metaPathFor(key)); } catch (e) {}
+        console.log(`🧹 Evicted cached render ${key.substring(0, 12)} (${meta.sceneName})`);
+    }
+}
+
+/**
+ * Render through the cache: identical scripts are only rendered once,
+ * and concurrent requests for the same key share one render.
+ */
+async function renderWithCache(job) {
+    const render = job.sections || job.fragments ? renderInSections : submitRender;
+    const manimVersion = await getManimVersion();
+    if (!manimVersion) {
+        return render(job);
+    }
+
+    const source = fs.readFileSync(job.scriptPath, 'utf-8');
+    const quality = job.quality || 'l';
+    const key = renderCacheKey(source, job.sceneName, quality, manimVersion);
+
+    const cached = getCachedRender(key);
+    if (cached) {
+        stats.hits++;
+        console.log(`⚡ Render cache hit: ${job.sceneName} (${key.substring(0, 12)})`);
+        return { success: true, cached: true, cacheKey: key, videoPath: cached.videoPath, sceneName: cached.sceneName, elapsedMs: 0 };
+    }
+
+    if (inFlight.has(key)) {
+        stats.coalesced++;
+        return inFlight.get(key);
+    }
+
+    stats.misses++;
+    const promise = render(job).then((result) => {
+        if (result.success && result.videoPath && fs.existsSync(result.videoPath)) {
+            try {
+                // Hand out the cached copy: the render's own file lives in the
+                // first caller's scratch folder, which goes away with that job
+                result.videoPath = storeRender(key, result.videoPath, {
+                    sceneName: result.sceneName || job.sceneName,
+                    quality,
+                    manimVersion,
+                    renderMs: result.elapsedMs
+                });
+            } catch (e) {
+                console.log(`⚠️ Could not store render in cache: ${e.message}`);
+            }
+        }
+        return { ...result, cached: false, cacheKey: key };
+    }).finally(() => inFlight.delete(key));
+
+    inFlight.set(key, promise);
+    return promise;
+}
+
+/**
+ * Cache status for monitoring
+ */
+function getRenderCacheStats() {
+    loadIndex();
+    return {
+        entries: entries.size,
+        totalBytes,
+        maxBytes: MAX_CACHE_BYTES,
+        ...stats
+    };
+}
+
+module.exports = {
+    renderWithCache,
+    renderCacheKey,
+    getCachedRender,
+    storeRender,
+    getRenderCacheStats
+};
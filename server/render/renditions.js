@@ -0,0 +1,93 @@
+const fs = require('fs');
+const { registerJobHandler, enqueueJob } = require('./jobQueue');
+
+// ==================== QUALITY LADDER CONFIGURATION ====================
+// The first rung is rendered and published right away, the others are queued
+// as low-priority "upgrade" jobs that swap the published video when ready
+const QUALITIES = {
+    l: { label: '480p', height: 480, fps: 15, minMbps: 0 },
+    m: { label: '720p', height: 720, fps: 30, minMbps: 2.5 },
+    h: { label: '1080p', height: 1080, fps: 60, minMbps: 6 },
+    p: { label: '1440p', height: 1440, fps: 60, minMbps: 12 },
+    k: { label: '2160p', height: 2160, fps: 60, minMbps: 25 }
+};
+const QUALITY_LADDER = (process.env.RENDER_QUALITY_LADDER || 'l,m,h')
+    .split(',')
+    .map(quality => quality.trim())
+    .filter(quality => QUALITIES[quality]);
+if (QUALITY_LADDER.length === 0) QUALITY_LADDER.push('l');
+const FIRST_QUALITY = QUALITY_LADDER[0];
+
+const upgradeTargets = {};
+
+function qualityRank(quality) {
+    return Object.keys(QUALITIES).indexOf(quality);
+}
+
+/**
+ * Rungs of the ladder above `quality`, up to `maxQuality`
+ */
+function upgradeQualities(quality = FIRST_QUALITY, maxQuality = 'k') {
+    return QUALITY_LADDER.filter(rung => qualityRank(rung) > qualityRank(quality) && qualityRank(rung) <= qualityRank(maxQuality));
+}
+
+/**
+ * Rendition entry stored with a lesson or doubt message
+ */
+function makeRendition(quality, url, filePath) {
+    let size = 0;
+    try { size = fs.statSync(filePath).size; } catch (e) {}
+    const { label, height, fps, minMbps } = QUALITIES[quality];
+    return { quality, label, height, fps, minMbps, url, size, createdAt: new Date() };
+}
+
+/**
+ * Add (or replace) a rendition and return the list best first
+ */
+function mergeRendition(renditions = [], rendition) {
+    return [...renditions.map(r => (r.toObject ? r.toObject() : r)).filter(r => r.quality !== rendition.quality), rendition]
+        .sort((a, b) => qualityRank(b.quality) - qualityRank(a.quality));
+}
+
+/**
+ * Register what an upgrade of one target type does.
+ * handler(payload, job) renders payload.quality and publishes it.
+ */
+function registerUpgradeTarget(target, handler) {
+    upgradeTargets[target] = handler;
+}
+
+/**
+ * Queue one low-priority upgrade job per rung above `fromQuality`
+ */
+async function enqueueUpgrades(target, payload, { fromQuality = FIRST_QUALITY, maxQuality } = {}) {
+    const qualities = upgradeQualities(fromQuality, maxQuality);
+    const jobIds = [];
+    for (const quality of qualities) {
+        jobIds.push(await enqueueJob('upgrade', { ...payload, target, quality }));
+    }
+    if (qualities.length > 0) {
+        console.log(`⏫ Queued ${qualities.map(q => QUALITIES[q].label).join(', ')} renditions for ${target}`);
+    }
+    return jobIds;
+}
+
+registerJobHandler('upgrade', (payload, job) => {
+    const handler = upgradeTargets[payload.target];
+    if (!handler) {
+        return { success: false, error: `No upgrade handler for ${payload.target}` };
+    }
+    return handler(payload, job);
+});
+
+module.exports = {
+    QUALITIES,
+    QUALITY_LADDER,
+    FIRST_QUALITY,
+    qualityRank,
+    upgradeQualities,
+    makeRendition,
+    mergeRendition,
+    registerUpgradeTarget,
+    enqueueUpgrades
+};
@@ -0,0 +1,276 @@
+const { spawn } = require('child_process');
+const fs = require('fs');
+const path = require('path');
+const { resolvePythonPath, renderEnv } = require('./workerPool');
+const { preflightScript, describePreflightErrors } = require('./preflight');
+const { renderWithCache } = require('./renderCache');
+
+// ==================== RENDER REPAIR CONFIGURATION ====================
+// Failed renders are classified from their traceback (python/render_repair.py).
+// Known causes get a local fix and an automatic retry; the LLM is only asked
+// when no local fix applies (or the remembered one did not work).
+const REPAIR_SCRIPT = path.join(__dirname, 'python', 'render_repair.py');
+const REPAIR_TIMEOUT = 5000;
+const RENDER_REPAIR_ATTEMPTS = parseInt(process.env.RENDER_REPAIR_ATTEMPTS || '2', 10);
+const REPAIR_CACHE_PATH = process.env.RENDER_REPAIR_CACHE || path.join(__dirname, '..', 'output', 'render_repairs.json');
+const MAX_SIGNATURES = 500;
+// Tail of the traceback handed to the LLM
+const LLM_TRACEBACK_CHARS = 3000;
+
+// signature -> { cause, fix, seen, lastSeen, local: {applied, succeeded}, llm: {applied, succeeded} }
+const signatures = new Map();
+let loaded = false;
+
+const stats = {
+    failures: 0,
+    localFixes: 0,
+    llmFixes: 0,
+    recovered: 0,
+    byCause: {}
+};
+
+function loadSignatures() {
+    if (loaded) return;
+    loaded = true;
+    try {
+        const saved = JSON.parse(fs.readFileSync(REPAIR_CACHE_PATH, 'utf-8'));
+        for (const [signature, entry] of Object.entries(saved.signatures || {})) {
+            signatures.set(signature, entry);
+        }
+    } catch (e) {
+        // No failures recorded yet
+    }
+}
+
+function saveSignatures() {
+    // Keep the most recently seen signatures
+    if (signatures.size > MAX_SIGNATURES) {
+        const stale = [...signatures.entries()].sort((a, b) => a[1].lastSeen - b[1].lastSeen);
+        stale.slice(0, signatures.size - MAX_SIGNATURES).forEach(([signature]) => signatures.delete(signature));
+    }
+    try {
+        fs.mkdirSync(path.dirname(REPAIR_CACHE_PATH), { recursive: true });
+        const tempPath = `${REPAIR_CACHE_PATH}.${process.pid}.tmp`;
+        fs.writeFileSync(tempPath, JSON.stringify({ signatures: Object.fromEntries(signatures) }, null, 2));
+        fs.renameSync(tempPath, REPAIR_CACHE_PATH);
+    } catch (e) {
+        console.log(`⚠️ Could not save render repair signatures: ${e.message}`);
+    }
+}
+
+function signatureEntry(diagnosis) {
+    loadSignatures();
+    let entry = signatures.get(diagnosis.signature);
+    if (!entry) {
+        entry = {
+            cause: diagnosis.cause,
+            fix: null,
+            seen: 0,
+            lastSeen: 0,
+            local: { applied: 0, succeeded: 0 },
+            llm: { applied: 0, succeeded: 0 }
+        };
+        signatures.set(diagnosis.signature, entry);
+    }
+    return entry;
+}
+
+/**
+ * Fixes that worked before, keyed by signature (passed to the classifier).
+ * Lossy fixes (ones that change what the student sees) are never reused.
+ */
+function knownFixes() {
+    loadSignatures();
+    const known = {};
+    for (const [signature, entry] of signatures) {
+        if (entry.fix && !entry.fix.lossy && entry.local.succeeded > 0) known[signature] = entry.fix;
+    }
+    return known;
+}
+
+/**
+ * Classify a failed render. Resolves to { cause, signature, detail, line,
+ * fixable, fix, repairs, repairedSource }; cause is 'unknown' if Python
+ * cannot run the classifier.
+ * @param {string} source - script that failed
+ * @param {string} scriptPath - its path (to find its frames in the traceback)
+ * @param {Object} result - failed render result ({ error, traceback, stderr })
+ */
+function diagnoseFailure(source, scriptPath, result) {
+    const failure = {
+        source,
+        scriptPath,
+        error: result.error,
+        traceback: result.traceback,
+        stderr: result.stderr,
+        known: knownFixes()
+    };
+
+    return new Promise((resolve) => {
+        const unknown = (reason) => {
+            console.log(`⚠️ Render failure not classified: ${reason}`);
+            resolve({ cause: 'unknown', signature: null, detail: result.error, fixable: false, repairs: [] });
+        };
+
+        const child = spawn(resolvePythonPath(), [REPAIR_SCRIPT, '-'], { env: renderEnv(), windowsHide: true });
+        let stdout = '';
+        let stderr = '';
+        const timer = setTimeout(() => child.kill('SIGKILL'), REPAIR_TIMEOUT);
+
+        child.stdout.on('data', (data) => { stdout += data.toString(); });
+        child.stderr.on('data', (data) => { stderr += data.toString(); });
+        child.stdin.on('error', () => {});
+        child.on('error', (error) => {
+            clearTimeout(timer);
+            unknown(`python not available: ${error.message}`);
+        });
+        child.on('close', (code) => {
+            clearTimeout(timer);
+            try {
+                resolve(JSON.parse(stdout));
+            } catch (e) {
+                unknown(`classifier exited with code ${code}: ${stderr.substring(0, 200)}`);
+            }
+        });
+        child.stdin.end(JSON.stringify(failure), 'utf-8');
+    });
+}
+
+/**
+ * Pick the fix for a classified failure: the local one unless it already
+ * failed for this signature, otherwise the LLM's (pre-flighted) rewrite.
+ */
+async function chooseFix(source, diagnosis, failure, job, { llmFix, llmUsed }) {
+    const entry = diagnosis.signature ? signatureEntry(diagnosis) : null;
+    const localFailedBefore = entry && entry.local.applied > 0 && entry.local.succeeded === 0;
+
+    if (diagnosis.fixable && !localFailedBefore) {
+        return { by: 'local', source: diagnosis.repairedSource, repairs: diagnosis.repairs, fix: diagnosis.fix };
+    }
+    // Timeouts and crashed workers are not something a script rewrite reliably fixes
+    if (!llmFix || llmUsed || !failure.traceback) return null;
+
+    let code = null;
+    try {
+        code = await llmFix(source, failure);
+    } catch (error) {
+        console.log(`⚠️ LLM script fix failed: ${error.message}`);
+    }
+    if (!code || code.trim() === source.trim()) return null;
+
+    const preflight = await preflightScript(code, { sceneName: job.sceneName, repair: true });
+    if (!preflight.ok || (preflight.sceneName && preflight.sceneName !== job.sceneName)) {
+        const reason = preflight.ok ? `scene is ${preflight.sceneName}` : describePreflightErrors(preflight);
+        console.log(`⚠️ LLM script fix rejected by pre-flight (${reason})`);
+        return null;
+    }
+    return { by: 'llm', source: preflight.repairedSource || code, repairs: ['script rewritten by the LLM'], fix: null };
+}
+
+/**
+ * A fix worked if the retry rendered, or at least got past this failure
+ * (a second, different error is a separate signature)
+ */
+function recordOutcome(diagnosis, fix, worked) {
+    if (!diagnosis.signature) return;
+    const entry = signatureEntry(diagnosis);
+    entry[fix.by].applied++;
+    if (worked) {
+        entry[fix.by].succeeded++;
+        if (fix.fix && !fix.fix.lossy) entry.fix = fix.fix;
+    }
+    saveSignatures();
+}
+
+/**
+ * Render through the cache and repair failed renders: the failure is
+ * classified from the full traceback, a deterministic local fix (or, as a
+ * last resort, llmFix) rewrites the script in place and the render is
+ * retried, up to RENDER_REPAIR_ATTEMPTS times.
+ *
+ * A failed result carries `failure` ({ cause, signature, detail, line,
+ * traceback }); any result carries `repairs`, the fixes that were tried.
+ * job.onEvent gets a 'reset' event before each retry.
+ *
+ * @param {Object} job - renderWithCache job
+ * @param {Object} options
+ * @param {Function} options.llmFix - async (source, failure) => corrected script or null
+ */
+async function renderWithRepair(job, { llmFix } = {}) {
+    let result = await renderWithCache(job);
+    const repairs = [];
+    let applied = null;
+
+    while (!result.success && !result.notInstalled) {
+        const source = fs.readFileSync(job.scriptPath, 'utf-8');
+        const diagnosis = await diagnoseFailure(source, job.scriptPath, result);
+        if (applied) recordOutcome(applied.diagnosis, applied.fix, diagnosis.signature !== applied.diagnosis.signature);
+        applied = null;
+        const failure = {
+            cause: diagnosis.cause,
+            signature: diagnosis.signature,
+            detail: diagnosis.detail,
+            line: diagnosis.line || null,
+            traceback: result.traceback || null
+        };
+        result = { ...result, failure };
+
+        stats.failures++;
+        stats.byCause[failure.cause] = (stats.byCause[failure.cause] || 0) + 1;
+        if (diagnosis.signature) {
+            const entry = signatureEntry(diagnosis);
+            entry.seen++;
+            entry.lastSeen = Date.now();
+        }
+        if (repairs.length >= RENDER_REPAIR_ATTEMPTS) break;
+
+        const llmUsed = repairs.some(repair => repair.by === 'llm');
+        const fix = await chooseFix(source, diagnosis, {
+            ...failure,
+            traceback: failure.traceback && failure.traceback.slice(-LLM_TRACEBACK_CHARS)
+        }, job, { llmFix, llmUsed });
+        if (!fix) {
+            if (diagnosis.signature) saveSignatures();
+            break;
+        }
+
+        stats[fix.by === 'local' ? 'localFixes' : 'llmFixes']++;
+        console.log(`🔧 Render failed (${failure.signature || failure.cause}), retrying with ${fix.by} fix: ${fix.repairs.join(', ')}${fix.fix && fix.fix.lossy ? ' (changes what is shown)' : ''}`);
+        fs.writeFileSync(job.scriptPath, fix.source, 'utf-8');
+        if (job.onEvent) job.onEvent({ event: 'reset' });
+
+        result = await renderWithCache(job);
+        applied = { diagnosis, fix };
+        repairs.push({ cause: failure.cause, signature: failure.signature, by: fix.by, repairs: fix.repairs, success: !!result.success });
+    }
+    if (applied) {
+        recordOutcome(applied.diagnosis, applied.fix, !!result.success);
+        if (result.success) stats.recovered++;
+    }
+
+    return { ...result, repairs };
+}
+
+/**
+ * Repair counters and the most frequent failure signatures, for monitoring
+ */
+function getRepairStats() {
+    loadSignatures();
+    const top = [...signatures.entries()]
+        .sort((a, b) => b[1].seen - a[1].seen)
+        .slice(0, 10)
+        .map(([signature, entry]) => ({ signature, ...entry }));
+    return {
+        maxAttempts: RENDER_REPAIR_ATTEMPTS,
+        signatures: signatures.size,
+        ...stats,
+        top
+    };
+}
+
+module.exports = {
+    RENDER_REPAIR_ATTEMPTS,
+    diagnoseFailure,
+    renderWithRepair,
+    getRepairStats
+};
@@ -0,0 +1,208 @@
+const fs = require('fs');
+const path = require('path');
+const { HLS_DIR, HLS_RETAIN, isStreamActive } = require('./hlsStream');
+
+// ==================== RENDER SCRATCH CONFIGURATION ====================
+// Every render gets its own media folder (partial movie files, texts/, Tex/),
+// removed once the finished video has been published or the render failed
+const SCRATCH_DIR = process.env.RENDER_SCRATCH_DIR || path.join(__dirname, '..', 'output', 'scratch');
+const SCRATCH_MAX_AGE = (parseInt(process.env.RENDER_SCRATCH_MAX_AGE_MIN, 10) || 360) * 60 * 1000;
+const GC_INTERVAL = (parseInt(process.env.RENDER_GC_INTERVAL_MIN, 10) || 30) * 60 * 1000;
+// Media trees of renders made before scratch folders existed (1 to collect
+// them). Off by default: client/public/videos also holds committed sample
+// renders whose Tex/ and texts/ folders are tracked in git.
+const COLLECT_LEGACY = process.env.RENDER_GC_LEGACY === '1';
+const LEGACY_ROOTS = [
+    path.join(__dirname, '..', '..', 'client', 'public', 'videos'),
+    path.join(__dirname, '..', 'output', 'manim', 'media')
+];
+const INTERMEDIATE_DIRS = new Set(['partial_movie_files', 'texts', 'Tex']);
+const INTERMEDIATE_MIN_AGE = 60 * 60 * 1000;
+
+const active = new Set();
+let gcTimer = null;
+
+const stats = {
+    created: 0,
+    removed: 0,
+    collections: 0,
+    orphansRemoved: 0,
+    intermediatesRemoved: 0,
+    streamsRemoved: 0,
+    bytesFreed: 0
+};
+
+/**
+ * Create an isolated scratch folder for one render.
+ * Call release() when the job is over, whatever its outcome.
+ * @param {string} label - readable prefix (lesson id, doubt stem)
+ * @returns {{dir: string, release: Function}}
+ */
+function createScratch(label) {
+    const safeLabel = String(label || 'render').replace(/[^\w.-]+/g, '_').substring(0, 80);
+    const dir = path.join(SCRATCH_DIR, `${safeLabel}.${process.pid}.${Date.now()}.${Math.random().toString(36).substr(2, 6)}`);
+    fs.mkdirSync(dir, { recursive: true });
+    active.add(dir);
+    stats.created++;
+
+    let released = false;
+    return {
+        dir,
+        release() {
+            if (released) return;
+            released = true;
+            active.delete(dir);
+            removeTree(dir);
+            stats.removed++;
+        }
+    };
+}
+
+/**
+ * Run fn(dir) with a scratch folder that is removed afterwards
+ */
+async function withScratch(label, fn) {
+    const scratch = createScratch(label);
+    try {
+        return await fn(scratch.dir);
+    } finally {
+        scratch.release();
+    }
+}
+
+function treeSize(target) {
+    let size = 0;
+    try {
+        const stat = fs.lstatSync(target);
+        if (!stat.isDirectory()) return stat.size;
+        for (const name of fs.readdirSync(target)) size += treeSize(path.join(target, name));
+    } catch (e) {}
+    return size;
+}
+
+function removeTree(target) {
+    const size = treeSize(target);
+    try {
+        fs.rmSync(target, { recursive: true, force: true });
+        stats.bytesFreed += size;
+        return true;
+    } catch (e) {
+        console.log(`⚠️ Could not remove ${target}: ${e.message}`);
+        return false;
+    }
+}
+
+function processAlive(pid) {
+    try {
+        process.kill(pid, 0);
+        return true;
+    } catch (e) {
+        return e.code === 'EPERM';
+    }
+}
+
+/**
+ * Scratch folders no live render owns: left by a crashed process, or too old to be running
+ */
+function collectOrphans(now) {
+    if (!fs.existsSync(SCRATCH_DIR)) return;
+    for (const name of fs.readdirSync(SCRATCH_DIR)) {
+        const dir = path.join(SCRATCH_DIR, name);
+        if (active.has(dir)) continue;
+        const pid = parseInt(name.split('.').slice(-3)[0], 10);
+        let mtime = 0;
+        try { mtime = fs.statSync(dir).mtimeMs; } catch (e) { continue; }
+        const abandoned = pid !== process.pid && !(pid > 0 && processAlive(pid));
+        if ((abandoned || now - mtime > SCRATCH_MAX_AGE) && removeTree(dir)) {
+            stats.orphansRemoved++;
+        }
+    }
+}
+
+/**
+ * HLS stream folders no stream of this process owns (left by a restart
+ * before their removal was due), once older than the stream grace period
+ */
+function collectStreams(now) {
+    if (!fs.existsSync(HLS_DIR)) return;
+    for (const name of fs.readdirSync(HLS_DIR)) {
+        if (isStreamActive(name)) continue;
+        const dir = path.join(HLS_DIR, name);
+        let mtime = 0;
+        try { mtime = fs.statSync(dir).mtimeMs; } catch (e) { continue; }
+        if (now - mtime > HLS_RETAIN && removeTree(dir)) stats.streamsRemoved++;
+    }
+}
+
+/**
+ * partial_movie_files/, texts/ and Tex/ (plus stale staging files) left
+ * next to published videos by older renders
+ */
+function collectIntermediates(dir, now, depth = 0) {
+    if (depth > 6 || !fs.existsSync(dir)) return;
+    for (const item of fs.readdirSync(dir, { withFileTypes: true })) {
+        const target = path.join(dir, item.name);
+        let mtime = 0;
+        try { mtime = fs.statSync(target).mtimeMs; } catch (e) { continue; }
+        const old = now - mtime > INTERMEDIATE_MIN_AGE;
+
+        if (item.isDirectory()) {
+            if (INTERMEDIATE_DIRS.has(item.name)) {
+                if (old && removeTree(target)) stats.intermediatesRemoved++;
+            } else {
+                collectIntermediates(target, now, depth + 1);
+            }
+        } else if (old && (item.name.endsWith('.tmp') || item.name.endsWith('.narrated.mp4'))) {
+            if (removeTree(target)) stats.intermediatesRemoved++;
+        }
+    }
+}
+
+/**
+ * One garbage collection pass over scratch folders, finished HLS streams
+ * and legacy media trees
+ */
+function collectScratch() {
+    const now = Date.now();
+    const freedBefore = stats.bytesFreed;
+    try {
+        collectOrphans(now);
+        collectStreams(now);
+        if (COLLECT_LEGACY) LEGACY_ROOTS.forEach(root => collectIntermediates(root, now));
+    } catch (error) {
+        console.log(`⚠️ Render scratch collection failed: ${error.message}`);
+    }
+    stats.collections++;
+    const freed = stats.bytesFreed - freedBefore;
+    if (freed > 0) {
+        console.log(`🧹 Render scratch collection freed ${(freed / 1024 / 1024).toFixed(1)} MB`);
+    }
+    return freed;
+}
+
+/**
+ * Collect once now and then every RENDER_GC_INTERVAL_MIN minutes
+ */
+function startScratchCollector() {
+    if (gcTimer) return;
+    setImmediate(collectScratch);
+    gcTimer = setInterval(collectScratch, GC_INTERVAL);
+    gcTimer.unref();
+}
+
+function getScratchStats() {
+    return {
+        dir: SCRATCH_DIR,
+        active: active.size,
+        ...stats
+    };
+}
+
+module.exports = {
+    SCRATCH_DIR,
+    createScratch,
+    withScratch,
+    collectScratch,
+    startScratchCollector,
+    getScratchStats
+};
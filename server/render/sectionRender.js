@@ -0,0 +1,101 @@
+const fs = require('fs');
+const path = require('path');
+const { submitJob, submitRender } = require('./workerPool');
+const { concatVideos } = require('./ffmpeg');
+const { renderFragment } = require('./fragments');
+
+/**
+ * Render a lesson by splitting it at its "# Section N" markers, rendering
+ * the sections in parallel on the worker pool and joining them with an
+ * ffmpeg stream-copy concat. Falls back to a whole-scene render whenever
+ * the script cannot be split safely or a section fails.
+ *
+ * With job.fragments the title card, section headers and outro are split
+ * off too and come from the fragment cache (see fragments.js), so only the
+ * parts that differ from earlier renders are rendered. job.sections: false
+ * ignores the "# Section N" markers and only cuts out fragments.
+ *
+ * job.onEvent receives the sections' animation events tagged with their
+ * section index, a 'section-done' event as each section finishes, and a
+ * 'reset' event if the render falls back to a whole-scene render.
+ */
+async function renderInSections(job) {
+    const started = Date.now();
+    const onEvent = job.onEvent;
+    const fallback = () => {
+        if (onEvent) onEvent({ event: 'reset' });
+        return submitRender(job);
+    };
+    // The section script is an intermediate too, so it goes to the job's media (scratch) folder
+    const partsScript = path.join(job.mediaDir, path.basename(job.scriptPath).replace(/\.py$/, '') + '_sections.py');
+
+    const plan = await submitJob({
+        action: 'split',
+        scriptPath: job.scriptPath,
+        sceneName: job.sceneName,
+        outputPath: partsScript,
+        sections: job.sections !== false,
+        fragments: !!job.fragments
+    }, { timeoutMs: 30000, priority: job.priority });
+
+    if (!plan.success || !plan.splittable) {
+        console.log(`🎞️ Rendering ${job.sceneName} as one scene (${plan.reason || plan.error || 'not splittable'})`);
+        return submitRender(job);
+    }
+
+    const fragments = plan.parts.filter(part => part.fragment).length;
+    console.log(`🎞️ Rendering ${job.sceneName} as ${plan.parts.length} parallel sections${fragments ? ` (${fragments} reusable fragments)` : ''}`);
+
+    const results = await Promise.all(plan.parts.map(async (part, section) => {
+        const sectionEvent = onEvent && (event => onEvent({ ...event, section }));
+        const renderPart = () => submitRender({
+            ...job,
+            scriptPath: plan.scriptPath,
+            sceneName: part.sceneName,
+            onEvent: sectionEvent
+        });
+        let result = part.fragment ? await renderFragment(job, part.fragment, sectionEvent) : await renderPart();
+        if (part.fragment && !result.success) {
+            // The parts script still has the card as an ordinary sub-scene
+            console.log(`⚠️ Fragment ${part.fragment.kind} failed (${result.error}), rendering it from the script`);
+            result = await renderPart();
+        }
+        if (onEvent && result.success) onEvent({ event: 'section-done', section });
+        return result;
+    }));
+
+    const failed = results.find(result => !result.success || !result.videoPath);
+    if (failed) {
+        console.log(`⚠️ Section render failed (${failed.error}), falling back to whole-scene render`);
+        return fallback();
+    }
+
+    const outputPath = path.join(job.mediaDir, 'videos', `${job.sceneName}_${job.quality || 'l'}.mp4`);
+    const joined = await concatVideos(results.map(result => result.videoPath), outputPath);
+    if (!joined.success) {
+        console.log(`⚠️ Section concat failed (${joined.error}), falling back to whole-scene render`);
+        return fallback();
+    }
+
+    try { fs.unlinkSync(plan.scriptPath); } catch (e) {}
+
+    const cpuMs = results.reduce((sum, result) => sum + (result.elapsedMs || 0), 0);
+    return {
+        success: true,
+        videoPath: outputPath,
+        sceneName: job.sceneName,
+        sections: plan.parts.map(({ fragment, ...part }, i) => ({
+            ...part,
+            fragment: fragment ? fragment.kind : undefined,
+            cached: results[i].cached || undefined,
+            elapsedMs: results[i].elapsedMs
+        })),
+        stderr: results.map(result => result.stderr).join(''),
+        elapsedMs: Date.now() - started,
+        renderMs: cpuMs
+    };
+}
+
+module.exports = {
+    renderInSections
+};
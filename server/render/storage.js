@@ -0,0 +1,330 @@
+const fs = require('fs');
+const path = require('path');
+const { hashFile, listRenderEntries, removeRenderEntry } = require('./manifest');
+
+// ==================== STORAGE MANAGER CONFIGURATION ====================
+// Generated scripts, audio and videos share one disk budget. Files still
+// referenced by a Lesson or Doubt are never evicted; identical media files
+// are hard-linked to a single copy.
+const STORAGE_MAX_BYTES = (parseInt(process.env.STORAGE_MAX_MB, 10) || 10240) * 1024 * 1024;
+const MIN_AGE = (parseFloat(process.env.STORAGE_MIN_AGE_HOURS) || 24) * 60 * 60 * 1000;
+const MAX_AGE_DAYS = parseFloat(process.env.STORAGE_MAX_AGE_DAYS || '30');
+const SWEEP_INTERVAL = (parseInt(process.env.STORAGE_SWEEP_INTERVAL_MIN, 10) || 60) * 60 * 1000;
+
+const SERVER_DIR = path.join(__dirname, '..');
+const PUBLIC_VIDEOS_DIR = path.join(SERVER_DIR, '..', 'client', 'public', 'videos');
+
+// Only generated entries are managed (committed samples next to them are left alone)
+const CATEGORIES = {
+    lessonScripts: { dir: path.join(SERVER_DIR, 'manim_scripts'), match: /^lesson_.*\.py$/ },
+    lessonVideos: { dir: PUBLIC_VIDEOS_DIR, match: /^lesson_/ },
+    doubtScripts: { dir: path.join(SERVER_DIR, 'output', 'manim'), match: /^doubt_.*\.py$/ },
+    doubtVideos: { dir: path.join(SERVER_DIR, 'output', 'videos'), match: /^doubt_/ },
+    audio: { dir: path.join(SERVER_DIR, 'output', 'audio'), match: /^(doubt_|lesson_)/ }
+};
+const DEDUP_EXTENSIONS = new Set(['.mp4', '.m4a', '.mp3', '.wav']);
+
+// Public URL prefixes and the folders that serve them
+const URL_ROOTS = {
+    '/videos/': [path.join(SERVER_DIR, 'output', 'videos'), PUBLIC_VIDEOS_DIR],
+    '/audio/': [path.join(SERVER_DIR, 'output', 'audio')]
+};
+
+let referenceSource = null;
+let sweepTimer = null;
+let sweeping = null;
+// path -> { size, mtimeMs, hash } so unchanged files are hashed once
+const hashes = new Map();
+
+const stats = {
+    sweeps: 0,
+    evictedFiles: 0,
+    evictedBytes: 0,
+    dedupedFiles: 0,
+    dedupedBytes: 0,
+    lastSweep: null
+};
+
+/**
+ * Register the function that lists what the database still references.
+ * fn() resolves to { urls: [], paths: [] }, or null when it cannot tell
+ * (eviction is then skipped for that sweep).
+ */
+function registerReferenceSource(fn) {
+    referenceSource = fn;
+}
+
+/**
+ * Files a public URL may be served from
+ */
+function urlToPaths(url) {
+    if (!url) return [];
+    const clean = url.split('?')[0];
+    for (const [prefix, roots] of Object.entries(URL_ROOTS)) {
+        if (clean.startsWith(prefix)) {
+            return roots.map(root => path.join(root, decodeURIComponent(clean.slice(prefix.length))));
+        }
+    }
+    return [];
+}
+
+async function loadReferences() {
+    if (!referenceSource) return null;
+    try {
+        const refs = await referenceSource();
+        if (!refs) return null;
+        const referenced = new Set();
+        (refs.urls || []).forEach(url => urlToPaths(url).forEach(p => referenced.add(path.resolve(p))));
+        (refs.paths || []).filter(Boolean).forEach(p => referenced.add(path.resolve(p)));
+        return referenced;
+    } catch (error) {
+        console.log(`⚠️ Could not load storage references: ${error.message}`);
+        return null;
+    }
+}
+
+function walkFiles(target, files) {
+    let stat;
+    try { stat = fs.lstatSync(target); } catch (e) { return; }
+    if (stat.isDirectory()) {
+        for (const name of fs.readdirSync(target)) walkFiles(path.join(target, name), files);
+    } else if (stat.isFile()) {
+        files.push({
+            path: target,
+            size: stat.size,
+            dev: stat.dev,
+            ino: stat.ino,
+            mtimeMs: stat.mtimeMs,
+            lastUsed: Math.max(stat.atimeMs, stat.mtimeMs)
+        });
+    }
+}
+
+/**
+ * Every managed file, tagged with its category
+ */
+function scanManagedFiles() {
+    const files = [];
+    for (const [category, { dir, match }] of Object.entries(CATEGORIES)) {
+        if (!fs.existsSync(dir)) continue;
+        for (const name of fs.readdirSync(dir)) {
+            if (!match.test(name)) continue;
+            const found = [];
+            walkFiles(path.join(dir, name), found);
+            found.forEach(file => files.push({ ...file, category }));
+        }
+    }
+    return files;
+}
+
+/**
+ * Remove now-empty folders up to (not including) the category root
+ */
+function pruneEmptyDirs(filePath, root) {
+    let dir = path.dirname(filePath);
+    while (dir.startsWith(root + path.sep)) {
+        try {
+            fs.rmdirSync(dir);
+        } catch (e) {
+            return;
+        }
+        dir = path.dirname(dir);
+    }
+}
+
+/**
+ * Delete unreferenced files: everything past STORAGE_MAX_AGE_DAYS, then the
+ * least recently used until the managed files fit the budget
+ */
+function evict(files, referenced, now) {
+    const manifestByPath = new Map(listRenderEntries().map(entry => [path.resolve(entry.path), entry.renderId]));
+    // Hard links share their bytes, so usage is counted per inode
+    const links = new Map();
+    let total = 0;
+    for (const file of files) {
+        const inode = `${file.dev}:${file.ino}`;
+        if (!links.has(inode)) total += file.size;
+        links.set(inode, (links.get(inode) || 0) + 1);
+    }
+    const candidates = files
+        .filter(file => !referenced.has(path.resolve(file.path)) && now - file.lastUsed > MIN_AGE)
+        .sort((a, b) => a.lastUsed - b.lastUsed);
+
+    const removed = [];
+    for (const file of candidates) {
+        const expired = MAX_AGE_DAYS > 0 && now - file.lastUsed > MAX_AGE_DAYS * 24 * 60 * 60 * 1000;
+        if (!expired && total <= STORAGE_MAX_BYTES) continue;
+        try {
+            fs.unlinkSync(file.path);
+        } catch (e) {
+            continue;
+        }
+        const inode = `${file.dev}:${file.ino}`;
+        links.set(inode, links.get(inode) - 1);
+        if (links.get(inode) === 0) total -= file.size;
+        hashes.delete(file.path);
+        const renderId = manifestByPath.get(path.resolve(file.path));
+        if (renderId) removeRenderEntry(renderId);
+        pruneEmptyDirs(file.path, CATEGORIES[file.category].dir);
+        removed.push(file);
+        stats.evictedFiles++;
+        stats.evictedBytes += file.size;
+    }
+    if (removed.length > 0) {
+        console.log(`🧹 Storage: evicted ${removed.length} files (${(removed.reduce((s, f) => s + f.size, 0) / 1024 / 1024).toFixed(1)} MB)`);
+    }
+    return removed;
+}
+
+async function contentHash(file) {
+    const known = hashes.get(file.path);
+    if (known && known.size === file.size && known.mtimeMs === file.mtimeMs) return known.hash;
+    const hash = await hashFile(file.path);
+    hashes.set(file.path, { size: file.size, mtimeMs: file.mtimeMs, hash });
+    return hash;
+}
+
+/**
+ * Hard-link identical media files to one copy. Only files of equal size
+ * are hashed; the duplicate is replaced by an atomic rename of the link.
+ */
+async function dedup(files) {
+    const bySize = new Map();
+    for (const file of files) {
+        if (!DEDUP_EXTENSIONS.has(path.extname(file.path).toLowerCase()) || file.size === 0) continue;
+        if (!bySize.has(file.size)) bySize.set(file.size, []);
+        bySize.get(file.size).push(file);
+    }
+
+    // Published videos already carry their hash in the manifest
+    for (const entry of listRenderEntries()) {
+        const stat = (() => { try { return fs.statSync(entry.path); } catch (e) { return null; } })();
+        if (stat && entry.hash && stat.size === entry.size && !hashes.has(entry.path)) {
+            hashes.set(entry.path, { size: stat.size, mtimeMs: stat.mtimeMs, hash: entry.hash });
+        }
+    }
+
+    let linked = 0;
+    for (const group of bySize.values()) {
+        const inodes = new Set(group.map(file => `${file.dev}:${file.ino}`));
+        if (inodes.size < 2) continue;
+
+        const byHash = new Map();
+        for (const file of group) {
+            try {
+                const hash = await contentHash(file);
+                if (!byHash.has(hash)) byHash.set(hash, []);
+                byHash.get(hash).push(file);
+            } catch (e) {}
+        }
+
+        for (const same of byHash.values()) {
+            const keep = same[0];
+            for (const file of same.slice(1)) {
+                if (file.dev !== keep.dev || file.ino === keep.ino) continue;
+                const tempPath = `${file.path}.dedup.tmp`;
+                try {
+                    fs.linkSync(keep.path, tempPath);
+                    fs.renameSync(tempPath, file.path);
+                    file.ino = keep.ino;
+                    linked++;
+                    stats.dedupedFiles++;
+                    stats.dedupedBytes += file.size;
+                } catch (e) {
+                    try { fs.unlinkSync(tempPath); } catch (err) {}
+                }
+            }
+        }
+    }
+    if (linked > 0) console.log(`🔗 Storage: hard-linked ${linked} duplicate media files`);
+    return linked;
+}
+
+/**
+ * One storage pass: dedup, then evict to the budget (only when the
+ * database references are known)
+ */
+async function sweepStorage() {
+    if (sweeping) return sweeping;
+    sweeping = (async () => {
+        const now = Date.now();
+        const referenced = await loadReferences();
+        const files = scanManagedFiles();
+        const deduped = await dedup(files);
+        const evicted = referenced ? evict(files, referenced, now) : [];
+        if (!referenced) console.log('⚠️ Storage: references unavailable, skipping eviction');
+
+        stats.sweeps++;
+        stats.lastSweep = {
+            at: now,
+            elapsedMs: Date.now() - now,
+            files: files.length,
+            deduped,
+            evicted: evicted.length,
+            evictionSkipped: !referenced
+        };
+        return stats.lastSweep;
+    })().finally(() => { sweeping = null; });
+    return sweeping;
+}
+
+/**
+ * Disk usage per category (distinct inodes, so hard links count once)
+ */
+async function getStorageReport() {
+    const referenced = await loadReferences();
+    const files = scanManagedFiles();
+    const seen = new Set();
+    const referencedInodes = new Set(files
+        .filter(file => referenced && referenced.has(path.resolve(file.path)))
+        .map(file => `${file.dev}:${file.ino}`));
+    const categories = {};
+    let totalBytes = 0;
+
+    for (const category of Object.keys(CATEGORIES)) {
+        categories[category] = { dir: CATEGORIES[category].dir, files: 0, bytes: 0, referencedBytes: 0, linkedFiles: 0 };
+    }
+    for (const file of files) {
+        const usage = categories[file.category];
+        usage.files++;
+        const inode = `${file.dev}:${file.ino}`;
+        if (seen.has(inode)) {
+            usage.linkedFiles++;
+            continue;
+        }
+        seen.add(inode);
+        usage.bytes += file.size;
+        totalBytes += file.size;
+        if (referencedInodes.has(inode)) usage.referencedBytes += file.size;
+    }
+
+    return {
+        totalBytes,
+        maxBytes: STORAGE_MAX_BYTES,
+        minAgeHours: MIN_AGE / 3600000,
+        maxAgeDays: MAX_AGE_DAYS,
+        referencesKnown: !!referenced,
+        categories,
+        ...stats
+    };
+}
+
+/**
+ * Sweep shortly after start-up and then every STORAGE_SWEEP_INTERVAL_MIN minutes
+ */
+function startStorageManager() {
+    if (sweepTimer) return;
+    const run = () => sweepStorage().catch(error => console.log(`⚠️ Storage sweep failed: ${error.message}`));
+    setTimeout(run, 60000).unref();
+    sweepTimer = setInterval(run, SWEEP_INTERVAL);
+    sweepTimer.unref();
+}
+
+module.exports = {
+    CATEGORIES,
+    registerReferenceSource,
+    urlToPaths,
+    sweepStorage,
+    getStorageReport,
+    startStorageManager
+};
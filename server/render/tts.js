@@ -0,0 +1,408 @@
+const { spawn } = require('child_process');
+const crypto = require('crypto');
+const fs = require('fs');
+const path = require('path');
+const { runFfmpeg, probeDuration, concatListEntry } = require('./ffmpeg');
+const { renderEnv } = require('./workerPool');
+
+// ==================== TTS CONFIGURATION ====================
+// Text is spoken sentence by sentence; each sentence is cached on disk per (backend, voice, rate)
+const TTS_BACKEND = process.env.TTS_BACKEND || 'edge';
+const TTS_VOICE = process.env.TTS_VOICE || null;        // backend default voice when unset
+const TTS_RATE = process.env.TTS_RATE || '+0%';
+const TTS_CONCURRENCY = parseInt(process.env.TTS_CONCURRENCY, 10) || 4;
+const TTS_TIMEOUT = 60000;
+const CACHE_DIR = process.env.TTS_CACHE_DIR || path.join(__dirname, '..', 'output', 'tts_cache');
+const MAX_CACHE_BYTES = (parseInt(process.env.TTS_CACHE_MAX_MB, 10) || 512) * 1024 * 1024;
+const MAX_SENTENCE_CHARS = 300;
+
+// In-memory index, ordered from least to most recently used
+const entries = new Map();
+const inFlight = new Map();
+const waiting = [];
+let active = 0;
+let totalBytes = 0;
+let loaded = false;
+
+const stats = {
+    hits: 0,
+    misses: 0,
+    coalesced: 0,
+    failures: 0,
+    evictions: 0,
+    synthesizedChars: 0,
+    synthesisMs: 0
+};
+
+/**
+ * Run a child process and collect its output
+ */
+function runProcess(command, args, timeoutMs = TTS_TIMEOUT) {
+    return new Promise((resolve) => {
+        const child = spawn(command, args, { env: renderEnv(), windowsHide: true });
+        let stderr = '';
+        const timer = setTimeout(() => child.kill('SIGKILL'), timeoutMs);
+
+        child.stderr.on('data', (data) => { stderr += data.toString(); });
+        child.on('error', (error) => {
+            clearTimeout(timer);
+            resolve({ success: false, error: `${path.basename(command)} not available: ${error.message}` });
+        });
+        child.on('close', (code) => {
+            clearTimeout(timer);
+            resolve({
+                success: code === 0,
+                error: code === 0 ? undefined : `${path.basename(command)} exited with code ${code}: ${stderr.substring(0, 200)}`
+            });
+        });
+    });
+}
+
+/**
+ * "+10%" / "-20%" -> 1.1 / 0.8
+ */
+function rateFactor(rate) {
+    const match = /^([+-]?\d+(?:\.\d+)?)%$/.exec(String(rate || '').trim());
+    return match ? Math.max(0.25, 1 + parseFloat(match[1]) / 100) : 1;
+}
+
+/**
+ * edge-tts from the project virtual environment, or the module on the system python
+ */
+function edgeTtsCommand() {
+    const venvPath = path.join(__dirname, '..', '..', '.venv');
+    const isWindows = process.platform === 'win32';
+    const edgeTtsPath = isWindows
+        ? path.join(venvPath, 'Scripts', 'edge-tts.exe')
+        : path.join(venvPath, 'bin', 'edge-tts');
+    if (fs.existsSync(edgeTtsPath)) {
+        return { command: edgeTtsPath, args: [] };
+    }
+    const pythonPath = isWindows
+        ? path.join(venvPath, 'Scripts', 'python.exe')
+        : path.join(venvPath, 'bin', 'python');
+    return { command: fs.existsSync(pythonPath) ? pythonPath : 'python', args: ['-m', 'edge_tts'] };
+}
+
+/**
+ * Speech backends. synthesize(text, { voice, rate }, outputPath) resolves to
+ * { success, error }; every file a backend writes uses its `extension`, so
+ * sentences from one backend can be joined by stream copy.
+ */
+const backends = {
+    // Microsoft Edge online voices (needs network access)
+    edge: {
+        extension: 'mp3',
+        synthesize(text, { voice, rate }, outputPath) {
+            const { command, args } = edgeTtsCommand();
+            const ttsArgs = [...args, '--text', text, '--write-media', outputPath, `--rate=${rate}`];
+            if (voice) ttsArgs.push('--voice', voice);
+            return runProcess(command, ttsArgs);
+        }
+    },
+    // eSpeak NG, fully offline
+    espeak: {
+        extension: 'wav',
+        async synthesize(text, { voice, rate }, outputPath) {
+            const args = ['-v', voice || 'en', '-s', String(Math.round(175 * rateFactor(rate))), '-w', outputPath, text];
+            const result = await runProcess('espeak-ng', args);
+            return result.success ? result : runProcess('espeak', args);
+        }
+    },
+    // Stand-in engine for tests and air-gapped installs: silence as long as
+    // the sentence would take to read aloud (about 150 words per minute)
+    local: {
+        extension: 'wav',
+        synthesize(text, { rate }, outputPath) {
+            const words = text.split(/\s+/).filter(Boolean).length;
+            const seconds = Math.max(0.5, (words / 2.5) / rateFactor(rate));
+            return runFfmpeg([
+                '-y',
+                '-f', 'lavfi',
+                '-i', 'anullsrc=r=24000:cl=mono',
+                '-t', seconds.toFixed(2),
+                '-c:a', 'pcm_s16le',
+                outputPath
+            ]);
+        }
+    }
+};
+
+/**
+ * Add or replace a speech backend ({ extension, synthesize(text, options, outputPath) })
+ */
+function registerTtsBackend(name, backend) {
+    backends[name] = backend;
+}
+
+/**
+ * Split narration into sentences (long ones are cut at commas or spaces)
+ */
+function splitSentences(text) {
+    const sentences = String(text || '')
+        .replace(/\s+/g, ' ')
+        .split(/(?<=[.!?।])(?<!\b(?:e\.g|i\.e|etc|vs|Mr|Mrs|Dr|St|No)\.)\s+(?=\S)/)
+        .map(sentence => sentence.trim())
+        .filter(sentence => /[\p{L}\p{N}]/u.test(sentence));
+
+    const chunks = [];
+    for (let sentence of sentences) {
+        while (sentence.length > MAX_SENTENCE_CHARS) {
+            const head = sentence.substring(0, MAX_SENTENCE_CHARS);
+            const cut = Math.max(head.lastIndexOf(', '), head.lastIndexOf(' '));
+            const at = cut > MAX_SENTENCE_CHARS / 2 ? cut + 1 : MAX_SENTENCE_CHARS;
+            chunks.push(sentence.substring(0, at).trim());
+            sentence = sentence.substring(at).trim();
+        }
+        if (sentence) chunks.push(sentence);
+    }
+    return chunks;
+}
+
+// ---------------------------------------------------------------- cache
+
+function loadIndex() {
+    if (loaded) return;
+    loaded = true;
+
+    if (!fs.existsSync(CACHE_DIR)) {
+        fs.mkdirSync(CACHE_DIR, { recursive: true });
+        return;
+    }
+
+    const metas = [];
+    for (const file of fs.readdirSync(CACHE_DIR)) {
+        if (!file.endsWith('.json')) continue;
+        try {
+            const meta = JSON.parse(fs.readFileSync(path.join(CACHE_DIR, file), 'utf-8'));
+            if (fs.existsSync(audioPathFor(meta.key, meta.extension))) metas.push(meta);
+        } catch (e) {
+            // Ignore unreadable metadata, the sentence will simply be synthesized again
+        }
+    }
+
+    metas.sort((a, b) => a.lastAccess - b.lastAccess);
+    for (const meta of metas) {
+        entries.set(meta.key, meta);
+        totalBytes += meta.size;
+    }
+    console.log(`🗄️ TTS cache loaded: ${entries.size} sentences, ${(totalBytes / 1024 / 1024).toFixed(1)} MB`);
+}
+
+function audioPathFor(key, extension) {
+    return path.join(CACHE_DIR, `${key}.${extension}`);
+}
+
+function metaPathFor(key) {
+    return path.join(CACHE_DIR, `${key}.json`);
+}
+
+function sentenceKey(sentence, backend, voice, rate) {
+    return crypto.createHash('sha256')
+        .update(sentence)
+        .update('\0' + backend)
+        .update('\0' + (voice || 'default'))
+        .update('\0' + rate)
+        .digest('hex');
+}
+
+function writeMeta(meta) {
+    fs.writeFileSync(metaPathFor(meta.key), JSON.stringify(meta));
+}
+
+function getCachedSentence(key) {
+    loadIndex();
+    const meta = entries.get(key);
+    if (!meta) return null;
+
+    const audioPath = audioPathFor(key, meta.extension);
+    if (!fs.existsSync(audioPath)) {
+        entries.delete(key);
+        totalBytes -= meta.size;
+        return null;
+    }
+
+    entries.delete(key);
+    meta.lastAccess = Date.now();
+    meta.hits = (meta.hits || 0) + 1;
+    entries.set(key, meta);
+    try { writeMeta(meta); } catch (e) {}
+    return { ...meta, path: audioPath };
+}
+
+function storeSentence(key, tempPath, metadata) {
+    const audioPath = audioPathFor(key, metadata.extension);
+    fs.renameSync(tempPath, audioPath);
+
+    const previous = entries.get(key);
+    if (previous) {
+        entries.delete(key);
+        totalBytes -= previous.size;
+    }
+    const meta = {
+        ...metadata,
+        key,
+        size: fs.statSync(audioPath).size,
+        createdAt: Date.now(),
+        lastAccess: Date.now(),
+        hits: 0
+    };
+    writeMeta(meta);
+    entries.set(key, meta);
+    totalBytes += meta.size;
+    evictToBudget(key);
+    return { ...meta, path: audioPath };
+}
+
+/**
+ * Drop least recently used sentences until the cache fits its size budget
+ */
+function evictToBudget(keep) {
+    for (const [key, meta] of entries) {
+        if (totalBytes <= MAX_CACHE_BYTES) break;
+        if (key === keep) continue;
+        entries.delete(key);
+        totalBytes -= meta.size;
+        stats.evictions++;
+        try { fs.unlinkSync(audioPathFor(key, meta.extension)); } catch (e) {}
+        try { fs.unlinkSync(metaPathFor(key)); } catch (e) {}
+    }
+}
+
+// ---------------------------------------------------------------- synthesis
+
+async function withSlot(task) {
+    if (active >= TTS_CONCURRENCY) {
+        await new Promise(resolve => waiting.push(resolve));
+    }
+    active++;
+    try {
+        return await task();
+    } finally {
+        active--;
+        if (waiting.length > 0) waiting.shift()();
+    }
+}
+
+/**
+ * Audio for one sentence: from the cache, or synthesized (once, even when
+ * several narrations ask for it at the same time)
+ */
+function sentenceAudio(sentence, { backend, voice, rate }) {
+    const engine = backends[backend];
+    const key = sentenceKey(sentence, backend, voice, rate);
+
+    const cached = getCachedSentence(key);
+    if (cached) {
+        stats.hits++;
+        return Promise.resolve({ ...cached, cached: true });
+    }
+    if (inFlight.has(key)) {
+        stats.coalesced++;
+        return inFlight.get(key);
+    }
+
+    stats.misses++;
+    const promise = withSlot(async () => {
+        const tempPath = path.join(CACHE_DIR, `${key}.${process.pid}.tmp.${engine.extension}`);
+        const started = Date.now();
+        const result = await engine.synthesize(sentence, { voice, rate }, tempPath);
+        const duration = result.success && fs.existsSync(tempPath) ? await probeDuration(tempPath) : null;
+        if (!duration) {
+            stats.failures++;
+            try { fs.unlinkSync(tempPath); } catch (e) {}
+            throw new Error(result.error || `${backend} produced no audio`);
+        }
+        stats.synthesizedChars += sentence.length;
+        stats.synthesisMs += Date.now() - started;
+        return storeSentence(key, tempPath, { backend, voice, rate, extension: engine.extension, duration, text: sentence });
+    }).finally(() => inFlight.delete(key));
+
+    inFlight.set(key, promise);
+    return promise;
+}
+
+/**
+ * Speak `text` into one audio file.
+ *
+ * The text is split into sentences; cached sentences are reused, the rest
+ * are synthesized concurrently, and the pieces are joined by stream copy
+ * (no re-encode). `outputBase` is the path without extension, the backend
+ * decides the format.
+ *
+ * @returns {Promise<{success, path, duration, sentences, cachedSentences, error}>}
+ */
+async function synthesize(text, outputBase, { backend = TTS_BACKEND, voice = TTS_VOICE, rate = TTS_RATE } = {}) {
+    const engine = backends[backend];
+    if (!engine) {
+        return { success: false, error: `Unknown TTS backend: ${backend}` };
+    }
+    loadIndex();
+
+    const sentences = splitSentences(text);
+    if (sentences.length === 0) {
+        return { success: false, error: 'Nothing to speak' };
+    }
+
+    let pieces;
+    try {
+        pieces = await Promise.all(sentences.map(sentence => sentenceAudio(sentence, { backend, voice, rate })));
+    } catch (error) {
+        return { success: false, error: error.message };
+    }
+
+    const outputPath = `${outputBase}.${engine.extension}`;
+    fs.mkdirSync(path.dirname(outputPath), { recursive: true });
+    try { fs.unlinkSync(outputPath); } catch (e) {}
+
+    if (pieces.length === 1) {
+        try {
+            fs.linkSync(pieces[0].path, outputPath);
+        } catch (e) {
+            fs.copyFileSync(pieces[0].path, outputPath);
+        }
+    } else {
+        const listPath = `${outputBase}.concat.txt`;
+        fs.writeFileSync(listPath, pieces.map(piece => concatListEntry(piece.path)).join('\n') + '\n');
+        const result = await runFfmpeg(['-y', '-f', 'concat', '-safe', '0', '-i', listPath, '-c', 'copy', outputPath]);
+        try { fs.unlinkSync(listPath); } catch (e) {}
+        if (!result.success) {
+            return { success: false, error: result.error };
+        }
+    }
+
+    const duration = pieces.length === 1 ? pieces[0].duration : await probeDuration(outputPath);
+    return {
+        success: true,
+        path: outputPath,
+        duration: duration || pieces.reduce((sum, piece) => sum + piece.duration, 0),
+        sentences: sentences.length,
+        cachedSentences: pieces.filter(piece => piece.cached).length
+    };
+}
+
+/**
+ * TTS cache status for monitoring
+ */
+function getTtsStats() {
+    loadIndex();
+    return {
+        backend: TTS_BACKEND,
+        voice: TTS_VOICE,
+        rate: TTS_RATE,
+        backends: Object.keys(backends),
+        entries: entries.size,
+        totalBytes,
+        maxBytes: MAX_CACHE_BYTES,
+        active,
+        queued: waiting.length,
+        ...stats
+    };
+}
+
+module.exports = {
+    synthesize,
+    splitSentences,
+    registerTtsBackend,
+    getTtsStats
+};
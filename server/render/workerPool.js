@@ -0,0 +1,390 @@
+const { spawn } = require('child_process');
+const readline = require('readline');
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+
+// ==================== RENDER POOL CONFIGURATION ====================
+// Long-lived Python workers that import manim once and render scenes on demand
+const WORKER_SCRIPT = path.join(__dirname, 'python', 'render_worker.py');
+const POOL_SIZE = parseInt(process.env.RENDER_WORKERS, 10) || os.cpus().length;
+const MAX_JOBS_PER_WORKER = parseInt(process.env.RENDER_WORKER_MAX_JOBS, 10) || 50;
+const DEFAULT_JOB_TIMEOUT = 10 * 60 * 1000; // 10 minutes
+// Write static pauses as one frame plus a duration (see python/static_holds.py)
+const STATIC_HOLDS = process.env.RENDER_STATIC_HOLDS !== '0';
+// Percent of the animation being rendered, from manim's progress bar on stderr
+const MANIM_PROGRESS = /Animation (\d+):[^\r\n]*?(\d+)%\|/g;
+
+// LaTeX/Tex SVGs shared by every worker and every render (see python/tex_cache.py)
+const TEX_DIR = process.env.RENDER_TEX_DIR || path.join(__dirname, '..', 'output', 'tex_cache');
+
+// Names exported by "from manim import *", written by the workers for python/preflight.py
+const MANIM_NAMES_FILE = process.env.MANIM_NAMES_FILE || path.join(__dirname, '..', 'output', 'manim_names.json');
+
+// FFmpeg path - required for Manim video rendering
+const FFMPEG_DIR = process.env.FFMPEG_DIR || 'C:\\Users\\asmit\\AppData\\Local\\Microsoft\\WinGet\\Packages\\Gyan.FFmpeg_Microsoft.Winget.Source_8wekyb3d8bbwe\\ffmpeg-8.0.1-full_build\\bin';
+
+const workers = [];
+const pendingJobs = [];
+let unavailable = null;
+let jobCounter = 0;
+let manimVersion = null;
+const versionWaiters = [];
+
+const stats = {
+    started: 0,
+    completed: 0,
+    failed: 0,
+    totalRenderMs: 0,
+    totalWaitMs: 0,
+    workerRestarts: 0,
+    texRequests: 0,
+    texCompiles: 0
+};
+
+/**
+ * Use the virtual environment Python if available, otherwise fall back to system python
+ */
+function resolvePythonPath() {
+    const venvPath = path.join(__dirname, '..', '..', '.venv');
+    const candidates = [
+        path.join(venvPath, 'Scripts', 'python.exe'),
+        path.join(venvPath, 'bin', 'python')
+    ];
+    return candidates.find(candidate => fs.existsSync(candidate)) || 'python';
+}
+
+/**
+ * Environment for render workers and ffmpeg (adds FFMPEG_DIR to PATH)
+ */
+function renderEnv() {
+    const envPath = process.env.PATH || '';
+    const newPath = fs.existsSync(FFMPEG_DIR) ? FFMPEG_DIR + path.delimiter + envPath : envPath;
+    return {
+        ...process.env,
+        PATH: newPath,
+        PYTHONUNBUFFERED: '1',
+        RENDER_TEX_DIR: TEX_DIR,
+        MANIM_NAMES_FILE
+    };
+}
+
+/**
+ * Spawn one render worker and wire up its protocol stream
+ */
+function spawnWorker(index) {
+    const worker = {
+        index,
+        process: null,
+        ready: false,
+        busy: false,
+        job: null,
+        jobsDone: 0,
+        manimVersion: null
+    };
+
+    const child = spawn(resolvePythonPath(), [WORKER_SCRIPT], {
+        stdio: ['pipe', 'pipe', 'pipe'],
+        env: renderEnv(),
+        windowsHide: true
+    });
+    worker.process = child;
+    child.stdin.on('error', () => {}); // exit handler reports the failure
+
+    readline.createInterface({ input: child.stdout }).on('line', (line) => {
+        let message;
+        try {
+            message = JSON.parse(line);
+        } catch (e) {
+            return;
+        }
+        handleWorkerMessage(worker, message);
+    });
+
+    child.stderr.on('data', (data) => {
+        const output = data.toString();
+        if (worker.job) {
+            worker.job.stderr += output;
+            // Manim's per-animation progress bar: "Animation 3: Write(...):  45%|####  | 9/20"
+            const bars = worker.job.onEvent ? [...output.matchAll(MANIM_PROGRESS)] : [];
+            if (bars.length > 0) {
+                const [, animation, percent] = bars[bars.length - 1];
+                emitJobEvent(worker.job, { event: 'progress', animation: Number(animation), percent: Number(percent) });
+            }
+        }
+        // Log progress from stderr (Manim writes progress here)
+        if (output.includes('Rendering') || output.includes('Writing') || output.includes('Animation')) {
+            console.log(`📹 [worker ${index}] ${output.trim()}`);
+        }
+    });
+
+    child.on('error', (error) => {
+        if (error.code === 'ENOENT') {
+            markUnavailable('Python not found in PATH. Ensure Python is installed and in PATH.');
+        }
+        console.error(`❌ Render worker ${index} failed to start: ${error.message}`);
+    });
+
+    child.on('exit', (code, signal) => handleWorkerExit(worker, code, signal));
+
+    workers[index] = worker;
+    return worker;
+}
+
+function handleWorkerMessage(worker, message) {
+    if (message.type === 'ready') {
+        worker.ready = true;
+        worker.manimVersion = message.manimVersion;
+        if (!manimVersion) {
+            manimVersion = message.manimVersion;
+            versionWaiters.splice(0).forEach(resolve => resolve(manimVersion));
+        }
+        console.log(`✅ Render worker ${worker.index} ready (manim ${message.manimVersion}, started in ${message.startupMs}ms)`);
+        dispatch();
+    } else if (message.type === 'fatal') {
+        markUnavailable(message.notInstalled
+            ? 'Manim module not found. Install with: pip install manim'
+            : `Render worker failed: ${message.error}`, message.notInstalled);
+    } else if (message.type === 'result' && worker.job && message.id === worker.job.id) {
+        finishJob(worker, message);
+    } else if (message.type === 'event' && worker.job && message.id === worker.job.id && worker.job.onEvent) {
+        emitJobEvent(worker.job, message);
+    }
+}
+
+function emitJobEvent(job, event) {
+    if (!job.onEvent) return;
+    try {
+        job.onEvent(event);
+    } catch (e) {
+        console.log(`⚠️ Render event handler failed: ${e.message}`);
+    }
+}
+
+function handleWorkerExit(worker, code, signal) {
+    const job = worker.job;
+    worker.ready = false;
+    worker.job = null;
+
+    if (job) {
+        clearTimeout(job.timer);
+        stats.failed++;
+        job.resolve({
+            success: false,
+            error: job.timedOut
+                ? `Rendering timed out after ${Math.round(job.timeoutMs / 1000)}s`
+                : `Render worker exited unexpectedly (code ${code}, signal ${signal})`,
+            stderr: job.stderr
+        });
+    }
+
+    if (workers[worker.index] !== worker || unavailable) return;
+
+    if (!worker.manimVersion) {
+        markUnavailable(`Render worker exited during start-up (code ${code}). Check the Python environment.`, false);
+        return;
+    }
+
+    stats.workerRestarts++;
+    spawnWorker(worker.index);
+}
+
+function markUnavailable(error, notInstalled = true) {
+    if (unavailable) return;
+    unavailable = { error, notInstalled };
+    console.log(`❌ ${error}`);
+    versionWaiters.splice(0).forEach(resolve => resolve(null));
+
+    while (pendingJobs.length > 0) {
+        const job = pendingJobs.shift();
+        job.resolve({ success: false, error, notInstalled });
+    }
+}
+
+function finishJob(worker, message) {
+    const job = worker.job;
+    clearTimeout(job.timer);
+    worker.job = null;
+    worker.busy = false;
+    worker.jobsDone++;
+
+    stats.totalRenderMs += Date.now() - job.dispatchedAt;
+    if (message.success) {
+        stats.completed++;
+    } else {
+        stats.failed++;
+    }
+    stats.texRequests += message.texRequests || 0;
+    stats.texCompiles += message.texCompiles || 0;
+
+    const { type, id, ...result } = message;
+    job.resolve({
+        ...result,
+        videoPath: message.videoPath || null,
+        error: message.success ? undefined : `Rendering failed: ${message.error}`,
+        stderr: job.stderr
+    });
+
+    // Recycle long-running workers to keep memory flat
+    if (worker.jobsDone >= MAX_JOBS_PER_WORKER) {
+        worker.ready = false;
+        worker.process.stdin.end();
+    }
+
+    dispatch();
+}
+
+/**
+ * Hand queued jobs to idle, ready workers
+ */
+function dispatch() {
+    for (const worker of workers) {
+        if (pendingJobs.length === 0) return;
+        if (!worker || !worker.ready || worker.busy) continue;
+
+        const job = pendingJobs.shift();
+        worker.busy = true;
+        worker.job = job;
+        job.dispatchedAt = Date.now();
+        stats.totalWaitMs += job.dispatchedAt - job.queuedAt;
+        stats.started++;
+
+        job.timer = setTimeout(() => {
+            job.timedOut = true;
+            worker.process.kill('SIGKILL');
+        }, job.timeoutMs);
+
+        worker.process.stdin.write(JSON.stringify(job.payload) + '\n');
+    }
+}
+
+/**
+ * Start the worker processes (idempotent)
+ */
+function startRenderPool() {
+    if (workers.length > 0 || unavailable) return;
+
+    if (!fs.existsSync(WORKER_SCRIPT)) {
+        markUnavailable(`Render worker script missing: ${WORKER_SCRIPT}`, false);
+        return;
+    }
+
+    console.log(`🎬 Starting ${POOL_SIZE} Manim render worker(s)...`);
+    for (let i = 0; i < POOL_SIZE; i++) {
+        spawnWorker(i);
+    }
+}
+
+/**
+ * Queue a raw job (any worker action) on the pool.
+ * @param {Object} options
+ * @param {number} options.timeoutMs - kill the worker if the job runs longer
+ * @param {Function} options.onEvent - receives the worker's intermediate {type: 'event'} messages
+ * @param {number} options.priority - higher priorities are dispatched first (see jobQueue.JOB_PRIORITIES)
+ */
+function submitJob(payload, { timeoutMs = DEFAULT_JOB_TIMEOUT, onEvent = null, priority = 0 } = {}) {
+    startRenderPool();
+
+    if (unavailable) {
+        return Promise.resolve({ success: false, ...unavailable });
+    }
+
+    return new Promise((resolve) => {
+        const id = `job_${Date.now()}_${++jobCounter}`;
+        const job = {
+            id,
+            payload: { ...payload, id },
+            timeoutMs,
+            priority,
+            queuedAt: Date.now(),
+            stderr: '',
+            onEvent,
+            resolve
+        };
+
+        // Keep the queue ordered by priority, FIFO within a priority
+        const index = pendingJobs.findIndex(queued => queued.priority < priority);
+        if (index === -1) {
+            pendingJobs.push(job);
+        } else {
+            pendingJobs.splice(index, 0, job);
+        }
+        dispatch();
+    });
+}
+
+/**
+ * Queue a scene render on the pool. With onEvent, the worker reports every
+ * finished animation ({event: 'animation', index, path, hold}) while it
+ * renders; `hold` is set (in seconds) for a static pause written as one frame.
+ * @returns {Promise<{success, videoPath, error, notInstalled, stderr, elapsedMs}>}
+ */
+function submitRender({ scriptPath, sceneName, quality = 'l', mediaDir, cwd, holds = STATIC_HOLDS, timeoutMs = DEFAULT_JOB_TIMEOUT, onEvent = null, priority = 0 }) {
+    return submitJob(
+        { action: 'render', scriptPath, sceneName, quality, mediaDir, cwd, holds, stream: !!onEvent },
+        { timeoutMs, onEvent, priority }
+    );
+}
+
+/**
+ * Run a scene with animations skipped (no video) and save key still frames.
+ * @returns {Promise<{success, frames, timeline, totalSeconds, animationCount, error, elapsedMs}>}
+ */
+function submitPreview({ scriptPath, sceneName, outputDir, mediaDir = path.join(outputDir, 'media'), cwd, maxFrames, timeoutMs = 60000, priority = 0 }) {
+    return submitJob(
+        { action: 'preview', scriptPath, sceneName, outputDir, mediaDir, cwd, maxFrames },
+        { timeoutMs, priority }
+    );
+}
+
+/**
+ * Manim version reported by the workers (null if the pool cannot start)
+ */
+function getManimVersion() {
+    startRenderPool();
+    if (manimVersion || unavailable) {
+        return Promise.resolve(manimVersion);
+    }
+    return new Promise(resolve => versionWaiters.push(resolve));
+}
+
+/**
+ * Pool status for monitoring
+ */
+function getRenderPoolStats() {
+    const finished = stats.completed + stats.failed;
+    return {
+        size: POOL_SIZE,
+        ready: workers.filter(w => w && w.ready).length,
+        busy: workers.filter(w => w && w.busy).length,
+        queued: pendingJobs.length,
+        texDir: TEX_DIR,
+        unavailable: unavailable ? unavailable.error : null,
+        ...stats,
+        avgRenderMs: finished > 0 ? Math.round(stats.totalRenderMs / finished) : 0,
+        avgWaitMs: stats.started > 0 ? Math.round(stats.totalWaitMs / stats.started) : 0
+    };
+}
+
+/**
+ * Stop all workers (used on shutdown)
+ */
+function shutdownRenderPool() {
+    const running = workers.splice(0, workers.length);
+    for (const worker of running) {
+        if (worker && worker.process) worker.process.stdin.end();
+    }
+}
+
+module.exports = {
+    STATIC_HOLDS,
+    startRenderPool,
+    submitJob,
+    submitRender,
+    submitPreview,
+    getRenderPoolStats,
+    getManimVersion,
+    shutdownRenderPool,
+    resolvePythonPath,
+    renderEnv
+};
@@ -1,5 +1,7 @@
-const fetch = require('node-fetch');
 const { v4: uuidv4 } = require('uuid');
+const { ondemandFetch } = require('../ondemand/http');
+const { readOnDemandStream } = require('../ondemand/stream');
+const { sessionGone, withSession } = require('../ondemand/sessions');
 
 const API_KEY = process.env.ONDEMAND_API_KEY || "<your_api_key>";
 console.log('📌 Analytics Agent API Key configured:', API_KEY ? `${API_KEY.substring(0, 10)}...` : 'NOT SET');
@@ -81,7 +83,7 @@ async function createChatSession(studentId, studentName) {
     console.log(`Creating analytics session for student: ${studentName} (${studentId})`);
 
     try {
-        const response = await fetch(url, {
+        const response = await ondemandFetch(url, {
             method: 'POST',
             headers: {
                 'apikey': API_KEY,
@@ -110,8 +112,9 @@ async function createChatSession(studentId, studentName) {
 
 /**
  * Submit quiz performance data to analytics agent
+ * @param {Object} handlers - readOnDemandStream handlers (onDelta, onMetrics) for the streamed answer
  */
-async function submitQueryToAgent(sessionId, query, contextMetadata) {
+async function submitQueryToAgent(sessionId, query, contextMetadata, handlers = {}) {
     const url = `${BASE_URL}/sessions/${sessionId}/query`;
     
     const body = {
@@ -134,7 +137,7 @@ async function submitQueryToAgent(sessionId, query, contextMetadata) {
     console.log(`🚀 Submitting analytics query...`);
 
     try {
-        const response = await fetch(url, {
+        const response = await ondemandFetch(url, {
             method: 'POST',
             headers: {
                 'apikey': API_KEY,
@@ -143,67 +146,29 @@ async function submitQueryToAgent(sessionId, query, contextMetadata) {
             body: JSON.stringify(body)
         });
 
+        if (!response.ok) {
+            const respBody = await response.text();
+            console.error(`❌ Error submitting query: ${response.status} - ${respBody}`);
+            return { success: false, error: `API error: ${response.status}`, sessionGone: sessionGone(response) };
+        }
+
         if (RESPONSE_MODE === "stream") {
             if (!response.body) {
                 console.error("❌ No response body for streaming.");
                 return null;
             }
 
-            let fullAnswer = "";
-            let finalSessionId = "";
-            let finalMessageId = "";
-            let metrics = {};
-
-            // Node.js streaming with node-fetch v2
-            return new Promise((resolve, reject) => {
-                let buffer = '';
-
-                response.body.on('data', (chunk) => {
-                    buffer += chunk.toString();
-                    const lines = buffer.split('\n');
-                    
-                    // Keep the last incomplete line in buffer
-                    buffer = lines.pop() || '';
-
-                    for (const line of lines) {
-                        if (line.startsWith("data:")) {
-                            const dataStr = line.slice(5).trim();
-                            if (dataStr === "[DONE]") continue;
-
-                            try {
-                                const event = JSON.parse(dataStr);
-                                if (event.eventType === "fulfillment") {
-                                    if (event.answer) fullAnswer += event.answer;
-                                    if (event.sessionId) finalSessionId = event.sessionId;
-                                    if (event.messageId) finalMessageId = event.messageId;
-                                } else if (event.eventType === "metricsLog") {
-                                    if (event.publicMetrics) metrics = event.publicMetrics;
-                                }
-                            } catch (e) {
-                                // Skip invalid JSON
-                                continue;
-                            }
-                        }
-                    }
-                });
-
-                response.body.on('end', () => {
-                    console.log(`✅ Streaming complete. Answer length: ${fullAnswer.length} characters`);
-                    resolve({
-                        sessionId: finalSessionId,
-                        messageId: finalMessageId,
-                        answer: fullAnswer,
-                        metrics: metrics,
-                        status: "completed",
-                        contextMetadata: contextMetadata,
-                    });
-                });
-
-                response.body.on('error', (error) => {
-                    console.error(`❌ Stream error: ${error.message}`);
-                    reject(error);
-                });
-            });
+            // Answer deltas can be acted on before the stream ends (handlers.onDelta)
+            const streamed = await readOnDemandStream(response.body, handlers);
+            console.log(`✅ Streaming complete. Answer length: ${streamed.answer.length} characters`);
+            return {
+                sessionId: streamed.sessionId,
+                messageId: streamed.messageId,
+                answer: streamed.answer,
+                metrics: streamed.metrics,
+                status: "completed",
+                contextMetadata: contextMetadata,
+            };
         } else {
             // Sync mode
             if (response.status === 200) {
@@ -318,25 +283,23 @@ Please provide:
 async function analyzeStudentPerformance(studentId, studentName, quizAttempts) {
     console.log(`\n=== Starting Analytics for ${studentName} ===`);
     
-    // Create session
-    const sessionData = await createChatSession(studentId, studentName);
-    if (!sessionData) {
-        console.error("Failed to create analytics session");
-        return null;
-    }
-
     // Format quiz data
     const query = formatQuizDataForAnalytics(quizAttempts);
     console.log("Query prepared for analytics agent");
 
-    // Submit query
-    const analyticsResult = await submitQueryToAgent(
-        sessionData.sessionId, 
-        query, 
-        sessionData.contextMetadata
+    // Submit query in the student's analytics session (created on first use)
+    const { session: sessionData, result: analyticsResult } = await withSession(
+        'analytics',
+        studentId,
+        () => createChatSession(studentId, studentName),
+        (session) => submitQueryToAgent(session.sessionId, query, session.contextMetadata)
     );
+    if (!sessionData) {
+        console.error("Failed to create analytics session");
+        return null;
+    }
 
-    if (analyticsResult) {
+    if (analyticsResult && analyticsResult.success !== false) {
         console.log(`✅ Analytics completed successfully`);
         console.log(`Analysis: ${analyticsResult.answer?.substring(0, 200)}...`);
         return analyticsResult;
@@ -1,5 +1,9 @@
-const fetch = require('node-fetch');
 const { v4: uuidv4 } = require('uuid');
+const { ondemandFetch } = require('../ondemand/http');
+const { readOnDemandStream } = require('../ondemand/stream');
+const { sessionGone, withSession } = require('../ondemand/sessions');
+const { createQuestionExtractor } = require('../ondemand/jsonQuestions');
+const { bankScope, addToBank, drawQuestions, topUpBank } = require('./questionBank');
 
 const API_KEY = process.env.ONDEMAND_API_KEY || "<your_api_key>";
 console.log('📌 Assignment Agent API Key configured:', API_KEY ? `${API_KEY.substring(0, 10)}...` : 'NOT SET');
@@ -19,6 +23,20 @@ const MAX_TOKENS = 6000;
 const PRESENCE_PENALTY = 0;
 const FREQUENCY_PENALTY = 0;
 
+// The prompt's marks and difficulty distributions, used to assemble
+// assignments from the question bank
+const ASSIGNMENT_MARKS = { easy: 2, medium: 3, hard: 5 };
+const CONFIDENCE_BREAKDOWN = { easy: 6, medium: 3, hard: 1 };
+const CHALLENGE_BREAKDOWN = { easy: 2, medium: 4, hard: 4 };
+// Bank top-ups run in a session of their own, with neutral analytics
+const QUESTION_BANK_STUDENT = 'question-bank';
+const QUESTION_BANK_ANALYTICS = {
+    performanceStatus: 'Stable',
+    weakConcepts: [],
+    riskLevel: 'Medium',
+    recommendedAction: 'Cover every concept of the topic'
+};
+
 const ASSIGNMENT_FULFILLMENT_PROMPT = `Role: You are an Adaptive Learning Assistant for Indian students (Classes 6-12, NCERT curriculum).
 Your task is to create a personalized daily assignment of 10 questions based on the student's performance analytics.
 
@@ -94,7 +112,7 @@ async function createAssignmentSession(studentId, studentName) {
     console.log(`\n📝 Creating assignment session for ${studentName}...`);
 
     try {
-        const response = await fetch(url, {
+        const response = await ondemandFetch(url, {
             method: 'POST',
             headers: {
                 'apikey': API_KEY,
@@ -120,8 +138,9 @@ async function createAssignmentSession(studentId, studentName) {
 
 /**
  * Generate assignment questions based on student analytics
+ * @param {Object} handlers - readOnDemandStream handlers (onDelta, onMetrics) for the streamed answer
  */
-async function generateAssignmentQuestions(sessionId, topic, analyticsData) {
+async function generateAssignmentQuestions(sessionId, topic, analyticsData, handlers = {}) {
     const url = `${BASE_URL}/sessions/${sessionId}/query`;
 
     // Build query with analytics context
@@ -165,7 +184,7 @@ Return ONLY valid JSON in the exact format specified.`;
     console.log(`⚠️ Risk Level: ${analyticsData.riskLevel || 'Medium'}`);
 
     try {
-        const response = await fetch(url, {
+        const response = await ondemandFetch(url, {
             method: 'POST',
             headers: {
                 'apikey': API_KEY,
@@ -179,7 +198,7 @@ Return ONLY valid JSON in the exact format specified.`;
         if (!response.ok) {
             const errorText = await response.text();
             console.error(`❌ API error (${response.status}):`, errorText);
-            return { success: false, error: `API error: ${response.status}` };
+            return { success: false, error: `API error: ${response.status}`, sessionGone: sessionGone(response) };
         }
 
         if (!response.body) {
@@ -187,97 +206,54 @@ Return ONLY valid JSON in the exact format specified.`;
             return { success: false, error: 'No response body' };
         }
 
-        // Handle streaming response
-        return new Promise((resolve, reject) => {
-            let buffer = '';
-            let fullAnswer = "";
-            let finalSessionId = "";
-            let finalMessageId = "";
-
-            response.body.on('data', (chunk) => {
-                buffer += chunk.toString();
-                const lines = buffer.split('\n');
-                buffer = lines.pop() || '';
-
-                for (const line of lines) {
-                    if (line.startsWith("data:")) {
-                        const dataStr = line.slice(5).trim();
-                        if (dataStr === "[DONE]") {
-                            console.log('📌 Received [DONE] signal');
-                            continue;
-                        }
-
-                        try {
-                            const event = JSON.parse(dataStr);
-                            
-                            // Handle response - check for answer field
-                            if (event.answer) {
-                                fullAnswer += event.answer;
-                            }
-                            if (event.sessionId) finalSessionId = event.sessionId;
-                            if (event.messageId) finalMessageId = event.messageId;
-                            
-                        } catch (e) {
-                            // Skip malformed lines
-                        }
-                    }
-                }
-            });
-
-            response.body.on('end', () => {
-                console.log(`✅ Assignment generated successfully`);
-                console.log(`📏 Total answer length: ${fullAnswer.length} characters`);
-                
-                // Parse the JSON response
-                let assignmentData;
-                try {
-                    if (!fullAnswer) {
-                        throw new Error('No answer content received');
-                    }
-                    
-                    console.log('📝 Raw answer (first 300 chars):', fullAnswer.substring(0, 300));
-                    
-                    // Extract JSON from response
-                    const jsonMatch = fullAnswer.match(/\{[\s\S]*\}/);
-                    if (jsonMatch) {
-                        assignmentData = JSON.parse(jsonMatch[0]);
-                    } else {
-                        throw new Error('No JSON found in response');
-                    }
-                    
-                    console.log('✅ Successfully parsed assignment data:', {
-                        title: assignmentData.assignmentTitle,
-                        totalQuestions: assignmentData.totalQuestions,
-                        actualQuestions: assignmentData.questions?.length
-                    });
-                    
-                    if (assignmentData.questions?.length < 10) {
-                        console.warn(`⚠️ Only ${assignmentData.questions.length} questions generated instead of 10`);
-                    }
-                    
-                    resolve({
-                        success: true,
-                        sessionId: finalSessionId,
-                        assignmentData: assignmentData,
-                        messageId: finalMessageId
-                    });
-                    
-                } catch (parseError) {
-                    console.error(`⚠️ Failed to parse assignment JSON: ${parseError.message}`);
-                    resolve({
-                        success: false,
-                        error: parseError.message,
-                        rawAnswer: fullAnswer
-                    });
-                }
-            });
+        // Answer deltas can be acted on before the stream ends (handlers.onDelta)
+        const streamed = await readOnDemandStream(response.body, handlers);
+        const fullAnswer = streamed.answer;
+        console.log(`✅ Assignment generated successfully`);
+        console.log(`📏 Total answer length: ${fullAnswer.length} characters`);
+
+        // Parse the JSON response
+        let assignmentData;
+        try {
+            if (!fullAnswer) {
+                throw new Error('No answer content received');
+            }
+
+            console.log('📝 Raw answer (first 300 chars):', fullAnswer.substring(0, 300));
+
+            // Extract JSON from response
+            const jsonMatch = fullAnswer.match(/\{[\s\S]*\}/);
+            if (jsonMatch) {
+                assignmentData = JSON.parse(jsonMatch[0]);
+            } else {
+                throw new Error('No JSON found in response');
+            }
+        } catch (parseError) {
+            console.error(`⚠️ Failed to parse assignment JSON: ${parseError.message}`);
+            return {
+                success: false,
+                error: parseError.message,
+                rawAnswer: fullAnswer
+            };
+        }
 
-            response.body.on('error', (error) => {
-                console.error(`❌ Stream error: ${error.message}`);
-                reject(error);
-            });
+        console.log('✅ Successfully parsed assignment data:', {
+            title: assignmentData.assignmentTitle,
+            totalQuestions: assignmentData.totalQuestions,
+            actualQuestions: assignmentData.questions?.length
         });
 
+        if (assignmentData.questions?.length < 10) {
+            console.warn(`⚠️ Only ${assignmentData.questions.length} questions generated instead of 10`);
+        }
+
+        return {
+            success: true,
+            sessionId: streamed.sessionId,
+            assignmentData: assignmentData,
+            messageId: streamed.messageId
+        };
+
     } catch (error) {
         console.error(`❌ Exception generating assignment: ${error.message}`);
         return { success: false, error: error.message };
@@ -285,30 +261,135 @@ Return ONLY valid JSON in the exact format specified.`;
 }
 
 /**
- * Main function to generate a complete assignment
+ * Difficulty distribution the prompt asks for, given the student's analytics
  */
-async function generateAssignment(studentId, studentName, topic, analyticsData) {
+function difficultyBreakdownFor(analyticsData) {
+    const status = analyticsData.performanceStatus || '';
+    const risk = analyticsData.riskLevel || '';
+    if (/stagnation|decline/i.test(status) || /high/i.test(risk)) return CONFIDENCE_BREAKDOWN;
+    if (/improvement/i.test(status) || /low/i.test(risk)) return CHALLENGE_BREAKDOWN;
+    // The prompt's default paper when the trend is unknown or stable
+    return CONFIDENCE_BREAKDOWN;
+}
+
+/**
+ * Generate more assignment questions on a topic for the question bank, in the background
+ */
+function topUpAssignmentBank(scope, breakdown) {
+    topUpBank(scope, breakdown, async () => {
+        const { result } = await withSession(
+            'assignment',
+            QUESTION_BANK_STUDENT,
+            () => createAssignmentSession(QUESTION_BANK_STUDENT, 'Question Bank'),
+            (sessionId) => generateAssignmentQuestions(sessionId, scope.topic, QUESTION_BANK_ANALYTICS)
+        );
+        return result && result.success ? result.assignmentData.questions : null;
+    });
+}
+
+/**
+ * An assignment from banked questions the student has not seen, weighted
+ * towards their weak concepts (null when the bank does not cover the topic)
+ */
+async function assignmentFromBank(scope, studentId, analyticsData) {
+    const breakdown = difficultyBreakdownFor(analyticsData);
+    const weakConcepts = analyticsData.weakConcepts || [];
+    let questions;
+    try {
+        questions = await drawQuestions(scope, breakdown, {
+            studentId,
+            focusConcepts: weakConcepts,
+            marks: ASSIGNMENT_MARKS
+        });
+    } catch (error) {
+        console.log(`⚠️ Question bank unavailable: ${error.message}`);
+        return null;
+    }
+    if (!questions) return null;
+
+    return {
+        assignmentTitle: `Daily Practice: ${scope.topic}`,
+        totalQuestions: questions.length,
+        totalMarks: questions.reduce((sum, q) => sum + q.marks, 0),
+        estimatedTime: '20 minutes',
+        difficultyBreakdown: breakdown,
+        questions,
+        analyticsBasedFeedback: weakConcepts.length > 0
+            ? `Practice questions chosen to focus on your weak concepts: ${weakConcepts.slice(0, 3).join(', ')}.`
+            : `Practice questions covering ${scope.topic}.`,
+        predictedOutcome: {
+            expectedPerformance: analyticsData.performanceStatus || 'Unknown',
+            focusConcepts: weakConcepts.slice(0, 3),
+            riskLevel: analyticsData.riskLevel || 'Medium',
+            nextRecommendation: analyticsData.recommendedAction || 'Continue practice'
+        }
+    };
+}
+
+/**
+ * Main function to generate a complete assignment: assembled from the
+ * question bank when it covers the topic, otherwise written by the
+ * assignment agent (and banked)
+ * @param {Object} options
+ * @param {string} options.assignmentId - id to give the assignment (generated if missing)
+ * @param {Function} options.onHeader - (header) title, marks, feedback as soon as they are streamed
+ * @param {Function} options.onQuestion - (question, index) each question as soon as it is streamed
+ * @param {string} options.grade - question bank grade (Class 9 by default)
+ * @param {string} options.subject - question bank subject (Mathematics by default)
+ * @param {boolean} options.fresh - skip the question bank and have the agent write new questions
+ */
+async function generateAssignment(studentId, studentName, topic, analyticsData, { assignmentId, onHeader, onQuestion, grade, subject, fresh = false } = {}) {
     console.log(`\n=== 📚 Generating Assignment for ${studentName} ===`);
     console.log(`Topic: ${topic}`);
     console.log(`Analytics:`, JSON.stringify(analyticsData, null, 2));
 
-    // Create session
-    const sessionId = await createAssignmentSession(studentId, studentName);
+    const scope = bankScope('assignment', topic, { grade, subject });
+    const banked = fresh ? null : await assignmentFromBank(scope, studentId, analyticsData);
+    if (banked) {
+        console.log(`🏦 Assignment assembled from the question bank (${banked.questions.length} questions)`);
+        if (onHeader) {
+            const { questions, ...header } = banked;
+            onHeader(header);
+        }
+        if (onQuestion) banked.questions.forEach(onQuestion);
+        topUpAssignmentBank(scope, banked.difficultyBreakdown);
+        return {
+            success: true,
+            assignmentId: assignmentId || uuidv4(),
+            sessionId: null,
+            topic: topic,
+            assignmentData: banked,
+            analyticsUsed: analyticsData,
+            fromBank: true
+        };
+    }
+
+    // Generate assignment in the student's assignment session (created on first use),
+    // handing each question out while the rest is still being written
+    const extractor = onHeader || onQuestion ? createQuestionExtractor({ onHeader, onQuestion }) : null;
+    const { session: sessionId, result } = await withSession(
+        'assignment',
+        studentId,
+        () => createAssignmentSession(studentId, studentName),
+        (assignmentSessionId) => generateAssignmentQuestions(assignmentSessionId, topic, analyticsData,
+            extractor ? { onDelta: (delta) => extractor.push(delta) } : {})
+    );
     if (!sessionId) {
         return { success: false, error: 'Failed to create session' };
     }
-
-    // Generate assignment
-    const result = await generateAssignmentQuestions(sessionId, topic, analyticsData);
     
     if (result.success) {
+        const generatedId = assignmentId || uuidv4();
+        addToBank(scope, result.assignmentData.questions, { sourceId: generatedId, studentId })
+            .catch(error => console.log(`⚠️ Could not bank assignment questions: ${error.message}`));
         return {
             success: true,
-            assignmentId: uuidv4(),
+            assignmentId: generatedId,
             sessionId: sessionId,
             topic: topic,
             assignmentData: result.assignmentData,
-            analyticsUsed: analyticsData
+            analyticsUsed: analyticsData,
+            fromBank: false
         };
     }
 
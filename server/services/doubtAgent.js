@@ -1,11 +1,21 @@
-const fetch = require('node-fetch');
 const { v4: uuidv4 } = require('uuid');
 const FormData = require('form-data');
 const fs = require('fs');
 const path = require('path');
-const { exec, spawn } = require('child_process');
-const util = require('util');
-const execPromise = util.promisify(exec);
+const { renderWithCache } = require('../render/renderCache');
+const { renderWithRepair } = require('../render/repair');
+const { requestScriptFix } = require('./teacherAgent');
+const { ondemandFetch } = require('../ondemand/http');
+const { readOnDemandStream } = require('../ondemand/stream');
+const { sessionGone, withSession } = require('../ondemand/sessions');
+const { JOB_PRIORITIES, registerJobHandler, runJob } = require('../render/jobQueue');
+const { preflightScript, describePreflightErrors } = require('../render/preflight');
+const { prepareNarration, muxNarration } = require('../render/narration');
+const { publishRender } = require('../render/manifest');
+const { withScratch } = require('../render/scratch');
+const { QUALITIES, FIRST_QUALITY, makeRendition, enqueueUpgrades } = require('../render/renditions');
+const { RENDER_FRAGMENTS } = require('../render/fragments');
+const { publishProgress, startProgress, createProgressTracker } = require('../render/progress');
 
 const API_KEY = process.env.ONDEMAND_API_KEY || "<your_api_key>";
 console.log('📌 Doubt Agent API Key configured:', API_KEY ? `${API_KEY.substring(0, 10)}...` : 'NOT SET');
@@ -35,6 +45,13 @@ const MANIM_RESPONSE_MODE = "stream";
 const MANIM_TEMPERATURE = 0.6;
 const MANIM_TOP_P = 1;
 const MANIM_MAX_TOKENS = 8000;
+// The streamed answer's size is reported on the doubt's progress at most this often
+const ANALYSIS_PROGRESS_INTERVAL = 500;
+
+// Doubt videos are short answers: longer scripts are not upgraded past the first quality
+const DOUBT_SCENE_NAME = 'DoubtAnimation';
+const DOUBT_MAX_SECONDS = parseInt(process.env.DOUBT_MAX_SECONDS, 10) || 120;
+const DOUBT_MAX_QUALITY = process.env.DOUBT_MAX_QUALITY || 'h';
 
 // Paths for video generation
 const OUTPUT_DIR = path.join(__dirname, '..', 'output', 'videos');
@@ -88,7 +105,7 @@ async function uploadImageToMedia(imageBase64, sessionId, fileName = 'question_i
             formData.append('agents', agent);
         });
 
-        const response = await fetch(url, {
+        const response = await ondemandFetch(url, {
             method: 'POST',
             headers: {
                 'apikey': API_KEY,
@@ -177,7 +194,7 @@ async function extractDataFromImage(sessionId, imageBase64, additionalContext =
     console.log(`\n� Querying Image Agent for analysis...`);
 
     try {
-        const response = await fetch(url, {
+        const response = await ondemandFetch(url, {
             method: 'POST',
             headers: {
                 'apikey': API_KEY,
@@ -192,48 +209,15 @@ async function extractDataFromImage(sessionId, imageBase64, additionalContext =
             return { success: false, error: `API error: ${response.status}`, extractedData: null };
         }
 
-        // Handle streaming response
-        return new Promise((resolve, reject) => {
-            let buffer = '';
-            let fullAnswer = "";
-
-            response.body.on('data', (chunk) => {
-                buffer += chunk.toString();
-                const lines = buffer.split('\n');
-                buffer = lines.pop() || '';
-
-                for (const line of lines) {
-                    if (line.startsWith("data:")) {
-                        const dataStr = line.slice(5).trim();
-                        if (dataStr === "[DONE]") continue;
-
-                        try {
-                            const event = JSON.parse(dataStr);
-                            if (event.answer) {
-                                fullAnswer += event.answer;
-                            }
-                        } catch (e) {
-                            // Skip malformed events
-                        }
-                    }
-                }
-            });
+        const { answer: fullAnswer } = await readOnDemandStream(response.body);
+        console.log(`✅ Image data extracted (${fullAnswer.length} chars)`);
+        console.log(`📝 Extracted content preview: "${fullAnswer.substring(0, 200)}..."`);
 
-            response.body.on('end', () => {
-                console.log(`✅ Image data extracted (${fullAnswer.length} chars)`);
-                console.log(`📝 Extracted content preview: "${fullAnswer.substring(0, 200)}..."`);
-                
-                resolve({
-                    success: true,
-                    extractedData: fullAnswer,
-                    error: null
-                });
-            });
-
-            response.body.on('error', (err) => {
-                reject({ success: false, error: err.message, extractedData: null });
-            });
-        });
+        return {
+            success: true,
+            extractedData: fullAnswer,
+            error: null
+        };
 
     } catch (error) {
         console.error(`❌ Exception extracting image data: ${error.message}`);
@@ -326,7 +310,7 @@ async function createDoubtSession(studentId, studentName) {
     console.log(`\n🤔 Creating doubt session for ${studentName}...`);
 
     try {
-        const response = await fetch(url, {
+        const response = await ondemandFetch(url, {
             method: 'POST',
             headers: {
                 'apikey': API_KEY,
@@ -357,8 +341,9 @@ async function createDoubtSession(studentId, studentName) {
  * Process image and analyze doubt using TWO-STEP approach:
  * Step 1: Use Image Agent to extract data/question from image
  * Step 2: Use Manim Agent to generate visual solution
+ * @param {Object} handlers - readOnDemandStream handlers (onDelta, onMetrics) for the streamed solution
  */
-async function analyzeDoubtWithImage(sessionId, doubtText, imageBase64, studentProfile) {
+async function analyzeDoubtWithImage(sessionId, doubtText, imageBase64, studentProfile, handlers = {}) {
     const url = `${BASE_URL}/sessions/${sessionId}/query`;
     
     let extractedImageData = null;
@@ -421,7 +406,7 @@ Return ONLY valid JSON in the specified format.`;
     console.log(`❓ Student question: "${doubtText?.substring(0, 50) || 'From image'}..."`);
 
     try {
-        const response = await fetch(url, {
+        const response = await ondemandFetch(url, {
             method: 'POST',
             headers: {
                 'apikey': API_KEY,
@@ -433,102 +418,56 @@ Return ONLY valid JSON in the specified format.`;
         if (!response.ok) {
             const errorText = await response.text();
             console.error(`❌ API error (${response.status}):`, errorText);
-            return { success: false, error: `API error: ${response.status}` };
+            return { success: false, error: `API error: ${response.status}`, sessionGone: sessionGone(response) };
         }
 
         if (!response.body) {
             return { success: false, error: 'No response body' };
         }
 
-        // Handle streaming response
-        return new Promise((resolve, reject) => {
-            let buffer = '';
-            let fullAnswer = "";
-
-            response.body.on('data', (chunk) => {
-                buffer += chunk.toString();
-                const lines = buffer.split('\n');
-                buffer = lines.pop() || '';
-
-                for (const line of lines) {
-                    if (line.startsWith("data:")) {
-                        const dataStr = line.slice(5).trim();
-                        if (dataStr === "[DONE]") {
-                            continue;
-                        }
-
-                        try {
-                            const event = JSON.parse(dataStr);
-                            if (event.answer) {
-                                fullAnswer += event.answer;
-                            }
-                        } catch (e) {
-                            // Skip malformed events
-                        }
-                    }
-                }
-            });
+        // Answer deltas can be acted on before the stream ends (handlers.onDelta)
+        const { answer: fullAnswer } = await readOnDemandStream(response.body, handlers);
+        console.log(`✅ Manim solution generated (${fullAnswer.length} chars)`);
 
-            response.body.on('end', () => {
-                console.log(`✅ Manim solution generated (${fullAnswer.length} chars)`);
-                
-                try {
-                    // Extract JSON from response
-                    const jsonMatch = fullAnswer.match(/\{[\s\S]*\}/);
-                    if (jsonMatch) {
-                        const parsed = JSON.parse(jsonMatch[0]);
-                        
-                        // Include extracted image data in response
-                        if (extractedImageData) {
-                            parsed.extractedImageData = extractedImageData;
-                        }
-                        
-                        resolve({
-                            success: true,
-                            data: parsed,
-                            rawResponse: fullAnswer,
-                            extractedImageData: extractedImageData
-                        });
-                    } else {
-                        // If no JSON, return as plain text response
-                        resolve({
-                            success: true,
-                            data: {
-                                doubtClarification: fullAnswer,
-                                guidedExplanation: { hints: [], visualConcepts: [] },
-                                manimCode: null,
-                                narration: [],
-                                reflectiveQuestion: "",
-                                encouragement: "",
-                                extractedImageData: extractedImageData
-                            },
-                            rawResponse: fullAnswer,
-                            extractedImageData: extractedImageData
-                        });
-                    }
-                } catch (parseError) {
-                    console.error('❌ JSON parse error:', parseError.message);
-                    resolve({
-                        success: true,
-                        data: {
-                            doubtClarification: fullAnswer,
-                            guidedExplanation: { hints: [], visualConcepts: [] },
-                            manimCode: null,
-                            narration: [],
-                            reflectiveQuestion: "",
-                            encouragement: "",
-                            extractedImageData: extractedImageData
-                        },
-                        rawResponse: fullAnswer,
-                        extractedImageData: extractedImageData
-                    });
-                }
-            });
+        // Plain text answer (no JSON, or JSON that does not parse)
+        const textResponse = {
+            success: true,
+            data: {
+                doubtClarification: fullAnswer,
+                guidedExplanation: { hints: [], visualConcepts: [] },
+                manimCode: null,
+                narration: [],
+                reflectiveQuestion: "",
+                encouragement: "",
+                extractedImageData: extractedImageData
+            },
+            rawResponse: fullAnswer,
+            extractedImageData: extractedImageData
+        };
 
-            response.body.on('error', (err) => {
-                reject({ success: false, error: err.message });
-            });
-        });
+        try {
+            // Extract JSON from response
+            const jsonMatch = fullAnswer.match(/\{[\s\S]*\}/);
+            if (!jsonMatch) {
+                return textResponse;
+            }
+            const parsed = JSON.parse(jsonMatch[0]);
+
+            // Include extracted image data in response
+            if (extractedImageData) {
+                parsed.extractedImageData = extractedImageData;
+            }
+
+            return {
+                success: true,
+                data: parsed,
+                rawResponse: fullAnswer,
+                extractedImageData: extractedImageData
+            };
+        } catch (parseError) {
+            console.error('❌ JSON parse error:', parseError.message);
+            return textResponse;
+        }
 
     } catch (error) {
         console.error(`❌ Exception generating Manim solution: ${error.message}`);
@@ -538,8 +477,9 @@ Return ONLY valid JSON in the specified format.`;
 
 /**
  * Follow-up question in same session (maintains context)
+ * @param {Object} handlers - readOnDemandStream handlers (onDelta, onMetrics) for the streamed answer
  */
-async function followUpDoubt(sessionId, followUpText, studentProfile) {
+async function followUpDoubt(sessionId, followUpText, studentProfile, handlers = {}) {
     const url = `${BASE_URL}/sessions/${sessionId}/query`;
 
     const query = `Follow-up question from student:
@@ -569,7 +509,7 @@ Return ONLY valid JSON in the specified format.`;
     console.log(`\n💬 Processing follow-up: "${followUpText.substring(0, 50)}..."`);
 
     try {
-        const response = await fetch(url, {
+        const response = await ondemandFetch(url, {
             method: 'POST',
             headers: {
                 'apikey': API_KEY,
@@ -580,66 +520,35 @@ Return ONLY valid JSON in the specified format.`;
 
         if (!response.ok) {
             const errorText = await response.text();
-            return { success: false, error: `API error: ${response.status}` };
+            return { success: false, error: `API error: ${response.status}`, sessionGone: sessionGone(response) };
         }
 
-        return new Promise((resolve, reject) => {
-            let buffer = '';
-            let fullAnswer = "";
-
-            response.body.on('data', (chunk) => {
-                buffer += chunk.toString();
-                const lines = buffer.split('\n');
-                buffer = lines.pop() || '';
-
-                for (const line of lines) {
-                    if (line.startsWith("data:")) {
-                        const dataStr = line.slice(5).trim();
-                        if (dataStr === "[DONE]") continue;
-
-                        try {
-                            const event = JSON.parse(dataStr);
-                            if (event.answer) {
-                                fullAnswer += event.answer;
-                            }
-                        } catch (e) {}
-                    }
-                }
-            });
-
-            response.body.on('end', () => {
-                try {
-                    const jsonMatch = fullAnswer.match(/\{[\s\S]*\}/);
-                    if (jsonMatch) {
-                        const parsed = JSON.parse(jsonMatch[0]);
-                        resolve({ success: true, data: parsed, rawResponse: fullAnswer });
-                    } else {
-                        resolve({
-                            success: true,
-                            data: {
-                                doubtClarification: fullAnswer,
-                                guidedExplanation: { hints: [], visualConcepts: [] },
-                                manimCode: null,
-                                narration: [],
-                                reflectiveQuestion: "",
-                                encouragement: ""
-                            },
-                            rawResponse: fullAnswer
-                        });
-                    }
-                } catch (e) {
-                    resolve({
-                        success: true,
-                        data: { doubtClarification: fullAnswer },
-                        rawResponse: fullAnswer
-                    });
-                }
-            });
-
-            response.body.on('error', (err) => {
-                reject({ success: false, error: err.message });
-            });
-        });
+        const { answer: fullAnswer } = await readOnDemandStream(response.body, handlers);
+        try {
+            const jsonMatch = fullAnswer.match(/\{[\s\S]*\}/);
+            if (jsonMatch) {
+                const parsed = JSON.parse(jsonMatch[0]);
+                return { success: true, data: parsed, rawResponse: fullAnswer };
+            }
+            return {
+                success: true,
+                data: {
+                    doubtClarification: fullAnswer,
+                    guidedExplanation: { hints: [], visualConcepts: [] },
+                    manimCode: null,
+                    narration: [],
+                    reflectiveQuestion: "",
+                    encouragement: ""
+                },
+                rawResponse: fullAnswer
+            };
+        } catch (e) {
+            return {
+                success: true,
+                data: { doubtClarification: fullAnswer },
+                rawResponse: fullAnswer
+            };
+        }
 
     } catch (error) {
         return { success: false, error: error.message };
@@ -649,184 +558,146 @@ Return ONLY valid JSON in the specified format.`;
 /**
  * Generate video from Manim code with audio
  */
-async function generateVideo(manimCode, narration, doubtId) {
-    const timestamp = Date.now();
-    const manimFile = path.join(MANIM_DIR, `doubt_${doubtId}_${timestamp}.py`);
-    const outputVideo = path.join(OUTPUT_DIR, `doubt_${doubtId}_${timestamp}.mp4`);
-    const audioFile = path.join(AUDIO_DIR, `doubt_${doubtId}_${timestamp}.mp3`);
-    const finalVideo = path.join(OUTPUT_DIR, `doubt_${doubtId}_${timestamp}_final.mp4`);
-
-    // Path to virtual environment Python/Manim
-    const venvPath = path.join(__dirname, '..', '..', '.venv');
-    const isWindows = process.platform === 'win32';
-    const pythonPath = isWindows 
-        ? path.join(venvPath, 'Scripts', 'python.exe')
-        : path.join(venvPath, 'bin', 'python');
-    const manimPath = isWindows
-        ? path.join(venvPath, 'Scripts', 'manim.exe')
-        : path.join(venvPath, 'bin', 'manim');
-
-    try {
-        // Step 1: Write Manim code to file
-        const fullManimCode = `
+/**
+ * Script file content for a doubt's Manim code
+ */
+function wrapDoubtScript(manimCode) {
+    return `
 from manim import *
 
 ${manimCode}
-
-# Render command will be: manim -pql ${manimFile} DoubtAnimation
 `;
+}
+
+/**
+ * Doubt Manim code back from a (repaired) script file's content
+ */
+function unwrapDoubtScript(source) {
+    const header = wrapDoubtScript('').replace(/\n+$/, '\n');
+    return source.startsWith(header) ? source.slice(header.length).trim() : source;
+}
+
+/**
+ * Pre-flight a doubt script before it is queued: repair it if possible,
+ * fall back to the topic template if not, and skip the quality upgrades
+ * when the estimated video is too long for a doubt answer.
+ */
+async function prepareDoubtScript(manimCode, topic) {
+    const preflight = await preflightScript(wrapDoubtScript(manimCode), {
+        sceneName: DOUBT_SCENE_NAME,
+        maxSeconds: DOUBT_MAX_SECONDS,
+        repair: true
+    });
+
+    if (!preflight.ok || (preflight.sceneName && preflight.sceneName !== DOUBT_SCENE_NAME)) {
+        const reason = preflight.ok ? `scene is ${preflight.sceneName}, not ${DOUBT_SCENE_NAME}` : describePreflightErrors(preflight);
+        console.log(`⚠️ Generated Manim code failed pre-flight (${reason}), using the default animation`);
+        return { manimCode: getDefaultManimCode(topic || ''), maxQuality: DOUBT_MAX_QUALITY, preflight: preflight.verdict, animationCount: null };
+    }
+
+    if (preflight.repairedSource) {
+        console.log(`🔧 Repaired doubt script: ${preflight.repairs.join(', ')}`);
+        manimCode = unwrapDoubtScript(preflight.repairedSource);
+    }
+
+    if (preflight.downgrade) {
+        console.log(`⏬ Doubt animation estimated at ${Math.round(preflight.estimatedSeconds)}s, keeping it at ${QUALITIES[FIRST_QUALITY].label}`);
+    }
+    return {
+        manimCode,
+        maxQuality: preflight.downgrade ? FIRST_QUALITY : DOUBT_MAX_QUALITY,
+        preflight: preflight.verdict,
+        animationCount: preflight.skipped ? null : preflight.animationCount
+    };
+}
+
+/**
+ * Render the doubt animation at the first rung of the quality ladder,
+ * narrate and publish it, then queue the better renditions up to maxQuality
+ * (see renderDoubtRendition).
+ * @param {Object} options
+ * @param {string} options.progressId - id the client follows on /api/progress/doubt/:id
+ * @param {number} options.animationCount - pre-flight animation count (for percent and ETA)
+ */
+async function generateVideo(manimCode, narration, doubtId, maxQuality = DOUBT_MAX_QUALITY, jobId = null, { progressId, animationCount } = {}) {
+    const stem = `doubt_${doubtId}_${Date.now()}`;
+    const progress = createProgressTracker('doubt', progressId || doubtId, { total: animationCount });
+    const manimFile = path.join(MANIM_DIR, `${stem}.py`);
+    const audioFile = path.join(AUDIO_DIR, `${stem}.m4a`);
+    const segmentDir = path.join(AUDIO_DIR, stem);
+
+    try {
+        // Step 1: Write Manim code to file
+        // Keep the file content deterministic so identical doubts share a cached render
+        const fullManimCode = wrapDoubtScript(manimCode);
         fs.writeFileSync(manimFile, fullManimCode);
         console.log(`📝 Manim code written to: ${manimFile}`);
 
-        // Step 2: Generate video using Manim from virtual environment
-        console.log(`🎬 Generating Manim animation...`);
-        console.log(`📍 Using Manim from: ${manimPath}`);
-        
-        try {
-            // Use the virtual environment's manim
-            let manimCmd;
-            if (fs.existsSync(manimPath)) {
-                manimCmd = `"${manimPath}" -qm "${manimFile}" DoubtAnimation`;
-            } else {
-                // Fallback: try using python -m manim
-                manimCmd = `"${pythonPath}" -m manim -qm "${manimFile}" DoubtAnimation`;
-            }
-            
-            console.log(`🔧 Running: ${manimCmd}`);
-            
-            try {
-                await execPromise(manimCmd, { 
-                    cwd: path.dirname(manimFile),
-                    timeout: 180000, // 3 minute timeout
-                    shell: true
-                });
-                console.log(`✅ Manim completed successfully`);
-            } catch (execError) {
-                console.log(`⚠️ Manim execution warning (may still have generated video): ${execError.message}`);
-            }
-            
-            // Manim outputs to media/videos folder, find the actual output
-            const mediaDir = path.join(path.dirname(manimFile), 'media', 'videos');
-            console.log(`🔍 Looking for video in: ${mediaDir}`);
-            
-            if (fs.existsSync(mediaDir)) {
-                // Find the generated video (look for the most recent DoubtAnimation.mp4)
-                const findVideo = (dir, depth = 0) => {
-                    if (depth > 5) return null; // Prevent infinite recursion
-                    
-                    try {
-                        const items = fs.readdirSync(dir);
-                        let mostRecentVideo = null;
-                        let mostRecentTime = 0;
-                        
-                        for (const item of items) {
-                            const fullPath = path.join(dir, item);
-                            const stat = fs.statSync(fullPath);
-                            
-                            if (stat.isDirectory()) {
-                                const found = findVideo(fullPath, depth + 1);
-                                if (found) {
-                                    const foundStat = fs.statSync(found);
-                                    if (foundStat.mtimeMs > mostRecentTime) {
-                                        mostRecentVideo = found;
-                                        mostRecentTime = foundStat.mtimeMs;
-                                    }
-                                }
-                            } else if (item.endsWith('.mp4') && item.includes('DoubtAnimation')) {
-                                if (stat.mtimeMs > mostRecentTime) {
-                                    mostRecentVideo = fullPath;
-                                    mostRecentTime = stat.mtimeMs;
-                                }
-                            }
-                        }
-                        
-                        return mostRecentVideo;
-                    } catch (e) {
-                        console.log(`Error reading directory: ${e.message}`);
-                        return null;
-                    }
-                };
-                
-                const generatedVideo = findVideo(mediaDir);
-                if (generatedVideo) {
-                    // Copy to output directory
-                    fs.copyFileSync(generatedVideo, outputVideo);
-                    console.log(`✅ Video found and copied to: ${outputVideo}`);
-                } else {
-                    console.log(`⚠️ No DoubtAnimation.mp4 found in media directory`);
-                }
-            } else {
-                console.log(`⚠️ Media directory not found: ${mediaDir}`);
-            }
-        } catch (manimError) {
-            console.log(`⚠️ Manim error: ${manimError.message}`);
-            // Return the code without video for now
-            return {
-                success: true,
-                manimCode: manimCode,
-                manimFile: manimFile,
-                videoUrl: null,
-                audioUrl: null,
-                message: 'Manim code generated. Video rendering failed: ' + manimError.message
-            };
-        }
-
-        // Step 3: Generate audio from narration (using TTS)
+        // Step 2: Synthesize the narration segments in parallel; the scene is
+        // lengthened where the narration runs longer than the animation
+        let narrationPlan = null;
         if (narration && narration.length > 0) {
             console.log(`🔊 Generating audio narration...`);
-            const narrationText = Array.isArray(narration) ? narration.join(' ') : narration;
-            
-            // Try to use edge-tts from virtual environment
-            try {
-                const edgeTtsPath = isWindows
-                    ? path.join(venvPath, 'Scripts', 'edge-tts.exe')
-                    : path.join(venvPath, 'bin', 'edge-tts');
-                
-                let ttsCmd;
-                if (fs.existsSync(edgeTtsPath)) {
-                    ttsCmd = `"${edgeTtsPath}" --text "${narrationText.replace(/"/g, '\\"')}" --write-media "${audioFile}"`;
-                } else {
-                    ttsCmd = `"${pythonPath}" -m edge_tts --text "${narrationText.replace(/"/g, '\\"')}" --write-media "${audioFile}"`;
-                }
-                
-                await execPromise(ttsCmd, { timeout: 60000, shell: true });
-                console.log(`✅ Audio generated: ${audioFile}`);
-            } catch (ttsError) {
-                console.log(`⚠️ TTS not available: ${ttsError.message}`);
-            }
+            progress.stage('tts');
+            narrationPlan = await prepareNarration(manimFile, {
+                sceneName: DOUBT_SCENE_NAME,
+                narration,
+                audioDir: segmentDir,
+                priority: JOB_PRIORITIES.doubt
+            });
         }
 
-        // Step 4: Combine video and audio using ffmpeg
-        if (fs.existsSync(outputVideo) && fs.existsSync(audioFile)) {
-            console.log(`🎥 Combining video and audio...`);
-            try {
-                const ffmpegCmd = `ffmpeg -i "${outputVideo}" -i "${audioFile}" -c:v copy -c:a aac -map 0:v:0 -map 1:a:0 -shortest "${finalVideo}"`;
-                await execPromise(ffmpegCmd, { timeout: 60000, shell: true });
-                console.log(`✅ Final video with audio: ${finalVideo}`);
-                
-                return {
-                    success: true,
-                    manimCode: manimCode,
-                    manimFile: manimFile,
-                    videoUrl: `/videos/${path.basename(finalVideo)}`,
-                    audioUrl: `/audio/${path.basename(audioFile)}`
-                };
-            } catch (ffmpegError) {
-                console.log(`⚠️ FFmpeg error: ${ffmpegError.message}`);
+        // Step 3: Render the animation on the warm Manim worker pool (identical scripts hit the cache)
+        // Step 4: Place every narration segment at its start time and publish the video
+        console.log(`🎬 Generating Manim animation...`);
+        progress.stage('render');
+        const segments = narrationPlan ? narrationPlan.segments : null;
+        const published = await withScratch(stem, async (scratchDir) => {
+            // A failed render is classified from its traceback, fixed and retried
+            const renderResult = await renderWithRepair({
+                scriptPath: manimFile,
+                sceneName: DOUBT_SCENE_NAME,
+                quality: FIRST_QUALITY,
+                mediaDir: scratchDir,
+                cwd: MANIM_DIR,
+                fragments: RENDER_FRAGMENTS,
+                timeoutMs: 180000, // 3 minute timeout
+                onEvent: progress.handleEvent,
+                priority: JOB_PRIORITIES.doubt
+            }, { llmFix: requestScriptFix });
+            if (renderResult.repairs && renderResult.repairs.length > 0) {
+                manimCode = unwrapDoubtScript(fs.readFileSync(manimFile, 'utf-8'));
             }
-        }
+            if (!renderResult.success || !renderResult.videoPath || !fs.existsSync(renderResult.videoPath)) {
+                const failure = renderResult.failure;
+                console.log(`⚠️ Manim execution failed${failure ? ` (${failure.cause})` : ''}: ${renderResult.error || 'no video produced'}`);
+                if (failure && failure.traceback) console.log(failure.traceback);
+                return null;
+            }
+            console.log(`✅ Manim ${renderResult.cached ? 'cache hit' : `completed in ${renderResult.elapsedMs}ms`}`);
+            progress.stage('mux');
+            return publishDoubtVideo(renderResult.videoPath, stem, FIRST_QUALITY, {
+                segments,
+                audioPath: audioFile,
+                scratchDir,
+                jobId
+            });
+        });
 
-        // Return video without audio if audio failed
-        if (fs.existsSync(outputVideo)) {
+        if (published) {
+            await queueDoubtUpgrades(manimFile, segments, published.videoUrl, maxQuality);
+            progress.finish({ success: true, videoUrl: published.videoUrl });
             return {
                 success: true,
                 manimCode: manimCode,
                 manimFile: manimFile,
-                videoUrl: `/videos/${path.basename(outputVideo)}`,
-                audioUrl: null
+                videoUrl: published.videoUrl,
+                audioUrl: published.audioUrl,
+                renditions: [published.rendition]
             };
         }
 
+        progress.finish({ success: false, error: 'No video was rendered' });
         return {
             success: true,
             manimCode: manimCode,
@@ -838,6 +709,7 @@ ${manimCode}
 
     } catch (error) {
         console.error(`❌ Video generation error: ${error.message}`);
+        progress.finish({ success: false, error: error.message });
         return {
             success: false,
             error: error.message,
@@ -846,40 +718,148 @@ ${manimCode}
     }
 }
 
+/**
+ * Queue the better renditions of a published doubt video. The upgrade jobs
+ * re-render the same (already narration-padded) script and reuse its audio.
+ */
+async function queueDoubtUpgrades(manimFile, segments, publishedUrl, maxQuality) {
+    try {
+        await enqueueUpgrades('doubt', { manimFile, segments, publishedUrl }, { maxQuality });
+    } catch (error) {
+        console.log(`⚠️ Could not queue doubt renditions: ${error.message}`);
+    }
+}
+
+/**
+ * Narrate a rendered doubt video (when there are segments) and publish it
+ * under its deterministic name: <stem>.mp4 for the first rendition,
+ * <stem>_<quality>.mp4 for the upgrades.
+ * @param {string} options.audioPath - also write the mixed narration here (m4a)
+ */
+async function publishDoubtVideo(videoPath, stem, quality, { segments, audioPath, scratchDir, jobId } = {}) {
+    const outputPath = path.join(OUTPUT_DIR, quality === FIRST_QUALITY ? `${stem}.mp4` : `${stem}_${quality}.mp4`);
+    let sourcePath = videoPath;
+    let audioUrl = null;
+
+    if (segments && segments.length > 0) {
+        console.log(`🎥 Combining video and audio...`);
+        const narratedPath = path.join(scratchDir, 'narrated.mp4');
+        const muxResult = await muxNarration(videoPath, segments, narratedPath, { audioPath });
+        if (muxResult.success) {
+            sourcePath = narratedPath;
+            audioUrl = audioPath ? `/audio/${path.basename(audioPath)}` : null;
+        } else {
+            console.log(`⚠️ FFmpeg error, publishing the silent video: ${muxResult.error}`);
+        }
+    }
+
+    const entry = await publishRender(`${stem}_${quality}`, sourcePath, outputPath, {
+        move: sourcePath !== videoPath,
+        jobId,
+        sceneName: DOUBT_SCENE_NAME,
+        quality,
+        narrated: sourcePath !== videoPath
+    });
+    const videoUrl = `/videos/${path.basename(entry.path)}`;
+    console.log(`✅ Doubt video published: ${entry.path}`);
+    return { entry, videoUrl, audioUrl, rendition: makeRendition(quality, videoUrl, entry.path) };
+}
+
+/**
+ * Render one better rendition of a published doubt video ('upgrade' job payload)
+ * @returns {Promise<{success, quality, publishedUrl, rendition, error}>}
+ */
+async function renderDoubtRendition({ manimFile, segments, publishedUrl, quality }, job = {}) {
+    const stem = path.basename(manimFile).replace(/\.py$/, '');
+    return withScratch(`${stem}_${quality}`, async (scratchDir) => {
+        const renderResult = await renderWithCache({
+            scriptPath: manimFile,
+            sceneName: DOUBT_SCENE_NAME,
+            quality,
+            mediaDir: scratchDir,
+            cwd: MANIM_DIR,
+            fragments: RENDER_FRAGMENTS,
+            timeoutMs: 600000,
+            priority: job.priority || JOB_PRIORITIES.upgrade
+        });
+        if (!renderResult.success || !renderResult.videoPath || !fs.existsSync(renderResult.videoPath)) {
+            return { success: false, quality, publishedUrl, error: renderResult.error || 'no video produced' };
+        }
+
+        const published = await publishDoubtVideo(renderResult.videoPath, stem, quality, { segments, scratchDir, jobId: job.jobId });
+        return { success: true, quality, publishedUrl, rendition: published.rendition };
+    });
+}
+
+// Doubt videos go through the render job queue ahead of lessons and chapters
+registerJobHandler('doubt', ({ manimCode, narration, doubtId, maxQuality, progressId, animationCount }, job) =>
+    generateVideo(manimCode, narration, doubtId, maxQuality, job.jobId, { progressId, animationCount }));
+
+/**
+ * Stream handlers that report how much of the tutor's answer has arrived
+ * while a doubt is being analyzed
+ */
+function analysisProgress(progressId) {
+    let lastPublished = 0;
+    return {
+        onDelta: (delta, answer, length) => {
+            if (Date.now() - lastPublished < ANALYSIS_PROGRESS_INTERVAL) return;
+            lastPublished = Date.now();
+            publishProgress('doubt', progressId, { stage: 'analyzing', answerChars: length });
+        }
+    };
+}
+
 /**
  * Main function to resolve doubt
+ * @param {Object} options
+ * @param {string} options.progressId - client-chosen id to follow on /api/progress/doubt/:id
  */
-async function resolveDoubt(studentId, studentName, doubtText, imageBase64 = null, studentProfile = {}) {
+async function resolveDoubt(studentId, studentName, doubtText, imageBase64 = null, studentProfile = {}, { progressId } = {}) {
     console.log('\n' + '='.repeat(60));
     console.log('🎓 DOUBT AGENT - Starting doubt resolution');
     console.log('='.repeat(60));
 
-    // Create session
-    const session = await createDoubtSession(studentId, studentName);
+    const doubtId = `${studentId}_${Date.now()}`;
+    startProgress('doubt', progressId || doubtId, 'analyzing');
+
+    // Analyze doubt in the student's doubt session (created on first use)
+    const { session, result: analysis } = await withSession(
+        'doubt',
+        studentId,
+        () => createDoubtSession(studentId, studentName),
+        (doubtSession) => analyzeDoubtWithImage(
+            doubtSession.sessionId,
+            doubtText,
+            imageBase64,
+            studentProfile,
+            analysisProgress(progressId || doubtId)
+        )
+    );
     if (!session) {
+        publishProgress('doubt', progressId || doubtId, { stage: 'failed', error: 'Failed to create session' });
         return { success: false, error: 'Failed to create session' };
     }
 
-    // Analyze doubt
-    const analysis = await analyzeDoubtWithImage(
-        session.sessionId,
-        doubtText,
-        imageBase64,
-        studentProfile
-    );
-
     if (!analysis.success) {
+        publishProgress('doubt', progressId || doubtId, { stage: 'failed', error: analysis.error });
         return { success: false, error: analysis.error, sessionId: session.sessionId };
     }
 
     // Generate video if Manim code is available
     let videoResult = null;
     if (analysis.data.manimCode) {
-        videoResult = await generateVideo(
-            analysis.data.manimCode,
-            analysis.data.narration,
-            `${studentId}_${Date.now()}`
-        );
+        const script = await prepareDoubtScript(analysis.data.manimCode, doubtText);
+        videoResult = await runJob('doubt', {
+            manimCode: script.manimCode,
+            narration: analysis.data.narration,
+            doubtId,
+            maxQuality: script.maxQuality,
+            progressId: progressId || doubtId,
+            animationCount: script.animationCount
+        });
+    } else {
+        publishProgress('doubt', progressId || doubtId, { stage: 'done', videoUrl: null });
     }
 
     return {
@@ -893,26 +873,38 @@ async function resolveDoubt(studentId, studentName, doubtText, imageBase64 = nul
 
 /**
  * Continue conversation with follow-up
+ * @param {Object} options
+ * @param {string} options.progressId - client-chosen id to follow on /api/progress/doubt/:id
  */
-async function continueDoubt(sessionId, followUpText, studentProfile = {}) {
+async function continueDoubt(sessionId, followUpText, studentProfile = {}, { progressId } = {}) {
     console.log('\n' + '='.repeat(60));
     console.log('💬 DOUBT AGENT - Processing follow-up');
     console.log('='.repeat(60));
 
-    const analysis = await followUpDoubt(sessionId, followUpText, studentProfile);
+    const doubtId = `followup_${Date.now()}`;
+    startProgress('doubt', progressId || doubtId, 'analyzing');
+
+    const analysis = await followUpDoubt(sessionId, followUpText, studentProfile, analysisProgress(progressId || doubtId));
 
     if (!analysis.success) {
+        publishProgress('doubt', progressId || doubtId, { stage: 'failed', error: analysis.error });
         return { success: false, error: analysis.error };
     }
 
     // Generate video if new Manim code is provided
     let videoResult = null;
     if (analysis.data.manimCode) {
-        videoResult = await generateVideo(
-            analysis.data.manimCode,
-            analysis.data.narration,
-            `followup_${Date.now()}`
-        );
+        const script = await prepareDoubtScript(analysis.data.manimCode, followUpText);
+        videoResult = await runJob('doubt', {
+            manimCode: script.manimCode,
+            narration: analysis.data.narration,
+            doubtId,
+            maxQuality: script.maxQuality,
+            progressId: progressId || doubtId,
+            animationCount: script.animationCount
+        });
+    } else {
+        publishProgress('doubt', progressId || doubtId, { stage: 'done', videoUrl: null });
     }
 
     return {
@@ -1024,6 +1016,7 @@ module.exports = {
     analyzeDoubtWithImage,
     followUpDoubt,
     generateVideo,
+    renderDoubtRendition,
     resolveDoubt,
     continueDoubt,
     getDefaultManimCode
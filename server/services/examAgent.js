@@ -1,5 +1,9 @@
-const fetch = require('node-fetch');
 const { v4: uuidv4 } = require('uuid');
+const { ondemandFetch } = require('../ondemand/http');
+const { readOnDemandStream } = require('../ondemand/stream');
+const { sessionGone, withSession } = require('../ondemand/sessions');
+const { createQuestionExtractor } = require('../ondemand/jsonQuestions');
+const { bankScope, addToBank, drawQuestions, topUpBank } = require('./questionBank');
 
 const API_KEY = process.env.ONDEMAND_API_KEY || "<your_api_key>";
 console.log('📌 Exam Agent API Key configured:', API_KEY ? `${API_KEY.substring(0, 10)}...` : 'NOT SET');
@@ -17,6 +21,15 @@ const TEMPERATURE = 0.5;  // Reduced for more consistent results
 const TOP_P = 1;
 const MAX_TOKENS = 8000;  // Increased from 4000 to accommodate full exam
 
+// The prompt's paper, used to assemble exams from the question bank
+const EXAM_BLUEPRINT = {
+    counts: { easy: 5, medium: 6, hard: 4 },
+    marks: { easy: 2, medium: 4, hard: 6 },
+    duration: '35 minutes'
+};
+// Bank top-ups run in a session of their own rather than a student's
+const QUESTION_BANK_STUDENT = 'question-bank';
+
 const EXAM_FULFILLMENT_PROMPT = `Role: You are an Adaptive Assessment Specialist for Indian students (Classes 6-12, NCERT curriculum).
 
 Objective: Create a balanced examination that is accessible to "weak learners" while remaining challenging for "strong learners" by adhering to a specific difficulty distribution.
@@ -87,7 +100,7 @@ async function createExamSession(studentId, studentName) {
     console.log(`\n📝 Creating exam session for ${studentName}...`);
 
     try {
-        const response = await fetch(url, {
+        const response = await ondemandFetch(url, {
             method: 'POST',
             headers: {
                 'apikey': API_KEY,
@@ -117,8 +130,9 @@ async function createExamSession(studentId, studentName) {
 
 /**
  * Generate exam questions for a topic
+ * @param {Object} handlers - readOnDemandStream handlers (onDelta, onMetrics) for the streamed answer
  */
-async function generateExamQuestions(sessionId, topic, difficulty = 'mixed') {
+async function generateExamQuestions(sessionId, topic, difficulty = 'mixed', handlers = {}) {
     const url = `${BASE_URL}/sessions/${sessionId}/query`;
 
     const query = `Generate a 15-question examination paper on the topic: "${topic}"
@@ -154,7 +168,7 @@ Return ONLY valid JSON in the exact format specified.`;
     console.log(`🤖 Agent IDs:`, EXAM_AGENT_IDS);
 
     try {
-        const response = await fetch(url, {
+        const response = await ondemandFetch(url, {
             method: 'POST',
             headers: {
                 'apikey': API_KEY,
@@ -169,7 +183,7 @@ Return ONLY valid JSON in the exact format specified.`;
         if (!response.ok) {
             const errorText = await response.text();
             console.error(`❌ API error (${response.status}):`, errorText);
-            return { success: false, error: `API error: ${response.status}` };
+            return { success: false, error: `API error: ${response.status}`, sessionGone: sessionGone(response) };
         }
 
         if (!response.body) {
@@ -177,124 +191,80 @@ Return ONLY valid JSON in the exact format specified.`;
             return { success: false, error: 'No response body' };
         }
 
-        // Handle streaming response like teacherAgent
-        return new Promise((resolve, reject) => {
-            let buffer = '';
-            let fullAnswer = "";
-            let finalSessionId = "";
-            let finalMessageId = "";
-
-            response.body.on('data', (chunk) => {
-                buffer += chunk.toString();
-                const lines = buffer.split('\n');
-                buffer = lines.pop() || '';
-
-                for (const line of lines) {
-                    if (line.startsWith("data:")) {
-                        const dataStr = line.slice(5).trim();
-                        if (dataStr === "[DONE]") {
-                            console.log('📌 Received [DONE] signal');
-                            continue;
-                        }
-
-                        try {
-                            const event = JSON.parse(dataStr);
-                            console.log(`📨 Full event:`, JSON.stringify(event).substring(0, 200));
-                            
-                            // Handle both old and new formats
-                            if (event.answer) {
-                                fullAnswer += event.answer;
-                                console.log(`✍️ Received ${event.answer.length} chars (total: ${fullAnswer.length})`);
-                            }
-                            if (event.sessionId) finalSessionId = event.sessionId;
-                            if (event.messageId) finalMessageId = event.messageId;
-                            
-                        } catch (e) {
-                            console.warn('⚠️ Failed to parse event:', dataStr.substring(0, 100));
-                        }
-                    }
-                }
-            });
-
-            response.body.on('end', () => {
-                console.log(`✅ Exam questions generated successfully`);
-                console.log(`📏 Total answer length: ${fullAnswer.length} characters`);
-                
-                // Parse the JSON response
-                let examData;
-                try {
-                    // Try to extract JSON from the answer
-                    if (!fullAnswer) {
-                        throw new Error('No answer content received');
-                    }
-                    
-                    console.log('📝 Raw answer (first 500 chars):', fullAnswer.substring(0, 500));
-                    console.log('📝 Raw answer (last 200 chars):', fullAnswer.substring(fullAnswer.length - 200));
-                    
-                    // Try multiple JSON extraction strategies
-                    let jsonMatch;
-                    
-                    // Strategy 1: Look for JSON object
-                    jsonMatch = fullAnswer.match(/\{[\s\S]*\}/);
-                    if (jsonMatch) {
-                        console.log('✅ Found JSON using regex');
-                        const jsonStr = jsonMatch[0];
-                        
-                        // Check if JSON appears complete (ends with }])
-                        if (!jsonStr.trim().endsWith('}')) {
-                            console.warn('⚠️ JSON may be incomplete - does not end with }');
-                        }
-                        
-                        examData = JSON.parse(jsonStr);
-                    } else {
-                        // Strategy 2: Try parsing entire answer as JSON
-                        console.log('🔄 Trying to parse entire answer as JSON');
-                        examData = JSON.parse(fullAnswer);
-                    }
-                    
-                    // Validate exam data
-                    if (!examData.questions || !Array.isArray(examData.questions)) {
-                        throw new Error('Invalid exam format: questions array missing');
-                    }
-                    
-                
-                console.log('✅ Successfully parsed exam data:', {
-                    title: examData.examTitle,
-                    totalQuestions: examData.totalQuestions,
-                    actualQuestions: examData.questions.length,
-                    totalMarks: examData.totalMarks
-                });
-                
-                // Warn if question count doesn't match
-                if (examData.questions.length < 15) {
-                    console.warn(`⚠️ Only ${examData.questions.length} questions generated instead of 15`);
+        // Answer deltas can be acted on before the stream ends (handlers.onDelta)
+        const streamed = await readOnDemandStream(response.body, handlers);
+        const fullAnswer = streamed.answer;
+        console.log(`✅ Exam questions generated successfully`);
+        console.log(`📏 Total answer length: ${fullAnswer.length} characters`);
+
+        // Parse the JSON response
+        let examData;
+        try {
+            // Try to extract JSON from the answer
+            if (!fullAnswer) {
+                throw new Error('No answer content received');
+            }
+
+            console.log('📝 Raw answer (first 500 chars):', fullAnswer.substring(0, 500));
+            console.log('📝 Raw answer (last 200 chars):', fullAnswer.substring(fullAnswer.length - 200));
+
+            // Try multiple JSON extraction strategies
+            let jsonMatch;
+
+            // Strategy 1: Look for JSON object
+            jsonMatch = fullAnswer.match(/\{[\s\S]*\}/);
+            if (jsonMatch) {
+                console.log('✅ Found JSON using regex');
+                const jsonStr = jsonMatch[0];
+
+                // Check if JSON appears complete (ends with }])
+                if (!jsonStr.trim().endsWith('}')) {
+                    console.warn('⚠️ JSON may be incomplete - does not end with }');
                 }
-                
-                resolve({
-                    success: true,
-                    sessionId: finalSessionId,
-                    examData: examData,
-                    messageId: finalMessageId
-                });                } catch (parseError) {
-                    console.error(`⚠️ Failed to parse exam JSON: ${parseError.message}`);
-                    console.error('Full answer length:', fullAnswer.length);
-                    console.error('First 500 chars:', fullAnswer.substring(0, 500));
-                    console.error('Last 500 chars:', fullAnswer.substring(Math.max(0, fullAnswer.length - 500)));
-                    
-                    resolve({
-                        success: false,
-                        error: 'Failed to parse exam data',
-                        rawAnswer: fullAnswer
-                    });
-                }
-            });
 
-            response.body.on('error', (err) => {
-                console.error('❌ Stream error:', err.message);
-                reject(err);
-            });
+                examData = JSON.parse(jsonStr);
+            } else {
+                // Strategy 2: Try parsing entire answer as JSON
+                console.log('🔄 Trying to parse entire answer as JSON');
+                examData = JSON.parse(fullAnswer);
+            }
+
+            // Validate exam data
+            if (!examData.questions || !Array.isArray(examData.questions)) {
+                throw new Error('Invalid exam format: questions array missing');
+            }
+        } catch (parseError) {
+            console.error(`⚠️ Failed to parse exam JSON: ${parseError.message}`);
+            console.error('Full answer length:', fullAnswer.length);
+            console.error('First 500 chars:', fullAnswer.substring(0, 500));
+            console.error('Last 500 chars:', fullAnswer.substring(Math.max(0, fullAnswer.length - 500)));
+
+            return {
+                success: false,
+                error: 'Failed to parse exam data',
+                rawAnswer: fullAnswer
+            };
+        }
+
+        console.log('✅ Successfully parsed exam data:', {
+            title: examData.examTitle,
+            totalQuestions: examData.totalQuestions,
+            actualQuestions: examData.questions.length,
+            totalMarks: examData.totalMarks
         });
 
+        // Warn if question count doesn't match
+        if (examData.questions.length < 15) {
+            console.warn(`⚠️ Only ${examData.questions.length} questions generated instead of 15`);
+        }
+
+        return {
+            success: true,
+            sessionId: streamed.sessionId,
+            examData: examData,
+            messageId: streamed.messageId
+        };
+
     } catch (error) {
         console.error(`❌ Exception generating exam: ${error.message}`);
         return {
@@ -305,33 +275,111 @@ Return ONLY valid JSON in the exact format specified.`;
 }
 
 /**
- * Generate a complete exam for a student
+ * Generate more exam questions on a topic for the question bank, in the background
+ */
+function topUpExamBank(scope) {
+    topUpBank(scope, EXAM_BLUEPRINT.counts, async () => {
+        const { result } = await withSession(
+            'exam',
+            QUESTION_BANK_STUDENT,
+            () => createExamSession(QUESTION_BANK_STUDENT, 'Question Bank'),
+            (examSession) => generateExamQuestions(examSession.sessionId, scope.topic, 'mixed')
+        );
+        return result && result.success ? result.examData.questions : null;
+    });
+}
+
+/**
+ * An exam paper from banked questions the student has not seen (null when
+ * the bank does not cover the topic)
+ */
+async function examFromBank(scope, studentId) {
+    let questions;
+    try {
+        questions = await drawQuestions(scope, EXAM_BLUEPRINT.counts, { studentId, marks: EXAM_BLUEPRINT.marks });
+    } catch (error) {
+        console.log(`⚠️ Question bank unavailable: ${error.message}`);
+        return null;
+    }
+    if (!questions) return null;
+
+    return {
+        examTitle: `${scope.topic} Examination`,
+        totalQuestions: questions.length,
+        totalMarks: questions.reduce((sum, q) => sum + q.marks, 0),
+        duration: EXAM_BLUEPRINT.duration,
+        questions
+    };
+}
+
+/**
+ * Generate a complete exam for a student: assembled from the question bank
+ * when it covers the topic, otherwise written by the exam agent (and banked)
+ * @param {Object} options
+ * @param {string} options.examId - id to give the exam (generated if missing)
+ * @param {Function} options.onHeader - (header) exam title, marks, duration as soon as they are streamed
+ * @param {Function} options.onQuestion - (question, index) each question as soon as it is streamed
+ * @param {string} options.grade - question bank grade (Class 9 by default)
+ * @param {string} options.subject - question bank subject (Mathematics by default)
+ * @param {boolean} options.fresh - skip the question bank and have the agent write new questions
  */
-async function generateExam(studentId, studentName, topic) {
+async function generateExam(studentId, studentName, topic, { examId, onHeader, onQuestion, grade, subject, fresh = false } = {}) {
     console.log(`\n=== 📋 Generating Exam for ${studentName} ===`);
     console.log(`Topic: ${topic}`);
 
-    // Create session
-    const session = await createExamSession(studentId, studentName);
+    const scope = bankScope('exam', topic, { grade, subject });
+    const banked = fresh ? null : await examFromBank(scope, studentId);
+    if (banked) {
+        console.log(`🏦 Exam assembled from the question bank (${banked.questions.length} questions)`);
+        if (onHeader) {
+            const { questions, ...header } = banked;
+            onHeader(header);
+        }
+        if (onQuestion) banked.questions.forEach(onQuestion);
+        topUpExamBank(scope);
+        return {
+            success: true,
+            examId: examId || `EXAM-${Date.now()}`,
+            sessionId: null,
+            studentId: studentId,
+            studentName: studentName,
+            topic: topic,
+            examData: banked,
+            fromBank: true,
+            createdAt: new Date().toISOString()
+        };
+    }
+
+    // Generate questions in the student's exam session (created on first use),
+    // handing each one out while the rest is still being written
+    const extractor = onHeader || onQuestion ? createQuestionExtractor({ onHeader, onQuestion }) : null;
+    const { session, result } = await withSession(
+        'exam',
+        studentId,
+        () => createExamSession(studentId, studentName),
+        (examSession) => generateExamQuestions(examSession.sessionId, topic, 'mixed',
+            extractor ? { onDelta: (delta) => extractor.push(delta) } : {})
+    );
     if (!session) {
         return {
             success: false,
             error: 'Failed to create exam session'
         };
     }
-
-    // Generate questions
-    const result = await generateExamQuestions(session.sessionId, topic);
     
     if (result.success) {
+        const generatedId = examId || `EXAM-${Date.now()}`;
+        addToBank(scope, result.examData.questions, { sourceId: generatedId, studentId })
+            .catch(error => console.log(`⚠️ Could not bank exam questions: ${error.message}`));
         return {
             success: true,
-            examId: `EXAM-${Date.now()}`,
+            examId: generatedId,
             sessionId: session.sessionId,
             studentId: studentId,
             studentName: studentName,
             topic: topic,
             examData: result.examData,
+            fromBank: false,
             createdAt: new Date().toISOString()
         };
     }
@@ -0,0 +1,180 @@
+// ==================== PRECOMPUTE CONFIGURATION ====================
+// After a quiz or exam is submitted the student usually asks for fresh
+// analytics and then a lesson on their weakest concept, each an LLM call
+// (plus a render). Both are computed speculatively in the background right
+// after the submission so those requests can answer at once.
+const PRECOMPUTE = process.env.PRECOMPUTE !== '0';
+// Wait this long before starting, so back-to-back submissions run once
+const PRECOMPUTE_DELAY = parseInt(process.env.PRECOMPUTE_DELAY || '5', 10) * 1000;
+// Speculative LLM steps and renders a student may use per budget window
+const PRECOMPUTE_BUDGET = parseInt(process.env.PRECOMPUTE_BUDGET || '6', 10);
+const PRECOMPUTE_BUDGET_WINDOW = parseInt(process.env.PRECOMPUTE_BUDGET_HOURS || '24', 10) * 60 * 60 * 1000;
+
+let pipeline = null;
+// studentId -> { controller, steps, trigger, stage, scheduledAt, timer }
+const runs = new Map();
+// studentId -> timestamps of the steps spent within the budget window
+const spending = new Map();
+
+const stats = {
+    scheduled: 0,
+    completed: 0,
+    cancelled: 0,
+    failed: 0,
+    stepsRun: 0,
+    overBudget: 0,
+    joined: 0
+};
+
+/**
+ * Register the pre-computation pipeline:
+ * pipeline(context, run) with
+ *   run.signal           - AbortSignal, aborted when the run is cancelled
+ *   run.step(name, fn)   - run fn() as a named step others can join (joinPrecompute)
+ *   run.spend(units)     - take units (1 by default) of the student's budget, all or
+ *                          none (false when there are not enough left)
+ *
+ * A cancelled run's signal is aborted; the pipeline checks it after each
+ * step and throws away what the step produced.
+ */
+function registerPrecompute(fn) {
+    pipeline = fn;
+}
+
+function budgetUsed(studentId) {
+    const since = Date.now() - PRECOMPUTE_BUDGET_WINDOW;
+    const used = (spending.get(studentId) || []).filter(at => at > since);
+    if (used.length > 0) spending.set(studentId, used);
+    else spending.delete(studentId);
+    return used;
+}
+
+function spend(studentId, units = 1) {
+    const used = budgetUsed(studentId);
+    if (used.length + units > PRECOMPUTE_BUDGET) {
+        stats.overBudget++;
+        return false;
+    }
+    const now = Date.now();
+    for (let i = 0; i < units; i++) used.push(now);
+    spending.set(studentId, used);
+    return true;
+}
+
+/**
+ * Cancel the student's pre-computation (queued or running). A step that is
+ * running finishes, but the pipeline stops at its next checkpoint.
+ * @returns {boolean} whether there was one
+ */
+function cancelPrecompute(studentId, reason = 'cancelled') {
+    const run = runs.get(studentId);
+    if (!run) return false;
+    runs.delete(studentId);
+    clearTimeout(run.timer);
+    run.controller.abort(new Error(`Pre-computation ${reason}`));
+    stats.cancelled++;
+    console.log(`🛑 Pre-computation for ${studentId} ${reason}`);
+    return true;
+}
+
+async function execute(studentId, run, context) {
+    run.stage = 'running';
+    const handle = {
+        signal: run.controller.signal,
+        step(name, fn) {
+            run.controller.signal.throwIfAborted();
+            const promise = Promise.resolve().then(fn);
+            run.steps.set(name, promise);
+            stats.stepsRun++;
+            return promise;
+        },
+        spend: (units) => spend(studentId, units)
+    };
+
+    try {
+        await pipeline(context, handle);
+        if (!run.controller.signal.aborted) {
+            stats.completed++;
+            console.log(`🔮 Pre-computation for ${studentId} finished`);
+        }
+    } catch (error) {
+        if (!run.controller.signal.aborted) {
+            stats.failed++;
+            console.log(`⚠️ Pre-computation for ${studentId} failed: ${error.message}`);
+        }
+    } finally {
+        if (runs.get(studentId) === run) runs.delete(studentId);
+    }
+}
+
+/**
+ * Pre-compute for a student after a submission. A newer submission
+ * replaces (cancels) the student's previous run.
+ *
+ * @param {string} studentId - whose results to pre-compute
+ * @param {Object} context - passed to the pipeline (studentName, trigger, ...)
+ * @returns {boolean} whether a run was scheduled
+ */
+function schedulePrecompute(studentId, context = {}) {
+    if (!PRECOMPUTE || !pipeline || !studentId) return false;
+    if (budgetUsed(studentId).length >= PRECOMPUTE_BUDGET) {
+        stats.overBudget++;
+        console.log(`💤 Pre-computation budget of ${studentId} used up`);
+        return false;
+    }
+    cancelPrecompute(studentId, 'superseded');
+
+    const run = {
+        controller: new AbortController(),
+        steps: new Map(),
+        trigger: context.trigger || null,
+        stage: 'scheduled',
+        scheduledAt: Date.now(),
+        timer: null
+    };
+    run.timer = setTimeout(() => execute(studentId, run, { studentId, ...context }), PRECOMPUTE_DELAY);
+    run.timer.unref();
+    runs.set(studentId, run);
+    stats.scheduled++;
+    return true;
+}
+
+/**
+ * The student's pre-computation step in progress (or finished in the
+ * current run) as a promise of its result, or null if there is none
+ */
+function joinPrecompute(studentId, step) {
+    const run = runs.get(studentId);
+    const promise = run && run.steps.get(step);
+    if (!promise) return null;
+    stats.joined++;
+    return promise;
+}
+
+function getPrecomputeStats(studentId = null) {
+    const summary = {
+        enabled: PRECOMPUTE,
+        delaySeconds: PRECOMPUTE_DELAY / 1000,
+        budget: PRECOMPUTE_BUDGET,
+        budgetWindowHours: PRECOMPUTE_BUDGET_WINDOW / 3600000,
+        active: runs.size,
+        ...stats
+    };
+    if (studentId) {
+        const run = runs.get(studentId);
+        summary.student = {
+            studentId,
+            budgetUsed: budgetUsed(studentId).length,
+            run: run ? { trigger: run.trigger, stage: run.stage, steps: [...run.steps.keys()], scheduledAt: run.scheduledAt } : null
+        };
+    }
+    return summary;
+}
+
+module.exports = {
+    registerPrecompute,
+    schedulePrecompute,
+    cancelPrecompute,
+    joinPrecompute,
+    getPrecomputeStats
+};
@@ -0,0 +1,309 @@
+const crypto = require('crypto');
+const mongoose = require('mongoose');
+const { BankQuestion, SeenQuestion } = require('../models/QuestionBank');
+const { Exam } = require('../models/Exam');
+const { Assignment } = require('../models/Assignment');
+
+// ==================== QUESTION BANK CONFIGURATION ====================
+// Every generated exam and assignment question is banked per (source,
+// grade, subject, topic, difficulty): exams and assignments keep separate
+// pools, since assignment practice questions are not exam questions.
+// Papers are assembled from the bank first, skipping questions a student
+// has already had, and the LLM is only asked when a topic is not covered
+// (or to top the bank up in the background).
+const QUESTION_BANK = process.env.QUESTION_BANK !== '0';
+// A topic is topped up while it holds fewer than this many papers' worth per difficulty
+const QUESTION_BANK_SPARE_PAPERS = parseInt(process.env.QUESTION_BANK_SPARE_PAPERS || '3', 10);
+const DEFAULT_GRADE = 'Class 9';
+const DEFAULT_SUBJECT = 'Mathematics';
+const DIFFICULTIES = ['easy', 'medium', 'hard'];
+// Candidates fetched per needed question, so weak concepts can be preferred
+const CANDIDATE_FACTOR = 3;
+
+// Top-ups in flight, one per scope
+const topUps = new Map();
+
+const stats = {
+    papersServed: 0,
+    questionsServed: 0,
+    uncovered: 0,
+    questionsAdded: 0,
+    topUps: 0,
+    topUpFailures: 0
+};
+
+function isAvailable() {
+    return QUESTION_BANK && mongoose.connection.readyState === 1;
+}
+
+function normalize(text) {
+    return String(text || '').trim().toLowerCase().replace(/\s+/g, ' ');
+}
+
+/**
+ * Where a paper's questions are looked up: source ('exam' or
+ * 'assignment'), grade, subject and topic
+ */
+function bankScope(source, topic, { grade, subject } = {}) {
+    return {
+        source,
+        grade: grade || DEFAULT_GRADE,
+        subject: subject || DEFAULT_SUBJECT,
+        topic,
+        topicKey: normalize(topic)
+    };
+}
+
+function scopeFilter(scope) {
+    return { source: scope.source, grade: scope.grade, subject: scope.subject, topicKey: scope.topicKey };
+}
+
+function questionKey(scope, question) {
+    return crypto.createHash('sha256')
+        .update(JSON.stringify([
+            scope.source,
+            scope.grade,
+            scope.subject,
+            scope.topicKey,
+            normalize(question.question),
+            (question.options || []).map(normalize)
+        ]))
+        .digest('hex');
+}
+
+/**
+ * Record that a student has had these bank questions
+ */
+async function markSeen(scope, studentId, questionIds) {
+    if (!studentId || questionIds.length === 0) return;
+    await SeenQuestion.bulkWrite(questionIds.map(questionId => ({
+        updateOne: {
+            filter: { studentId, ...scopeFilter(scope), questionId },
+            update: { $setOnInsert: { seenAt: new Date() } },
+            upsert: true
+        }
+    })), { ordered: false });
+}
+
+/**
+ * Bank the questions of a generated exam or assignment. Questions already
+ * in the bank only record that studentId has seen them.
+ *
+ * @param {Object} scope - from bankScope()
+ * @param {Array} questions - generated questions ({ question, options, correctAnswer, difficulty, ... })
+ * @param {Object} origin
+ * @param {string} origin.sourceId - examId / assignmentId
+ * @param {string} origin.studentId - student the questions were generated for
+ * @returns {Promise<number>} questions that were new to the bank
+ */
+async function addToBank(scope, questions, { sourceId = null, studentId = null } = {}) {
+    if (!isAvailable() || !Array.isArray(questions)) return 0;
+
+    const operations = [];
+    for (const q of questions) {
+        const difficulty = normalize(q.difficulty);
+        if (!q.question || !q.correctAnswer || !DIFFICULTIES.includes(difficulty)) continue;
+        operations.push({
+            updateOne: {
+                filter: { questionKey: questionKey(scope, q) },
+                update: {
+                    $setOnInsert: {
+                        ...scopeFilter(scope),
+                        topic: scope.topic,
+                        difficulty,
+                        question: q.question,
+                        options: q.options || [],
+                        correctAnswer: q.correctAnswer,
+                        marks: q.marks,
+                        concept: q.concept,
+                        explanation: q.explanation,
+                        sourceId,
+                        createdAt: new Date()
+                    }
+                },
+                upsert: true
+            }
+        });
+    }
+    if (operations.length === 0) return 0;
+
+    const result = await BankQuestion.bulkWrite(operations, { ordered: false });
+    stats.questionsAdded += result.upsertedCount;
+    if (result.upsertedCount > 0) {
+        console.log(`🏦 Banked ${result.upsertedCount} new ${scope.source} question(s) for ${scope.topic}`);
+    }
+    if (studentId) {
+        const banked = await BankQuestion.find(
+            { questionKey: { $in: operations.map(op => op.updateOne.filter.questionKey) } },
+            '_id'
+        ).lean();
+        await markSeen(scope, studentId, banked.map(q => q._id));
+    }
+    return result.upsertedCount;
+}
+
+/**
+ * Pick questions for a paper: counts[difficulty] of each difficulty, least
+ * served first, none that studentId has already seen. Questions on one of
+ * focusConcepts are preferred. The picked questions are marked as served.
+ *
+ * @param {Object} scope - from bankScope()
+ * @param {Object} counts - questions per difficulty
+ * @param {Object} options
+ * @param {string} options.studentId - who the paper is for
+ * @param {Array} options.focusConcepts - concepts to prefer (weak concepts)
+ * @param {Object} options.marks - marks per difficulty (the banked marks when missing)
+ * @returns {Promise<Array|null>} paper questions numbered from 1 (easy, then
+ *   medium, then hard), or null when the bank cannot fill the paper
+ */
+async function drawQuestions(scope, counts, { studentId = null, focusConcepts = [], marks = {} } = {}) {
+    if (!isAvailable()) return null;
+
+    const focus = focusConcepts.map(normalize).filter(Boolean);
+    const isFocus = (q) => focus.some(concept => normalize(q.concept).includes(concept));
+
+    // The student's seen questions of this scope (bounded by the papers they took)
+    const seen = studentId
+        ? await SeenQuestion.distinct('questionId', { studentId, ...scopeFilter(scope) })
+        : [];
+
+    const picked = [];
+    for (const difficulty of DIFFICULTIES) {
+        const count = counts[difficulty] || 0;
+        if (count === 0) continue;
+
+        const filter = { ...scopeFilter(scope), difficulty };
+        if (seen.length > 0) filter._id = { $nin: seen };
+        const candidates = await BankQuestion.find(filter)
+            .sort({ timesServed: 1, createdAt: 1 })
+            .limit(count * (focus.length > 0 ? CANDIDATE_FACTOR : 1))
+            .lean();
+        if (candidates.length < count) {
+            stats.uncovered++;
+            return null;
+        }
+        // Stable: among focus and non-focus questions, least served stay first
+        const ordered = focus.length > 0
+            ? [...candidates.filter(isFocus), ...candidates.filter(q => !isFocus(q))]
+            : candidates;
+        picked.push(...ordered.slice(0, count));
+    }
+    if (picked.length === 0) return null;
+
+    await BankQuestion.updateMany(
+        { _id: { $in: picked.map(q => q._id) } },
+        { $inc: { timesServed: 1 }, $set: { lastServedAt: new Date() } }
+    );
+    await markSeen(scope, studentId, picked.map(q => q._id));
+    stats.papersServed++;
+    stats.questionsServed += picked.length;
+    return picked.map((q, index) => ({
+        id: index + 1,
+        question: q.question,
+        options: q.options,
+        correctAnswer: q.correctAnswer,
+        difficulty: q.difficulty,
+        marks: marks[q.difficulty] || q.marks,
+        concept: q.concept,
+        explanation: q.explanation
+    }));
+}
+
+/**
+ * Ask generate() for more questions of a scope in the background when the
+ * bank holds fewer than QUESTION_BANK_SPARE_PAPERS papers' worth of some
+ * difficulty. At most one top-up per scope runs at a time.
+ *
+ * @param {Object} scope - from bankScope()
+ * @param {Object} counts - questions per difficulty in one paper
+ * @param {Function} generate - async () => generated questions (or null)
+ */
+function topUpBank(scope, counts, generate) {
+    if (!isAvailable()) return;
+    const key = `${scope.source}:${scope.grade}:${scope.subject}:${scope.topicKey}`;
+    if (topUps.has(key)) return;
+
+    const run = (async () => {
+        const held = await BankQuestion.aggregate([
+            { $match: scopeFilter(scope) },
+            { $group: { _id: '$difficulty', count: { $sum: 1 } } }
+        ]);
+        const heldBy = Object.fromEntries(held.map(row => [row._id, row.count]));
+        const short = DIFFICULTIES.some(d => (heldBy[d] || 0) < (counts[d] || 0) * QUESTION_BANK_SPARE_PAPERS);
+        if (!short) return;
+
+        stats.topUps++;
+        console.log(`🏦 Topping up ${scope.source} questions for ${scope.topic}`);
+        const questions = await generate();
+        if (!questions) {
+            stats.topUpFailures++;
+            return;
+        }
+        await addToBank(scope, questions);
+    })()
+        .catch((error) => {
+            stats.topUpFailures++;
+            console.log(`⚠️ Question bank top-up failed: ${error.message}`);
+        })
+        .finally(() => topUps.delete(key));
+    topUps.set(key, run);
+}
+
+/**
+ * Bank the questions of the exams and assignments generated before the
+ * bank existed (only when it is still empty)
+ */
+async function backfillQuestionBank() {
+    if (!isAvailable() || await BankQuestion.estimatedDocumentCount() > 0) return;
+
+    let added = 0;
+    for (const [Model, source, idField] of [[Exam, 'exam', 'examId'], [Assignment, 'assignment', 'assignmentId']]) {
+        const cursor = Model.find({ status: { $ne: 'generating' } })
+            .select(`${idField} studentId topic questions`)
+            .lean()
+            .cursor();
+        for await (const doc of cursor) {
+            added += await addToBank(bankScope(source, doc.topic), doc.questions, {
+                sourceId: doc[idField],
+                studentId: doc.studentId
+            });
+        }
+    }
+    if (added > 0) console.log(`🏦 Question bank backfilled with ${added} questions`);
+}
+
+/**
+ * Bank size per topic and difficulty, plus usage counters
+ */
+async function getQuestionBankStats() {
+    const topics = isAvailable()
+        ? await BankQuestion.aggregate([
+            {
+                $group: {
+                    _id: { source: '$source', grade: '$grade', subject: '$subject', topicKey: '$topicKey', difficulty: '$difficulty' },
+                    topic: { $first: '$topic' },
+                    questions: { $sum: 1 },
+                    timesServed: { $sum: '$timesServed' }
+                }
+            },
+            { $sort: { '_id.source': 1, '_id.topicKey': 1, '_id.difficulty': 1 } }
+        ])
+        : [];
+    return {
+        enabled: QUESTION_BANK,
+        available: isAvailable(),
+        sparePapers: QUESTION_BANK_SPARE_PAPERS,
+        topUpsInFlight: topUps.size,
+        ...stats,
+        topics: topics.map(row => ({ ...row._id, topic: row.topic, questions: row.questions, timesServed: row.timesServed }))
+    };
+}
+
+module.exports = {
+    bankScope,
+    addToBank,
+    drawQuestions,
+    topUpBank,
+    backfillQuestionBank,
+    getQuestionBankStats
+};
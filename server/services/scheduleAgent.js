@@ -1,5 +1,7 @@
-const fetch = require('node-fetch');
 const { v4: uuidv4 } = require('uuid');
+const { ondemandFetch } = require('../ondemand/http');
+const { readOnDemandStream } = require('../ondemand/stream');
+const { sessionGone, withSession } = require('../ondemand/sessions');
 
 const API_KEY = process.env.ONDEMAND_API_KEY || "<your_api_key>";
 console.log('📌 Schedule Agent API Key configured:', API_KEY ? `${API_KEY.substring(0, 10)}...` : 'NOT SET');
@@ -125,7 +127,7 @@ async function createScheduleSession(studentId, studentName) {
     console.log(`\n📅 Creating schedule session for ${studentName}...`);
 
     try {
-        const response = await fetch(url, {
+        const response = await ondemandFetch(url, {
             method: 'POST',
             headers: {
                 'apikey': API_KEY,
@@ -154,8 +156,9 @@ async function createScheduleSession(studentId, studentName) {
 
 /**
  * Generate weekly schedule
+ * @param {Object} handlers - readOnDemandStream handlers (onDelta, onMetrics) for the streamed answer
  */
-async function generateWeeklySchedule(sessionId, studentProfile, chapterInfo) {
+async function generateWeeklySchedule(sessionId, studentProfile, chapterInfo, handlers = {}) {
     const url = `${BASE_URL}/sessions/${sessionId}/query`;
 
     const query = `Generate a personalized weekly study schedule for:
@@ -200,7 +203,7 @@ Return ONLY valid JSON in the specified format.`;
     console.log(`📊 Student Level: ${studentProfile.masteryLevel || 'MODERATE'}`);
 
     try {
-        const response = await fetch(url, {
+        const response = await ondemandFetch(url, {
             method: 'POST',
             headers: {
                 'apikey': API_KEY,
@@ -212,75 +215,42 @@ Return ONLY valid JSON in the specified format.`;
         if (!response.ok) {
             const errorText = await response.text();
             console.error(`❌ API error (${response.status}):`, errorText);
-            return { success: false, error: `API error: ${response.status}` };
+            return { success: false, error: `API error: ${response.status}`, sessionGone: sessionGone(response) };
         }
 
-        // Handle streaming response
-        return new Promise((resolve, reject) => {
-            let buffer = '';
-            let fullAnswer = "";
-
-            response.body.on('data', (chunk) => {
-                buffer += chunk.toString();
-                const lines = buffer.split('\n');
-                buffer = lines.pop() || '';
-
-                for (const line of lines) {
-                    if (line.startsWith("data:")) {
-                        const dataStr = line.slice(5).trim();
-                        if (dataStr === "[DONE]") continue;
-
-                        try {
-                            const event = JSON.parse(dataStr);
-                            if (event.answer) {
-                                fullAnswer += event.answer;
-                            }
-                        } catch (e) {
-                            // Skip malformed events
-                        }
-                    }
-                }
-            });
-
-            response.body.on('end', () => {
-                console.log(`✅ Schedule generated (${fullAnswer.length} chars)`);
-
-                try {
-                    // Extract JSON from response
-                    const jsonMatch = fullAnswer.match(/\{[\s\S]*\}/);
-                    if (jsonMatch) {
-                        const parsed = JSON.parse(jsonMatch[0]);
-                        
-                        // Add metadata
-                        parsed.generatedAt = new Date().toISOString();
-                        parsed.studentId = studentProfile.id;
-                        
-                        resolve({
-                            success: true,
-                            schedule: parsed,
-                            rawResponse: fullAnswer
-                        });
-                    } else {
-                        resolve({
-                            success: false,
-                            error: 'No valid JSON in response',
-                            rawResponse: fullAnswer
-                        });
-                    }
-                } catch (parseError) {
-                    console.error('❌ JSON parse error:', parseError.message);
-                    resolve({
-                        success: false,
-                        error: 'Failed to parse schedule',
-                        rawResponse: fullAnswer
-                    });
-                }
-            });
-
-            response.body.on('error', (err) => {
-                reject({ success: false, error: err.message });
-            });
-        });
+        // Answer deltas can be acted on before the stream ends (handlers.onDelta)
+        const { answer: fullAnswer } = await readOnDemandStream(response.body, handlers);
+        console.log(`✅ Schedule generated (${fullAnswer.length} chars)`);
+
+        try {
+            // Extract JSON from response
+            const jsonMatch = fullAnswer.match(/\{[\s\S]*\}/);
+            if (jsonMatch) {
+                const parsed = JSON.parse(jsonMatch[0]);
+
+                // Add metadata
+                parsed.generatedAt = new Date().toISOString();
+                parsed.studentId = studentProfile.id;
+
+                return {
+                    success: true,
+                    schedule: parsed,
+                    rawResponse: fullAnswer
+                };
+            }
+            return {
+                success: false,
+                error: 'No valid JSON in response',
+                rawResponse: fullAnswer
+            };
+        } catch (parseError) {
+            console.error('❌ JSON parse error:', parseError.message);
+            return {
+                success: false,
+                error: 'Failed to parse schedule',
+                rawResponse: fullAnswer
+            };
+        }
 
     } catch (error) {
         console.error(`❌ Exception generating schedule: ${error.message}`);
@@ -290,8 +260,9 @@ Return ONLY valid JSON in the specified format.`;
 
 /**
  * Get daily questions for a specific day
+ * @param {Object} handlers - readOnDemandStream handlers (onDelta, onMetrics) for the streamed answer
  */
-async function getDailyQuestions(sessionId, studentProfile, daySchedule, historyLog = []) {
+async function getDailyQuestions(sessionId, studentProfile, daySchedule, historyLog = [], handlers = {}) {
     const url = `${BASE_URL}/sessions/${sessionId}/query`;
 
     const query = `Generate ${daySchedule.questionsCount || 10} practice questions for today's study session.
@@ -344,7 +315,7 @@ Return ONLY valid JSON.`;
     console.log(`\n📝 Generating daily questions...`);
 
     try {
-        const response = await fetch(url, {
+        const response = await ondemandFetch(url, {
             method: 'POST',
             headers: {
                 'apikey': API_KEY,
@@ -354,55 +325,26 @@ Return ONLY valid JSON.`;
         });
 
         if (!response.ok) {
-            return { success: false, error: `API error: ${response.status}` };
+            const errorText = await response.text();
+            console.error(`❌ API error (${response.status}):`, errorText);
+            return { success: false, error: `API error: ${response.status}`, sessionGone: sessionGone(response) };
         }
 
-        return new Promise((resolve, reject) => {
-            let buffer = '';
-            let fullAnswer = "";
-
-            response.body.on('data', (chunk) => {
-                buffer += chunk.toString();
-                const lines = buffer.split('\n');
-                buffer = lines.pop() || '';
-
-                for (const line of lines) {
-                    if (line.startsWith("data:")) {
-                        const dataStr = line.slice(5).trim();
-                        if (dataStr === "[DONE]") continue;
-
-                        try {
-                            const event = JSON.parse(dataStr);
-                            if (event.answer) {
-                                fullAnswer += event.answer;
-                            }
-                        } catch (e) {}
-                    }
-                }
-            });
-
-            response.body.on('end', () => {
-                try {
-                    const jsonMatch = fullAnswer.match(/\{[\s\S]*\}/);
-                    if (jsonMatch) {
-                        const parsed = JSON.parse(jsonMatch[0]);
-                        resolve({
-                            success: true,
-                            questions: parsed.questions || [],
-                            rawResponse: fullAnswer
-                        });
-                    } else {
-                        resolve({ success: false, error: 'No valid JSON' });
-                    }
-                } catch (e) {
-                    resolve({ success: false, error: e.message });
-                }
-            });
-
-            response.body.on('error', (err) => {
-                reject({ success: false, error: err.message });
-            });
-        });
+        const { answer: fullAnswer } = await readOnDemandStream(response.body, handlers);
+        try {
+            const jsonMatch = fullAnswer.match(/\{[\s\S]*\}/);
+            if (jsonMatch) {
+                const parsed = JSON.parse(jsonMatch[0]);
+                return {
+                    success: true,
+                    questions: parsed.questions || [],
+                    rawResponse: fullAnswer
+                };
+            }
+            return { success: false, error: 'No valid JSON' };
+        } catch (e) {
+            return { success: false, error: e.message };
+        }
 
     } catch (error) {
         return { success: false, error: error.message };
@@ -417,19 +359,21 @@ async function createWeeklySchedule(studentId, studentName, studentProfile, chap
     console.log('📅 SCHEDULE AGENT - Creating Weekly Study Schedule');
     console.log('='.repeat(60));
 
-    // Create session
-    const session = await createScheduleSession(studentId, studentName);
+    // Generate schedule in the student's schedule session (created on first use)
+    const { session, result: scheduleResult } = await withSession(
+        'schedule',
+        studentId,
+        () => createScheduleSession(studentId, studentName),
+        (scheduleSession) => generateWeeklySchedule(
+            scheduleSession.sessionId,
+            { ...studentProfile, id: studentId, name: studentName },
+            chapterInfo
+        )
+    );
     if (!session) {
         return { success: false, error: 'Failed to create session' };
     }
 
-    // Generate schedule
-    const scheduleResult = await generateWeeklySchedule(
-        session.sessionId,
-        { ...studentProfile, id: studentId, name: studentName },
-        chapterInfo
-    );
-
     if (!scheduleResult.success) {
         return { 
             success: false, 
@@ -479,22 +423,6 @@ async function generateScheduleFromContext(studentContext) {
         }
     }
 
-    // Create session
-    const session = await createScheduleSession(
-        studentContext.studentId || 'student_' + Date.now(),
-        studentContext.studentName
-    );
-
-    if (!session) {
-        return { 
-            success: false, 
-            error: 'Failed to create session',
-            performanceLevel,
-            schedule: generateFallbackSchedule(studentContext, performanceLevel),
-            recommendations: getDefaultRecommendations(performanceLevel)
-        };
-    }
-
     // Build student profile
     const studentProfile = {
         name: studentContext.studentName,
@@ -518,13 +446,29 @@ async function generateScheduleFromContext(studentContext) {
     console.log('📊 Performance Level:', performanceLevel);
     console.log('📖 Chapter Info:', chapterInfo);
 
-    // Generate schedule
-    const scheduleResult = await generateWeeklySchedule(
-        session.sessionId,
-        studentProfile,
-        chapterInfo
+    // Generate schedule in the student's schedule session (created on first use)
+    const studentId = studentContext.studentId || 'student_' + Date.now();
+    const { session, result: scheduleResult } = await withSession(
+        'schedule',
+        studentId,
+        () => createScheduleSession(studentId, studentContext.studentName),
+        (scheduleSession) => generateWeeklySchedule(
+            scheduleSession.sessionId,
+            studentProfile,
+            chapterInfo
+        )
     );
 
+    if (!session) {
+        return { 
+            success: false, 
+            error: 'Failed to create session',
+            performanceLevel,
+            schedule: generateFallbackSchedule(studentContext, performanceLevel),
+            recommendations: getDefaultRecommendations(performanceLevel)
+        };
+    }
+
     if (!scheduleResult.success) {
         console.log('⚠️ Schedule generation failed, using fallback');
         return {
@@ -1,8 +1,19 @@
-const fetch = require('node-fetch');
 const { v4: uuidv4 } = require('uuid');
-const { spawn } = require('child_process');
 const fs = require('fs');
 const path = require('path');
+const { renderWithRepair } = require('../render/repair');
+const { createHlsStream } = require('../render/hlsStream');
+const { submitPreview } = require('../render/workerPool');
+const { enqueueJob } = require('../render/jobQueue');
+const { preflightScript, describePreflightErrors } = require('../render/preflight');
+const { prepareNarration, muxNarration } = require('../render/narration');
+const { publishRender } = require('../render/manifest');
+const { createScratch, withScratch } = require('../render/scratch');
+const { QUALITIES, FIRST_QUALITY } = require('../render/renditions');
+const { RENDER_FRAGMENTS } = require('../render/fragments');
+const { ondemandFetch } = require('../ondemand/http');
+const { readOnDemandStream } = require('../ondemand/stream');
+const { sessionGone, withSession } = require('../ondemand/sessions');
 
 const API_KEY = process.env.ONDEMAND_API_KEY || "<your_api_key>";
 console.log('📌 Teacher Agent API Key configured:', API_KEY ? `${API_KEY.substring(0, 10)}...` : 'NOT SET');
@@ -175,6 +186,10 @@ class ConceptLesson(Scene):
 // Ensure directories exist
 const MANIM_SCRIPTS_DIR = path.join(__dirname, '..', 'manim_scripts');
 const MANIM_OUTPUT_DIR = path.join(__dirname, '..', '..', 'client', 'public', 'videos');
+const RENDER_SECTIONS = process.env.RENDER_SECTIONS !== '0';
+const RENDER_HLS = process.env.RENDER_HLS !== '0';
+const LESSON_NARRATION = process.env.LESSON_NARRATION !== '0';
+const NARRATION_AUDIO_DIR = path.join(__dirname, '..', 'output', 'audio');
 
 function ensureDirectories() {
     if (!fs.existsSync(MANIM_SCRIPTS_DIR)) {
@@ -206,7 +221,7 @@ async function createTeacherSession(studentId, studentName) {
     console.log(`📚 Creating teacher session for student: ${studentName} (${studentId})`);
 
     try {
-        const response = await fetch(url, {
+        const response = await ondemandFetch(url, {
             method: 'POST',
             headers: {
                 'apikey': API_KEY,
@@ -235,8 +250,9 @@ async function createTeacherSession(studentId, studentName) {
 
 /**
  * Submit teaching request to teacher agent
+ * @param {Object} handlers - readOnDemandStream handlers (onDelta, onMetrics) for the streamed answer
  */
-async function submitTeachingQuery(sessionId, query, contextMetadata) {
+async function submitTeachingQuery(sessionId, query, contextMetadata, handlers = {}) {
     const url = `${BASE_URL}/sessions/${sessionId}/query`;
     
     const body = {
@@ -259,7 +275,7 @@ async function submitTeachingQuery(sessionId, query, contextMetadata) {
     console.log(`🎓 Submitting teaching query...`);
 
     try {
-        const response = await fetch(url, {
+        const response = await ondemandFetch(url, {
             method: 'POST',
             headers: {
                 'apikey': API_KEY,
@@ -268,69 +284,62 @@ async function submitTeachingQuery(sessionId, query, contextMetadata) {
             body: JSON.stringify(body)
         });
 
+        if (!response.ok) {
+            const respBody = await response.text();
+            console.error(`❌ Error submitting teaching query: ${response.status} - ${respBody}`);
+            return { success: false, error: `API error: ${response.status}`, sessionGone: sessionGone(response) };
+        }
+
         if (!response.body) {
             console.error("❌ No response body for streaming.");
             return null;
         }
 
-        let fullAnswer = "";
-        let finalSessionId = "";
-        let finalMessageId = "";
-        let metrics = {};
-
-        // Node.js streaming with node-fetch v2
-        return new Promise((resolve, reject) => {
-            let buffer = '';
-
-            response.body.on('data', (chunk) => {
-                buffer += chunk.toString();
-                const lines = buffer.split('\n');
-                buffer = lines.pop() || '';
-
-                for (const line of lines) {
-                    if (line.startsWith("data:")) {
-                        const dataStr = line.slice(5).trim();
-                        if (dataStr === "[DONE]") continue;
-
-                        try {
-                            const event = JSON.parse(dataStr);
-                            if (event.eventType === "fulfillment") {
-                                if (event.answer) fullAnswer += event.answer;
-                                if (event.sessionId) finalSessionId = event.sessionId;
-                                if (event.messageId) finalMessageId = event.messageId;
-                            } else if (event.eventType === "metricsLog") {
-                                if (event.publicMetrics) metrics = event.publicMetrics;
-                            }
-                        } catch (e) {
-                            continue;
-                        }
-                    }
-                }
-            });
-
-            response.body.on('end', () => {
-                console.log(`✅ Teacher response complete. Length: ${fullAnswer.length} characters`);
-                resolve({
-                    sessionId: finalSessionId,
-                    messageId: finalMessageId,
-                    answer: fullAnswer,
-                    metrics: metrics,
-                    status: "completed",
-                    contextMetadata: contextMetadata,
-                });
-            });
-
-            response.body.on('error', (error) => {
-                console.error(`❌ Stream error: ${error.message}`);
-                reject(error);
-            });
-        });
+        // Answer deltas can be acted on before the stream ends (handlers.onDelta)
+        const streamed = await readOnDemandStream(response.body, handlers);
+        console.log(`✅ Teacher response complete. Length: ${streamed.answer.length} characters`);
+        return {
+            sessionId: streamed.sessionId,
+            messageId: streamed.messageId,
+            answer: streamed.answer,
+            metrics: streamed.metrics,
+            status: "completed",
+            contextMetadata: contextMetadata,
+        };
     } catch (error) {
         console.error(`❌ Exception during query submission: ${error.message}`);
         return null;
     }
 }
 
+/**
+ * Ask the teacher agent to correct a script whose render failed and no
+ * local fix applies (render/repair.js llmFix)
+ * @returns {Promise<string|null>} corrected script
+ */
+async function requestScriptFix(source, failure) {
+    const sessionData = await createTeacherSession('render-repair', 'Render repair');
+    if (!sessionData) return null;
+
+    const query = `This Manim Community Edition script failed to render.
+
+Cause: ${failure.cause}${failure.line ? ` (line ${failure.line})` : ''}
+Traceback:
+${failure.traceback}
+
+Script:
+\`\`\`python
+${source}
+\`\`\`
+
+Fix the error with as few changes as possible. Keep the scene class name, the "# Section N" and "# Teacher Voice:" comments and the lesson content.
+Return ONLY the complete corrected script in a \`\`\`python code block.`;
+
+    console.log(`🩹 Asking the teacher agent to fix the script (${failure.signature || failure.cause})`);
+    const response = await submitTeachingQuery(sessionData.sessionId, query, sessionData.contextMetadata);
+    return response && response.answer ? extractManimCode(response.answer) : null;
+}
+
 /**
  * Determine mastery level based on analytics
  */
@@ -467,190 +476,241 @@ function saveManimScript(code, lessonId) {
 }
 
 /**
- * Render Manim animation
+ * Pre-flight a lesson script before it takes a render slot (and fix what can be fixed safely)
+ * @returns {Promise<{sceneName, preflight, error}>}
  */
-async function renderManimAnimation(scriptPath, lessonId) {
-    return new Promise((resolve, reject) => {
-        // Extract scene class name from the script
-        const scriptContent = fs.readFileSync(scriptPath, 'utf-8');
-        const sceneMatch = scriptContent.match(/class\s+(\w+)\s*\(\s*Scene\s*\)/);
-        const sceneName = sceneMatch ? sceneMatch[1] : 'TeachingScene';
-        
-        console.log(`🎬 Rendering Manim animation: ${sceneName}`);
+async function checkLessonScript(scriptPath) {
+    const scriptContent = fs.readFileSync(scriptPath, 'utf-8');
+    const preflight = await preflightScript(scriptContent, { repair: true });
+    if (!preflight.ok) {
+        const error = `Pre-flight check failed: ${describePreflightErrors(preflight)}`;
+        console.error(`❌ ${error}`);
+        return { error, preflight };
+    }
+    if (preflight.repairedSource) {
+        console.log(`🔧 Repaired script before rendering: ${preflight.repairs.join(', ')}`);
+        fs.writeFileSync(scriptPath, preflight.repairedSource, 'utf-8');
+    }
+    
+    // Extract scene class name from the script
+    const sceneMatch = scriptContent.match(/class\s+(\w+)\s*\(\s*Scene\s*\)/);
+    const sceneName = preflight.sceneName || (sceneMatch ? sceneMatch[1] : 'TeachingScene');
+    
+    if (!preflight.skipped) {
+        console.log(`📋 ${sceneName}: ${preflight.animationCount} animations, ~${Math.round(preflight.estimatedSeconds)}s (checked in ${preflight.elapsedMs}ms)`);
+    }
+    return { sceneName, preflight };
+}
+
+/**
+ * Render Manim animation on the warm render worker pool (cached by script content)
+ * @param {Object} options
+ * @param {Function} options.onStreamReady - called with an HLS playlist URL as soon as the first animation can be played
+ * @param {number} options.priority - render priority on the worker pool (see jobQueue.JOB_PRIORITIES)
+ * @param {string} options.quality - manim quality flag (first rung of the quality ladder by default)
+ * @param {string} options.jobId - render queue job recorded in the manifest
+ * @param {Object} options.progress - progress tracker (render/progress.js) told about each stage and animation
+ */
+async function renderManimAnimation(scriptPath, lessonId, { onStreamReady, priority, quality = FIRST_QUALITY, jobId = null, progress = null } = {}) {
+    const checked = await checkLessonScript(scriptPath);
+    if (checked.error) {
+        return { success: false, error: checked.error, preflight: checked.preflight };
+    }
+    const { sceneName, preflight } = checked;
+    if (progress && !preflight.skipped) progress.expect(preflight.animationCount);
+    
+    // Synthesize the "# Teacher Voice:" narration first: its length decides how long each block runs
+    if (progress && LESSON_NARRATION) progress.stage('tts');
+    const narration = LESSON_NARRATION
+        ? await prepareNarration(scriptPath, { sceneName, audioDir: path.join(NARRATION_AUDIO_DIR, lessonId, quality), priority })
+        : null;
+    
+    console.log(`🎬 Rendering Manim animation: ${sceneName} (${QUALITIES[quality].label})`);
+    if (progress) progress.stage('render');
+    
+    // Partial movie files, texts/ and Tex/ go to a scratch folder that is
+    // removed once the video is published (or the render failed)
+    const scratch = createScratch(`${lessonId}_${quality}`);
+    try {
+        const stream = onStreamReady && RENDER_HLS ? createHlsStream(lessonId, { onReady: onStreamReady }) : null;
+        const onEvent = stream || progress
+            ? (event) => {
+                if (stream) stream.handleEvent(event);
+                if (progress) progress.handleEvent(event);
+            }
+            : null;
         
-        const outputDir = path.join(MANIM_OUTPUT_DIR, lessonId);
-        if (!fs.existsSync(outputDir)) {
-            fs.mkdirSync(outputDir, { recursive: true });
-        }
+        // A failed render is classified from its traceback, fixed and retried
+        const renderResult = await renderWithRepair({
+            scriptPath,
+            sceneName,
+            quality,
+            mediaDir: scratch.dir,
+            cwd: path.dirname(scriptPath),      // Run in the script's directory
+            sections: RENDER_SECTIONS,          // Render "# Section N" blocks in parallel
+            fragments: RENDER_FRAGMENTS,        // Title card and outro come from the fragment cache
+            onEvent,
+            priority
+        }, { llmFix: requestScriptFix });
         
-        // Use the virtual environment Python if available, otherwise fall back to system python
-        let pythonPath = 'python';
-        const venvPath = path.join(__dirname, '..', '..', '.venv', 'Scripts', 'python.exe');
-        if (fs.existsSync(venvPath)) {
-            pythonPath = venvPath;
-            console.log(`📦 Using virtual environment Python: ${pythonPath}`);
-        } else {
-            console.log(`📦 Using system Python`);
+        // Close the live playlist for viewers already watching it, or drop it if nothing was streamed
+        if (stream) {
+            if (renderResult.success && stream.isLive()) {
+                await stream.finish();
+            } else {
+                await stream.discard();
+            }
         }
         
-        // FFmpeg path - required for Manim video rendering
-        const ffmpegDir = 'C:\\Users\\asmit\\AppData\\Local\\Microsoft\\WinGet\\Packages\\Gyan.FFmpeg_Microsoft.Winget.Source_8wekyb3d8bbwe\\ffmpeg-8.0.1-full_build\\bin';
-        const envPath = process.env.PATH || '';
-        const newPath = ffmpegDir + ';' + envPath;
-        
-        console.log(`🎞️ FFmpeg path added to environment`);
-        
-        // Use python -m manim to run manim module directly
-        const pythonProcess = spawn(pythonPath, [
-            '-m', 'manim',
-            '-ql',                          // Low quality for faster rendering
-            scriptPath,                     // The Python script
-            sceneName,                      // Scene class name
-            '--media_dir', outputDir,       // Output directory
-        ], {
-            shell: true,
-            stdio: ['pipe', 'pipe', 'pipe'],
-            cwd: path.dirname(scriptPath),   // Run in the script's directory
-            env: { ...process.env, PATH: newPath }  // Include FFmpeg in PATH
-        });
-        
-        let stdout = '';
-        let stderr = '';
+        // A repaired script was rewritten in place before the retry
+        const manimCode = renderResult.repairs && renderResult.repairs.length > 0
+            ? fs.readFileSync(scriptPath, 'utf-8')
+            : undefined;
         
-        pythonProcess.stdout.on('data', (data) => {
-            const output = data.toString();
-            stdout += output;
-            // Only log progress lines
-            if (output.includes('Rendering') || output.includes('Scene') || output.includes('Writing') || output.includes('Animation')) {
-                console.log(`📹 ${output.trim()}`);
+        if (!renderResult.success) {
+            if (renderResult.notInstalled) {
+                console.log(`❌ ${renderResult.error}`);
+            } else {
+                const failure = renderResult.failure || {};
+                console.error(`❌ Manim rendering failed (${failure.cause || 'unknown cause'})`);
+                console.error(failure.traceback || renderResult.stderr || renderResult.error || '');
             }
-        });
+            return {
+                success: false,
+                error: renderResult.error,
+                notInstalled: renderResult.notInstalled,
+                failure: renderResult.failure,
+                repairs: renderResult.repairs,
+                manimCode,
+                stderr: renderResult.stderr
+            };
+        }
         
-        pythonProcess.stderr.on('data', (data) => {
-            const output = data.toString();
-            stderr += output;
-            // Log progress from stderr (Manim writes progress here)
-            if (output.includes('Rendering') || output.includes('Scene') || output.includes('Writing')) {
-                console.log(`📹 ${output.trim()}`);
-            }
-        });
+        if (!renderResult.videoPath || !fs.existsSync(renderResult.videoPath)) {
+            console.log(`⚠️ Video not found after rendering`);
+            return {
+                success: false,
+                error: 'Video file not found after rendering.',
+                stderr: renderResult.stderr
+            };
+        }
         
-        pythonProcess.on('close', (code) => {
-            if (code === 0) {
-                // Find the generated video file
-                const videoResult = findGeneratedVideo(outputDir, sceneName, lessonId);
-                if (videoResult) {
-                    console.log(`✅ Animation rendered successfully: ${videoResult.absolutePath}`);
-                    resolve({
-                        success: true,
-                        videoPath: videoResult.absolutePath,
-                        relativePath: videoResult.relativePath
-                    });
-                } else {
-                    console.log(`⚠️ Video not found after rendering`);
-                    resolve({
-                        success: false,
-                        error: 'Video file not found after rendering. Check output directory.',
-                        outputDir,
-                        stdout,
-                        stderr
-                    });
-                }
+        // Narrate into a temporary file that is then published in place of the silent render
+        if (progress) progress.stage('mux');
+        const outputPath = path.join(MANIM_OUTPUT_DIR, lessonId, `${lessonId}_${quality}.mp4`);
+        let sourcePath = renderResult.videoPath;
+        if (narration) {
+            const narratedPath = path.join(scratch.dir, 'narrated.mp4');
+            const muxResult = await muxNarration(renderResult.videoPath, narration.segments, narratedPath);
+            if (muxResult.success) {
+                sourcePath = narratedPath;
             } else {
-                // Check if it's a module not found error
-                const errorMsg = (stderr + stdout).toLowerCase();
-                
-                if (errorMsg.includes('no module named') || errorMsg.includes('modulenotfounderror')) {
-                    console.log(`❌ Manim Python module not found. Install with: pip install manim`);
-                    resolve({
-                        success: false,
-                        error: 'Manim module not found. Install with: pip install manim',
-                        notInstalled: true,
-                        stdout,
-                        stderr
-                    });
-                } else if (errorMsg.includes('not recognized') || errorMsg.includes('command not found')) {
-                    console.log(`❌ Python command not found in PATH`);
-                    resolve({
-                        success: false,
-                        error: 'Python not found in PATH. Ensure Python is installed and in PATH.',
-                        notInstalled: true,
-                        stdout,
-                        stderr
-                    });
-                } else {
-                    console.error(`❌ Manim rendering failed with code ${code}`);
-                    console.error(`Error output: ${stderr.substring(0, 300)}`);
-                    resolve({
-                        success: false,
-                        error: `Rendering failed: ${stderr.substring(0, 200) || stdout.substring(0, 200)}`,
-                        stdout,
-                        stderr
-                    });
-                }
+                console.log(`⚠️ Narration could not be added, keeping the silent video: ${muxResult.error}`);
             }
-        });
+        }
         
-        pythonProcess.on('error', (error) => {
-            console.error(`❌ Failed to start Manim: ${error.message}`);
-            reject(error);
+        const entry = await publishRender(`${lessonId}_${quality}`, sourcePath, outputPath, {
+            move: sourcePath !== renderResult.videoPath,
+            jobId,
+            lessonId,
+            sceneName,
+            quality,
+            cacheKey: renderResult.cacheKey || null,
+            narrated: sourcePath !== renderResult.videoPath
         });
-    });
+        // The path is reused by every re-render, so the URL carries the content hash
+        const videoResult = toVideoResult(entry.path);
+        
+        console.log(`✅ Animation ${renderResult.cached ? 'served from cache' : `rendered successfully in ${renderResult.elapsedMs}ms`}: ${entry.path}`);
+        return {
+            success: true,
+            videoPath: entry.path,
+            relativePath: `${videoResult.relativePath}?v=${entry.hash.substring(0, 12)}`,
+            quality,
+            duration: entry.duration,
+            cached: !!renderResult.cached,
+            repairs: renderResult.repairs,
+            manimCode
+        };
+    } finally {
+        scratch.release();
+    }
 }
 
 /**
- * Find generated video file in output directory
+ * Preview a lesson without rendering it: the scene runs with animations
+ * skipped on the render pool and returns key still frames (section titles,
+ * section ends, final frame) plus the timeline measured per section.
+ * @param {Object} options
+ * @param {number} options.priority - pool priority (previews are interactive)
+ * @param {number} options.maxFrames - cap on saved still frames
  */
-function findGeneratedVideo(outputDir, sceneName, lessonId) {
-    console.log(`🔍 Searching for video in: ${outputDir}, scene: ${sceneName}`);
-    
-    // Recursive search for the final mp4 file (not partial files)
-    function findFinalMp4(dir, depth = 0) {
-        if (!fs.existsSync(dir) || depth > 10) return null;
-        
-        const items = fs.readdirSync(dir, { withFileTypes: true });
-        
-        // First, check current directory for mp4 files matching scene name
-        for (const item of items) {
-            if (!item.isDirectory() && item.name.endsWith('.mp4')) {
-                // Skip partial movie files
-                if (dir.includes('partial_movie_files')) continue;
-                
-                const fullPath = path.join(dir, item.name);
-                console.log(`📹 Found video: ${fullPath}`);
-                
-                // Prefer files matching the scene name
-                if (sceneName && item.name.includes(sceneName)) {
-                    return fullPath;
-                }
-            }
-        }
-        
-        // Then search subdirectories
-        for (const item of items) {
-            if (item.isDirectory() && item.name !== 'partial_movie_files') {
-                const found = findFinalMp4(path.join(dir, item.name), depth + 1);
-                if (found) return found;
-            }
-        }
-        
-        return null;
+async function previewManimAnimation(scriptPath, lessonId, { priority, maxFrames } = {}) {
+    const checked = await checkLessonScript(scriptPath);
+    if (checked.error) {
+        return { success: false, error: checked.error, preflight: checked.preflight };
     }
+    const { sceneName, preflight } = checked;
+    
+    console.log(`🖼️ Previewing Manim animation: ${sceneName}`);
     
-    const videoPath = findFinalMp4(outputDir);
+    const outputDir = path.join(MANIM_OUTPUT_DIR, lessonId, 'preview');
+    const previewResult = await withScratch(`${lessonId}_preview`, mediaDir => submitPreview({
+        scriptPath,
+        sceneName,
+        outputDir,
+        mediaDir,
+        cwd: path.dirname(scriptPath),
+        maxFrames,
+        priority
+    }));
     
-    if (videoPath) {
-        // Calculate relative path from client/public/videos
-        const videosDir = path.join(__dirname, '..', '..', 'client', 'public', 'videos');
-        const relativePath = path.relative(videosDir, videoPath).replace(/\\/g, '/');
-        console.log(`✅ Video relative path: /videos/${relativePath}`);
+    if (!previewResult.success) {
+        console.error(`❌ Manim preview failed: ${(previewResult.error || '').substring(0, 300)}`);
         return {
-            absolutePath: videoPath,
-            relativePath: `/videos/${relativePath}`
+            success: false,
+            error: previewResult.error,
+            notInstalled: previewResult.notInstalled,
+            // The static estimate is still useful when manim cannot run
+            estimate: preflight.skipped ? null : {
+                totalSeconds: preflight.estimatedSeconds,
+                animationCount: preflight.animationCount,
+                sections: preflight.sections
+            }
         };
     }
     
-    return null;
+    // Frames keep their names between previews, so version the URLs
+    const version = Date.now();
+    console.log(`✅ Preview ready in ${previewResult.elapsedMs}ms: ${previewResult.frames.length} frames, ~${Math.round(previewResult.totalSeconds)}s of video`);
+    return {
+        success: true,
+        sceneName,
+        elapsedMs: previewResult.elapsedMs,
+        totalSeconds: previewResult.totalSeconds,
+        animationCount: previewResult.animationCount,
+        timeline: previewResult.timeline,
+        frames: previewResult.frames.map(frame => ({
+            kind: frame.kind,
+            section: frame.section,
+            title: frame.title,
+            seconds: frame.seconds,
+            url: `${toVideoResult(frame.path).relativePath}?v=${version}`
+        })),
+        frameErrors: previewResult.frameErrors,
+        repairs: preflight.repairs || []
+    };
+}
+
+/**
+ * Build absolute and public (/videos/...) paths for a rendered video
+ */
+function toVideoResult(videoPath) {
+    const relativePath = path.relative(MANIM_OUTPUT_DIR, videoPath).replace(/\\/g, '/');
+    return {
+        absolutePath: videoPath,
+        relativePath: `/videos/${relativePath}`
+    };
 }
 
 /**
@@ -661,8 +721,17 @@ async function generateTeachingLesson(studentId, studentName, analytics, quizAtt
     
     const lessonId = `lesson_${Date.now()}`;
     
-    // Create teacher session
-    const sessionData = await createTeacherSession(studentId, studentName);
+    // Format and submit teaching query
+    const { query, masteryLevel, topic } = formatTeachingQuery(analytics, quizAttempts, specificTopic);
+    console.log(`📊 Student Level: ${masteryLevel}, Topic: ${topic}`);
+    
+    // In the student's teacher session (created on first use)
+    const { session: sessionData, result: teacherResponse } = await withSession(
+        'teacher',
+        studentId,
+        () => createTeacherSession(studentId, studentName),
+        (session) => submitTeachingQuery(session.sessionId, query, session.contextMetadata)
+    );
     if (!sessionData) {
         return {
             success: false,
@@ -670,16 +739,6 @@ async function generateTeachingLesson(studentId, studentName, analytics, quizAtt
         };
     }
     
-    // Format and submit teaching query
-    const { query, masteryLevel, topic } = formatTeachingQuery(analytics, quizAttempts, specificTopic);
-    console.log(`📊 Student Level: ${masteryLevel}, Topic: ${topic}`);
-    
-    const teacherResponse = await submitTeachingQuery(
-        sessionData.sessionId,
-        query,
-        sessionData.contextMetadata
-    );
-    
     if (!teacherResponse || !teacherResponse.answer) {
         return {
             success: false,
@@ -711,7 +770,27 @@ async function generateTeachingLesson(studentId, studentName, analytics, quizAtt
         console.log(`✅ Manim code extracted (${manimCode.length} chars)`);
         
         try {
-            const scriptPath = saveManimScript(manimCode, lessonId);
+            // Reject (or repair) broken scripts here so they never reach the render queue
+            const preflight = await preflightScript(manimCode, { repair: true });
+            result.preflight = {
+                verdict: preflight.verdict,
+                animationCount: preflight.animationCount,
+                estimatedSeconds: preflight.estimatedSeconds,
+                repairs: preflight.repairs
+            };
+            if (!preflight.ok) {
+                console.log(`❌ Generated script failed pre-flight: ${describePreflightErrors(preflight)}`);
+                result.renderStatus = 'failed';
+                result.renderError = `Pre-flight check failed: ${describePreflightErrors(preflight)}`;
+                console.log(`✅ Teaching lesson generated: ${lessonId} (no video)`);
+                return result;
+            }
+            if (preflight.repairedSource) {
+                console.log(`🔧 Repaired generated script: ${preflight.repairs.join(', ')}`);
+                result.manimCode = preflight.repairedSource;
+            }
+            
+            const scriptPath = saveManimScript(result.manimCode, lessonId);
             result.scriptPath = scriptPath;
             
             // If skipRendering is true, just return with 'rendering' status (will be done in background)
@@ -722,12 +801,14 @@ async function generateTeachingLesson(studentId, studentName, analytics, quizAtt
                 // Attempt rendering (this may fail if Manim is not installed)
                 try {
                     const renderResult = await renderManimAnimation(scriptPath, lessonId);
+                    if (renderResult.manimCode) result.manimCode = renderResult.manimCode;
                     if (renderResult.success) {
                         result.videoUrl = renderResult.relativePath;
                         result.renderStatus = 'completed';
                     } else {
                         result.renderStatus = 'failed';
                         result.renderError = renderResult.error;
+                        result.renderFailure = renderResult.failure;
                     }
                 } catch (renderError) {
                     console.log(`⚠️ Manim rendering skipped: ${renderError.message}`);
@@ -763,10 +844,14 @@ async function generateChapterContent(studentId, studentName, analytics) {
             studentName,
             analytics,
             [],
-            concept
+            concept,
+            true  // Rendered by the job queue instead of one after another here
         );
         
         if (lesson.success) {
+            if (lesson.scriptPath) {
+                lesson.renderJobId = await enqueueJob('chapter', { lessonId: lesson.lessonId, scriptPath: lesson.scriptPath });
+            }
             chapters.push({
                 concept,
                 lesson
@@ -789,5 +874,7 @@ module.exports = {
     generateChapterContent,
     determineMasteryLevel,
     extractManimCode,
-    renderManimAnimation
+    renderManimAnimation,
+    previewManimAnimation,
+    requestScriptFix
 };